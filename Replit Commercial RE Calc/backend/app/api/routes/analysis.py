@@ -1,69 +1,147 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from typing import Dict, Any
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
+from typing import Dict, Any, List
 import json
 
-from app.core.database import get_db
-from app.services.calculations import FinancialCalculator
-from app.services.ai_analysis import AIAnalyzer
-from app.schemas.deal import DealInput, DealAnalysisResponse
+from app.core.database import get_async_db
+from app.core.metrics import TimedRoute, timed
+from app.services.analysis_stages import loan_terms_update, run_stages
+from app.services.ai_analysis import AIAnalyzer, ai_analysis_stats
+from app.services import analysis_snapshots
+from app.services.screening import screen_deals
+from app.services.batch_metrics import deals_to_columns
+from app.services.sensitivity import axis_values, encode_grid, sensitivity_grid
+from app.schemas.deal import DealInput, DealAnalysis, DealMetrics, ScreeningPage, ScreeningRequest, SensitivityGridAxis, SensitivityGridRequest, SensitivityGrid
 
-router = APIRouter()
+router = APIRouter(route_class=TimedRoute)
 
-@router.post("/analyze-deal", response_model=DealAnalysisResponse)
+@router.post("/analyze-deal", response_model=DealAnalysis)
 async def analyze_deal(
     deal_input: DealInput,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Analyze a commercial real estate deal and return financial metrics and AI insights
+    
+    Grids of metrics over adjusted inputs come from /sensitivity-analysis.
     """
     try:
-        # Initialize calculators
-        calculator = FinancialCalculator()
-        ai_analyzer = AIAnalyzer()
-        
         # Calculate financial metrics
-        financial_metrics = calculator.calculate_all_metrics(deal_input)
-        
-        # Generate AI analysis
-        ai_analysis = ai_analyzer.analyze_deal(deal_input, financial_metrics)
-        
-        # Create sensitivity table
-        sensitivity_table = calculator.create_sensitivity_table(deal_input, financial_metrics)
+        with timed("metrics"):
+            results, _ = run_stages(deal_input, through="returns")
+        financial_metrics = results["returns"]["metrics"]
         
-        # Prepare response
-        analysis_result = {
-            "dealInput": deal_input.dict(),
-            "financialMetrics": financial_metrics,
-            "sensitivityTable": sensitivity_table,
-            "aiAnalysis": ai_analysis
-        }
+        # Generate AI analysis; falls back to the grading rules if the model is slow or down
+        with timed("aiAnalysis"):
+            ai_analysis = await AIAnalyzer().analyze_deal(deal_input, financial_metrics)
         
-        return DealAnalysisResponse(**analysis_result)
+        return DealAnalysis(
+            # Echo the input with the loan terms the analysis settled on
+            dealInput=deal_input.model_copy(
+                update={"loanTerms": deal_input.loanTerms.model_copy(update=loan_terms_update(results))}
+            ),
+            financialMetrics=financial_metrics,
+            aiAnalysis=ai_analysis
+        )
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Analysis failed: {str(e)}")
 
-@router.get("/metrics/{deal_id}")
-async def get_deal_metrics(deal_id: int, db: Session = Depends(get_db)):
+@router.get("/ai-analysis/stats")
+async def get_ai_analysis_stats():
+    """
+    Share of analyses answered by the model rather than the rules, model failures, and cache hit ratio
+    """
+    return ai_analysis_stats()
+
+@router.get("/metrics", response_model=List[DealMetrics])
+async def get_deals_metrics(
+    dealId: List[int] = Query(..., max_length=500),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Get financial metrics for several deals at once, in the order requested; unknown deals are left out
+    """
+    try:
+        metrics = await analysis_snapshots.get_deal_metrics(db, dealId)
+        return [metrics[deal_id] for deal_id in dict.fromkeys(dealId) if deal_id in metrics]
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Metrics retrieval failed: {str(e)}")
+
+@router.get("/metrics/{deal_id}", response_model=DealMetrics)
+async def get_deal_metrics(deal_id: int, db: AsyncSession = Depends(get_async_db)):
     """
     Get financial metrics for a specific deal
+
+    The stored analysis is served as is while the deal and calculator are
+    unchanged since it was computed; otherwise it is recomputed and stored.
+    """
+    try:
+        metrics = await analysis_snapshots.get_deal_metrics(db, [deal_id])
+        if deal_id not in metrics:
+            raise HTTPException(status_code=404, detail="Deal not found")
+        return metrics[deal_id]
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Metrics retrieval failed: {str(e)}")
+
+@router.post("/screen", response_model=ScreeningPage)
+async def screen(
+    request: ScreeningRequest,
+    db: AsyncSession = Depends(get_async_db)
+):
     """
-    # TODO: Implement deal retrieval and metrics calculation
-    pass
+    Find analyzed deals whose metrics fall within every requested range, a page at a time
 
-@router.post("/sensitivity-analysis")
+    Only deals analyzed since they were last edited are screened.
+    """
+    try:
+        items, next_cursor = await screen_deals(
+            db,
+            request.filters,
+            sort=request.sort,
+            descending=request.descending,
+            cursor=request.cursor,
+            limit=request.limit
+        )
+        return ScreeningPage(items=items, nextCursor=next_cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Screening failed: {str(e)}")
+
+@router.post("/sensitivity-analysis", response_model=SensitivityGrid)
 async def sensitivity_analysis(
-    deal_input: DealInput,
-    db: Session = Depends(get_db)
+    request: SensitivityGridRequest,
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
-    Perform sensitivity analysis on deal parameters
+    Perform sensitivity analysis over the full cartesian grid of the requested axes
     """
     try:
-        calculator = FinancialCalculator()
-        sensitivity_results = calculator.create_sensitivity_table(deal_input)
-        return {"sensitivity_table": sensitivity_results}
+        axes = [
+            (axis.parameter, axis_values(axis.values, axis.low, axis.high, axis.steps))
+            for axis in request.axes
+        ]
+        # A 6 x 11 grid takes seconds; off the event loop
+        result = await run_in_threadpool(
+            sensitivity_grid, deals_to_columns([request.dealInput]), axes, request.metrics
+        )
+        encoding, metrics = encode_grid(result.metrics, request.encoding)
+        return SensitivityGrid(
+            axes=[SensitivityGridAxis(parameter=parameter, values=values.tolist()) for parameter, values in axes],
+            shape=[len(values) for _, values in axes],
+            encoding=encoding,
+            metrics=metrics,
+            estimatedInputs=result.estimated,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Sensitivity analysis failed: {str(e)}") 
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Sensitivity analysis failed: {str(e)}")
@@ -4,10 +4,11 @@ from sqlalchemy.orm import Session
 from typing import Optional
 
 from app.core.database import get_db
+from app.core.metrics import TimedRoute
 from app.services.auth_service import AuthService
 from app.schemas.user import UserResponse
 
-router = APIRouter()
+router = APIRouter(route_class=TimedRoute)
 security = HTTPBearer()
 
 @router.get("/me", response_model=UserResponse)
@@ -1,60 +1,118 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from typing import List
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
 
-from app.core.database import get_db
-from app.schemas.deal import DealInput, DealResponse
+from app.core.database import get_async_db
+from app.core.metrics import TimedRoute
+from app.schemas.deal import DealInput, DealPage, DealResponse, DealSummary, DealSummaryPage, PortfolioSummary
 from app.services.deal_service import DealService
+from app.services.portfolio import get_portfolio
 
-router = APIRouter()
+router = APIRouter(route_class=TimedRoute)
 
 @router.post("/", response_model=DealResponse)
 async def create_deal(
     deal_input: DealInput,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Create a new deal
     """
     try:
         deal_service = DealService(db)
-        deal = deal_service.create_deal(deal_input)
-        return DealResponse.from_orm(deal)
+        deal = await deal_service.create_deal(deal_input)
+        return DealResponse.model_validate(deal)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to create deal: {str(e)}")
 
-@router.get("/", response_model=List[DealResponse])
+@router.get("/", response_model=DealSummaryPage)
 async def get_deals(
-    skip: int = 0,
-    limit: int = 100,
-    db: Session = Depends(get_db)
+    cursor: Optional[str] = None,
+    limit: int = Query(default=100, ge=1, le=1000),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
-    Get all deals for the current user
+    Get a page of deals for the current user, newest first
+    
+    Pass the returned nextCursor as cursor to get the following page.
     """
     try:
         deal_service = DealService(db)
-        deals = deal_service.get_deals(skip=skip, limit=limit)
-        return [DealResponse.from_orm(deal) for deal in deals]
+        rows, next_cursor = await deal_service.get_deal_summaries(cursor=cursor, limit=limit)
+        return DealSummaryPage(
+            items=[
+                DealSummary(
+                    id=row.id,
+                    name=row.name,
+                    propertyType=row.property_type,
+                    purchasePrice=row.purchase_price,
+                    numberOfUnits=row.number_of_units,
+                    createdAt=row.created_at,
+                    updatedAt=row.updated_at
+                )
+                for row in rows
+            ],
+            nextCursor=next_cursor
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to get deals: {str(e)}")
 
+@router.get("/details", response_model=DealPage)
+async def get_deal_details(
+    cursor: Optional[str] = None,
+    limit: int = Query(default=100, ge=1, le=1000),
+    include: List[str] = Query(default=[]),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Get a page of full deals for the current user, newest first
+    
+    include (repeatable: rentRoll, analysis) names the relationships to load;
+    each costs one extra query for the whole page.
+    """
+    try:
+        deal_service = DealService(db)
+        deals, next_cursor = await deal_service.get_deals(cursor=cursor, limit=limit, include=include)
+        return DealPage(items=[DealResponse.model_validate(deal) for deal in deals], nextCursor=next_cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to get deals: {str(e)}")
+
+@router.get("/portfolio", response_model=PortfolioSummary)
+async def get_portfolio_summary(db: AsyncSession = Depends(get_async_db)):
+    """
+    Get portfolio totals across all deals of the current user
+    
+    Totals are kept up to date as deals and analyses are saved, so this is a
+    single row lookup however many deals there are.
+    """
+    try:
+        return await get_portfolio(db)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to get portfolio: {str(e)}")
+
 @router.get("/{deal_id}", response_model=DealResponse)
 async def get_deal(
     deal_id: int,
-    db: Session = Depends(get_db)
+    include: List[str] = Query(default=["rentRoll"]),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Get a specific deal by ID
     """
     try:
         deal_service = DealService(db)
-        deal = deal_service.get_deal(deal_id)
+        deal = await deal_service.get_deal(deal_id, include=include)
         if not deal:
             raise HTTPException(status_code=404, detail="Deal not found")
-        return DealResponse.from_orm(deal)
+        return DealResponse.model_validate(deal)
     except HTTPException:
         raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to get deal: {str(e)}")
 
@@ -62,17 +120,17 @@ async def get_deal(
 async def update_deal(
     deal_id: int,
     deal_input: DealInput,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Update a deal
     """
     try:
         deal_service = DealService(db)
-        deal = deal_service.update_deal(deal_id, deal_input)
+        deal = await deal_service.update_deal(deal_id, deal_input)
         if not deal:
             raise HTTPException(status_code=404, detail="Deal not found")
-        return DealResponse.from_orm(deal)
+        return DealResponse.model_validate(deal)
     except HTTPException:
         raise
     except Exception as e:
@@ -81,14 +139,14 @@ async def update_deal(
 @router.delete("/{deal_id}")
 async def delete_deal(
     deal_id: int,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Delete a deal
     """
     try:
         deal_service = DealService(db)
-        success = deal_service.delete_deal(deal_id)
+        success = await deal_service.delete_deal(deal_id)
         if not success:
             raise HTTPException(status_code=404, detail="Deal not found")
         return {"message": "Deal deleted successfully"}
@@ -1,22 +1,61 @@
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Response
+from fastapi.responses import JSONResponse, StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List
 import os
 
-from app.core.database import get_db
+from app.core.database import get_async_db
 from app.core.config import settings
-from app.services.file_parser import FileParser
-from app.schemas.file import FileUploadResponse
+from app.core.metrics import TimedRoute
+from app.services.file_parser import FileParser, ParserBusyError
+from app.services.jobs import submit_upload_job
+from app.services.upload_cache import CachedJSON, JSONStream, upload_cache
+from app.schemas.file import FileUploadResponse, UploadCacheStats
+from app.schemas.job import JobSubmission
 
-router = APIRouter()
+router = APIRouter(route_class=TimedRoute)
 
-@router.post("/upload-rent-roll", response_model=FileUploadResponse)
+def cached_upload_response(cached: CachedJSON, message: str) -> Response:
+    """
+    Response for a cache hit, splicing the stored result into the body as-is
+    """
+    fields = f'{{"success":true,"message":"{message}","error":null,"cached":true,'.encode()
+    return Response(content=fields + cached[1:], media_type="application/json")
+
+def streamed_upload_response(result: JSONStream, message: str) -> StreamingResponse:
+    """
+    Response for a result too large to hold in memory, sent as it is read or encoded
+    """
+    fields = f'{{"success":true,"message":"{message}","error":null,"cached":{"true" if result.cached else "false"},'.encode()
+
+    def body():
+        chunks = iter(result)
+        yield fields + next(chunks)[1:]
+        yield from chunks
+
+    return StreamingResponse(body(), media_type="application/json")
+
+async def queued_upload_response(db: AsyncSession, kind: str, file: UploadFile, **options) -> JSONResponse:
+    """
+    202 for an upload handed to a background job; the job's result is the body the upload would have returned
+    """
+    job = await submit_upload_job(db, kind, file, **options)
+    submission = JobSubmission(jobId=job.id, type=job.kind, status=job.status)
+    return JSONResponse(status_code=202, content=submission.model_dump())
+
+@router.post("/upload-rent-roll", response_model=FileUploadResponse, responses={202: {"model": JobSubmission}})
 async def upload_rent_roll(
     file: UploadFile = File(...),
-    db: Session = Depends(get_db)
+    stream: bool = False,
+    background: bool = False,
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Upload and parse rent roll file (CSV, Excel)
+
+    With stream=true a CSV is parsed chunk by chunk into a columnar rent roll,
+    which allows files up to MAX_STREAMING_FILE_SIZE. With background=true the
+    file is parsed by a background job instead, and 202 returns its id.
     """
     try:
         # Validate file type
@@ -30,37 +69,55 @@ async def upload_rent_roll(
             )
         
         # Validate file size
-        if file.size > settings.MAX_FILE_SIZE:
+        max_size = settings.MAX_STREAMING_FILE_SIZE if stream else settings.MAX_FILE_SIZE
+        if file.size and file.size > max_size:
             raise HTTPException(
                 status_code=400,
-                detail=f"File too large. Maximum size: {settings.MAX_FILE_SIZE / (1024*1024)}MB"
+                detail=f"File too large. Maximum size: {max_size / (1024*1024)}MB"
             )
         
+        if background:
+            return await queued_upload_response(db, "rent_roll", file, stream=stream)
+        
         # Parse file
         file_parser = FileParser()
-        rent_roll_data = await file_parser.parse_rent_roll(file)
+        rent_roll_data = await file_parser.parse_rent_roll(file, stream=stream)
+        
+        if isinstance(rent_roll_data, CachedJSON):
+            return cached_upload_response(rent_roll_data, "Rent roll parsed successfully")
+        if isinstance(rent_roll_data, JSONStream):
+            return streamed_upload_response(rent_roll_data, "Rent roll parsed successfully")
         
         return FileUploadResponse(
             success=True,
-            data=rent_roll_data,
-            message="Rent roll parsed successfully"
+            message="Rent roll parsed successfully",
+            **rent_roll_data
         )
         
     except HTTPException:
         raise
+    except ParserBusyError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except TimeoutError as e:
+        raise HTTPException(status_code=504, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(
             status_code=500,
             detail=f"Failed to process file: {str(e)}"
         )
 
-@router.post("/upload-t12", response_model=FileUploadResponse)
+@router.post("/upload-t12", response_model=FileUploadResponse, responses={202: {"model": JobSubmission}})
 async def upload_t12(
     file: UploadFile = File(...),
-    db: Session = Depends(get_db)
+    background: bool = False,
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Upload and parse T12 financial statement (PDF)
+
+    With background=true the file is parsed by a background job, and 202 returns its id.
     """
     try:
         # Validate file type
@@ -77,18 +134,28 @@ async def upload_t12(
                 detail=f"File too large. Maximum size: {settings.MAX_FILE_SIZE / (1024*1024)}MB"
             )
         
+        if background:
+            return await queued_upload_response(db, "t12", file)
+        
         # Parse file
         file_parser = FileParser()
         t12_data = await file_parser.parse_t12(file)
         
+        if isinstance(t12_data, CachedJSON):
+            return cached_upload_response(t12_data, "T12 statement parsed successfully")
+        
         return FileUploadResponse(
             success=True,
-            data=t12_data,
-            message="T12 statement parsed successfully"
+            message="T12 statement parsed successfully",
+            **t12_data
         )
         
     except HTTPException:
         raise
+    except TimeoutError as e:
+        raise HTTPException(status_code=504, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(
             status_code=500,
@@ -103,10 +170,19 @@ async def get_supported_formats():
     return {
         "rent_roll": {
             "formats": ["CSV", "Excel (.xlsx, .xls)"],
-            "max_size_mb": settings.MAX_FILE_SIZE / (1024*1024)
+            "max_size_mb": settings.MAX_FILE_SIZE / (1024*1024),
+            "streaming_formats": ["CSV"],
+            "streaming_max_size_mb": settings.MAX_STREAMING_FILE_SIZE / (1024*1024)
         },
         "t12": {
             "formats": ["PDF"],
             "max_size_mb": settings.MAX_FILE_SIZE / (1024*1024)
         }
-    } 
\ No newline at end of file
+    }
+
+@router.get("/cache-stats", response_model=UploadCacheStats)
+async def get_upload_cache_stats():
+    """
+    Hit/miss counters and size of the parsed-upload cache
+    """
+    return UploadCacheStats(**upload_cache.stats())
\ No newline at end of file
@@ -0,0 +1,97 @@
+from fastapi import APIRouter, Depends, HTTPException, Response
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
+
+from app.api.routes.files import streamed_upload_response
+from app.core.database import get_async_db
+from app.core.metrics import TimedRoute
+from app.schemas.job import AIAnalysisJobRequest, JobStatus, JobSubmission
+from app.services.analysis_snapshots import json_floats
+from app.services.jobs import FINISHED, cached_result, cancel_job, get_job, job_status, submit_job
+
+# The app including this router runs the job workers from its lifespan (start_job_runner, stop_job_runner)
+router = APIRouter(route_class=TimedRoute)
+
+@router.post("/ai-analysis", response_model=JobSubmission, status_code=202)
+async def submit_ai_analysis(
+    request: AIAnalysisJobRequest,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Queue AI commentary on a deal; the result is an AIAnalysis
+    """
+    try:
+        job = await submit_job(db, "ai_analysis", {
+            "dealInput": request.dealInput.model_dump(),
+            "financialMetrics": json_floats(request.financialMetrics.model_dump()),
+        })
+        return JobSubmission(jobId=job.id, type=job.kind, status=job.status)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to queue analysis: {str(e)}")
+
+@router.get("/{job_id}", response_model=JobStatus)
+async def get_job_status(
+    job_id: str,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Status and progress of a job; poll until it is succeeded, failed or cancelled
+    """
+    try:
+        job = await get_job(db, job_id)
+        if job is None:
+            raise HTTPException(status_code=404, detail="Job not found or expired")
+        return job_status(job)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to get job: {str(e)}")
+
+@router.get("/{job_id}/result")
+async def get_job_result(
+    job_id: str,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Result of a succeeded job, in the form the job type's synchronous endpoint returns
+    """
+    try:
+        job = await get_job(db, job_id)
+        if job is None:
+            raise HTTPException(status_code=404, detail="Job not found or expired")
+        if job.status != "succeeded":
+            detail = f"Job {job.status}" + (f": {job.error}" if job.error else "")
+            raise HTTPException(status_code=409, detail=detail)
+        if job.result_entry is not None:
+            stream = await run_in_threadpool(cached_result, job)
+            if stream is None:
+                raise HTTPException(
+                    status_code=410,
+                    detail="Job result evicted from the upload cache; upload the file again"
+                )
+            return streamed_upload_response(stream, job.result_entry["message"])
+        return Response(content=job.result, media_type="application/json")
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to get job result: {str(e)}")
+
+@router.post("/{job_id}/cancel", response_model=JobStatus)
+async def cancel(
+    job_id: str,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Cancel a queued or running job; a running job stops within a few seconds
+    """
+    try:
+        job = await cancel_job(db, job_id)
+        if job is None:
+            raise HTTPException(status_code=404, detail="Job not found or expired")
+        if job.status in FINISHED and job.status != "cancelled":
+            raise HTTPException(status_code=409, detail=f"Job already {job.status}")
+        return job_status(job)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to cancel job: {str(e)}")
\ No newline at end of file
@@ -1,10 +1,17 @@
 from pydantic_settings import BaseSettings
-from typing import List
+from typing import Dict, List
 import os
 
 class Settings(BaseSettings):
     # Database - Use SQLite for Replit, PostgreSQL for production
     DATABASE_URL: str = "sqlite:///./commercial_re_calc.db"
+    DATABASE_POOL_SIZE: int = 5  # connections kept open per engine
+    DATABASE_MAX_OVERFLOW: int = 10  # extra connections allowed under load
+    DATABASE_POOL_TIMEOUT: float = 30.0  # seconds to wait for a free connection
+    DATABASE_POOL_RECYCLE: int = 300  # seconds before a connection is replaced
+    DATABASE_CONNECT_TIMEOUT: int = 10  # seconds to establish a connection
+    RENT_ROLL_WRITE_BATCH: int = 1000  # rent roll rows per bulk INSERT, UPDATE or DELETE
+    SCREENING_PROBE_ROWS: int = 20_000  # deal screens scan and sort a filter range narrower than this (SQLite)
     
     # Security
     SECRET_KEY: str = "your-secret-key-here-change-this-in-production"
@@ -29,6 +36,13 @@ class Settings(BaseSettings):
     
     # OpenAI
     OPENAI_API_KEY: str = ""
+    OPENAI_BASE_URL: str = ""  # empty = api.openai.com; any compatible server, e.g. a local stub
+    OPENAI_MODEL: str = "gpt-3.5-turbo-1106"
+    AI_ANALYSIS_MAX_CONCURRENCY: int = 8  # model calls in flight across the process
+    AI_ANALYSIS_TIMEOUT: float = 8.0  # seconds per deal, waiting for a slot included, before the rules answer instead
+    AI_ANALYSIS_RETRY_AFTER: float = 30.0  # seconds the model is skipped after it fails or times out
+    AI_ANALYSIS_CACHE_SIZE: int = 4096  # answers kept by metrics profile; 0 disables
+    AI_ANALYSIS_CACHE_TTL: float = 24 * 3600.0  # seconds
     
     # Stripe
     STRIPE_SECRET_KEY: str = ""
@@ -37,6 +51,37 @@ class Settings(BaseSettings):
     # File Upload
     MAX_FILE_SIZE: int = 10 * 1024 * 1024  # 10MB
     UPLOAD_DIR: str = "uploads"
+    MAX_STREAMING_FILE_SIZE: int = 1024 * 1024 * 1024  # 1GB, streamed CSV rent rolls
+    RENT_ROLL_CHUNK_ROWS: int = 50_000  # rows parsed per step when streaming
+    EXCEL_PARSE_WORKERS: int = 2  # processes parsing workbooks
+    EXCEL_PARSE_QUEUE_DEPTH: int = 10  # workbooks queued or parsing before uploads are turned away
+    EXCEL_PARSE_TIMEOUT: float = 60.0  # seconds per workbook
+    PDF_PARSE_WORKERS: int = 2  # processes extracting T12 pages
+    PDF_PARSE_TIMEOUT: float = 120.0  # seconds per T12 upload
+    UPLOAD_CACHE_MAX_BYTES: int = 512 * 1024 * 1024  # parsed-upload cache under UPLOAD_DIR; 0 disables
+    
+    # Memoized /api/analyze-deal results, also the analyses /api/reanalyze-deal can patch
+    ANALYSIS_CACHE_SIZE: int = 1024  # 0 disables
+    ANALYSIS_CACHE_TTL: float = 600.0  # seconds
+    ANALYSIS_CACHE_MAX_BYTES: int = 256 * 1024 * 1024  # estimated memory of the cached analyses; 0 for no limit
+    
+    # Background jobs, queued in the database and run by workers in every API process
+    JOB_WORKERS: Dict[str, int] = {"rent_roll": 2, "t12": 2, "ai_analysis": 4}  # concurrent jobs per type, per process
+    JOB_POLL_INTERVAL: float = 2.0  # seconds between checks for jobs submitted to other processes
+    JOB_HEARTBEAT_INTERVAL: float = 2.0  # seconds between lease renewals, progress writes and cancel checks
+    JOB_LEASE_TIMEOUT: float = 30.0  # seconds without a heartbeat before a running job is retried elsewhere
+    JOB_MAX_ATTEMPTS: int = 3  # runs of a job whose worker keeps disappearing before it is failed
+    JOB_RESULT_TTL: float = 24 * 3600.0  # seconds finished jobs and their results are kept
+    
+    # Grading
+    GRADING_RULES_FILE: str = ""  # JSON replacing keys of DEFAULT_GRADING_RULES; reloaded when it changes
+    
+    # Monte Carlo simulation
+    SIMULATION_WORKERS: int = 0  # 0 = one worker process per CPU
+    SIMULATION_MAX_PATHS: int = 1_000_000
+    
+    # Instrumentation (app.core.metrics)
+    SERVER_TIMING_HEADER: bool = True  # per-stage timings on every response; turn off to keep them from clients
     
     # App Settings
     DEBUG: bool = True
@@ -1,25 +1,161 @@
-from sqlalchemy import create_engine
+from contextlib import contextmanager
+from typing import AsyncIterator, Iterator, List, Optional, Union
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
 from app.core.config import settings
+from app.core.metrics import register_collector
+
+# Async drivers used for each sync DATABASE_URL backend
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+    "postgres": "postgresql+asyncpg",
+}
+
+def async_database_url(url: str) -> str:
+    """DATABASE_URL with its driver swapped for the async one (aiosqlite, asyncpg)"""
+    parsed = make_url(url)
+    backend = parsed.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(f"No async driver configured for '{backend}' databases")
+    return parsed.set(drivername=ASYNC_DRIVERS[backend]).render_as_string(hide_password=False)
+
+# Name of the connect timeout argument for each driver
+CONNECT_TIMEOUT_ARGS = {
+    "pysqlite": "timeout",
+    "aiosqlite": "timeout",
+    "psycopg2": "connect_timeout",
+    "asyncpg": "timeout",
+}
+
+def engine_options(url: str) -> dict:
+    """Pool and timeout options from Settings for an engine on url"""
+    parsed = make_url(url)
+    options = {
+        "pool_pre_ping": True,
+        "pool_recycle": settings.DATABASE_POOL_RECYCLE,
+    }
+    timeout_arg = CONNECT_TIMEOUT_ARGS.get(parsed.get_driver_name())
+    if timeout_arg:
+        options["connect_args"] = {timeout_arg: settings.DATABASE_CONNECT_TIMEOUT}
+    # In-memory SQLite runs on a single static connection; there is no pool to size
+    if not (parsed.get_backend_name() == "sqlite" and parsed.database in (None, "", ":memory:")):
+        options.update(
+            pool_size=settings.DATABASE_POOL_SIZE,
+            max_overflow=settings.DATABASE_MAX_OVERFLOW,
+            pool_timeout=settings.DATABASE_POOL_TIMEOUT,
+        )
+        # aiosqlite defaults to opening a connection per checkout; pool file databases like the others
+        if parsed.get_driver_name() == "aiosqlite":
+            options["poolclass"] = AsyncAdaptedQueuePool
+    return options
+
+# INSERT constructs supporting ON CONFLICT, for each backend with an async driver
+UPSERT_INSERTS = {
+    "postgresql": postgresql.insert,
+    "sqlite": sqlite.insert,
+}
+
+def upsert_insert(dialect_name: str, table):
+    """INSERT into table that accepts on_conflict_do_update() on the given backend"""
+    if dialect_name not in UPSERT_INSERTS:
+        raise ValueError(f"Upserts are not supported on '{dialect_name}' databases")
+    return UPSERT_INSERTS[dialect_name](table)
 
 # Create database engine
-engine = create_engine(
-    settings.DATABASE_URL,
-    pool_pre_ping=True,
-    pool_recycle=300,
-)
+engine = create_engine(settings.DATABASE_URL, **engine_options(settings.DATABASE_URL))
 
 # Create session factory
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Async engine and session factory, created on first use so the async driver is only needed when used
+_async_engine: Optional[AsyncEngine] = None
+_async_session_factory: Optional[async_sessionmaker] = None
+
+def get_async_engine() -> AsyncEngine:
+    global _async_engine
+    if _async_engine is None:
+        url = async_database_url(settings.DATABASE_URL)
+        _async_engine = create_async_engine(url, **engine_options(url))
+    return _async_engine
+
+def get_async_session_factory() -> async_sessionmaker:
+    global _async_session_factory
+    if _async_session_factory is None:
+        # Objects stay usable after commit; lazy refreshes would need a round trip outside the await
+        _async_session_factory = async_sessionmaker(
+            get_async_engine(), autoflush=False, expire_on_commit=False
+        )
+    return _async_session_factory
+
+def _pools() -> List[tuple]:
+    # (engine label, pool) of each engine created so far with a sized pool
+    engines = [("sync", engine)]
+    if _async_engine is not None:
+        engines.append(("async", _async_engine.sync_engine))
+    return [(name, bound.pool) for name, bound in engines if isinstance(bound.pool, QueuePool)]
+
+# (metric, help, reading of a QueuePool); the pool's own overflow count starts below zero
+POOL_METRICS = (
+    ("db_pool_size", "Connections the pool keeps open", lambda pool: pool.size()),
+    ("db_pool_checked_out", "Connections in use", lambda pool: pool.checkedout()),
+    ("db_pool_checked_in", "Open connections waiting in the pool", lambda pool: pool.checkedin()),
+    ("db_pool_overflow", "Connections open beyond the pool size", lambda pool: max(pool.overflow(), 0)),
+)
+
+for _name, _help, _read in POOL_METRICS:
+    register_collector(
+        _name, _help, "gauge",
+        lambda read=_read: [("", {"engine": name}, read(pool)) for name, pool in _pools()],
+    )
+
 # Create base class for models
 Base = declarative_base()
 
+async def create_tables() -> None:
+    """Create the table of every model registered with Base that does not exist yet, through the async engine"""
+    async with get_async_engine().begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
 # Dependency to get database session
 def get_db():
     db = SessionLocal()
     try:
         yield db
     finally:
-        db.close() 
\ No newline at end of file
+        db.close()
+
+# Dependency to get an async database session; DB round trips are awaited instead of blocking the event loop
+async def get_async_db() -> AsyncIterator[AsyncSession]:
+    async with get_async_session_factory()() as db:
+        yield db
+
+@contextmanager
+def count_queries(bind: Union[Engine, AsyncEngine]) -> Iterator[List[str]]:
+    """
+    Collect the SQL statements executed on bind inside the block.
+
+    Used to check that a code path issues a fixed number of statements however
+    many rows it handles, e.g. that listing deals has no per-deal queries:
+
+        with count_queries(get_async_engine()) as statements:
+            await DealService(db).get_deals(include=["rentRoll"])
+        assert len(statements) <= 2
+    """
+    sync_engine = bind.sync_engine if isinstance(bind, AsyncEngine) else bind
+    statements: List[str] = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(sync_engine, "before_cursor_execute", record)
+    try:
+        yield statements
+    finally:
+        event.remove(sync_engine, "before_cursor_execute", record)
\ No newline at end of file
@@ -0,0 +1,472 @@
+"""
+Request timing: Server-Timing headers and Prometheus metrics.
+
+RequestMetricsMiddleware starts a RequestTiming for every HTTP request and
+keeps it in a context variable for the length of the request. The endpoints
+of routes built with TimedRoute (the route_class of the app and of every
+router) mark when they start and finish, which splits the request into
+three stages without any code in the endpoints:
+
+    validate   routing, reading the body, validating it and resolving dependencies
+    endpoint   the endpoint function itself
+    serialize  validating and encoding what the endpoint returned
+
+Endpoints time their own steps inside that with `with timed("name"):` or
+record_stage. When the response starts, the stages so far and the total go
+out as a Server-Timing header (milliseconds, as browsers' dev tools expect),
+and when it ends the request's latency and stages are added to histograms
+labelled by route template, so /api/deals/{deal_id} is one series however
+many deals there are.
+
+GET /metrics renders those, the requests in flight and the collectors
+registered with register_collector (cache hit ratios, connection pools) in
+the Prometheus text format. Nothing outside a request is timed: timed and
+record_stage do nothing when there is no current request, so services can
+be called from jobs and benchmarks as they are.
+
+Every request is timed by stage, so the per-request path is kept short. The
+RequestTiming objects are pooled and reused, each with its send wrapper bound
+once, so a request allocates no timing object or closure of its own. The
+series a route updates are looked up once, not by label values on every
+request, and finished requests are added to them in batches. What is left
+is a few perf_counter calls, the context variable, formatting the header
+(SERVER_TIMING_HEADER turns that off) and binning the stages into the
+histogram.
+"""
+
+import asyncio
+import bisect
+import functools
+from time import perf_counter
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from fastapi.routing import APIRoute
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from app.core.config import settings
+
+# Upper bounds, in seconds, of the latency histogram buckets
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Route label of requests no route matched
+UNMATCHED_ROUTE = "unmatched"
+
+# Starlette appends the charset
+CONTENT_TYPE = "text/plain; version=0.0.4"
+
+# A sample: (name suffix, labels, value)
+Sample = Tuple[str, Dict[str, str], float]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _format_samples(name: str, help_text: str, kind: str, samples: Iterable[Sample]) -> List[str]:
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+    for suffix, labels, value in samples:
+        label_text = ",".join(f'{key}="{_escape(str(label))}"' for key, label in labels.items())
+        lines.append(f"{name}{suffix}{{{label_text}}} {_format_value(value)}" if label_text
+                     else f"{name}{suffix} {_format_value(value)}")
+    return lines
+
+
+class Metric:
+    """
+    A named metric with a fixed set of label names; one series per combination of label values.
+
+    Only updated and read on the event loop (by the middleware and /metrics), so there is no lock.
+    """
+
+    kind = "untyped"
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self._series: Dict[Tuple[str, ...], Any] = {}
+
+    def render(self) -> List[str]:
+        return _format_samples(self.name, self.help, self.kind, self.samples())
+
+    def samples(self) -> Iterator[Sample]:
+        for label_values, value in list(self._series.items()):
+            yield "", dict(zip(self.labels, label_values)), value
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    # Each series is a one-item list, so a caller can hold on to it and count without the lookup
+
+    def cell(self, *label_values: str) -> List[int]:
+        cell = self._series.get(label_values)
+        if cell is None:
+            cell = self._series[label_values] = [0]
+        return cell
+
+    def inc(self, *label_values: str) -> None:
+        self.cell(*label_values)[0] += 1
+
+    def samples(self) -> Iterator[Sample]:
+        for label_values, cell in list(self._series.items()):
+            yield "", dict(zip(self.labels, label_values)), cell[0]
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def __init__(self, name: str, help_text: str):
+        super().__init__(name, help_text)
+        self.value = 0
+
+    def samples(self) -> Iterator[Sample]:
+        yield "", {}, self.value
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(buckets)
+
+    def series(self, *label_values: str) -> list:
+        """One count per bucket, not yet cumulative, the +Inf bucket last, then the sum; see observe_series"""
+        series = self._series.get(label_values)
+        if series is None:
+            series = self._series[label_values] = [0] * (len(self.buckets) + 1) + [0.0]
+        return series
+
+    def observe_series(self, series: list, value: float) -> None:
+        series[bisect.bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def observe(self, value: float, *label_values: str) -> None:
+        self.observe_series(self.series(*label_values), value)
+
+    def samples(self) -> Iterator[Sample]:
+        for label_values, series in list(self._series.items()):
+            labels = dict(zip(self.labels, label_values))
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), series):
+                cumulative += count
+                yield "_bucket", {**labels, "le": _format_value(float(bound))}, cumulative
+            yield "_sum", labels, series[-1]
+            yield "_count", labels, cumulative
+
+
+REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds", "Time to answer an HTTP request, by route", ("method", "route")
+)
+REQUESTS = Counter("http_requests_total", "HTTP requests answered, by route and status", ("method", "route", "status"))
+REQUESTS_IN_FLIGHT = Gauge("http_requests_in_flight", "HTTP requests being answered")
+STAGE_DURATION = Histogram(
+    "http_request_stage_seconds",
+    "Time spent in each stage of answering a request, by route",
+    ("route", "stage"),
+)
+
+METRICS: List[Metric] = [REQUEST_DURATION, REQUESTS, REQUESTS_IN_FLIGHT, STAGE_DURATION]
+
+# name -> (help, type, callable returning samples); called on every scrape
+_collectors: Dict[str, Tuple[str, str, Callable[[], Iterable[Sample]]]] = {}
+
+
+def register_collector(name: str, help_text: str, kind: str, collect: Callable[[], Iterable[Sample]]) -> None:
+    """Add a metric whose samples are read when /metrics is scraped, e.g. from a cache's stats()"""
+    _collectors[name] = (help_text, kind, collect)
+
+
+# cache name -> its stats(); TTLCache and UploadCache both report hits, misses and evictions
+_caches: Dict[str, Callable[[], Dict[str, float]]] = {}
+
+# (metric, help, type, stats key)
+CACHE_METRICS = (
+    ("cache_hits_total", "Cache lookups answered from the cache", "counter", "hits"),
+    ("cache_misses_total", "Cache lookups that missed", "counter", "misses"),
+    ("cache_evictions_total", "Entries evicted to stay within the cache's bound", "counter", "evictions"),
+    ("cache_hit_ratio", "Share of lookups answered from the cache since the process started", "gauge", "hitRatio"),
+    ("cache_entries", "Entries held", "gauge", "entries"),
+)
+
+
+def register_cache(name: str, stats: Callable[[], Dict[str, float]]) -> None:
+    """Expose a cache's stats() as the cache_* metrics, labelled cache=name"""
+    _caches[name] = stats
+
+
+def _cache_samples(key: str) -> Iterator[Sample]:
+    for name, stats in _caches.items():
+        values = stats()
+        lookups = values["hits"] + values["misses"]
+        values = {
+            **values,
+            "hitRatio": values["hits"] / lookups if lookups else 0.0,
+            "entries": values.get("size", values.get("entries", 0)),
+        }
+        yield "", {"cache": name}, values[key]
+
+
+for _name, _help, _kind, _key in CACHE_METRICS:
+    register_collector(_name, _help, _kind, functools.partial(_cache_samples, _key))
+
+
+def render_metrics() -> str:
+    """Every metric and collector in the Prometheus text exposition format"""
+    record_finished()
+    lines = []
+    for metric in METRICS:
+        lines.extend(metric.render())
+    for name, (help_text, kind, collect) in _collectors.items():
+        lines.extend(_format_samples(name, help_text, kind, collect()))
+    return "\n".join(lines) + "\n"
+
+
+class RequestTiming:
+    """
+    The timing of the request being answered, and the send wrapper that adds
+    its Server-Timing header. Pooled: acquire_timing hands one out for each
+    request and release_timing takes it back once the request has finished.
+    """
+
+    __slots__ = (
+        "started", "stages", "endpoint_started", "endpoint_finished", "status", "sent_stages", "scope", "send",
+        "send_with_timing",
+    )
+
+    def __init__(self):
+        # Stages timed inside the endpoint, in the order they finished
+        self.stages: List[Tuple[str, float]] = []
+        # Bound once here rather than once per request
+        self.send_with_timing = self._send_with_timing
+        self.reset()
+
+    def reset(self) -> None:
+        self.started = 0.0
+        self.stages.clear()
+        self.endpoint_started: Optional[float] = None
+        self.endpoint_finished: Optional[float] = None
+        self.status = 500
+        # The stages as of the response starting, as the header and the histograms report them
+        self.sent_stages: Optional[List[Tuple[str, float]]] = None
+        self.scope: Optional[Scope] = None
+        self.send: Optional[Send] = None
+
+    def route_stages(self, now: float) -> List[Tuple[str, float]]:
+        """All the stages of a request a route answered, with validate, endpoint and serialize around the rest"""
+        if self.endpoint_started is None:
+            # Rejected before the endpoint ran, e.g. an invalid body
+            return [("validate", now - self.started), *self.stages]
+        finished = self.endpoint_finished or now
+        return [
+            ("validate", self.endpoint_started - self.started),
+            ("endpoint", finished - self.endpoint_started),
+            *self.stages,
+            ("serialize", now - finished),
+        ]
+
+    # Hands back send's awaitable rather than being a coroutine itself: one less per message
+    def _send_with_timing(self, message):
+        if message["type"] == "http.response.start":
+            self.status = message["status"]
+            now = perf_counter()
+            # The router puts the matched route in the scope; FastAPI routes are always there
+            stages = self.sent_stages = self.route_stages(now) if "route" in self.scope else list(self.stages)
+            if settings.SERVER_TIMING_HEADER:
+                # The message dict is new for each send, but its headers list is the response's own
+                header = (b"server-timing", _server_timing(stages, now - self.started))
+                message["headers"] = [*message.get("headers", ()), header]
+        return self.send(message)
+
+    def finished_stages(self) -> List[Tuple[str, float]]:
+        """The stages to record once the request is over; those sent, or all so far if no response started"""
+        return list(self.stages) if self.sent_stages is None else self.sent_stages
+
+
+# Idle RequestTimings, and how many are kept for reuse
+_timings: List[RequestTiming] = []
+TIMING_POOL_SIZE = 256
+
+
+def acquire_timing(scope: Scope, send: Send) -> RequestTiming:
+    timing = _timings.pop() if _timings else RequestTiming()
+    timing.started = perf_counter()
+    timing.scope = scope
+    timing.send = send
+    return timing
+
+
+def release_timing(timing: RequestTiming) -> None:
+    if len(_timings) < TIMING_POOL_SIZE:
+        timing.reset()
+        _timings.append(timing)
+
+
+class RouteSeries:
+    """
+    The series a route's requests update, looked up once per route and method
+    rather than by label values on every request.
+    """
+
+    __slots__ = ("method", "label", "duration", "counts", "stages")
+
+    def __init__(self, method: str, label: str):
+        self.method = method
+        self.label = label
+        self.duration = REQUEST_DURATION.series(method, label)
+        self.counts: Dict[int, List[int]] = {}  # status -> REQUESTS cell
+        self.stages: Dict[str, list] = {}  # stage -> STAGE_DURATION series
+
+    def record(self, elapsed: float, status: int, stages: Iterable[Tuple[str, float]]) -> None:
+        REQUEST_DURATION.observe_series(self.duration, elapsed)
+        count = self.counts.get(status)
+        if count is None:
+            count = self.counts[status] = REQUESTS.cell(self.method, self.label, str(status))
+        count[0] += 1
+        buckets = STAGE_DURATION.buckets
+        for name, seconds in stages:
+            series = self.stages.get(name)
+            if series is None:
+                series = self.stages[name] = STAGE_DURATION.series(self.label, name)
+            series[bisect.bisect_left(buckets, seconds)] += 1
+            series[-1] += seconds
+
+
+_route_series: Dict[Tuple[str, str], RouteSeries] = {}
+
+
+def route_series(method: str, label: str) -> RouteSeries:
+    series = _route_series.get((method, label))
+    if series is None:
+        series = _route_series[(method, label)] = RouteSeries(method, label)
+    return series
+
+
+# Requests answered but not yet in the histograms: (method, route or None, seconds, status, stages).
+# Added a batch at a time, and before every scrape, so a request only appends to this.
+_finished: List[Tuple[str, Any, float, int, Sequence[Tuple[str, float]]]] = []
+FINISHED_BATCH = 256
+
+
+def record_finished() -> None:
+    """Add the requests answered since the last call to the request metrics"""
+    for method, route, elapsed, status, stages in _finished:
+        label = route.path_format if route is not None else UNMATCHED_ROUTE
+        route_series(method, label).record(elapsed, status, stages)
+    _finished.clear()
+
+
+# Server-Timing format for a number of stages, with the total last
+_server_timing_formats: Dict[int, str] = {}
+
+
+def _server_timing(stages: List[Tuple[str, float]], total: float) -> bytes:
+    # One % for the whole header; formatting the milliseconds is most of its cost
+    values = []
+    for name, seconds in stages:
+        values += (name, seconds * 1000)
+    values.append(total * 1000)
+    template = _server_timing_formats.get(len(stages))
+    if template is None:
+        template = _server_timing_formats[len(stages)] = "%s;dur=%.3f, " * len(stages) + "total;dur=%.3f"
+    return (template % tuple(values)).encode()
+
+
+_current: ContextVar[Optional[RequestTiming]] = ContextVar("request_timing", default=None)
+
+
+def record_stage(name: str, seconds: float) -> None:
+    """Add a stage timed elsewhere to the current request"""
+    timing = _current.get()
+    if timing is not None:
+        timing.stages.append((name, seconds))
+
+
+class timed:
+    """Time the block as a stage of the current request: `with timed("name"):`"""
+
+    # A class rather than a generator-based context manager: it runs on every request
+    __slots__ = ("name", "timing", "start")
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self) -> None:
+        self.timing = _current.get()
+        self.start = perf_counter()
+
+    def __exit__(self, *exc_info) -> None:
+        if self.timing is not None:
+            self.timing.stages.append((self.name, perf_counter() - self.start))
+
+
+class RequestMetricsMiddleware:
+    """Times every HTTP request by stage, adds the Server-Timing header and records the request metrics"""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timing = acquire_timing(scope, send)
+        token = _current.set(timing)
+        REQUESTS_IN_FLIGHT.value += 1
+        try:
+            await self.app(scope, receive, timing.send_with_timing)
+        finally:
+            elapsed = perf_counter() - timing.started
+            REQUESTS_IN_FLIGHT.value -= 1
+            _current.reset(token)
+            _finished.append((scope["method"], scope.get("route"), elapsed, timing.status, timing.finished_stages()))
+            release_timing(timing)
+            if len(_finished) >= FINISHED_BATCH:
+                record_finished()
+
+
+def _time_endpoint(call: Callable) -> Callable:
+    # Marks when the endpoint starts and finishes, which splits the request into validate, endpoint and serialize
+    if asyncio.iscoroutinefunction(call):
+        @functools.wraps(call)
+        async def endpoint(*args, **kwargs):
+            timing = _current.get()
+            if timing is not None:
+                timing.endpoint_started = perf_counter()
+            try:
+                return await call(*args, **kwargs)
+            finally:
+                if timing is not None:
+                    timing.endpoint_finished = perf_counter()
+    else:
+        # Runs in the thread pool, which copies the request's context along
+        @functools.wraps(call)
+        def endpoint(*args, **kwargs):
+            timing = _current.get()
+            if timing is not None:
+                timing.endpoint_started = perf_counter()
+            try:
+                return call(*args, **kwargs)
+            finally:
+                if timing is not None:
+                    timing.endpoint_finished = perf_counter()
+    endpoint._timed = True
+    return endpoint
+
+
+class TimedRoute(APIRoute):
+    """APIRoute whose endpoint marks where validate ends and serialize begins"""
+
+    def get_route_handler(self) -> Callable:
+        if self.dependant.call is not None and not getattr(self.dependant.call, "_timed", False):
+            self.dependant.call = _time_endpoint(self.dependant.call)
+        return super().get_route_handler()
@@ -1,88 +1,73 @@
-from fastapi import FastAPI, HTTPException
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Request, Response
+from fastapi.encoders import jsonable_encoder
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from fastapi.responses import JSONResponse, PlainTextResponse
+from starlette.concurrency import run_in_threadpool
 from typing import List, Optional, Dict, Any
 import os
+import sys
+import asyncio
 import json
+import math
 from datetime import datetime
 
-# Simple models for the demo
-class RentRollUnit(BaseModel):
-    unitNumber: str
-    unitType: str
-    bedrooms: int
-    bathrooms: int
-    squareFootage: float
-    monthlyRent: float
-    occupied: bool
-
-class OperatingExpenses(BaseModel):
-    propertyTax: float = 0
-    insurance: float = 0
-    utilities: float = 0
-    maintenance: float = 0
-    propertyManagement: float = 0
-    other: float = 0
-    total: float = 0
-
-class LoanTerms(BaseModel):
-    ltv: float = 75.0
-    interestRate: float = 5.5
-    amortizationPeriod: int = 30
-    isInterestOnly: bool = False
-    interestOnlyMonths: int = 0
-    loanAmount: float = 0.0
-    monthlyPayment: float = 0.0
-
-class ExitAssumptions(BaseModel):
-    holdPeriod: float = 5.0
-    exitCapRate: float = 6.5
-    annualAppreciation: float = 3.0
-    marketCapRate: float = 6.0
-
-class DealInput(BaseModel):
-    propertyType: str
-    purchasePrice: float
-    numberOfUnits: int
-    rentRoll: List[RentRollUnit]
-    vacancyRate: float
-    operatingExpenses: OperatingExpenses
-    capexBudget: float
-    loanTerms: LoanTerms
-    exitAssumptions: ExitAssumptions
-
-class FinancialMetrics(BaseModel):
-    noi: float
-    goingInCapRate: float
-    reversionCapRate: float
-    cashOnCashReturn: float
-    stabilizedCashOnCash: float
-    irr: float
-    equityMultiple: float
-    breakEvenOccupancy: float
-    dscr: float
-    exitSalePrice: float
-    totalReturn: float
-    annualCashFlow: float
-    exitValue: float
-
-class AIAnalysis(BaseModel):
-    summary: str
-    redFlags: List[str]
-    recommendations: List[str]
-
-class DealAnalysis(BaseModel):
-    dealInput: DealInput
-    financialMetrics: FinancialMetrics
-    aiAnalysis: AIAnalysis
+# Make the `app` package importable both via `python app/main_simple.py` and uvicorn
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.models import base as models  # noqa: F401  registers every model with Base
+from app.api.routes import analysis, deals, files, jobs
+from app.core.database import create_tables
+from app.services.jobs import start_job_runner, stop_job_runner
+from app.core.metrics import CONTENT_TYPE, RequestMetricsMiddleware, TimedRoute, record_stage, render_metrics, timed
+from app.services.analysis_cache import AnalysisEntry, analysis_cache, analysis_id, etag_matches
+from app.services.analysis_stages import changed_stages, loan_terms_update, patch_deal_input, run_stages
+from app.services.batch_metrics import column_lists, deals_to_columns, calculate_financial_metrics_batch
+from app.services.grading import grade_deals, grade_metric, generate_ai_analysis, grading_rules
+from app.services.sensitivity import axis_values, encode_grid, sensitivity_grid
+from app.services.simulation import get_simulation_pool, run_simulation
+
+from app.schemas.deal import (
+    RentRollUnit,
+    OperatingExpenses,
+    LoanTerms,
+    ExitAssumptions,
+    DealInput,
+    FinancialMetrics,
+    AIAnalysis,
+    DealAnalysis,
+    ReanalysisRequest,
+    DealReanalysis,
+    BatchDealInput,
+    BatchDealAnalysis,
+    SensitivityGridAxis,
+    SensitivityGridRequest,
+    SensitivityGrid,
+    SimulationRequest,
+    SimulationResult,
+)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # The deals, jobs, snapshot, screening and portfolio tables, on a fresh database too
+    await create_tables()
+    # This process's background job workers, for the jobs router
+    await start_job_runner()
+    try:
+        yield
+    finally:
+        await stop_job_runner()
 
 app = FastAPI(
     title="Commercial RE Calculator API",
     description="AI-Enhanced Deal Analyzer for Commercial Real Estate",
     version="1.0.0",
     docs_url="/docs",
-    redoc_url="/redoc"
+    redoc_url="/redoc",
+    lifespan=lifespan
 )
+# Time every route's stages; set before any route is declared
+app.router.route_class = TimedRoute
 
 # Add CORS middleware
 app.add_middleware(
@@ -91,8 +76,18 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"],
     allow_headers=["*"],
+    expose_headers=["ETag", "Server-Timing"],
 )
 
+# Server-Timing headers and the request metrics behind /metrics
+app.add_middleware(RequestMetricsMiddleware)
+
+# Database-backed APIs: saved deals and their analyses, file uploads and background jobs
+app.include_router(deals.router, prefix="/api/deals", tags=["deals"])
+app.include_router(analysis.router, prefix="/api/analysis", tags=["analysis"])
+app.include_router(files.router, prefix="/api/files", tags=["files"])
+app.include_router(jobs.router, prefix="/api/jobs", tags=["jobs"])
+
 # Add error handling middleware
 @app.exception_handler(Exception)
 async def global_exception_handler(request, exc):
@@ -105,275 +100,35 @@ async def global_exception_handler(request, exc):
 # Function to calculate financial metrics
 def calculate_financial_metrics(deal_input: DealInput) -> FinancialMetrics:
     """Calculate comprehensive financial metrics"""
-
-    # Basic inputs
-    purchase_price = deal_input.purchasePrice
-    num_units = deal_input.numberOfUnits
-    vacancy_rate = deal_input.vacancyRate / 100
-
-    # Calculate total rent from rent roll
-    total_monthly_rent = 0
-    if deal_input.rentRoll:
-        total_monthly_rent = sum(float(unit.monthlyRent) for unit in deal_input.rentRoll)
-
-    # If no rent roll data, estimate based on units and market assumptions
-    if total_monthly_rent == 0 and num_units > 0:
-        # Estimate $1,500 per unit per month as default for calculation purposes
-        estimated_rent_per_unit = 1500
-        total_monthly_rent = float(num_units * estimated_rent_per_unit)
-
-    annual_gross_income = float(total_monthly_rent * 12)
-
-    # Apply vacancy
-    effective_gross_income = float(annual_gross_income * (1 - vacancy_rate))
-
-    # Operating expenses
-    total_expenses = float(
-        deal_input.operatingExpenses.propertyTax +
-        deal_input.operatingExpenses.insurance +
-        deal_input.operatingExpenses.utilities +
-        deal_input.operatingExpenses.maintenance +
-        deal_input.operatingExpenses.propertyManagement +
-        deal_input.operatingExpenses.other
-    )
-
-    # If no operating expenses provided, estimate as 50% of effective gross income
-    if total_expenses == 0 and effective_gross_income > 0:
-        total_expenses = float(effective_gross_income * 0.5)
-
-    # NOI calculation
-    noi = float(effective_gross_income - total_expenses)
-
-    # Safe division helper function
-    def safe_divide(numerator, denominator, default=0):
-        return numerator / denominator if denominator != 0 else default
-
-    # Cap rates
-    going_in_cap_rate = safe_divide(noi, purchase_price) * 100
-    exit_cap_rate = deal_input.exitAssumptions.exitCapRate
-
-    # Loan calculations
-    loan_amount = float(deal_input.loanTerms.loanAmount) if deal_input.loanTerms.loanAmount else 0.0
-
-    # If loan amount is 0, calculate from LTV
-    if loan_amount == 0:
-        ltv = float(deal_input.loanTerms.ltv) / 100
-        loan_amount = float(purchase_price * ltv)
-
-    monthly_payment = float(deal_input.loanTerms.monthlyPayment) if deal_input.loanTerms.monthlyPayment else 0.0
-
-    # If monthly payment is 0, calculate it
-    if monthly_payment == 0 and loan_amount > 0:
-        interest_rate = float(deal_input.loanTerms.interestRate) / 100 / 12
-        amort_months = int(deal_input.loanTerms.amortizationPeriod) * 12
-
-        if deal_input.loanTerms.isInterestOnly:
-            monthly_payment = float(loan_amount * (deal_input.loanTerms.interestRate / 100 / 12))
-        else:
-            if interest_rate > 0 and amort_months > 0:
-                monthly_payment = float(loan_amount * (interest_rate * (1 + interest_rate)**amort_months) / ((1 + interest_rate)**amort_months - 1))
-            elif amort_months > 0:
-                monthly_payment = float(loan_amount / amort_months)
-            else:
-                monthly_payment = 0.0
-
-    annual_debt_service = float(monthly_payment * 12)
-
-    # DSCR
-    dscr = safe_divide(noi, annual_debt_service, float('inf'))
-
-    # Cash calculations
-    down_payment = float(purchase_price - loan_amount)
-    cash_flow_before_tax = float(noi - annual_debt_service)
-    cash_on_cash_return = safe_divide(cash_flow_before_tax, down_payment) * 100 if down_payment > 0 else 0
-
-    # IRR and NPV calculations (simplified)
-    annual_cash_flow = float(noi - annual_debt_service)
-    hold_period_years = int(deal_input.exitAssumptions.holdPeriod) if deal_input.exitAssumptions.holdPeriod else 5
-    annual_cash_flows = [annual_cash_flow] * hold_period_years
-    
-    exit_cap_rate_decimal = float(exit_cap_rate) / 100 if exit_cap_rate > 0 else 0.065
-    exit_value = safe_divide(noi, exit_cap_rate_decimal, purchase_price)
-
-    # Calculate remaining loan balance (simplified)
-    remaining_loan_balance = float(loan_amount * 0.8)  # Approximate after hold period
-    final_cash_flow = float(annual_cash_flow + exit_value - remaining_loan_balance)
-    
-    if len(annual_cash_flows) > 0:
-        annual_cash_flows[-1] = final_cash_flow
-
-    # Simple IRR approximation
-    total_return = float(sum(annual_cash_flows))
-    hold_period = max(hold_period_years, 1)  # Avoid division by zero
-    irr = safe_divide(total_return, down_payment) / hold_period * 100 if down_payment > 0 else 0
+    results, _ = run_stages(deal_input, through="returns")
 
     # Update the deal input with calculated loan amount for consistency
-    deal_input.loanTerms.loanAmount = loan_amount
-    deal_input.loanTerms.monthlyPayment = monthly_payment
-
-    return FinancialMetrics(
-        noi=float(noi),
-        goingInCapRate=float(going_in_cap_rate),
-        reversionCapRate=float(exit_cap_rate),
-        cashOnCashReturn=float(cash_on_cash_return),
-        stabilizedCashOnCash=float(cash_on_cash_return),
-        irr=float(irr),
-        equityMultiple=float(safe_divide((exit_value - remaining_loan_balance), down_payment) if down_payment > 0 else 1.0),
-        breakEvenOccupancy=float(0),
-        dscr=float(dscr),
-        exitSalePrice=float(exit_value),
-        totalReturn=float(total_return),
-        annualCashFlow=float(annual_cash_flow),
-        exitValue=float(exit_value)
-    )
-
-def grade_metric(metric_type: str, value: float, num_units: int = 1) -> str:
-    """Grade financial metrics with letter grades"""
-    
-    if metric_type == "cap_rate":
-        if value >= 8.0: return "A+"
-        elif value >= 7.0: return "A"
-        elif value >= 6.0: return "B"
-        elif value >= 5.0: return "C"
-        else: return "D"
-    
-    elif metric_type == "cash_on_cash":
-        if value >= 12: return "A+"
-        elif value >= 10: return "A"
-        elif value >= 8: return "B"
-        elif value >= 6: return "C"
-        else: return "D"
-    
-    elif metric_type == "dscr":
-        if value >= 1.5: return "A+"
-        elif value >= 1.35: return "A"
-        elif value >= 1.25: return "B"
-        elif value >= 1.15: return "C"
-        else: return "D"
-    
-    elif metric_type == "irr":
-        if value >= 15: return "A+"
-        elif value >= 12: return "A"
-        elif value >= 10: return "B"
-        elif value >= 8: return "C"
-        else: return "D"
-    
-    elif metric_type == "equity_multiple":
-        if value >= 2.5: return "A+"
-        elif value >= 2.0: return "A"
-        elif value >= 1.75: return "B"
-        elif value >= 1.5: return "C"
-        else: return "D"
-    
-    elif metric_type == "noi_per_unit":
-        noi_per_unit_monthly = (value / num_units) / 12 if num_units > 0 else 0
-        if noi_per_unit_monthly >= 150: return "A+"
-        elif noi_per_unit_monthly >= 125: return "A"
-        elif noi_per_unit_monthly >= 100: return "B"
-        elif noi_per_unit_monthly >= 75: return "C"
-        else: return "D"
-    
-    return "C"
-
-def generate_ai_analysis(deal_input: DealInput, metrics: FinancialMetrics) -> AIAnalysis:
-    """Generate AI-like analysis with grading"""
-
-    summary_parts = []
-    red_flags = []
-    recommendations = []
-    
-    # Grade key metrics
-    cap_rate_grade = grade_metric("cap_rate", metrics.goingInCapRate)
-    cash_on_cash_grade = grade_metric("cash_on_cash", metrics.cashOnCashReturn)
-    dscr_grade = grade_metric("dscr", metrics.dscr)
-    irr_grade = grade_metric("irr", metrics.irr)
-    equity_multiple_grade = grade_metric("equity_multiple", metrics.equityMultiple)
-    noi_grade = grade_metric("noi_per_unit", metrics.noi, deal_input.numberOfUnits)
-    
-    # Calculate overall grade based on key metrics
-    grade_points = {
-        "A+": 4.3, "A": 4.0, "B": 3.0, "C": 2.0, "D": 1.0
-    }
-    
-    # Weight metrics by importance
-    weighted_score = (
-        grade_points.get(cap_rate_grade, 1.0) * 0.25 +  # 25% weight
-        grade_points.get(cash_on_cash_grade, 1.0) * 0.25 +  # 25% weight
-        grade_points.get(irr_grade, 1.0) * 0.25 +  # 25% weight
-        grade_points.get(dscr_grade, 1.0) * 0.15 +  # 15% weight
-        grade_points.get(equity_multiple_grade, 1.0) * 0.10  # 10% weight
-    )
-    
-    # Convert weighted score to letter grade
-    if weighted_score >= 4.0:
-        overall_grade = "A+"
-        investment_recommendation = "STRONG BUY"
-    elif weighted_score >= 3.5:
-        overall_grade = "A"
-        investment_recommendation = "BUY"
-    elif weighted_score >= 3.0:
-        overall_grade = "B+"
-        investment_recommendation = "BUY"
-    elif weighted_score >= 2.5:
-        overall_grade = "B"
-        investment_recommendation = "HOLD/CONSIDER"
-    elif weighted_score >= 2.0:
-        overall_grade = "C"
-        investment_recommendation = "AVOID"
-    else:
-        overall_grade = "D"
-        investment_recommendation = "AVOID"
-
-    # Analyze cap rate
-    if metrics.goingInCapRate < 5:
-        red_flags.append("Going-in cap rate is below 5%, indicating potentially overpriced property")
-        recommendations.append("Consider negotiating a lower purchase price")
-    elif metrics.goingInCapRate > 8:
-        summary_parts.append("Strong going-in cap rate suggests good value")
-
-    # Analyze DSCR
-    if metrics.dscr < 1.2:
-        red_flags.append("DSCR below 1.2 indicates high leverage risk")
-        recommendations.append("Consider reducing loan amount or improving NOI")
-    elif metrics.dscr > 1.5:
-        summary_parts.append("Strong debt service coverage provides good safety margin")
-
-    # Analyze cash-on-cash return
-    if metrics.cashOnCashReturn < 6:
-        red_flags.append("Cash-on-cash return below 6% may not meet investor requirements")
-        recommendations.append("Look for ways to increase NOI or reduce expenses")
-    elif metrics.cashOnCashReturn > 10:
-        summary_parts.append("Excellent cash-on-cash return indicates strong cash flow")
-
-    # Analyze vacancy rate
-    if deal_input.vacancyRate > 10:
-        red_flags.append("High vacancy rate may indicate market or property issues")
-        recommendations.append("Investigate market conditions and property management")
-
-    # Generate summary with grades
-    if not summary_parts:
-        summary_parts.append("This deal shows moderate returns with standard risk profile")
-
-    grades_summary = f"Metric Grades: Cap Rate {cap_rate_grade} ({metrics.goingInCapRate:.1f}%), Cash-on-Cash {cash_on_cash_grade} ({metrics.cashOnCashReturn:.1f}%), DSCR {dscr_grade} ({metrics.dscr:.2f}x), IRR {irr_grade} ({metrics.irr:.1f}%), Equity Multiple {equity_multiple_grade} ({metrics.equityMultiple:.1f}x), NOI/Unit {noi_grade}"
-    
-    # Generate investment recommendation explanation
-    investment_explanation = ""
-    if investment_recommendation == "STRONG BUY":
-        investment_explanation = "This deal shows exceptional returns across all key metrics. The combination of strong cash flow, solid debt coverage, and attractive cap rate makes this a premium investment opportunity."
-    elif investment_recommendation == "BUY":
-        investment_explanation = "This is a solid investment opportunity with good returns and manageable risk. The metrics indicate this property should perform well in the current market."
-    elif investment_recommendation == "HOLD/CONSIDER":
-        investment_explanation = "This deal has mixed results. While some metrics are acceptable, consider negotiating better terms or look for ways to improve performance before proceeding."
-    else:
-        investment_explanation = "This deal does not meet standard investment criteria. The returns are below market expectations and/or the risk profile is too high for most investors."
-    
-    summary = f"OVERALL GRADE: {overall_grade} - {investment_recommendation}. {investment_explanation} Analysis: {grades_summary}. {'. '.join(summary_parts)}."
-
-    return AIAnalysis(
-        summary=summary,
-        redFlags=red_flags,
-        recommendations=recommendations
+    for field, value in loan_terms_update(results).items():
+        setattr(deal_input.loanTerms, field, value)
+
+    return results["returns"]["metrics"]
+
+def record_stage_timings(timings: List[Dict[str, Any]]) -> None:
+    """Add the analysis stages run_stages recomputed to the request's Server-Timing"""
+    for timing in timings:
+        if timing["recomputed"]:
+            record_stage(timing["stage"], timing["milliseconds"] / 1000)
+
+def store_analysis(key: str, deal_input: DealInput, results: Dict[str, Dict[str, Any]]) -> AnalysisEntry:
+    """Render the analysis of deal_input and cache it along with its stage results"""
+    analysis = DealAnalysis(
+        # Echo the input with the loan terms the analysis settled on, leaving the cached input as submitted
+        dealInput=deal_input.model_copy(
+            update={"loanTerms": deal_input.loanTerms.model_copy(update=loan_terms_update(results))}
+        ),
+        financialMetrics=results["returns"]["metrics"],
+        aiAnalysis=results["grading"]["analysis"],
+        analysisId=key
     )
+    with timed("render"):
+        entry = AnalysisEntry(JSONResponse(content=jsonable_encoder(analysis)).body, deal_input, results)
+    analysis_cache.put(key, entry)
+    return entry
 
 @app.get("/")
 async def root():
@@ -394,23 +149,157 @@ async def health_check():
     }
 
 @app.post("/api/analyze-deal", response_model=DealAnalysis)
-async def analyze_deal(deal_input: DealInput):
+async def analyze_deal(deal_input: DealInput, request: Request):
     """Analyze a commercial real estate deal"""
     try:
-        # Calculate financial metrics
-        financial_metrics = calculate_financial_metrics(deal_input)
+        # The ETag is derived from the input, so an unchanged input can be answered with 304 up front
+        with timed("hash"):
+            key = analysis_id(deal_input)
+        etag = f'"{key}"'
+        if etag_matches(request.headers.get("if-none-match"), etag):
+            analysis_cache.not_modified += 1
+            return Response(status_code=304, headers={"ETag": etag})
+
+        entry = analysis_cache.get(key)
+        if entry is None:
+            results, timings = run_stages(deal_input)
+            record_stage_timings(timings)
+            entry = store_analysis(key, deal_input, results)
+
+        return Response(content=entry.body, media_type="application/json", headers={"ETag": etag})
+
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Analysis failed: {str(e)}")
 
-        # Generate AI analysis
-        ai_analysis = generate_ai_analysis(deal_input, financial_metrics)
+@app.get("/api/analyze-deal/cache-stats")
+async def analysis_cache_stats():
+    """Hit ratio, evictions and size of the analyze-deal result cache"""
+    return analysis_cache.stats()
 
-        return DealAnalysis(
-            dealInput=deal_input,
-            financialMetrics=financial_metrics,
-            aiAnalysis=ai_analysis
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Request latency, stage and count metrics, caches and connection pools, in the Prometheus text format"""
+    return PlainTextResponse(render_metrics(), media_type=CONTENT_TYPE)
+
+@app.post("/api/reanalyze-deal", response_model=DealReanalysis)
+async def reanalyze_deal(request: ReanalysisRequest):
+    """Patch the input of an earlier analysis and recompute only the stages the patch affects"""
+    try:
+        previous = analysis_cache.get(request.analysisId)
+        if previous is None:
+            raise HTTPException(
+                status_code=404,
+                detail="Analysis not found or expired; submit the deal to /api/analyze-deal again"
+            )
+
+        deal_input = patch_deal_input(
+            previous.deal_input, [operation.model_dump(by_alias=True) for operation in request.patch]
+        )
+        key = analysis_id(deal_input)
+        entry = analysis_cache.get(key)
+        if entry is None:
+            changed = changed_stages(previous.deal_input, deal_input)
+            if previous.stages["grading"].get("rules") != grading_rules().fingerprint:
+                # Graded under rules since replaced
+                changed.add("grading")
+            results, timings = run_stages(deal_input, previous.stages, changed)
+            record_stage_timings(timings)
+            entry = store_analysis(key, deal_input, results)
+        else:
+            # Already analyzed, e.g. a patch that undoes an earlier one
+            _, timings = run_stages(deal_input, entry.stages)
+
+        # The cached body is a DealAnalysis; splice the re-analysis fields onto its end
+        extra = json.dumps({"previousAnalysisId": request.analysisId, "stages": timings}, separators=(",", ":"))
+        return Response(
+            content=entry.body[:-1] + b"," + extra[1:].encode(),
+            media_type="application/json",
+            headers={"ETag": f'"{key}"'}
         )
 
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Analysis failed: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Re-analysis failed: {str(e)}")
+
+@app.post("/api/analyze-deals", response_model=BatchDealAnalysis)
+async def analyze_deals(batch: BatchDealInput):
+    """Analyze many deals in one vectorized pass"""
+    try:
+        columns = deals_to_columns(batch.deals)
+        metrics = calculate_financial_metrics_batch(columns)
+        grades = grade_deals(
+            {**metrics, "numberOfUnits": columns["numberOfUnits"], "vacancyRate": columns["vacancyRate"]},
+            [deal.propertyType for deal in batch.deals],
+        )
+
+        # Rendered here rather than validated against BatchDealAnalysis again; for a large batch
+        # that would take longer than the analysis
+        return JSONResponse(content={
+            "count": len(batch.deals),
+            "financialMetrics": column_lists(metrics, FinancialMetrics.model_fields),
+            "grades": {
+                **{metric: letters.tolist() for metric, letters in grades.metrics.items()},
+                "overall": grades.overall.tolist(),
+                "recommendation": grades.recommendation.tolist(),
+            },
+        })
+
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Batch analysis failed: {str(e)}")
+
+@app.post("/api/sensitivity-analysis", response_model=SensitivityGrid)
+async def sensitivity_analysis(request: SensitivityGridRequest):
+    """Evaluate metrics over the full cartesian grid of the requested axes"""
+    try:
+        axes = [
+            (axis.parameter, axis_values(axis.values, axis.low, axis.high, axis.steps))
+            for axis in request.axes
+        ]
+        # A 6 x 11 grid takes seconds; off the event loop
+        result = await run_in_threadpool(
+            sensitivity_grid, deals_to_columns([request.dealInput]), axes, request.metrics
+        )
+        encoding, metrics = encode_grid(result.metrics, request.encoding)
+
+        return SensitivityGrid(
+            axes=[SensitivityGridAxis(parameter=parameter, values=values.tolist()) for parameter, values in axes],
+            shape=[len(values) for _, values in axes],
+            encoding=encoding,
+            metrics=metrics,
+            estimatedInputs=result.estimated,
+        )
+
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Sensitivity analysis failed: {str(e)}")
+
+@app.post("/api/simulate-deal", response_model=SimulationResult)
+async def simulate_deal(request: SimulationRequest):
+    """Monte Carlo distribution of IRR, DSCR and equity multiple for a deal"""
+    try:
+        distributions = {name: spec.model_dump() for name, spec in request.distributions.items()}
+
+        # The worker pool does the math; keep the event loop free while it runs
+        loop = asyncio.get_running_loop()
+        result = await loop.run_in_executor(
+            None,
+            run_simulation,
+            deals_to_columns([request.dealInput]),
+            distributions,
+            request.paths,
+            request.seed,
+            get_simulation_pool(),
+        )
+        return SimulationResult(**result)
+
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Simulation failed: {str(e)}")
 
 @app.get("/api/test")
 async def test_endpoint():
@@ -419,6 +308,10 @@ async def test_endpoint():
         "timestamp": datetime.now().isoformat(),
         "features": [
             "Deal analysis",
+            "Incremental re-analysis",
+            "Batch deal analysis",
+            "Sensitivity grids",
+            "Monte Carlo simulation",
             "Financial calculations",
             "AI insights",
             "Red flag detection"
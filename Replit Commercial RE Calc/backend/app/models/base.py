@@ -1,6 +1,9 @@
 from app.models.user import User
 from app.models.deal import Deal, DealAnalysis
 from app.models.rent_roll import RentRollUnit
+from app.models.portfolio import PortfolioAggregate
+from app.models.screening import DealScreening
+from app.models.job import Job
 
 # Import all models here so they are registered with SQLAlchemy
-__all__ = ["User", "Deal", "DealAnalysis", "RentRollUnit"] 
\ No newline at end of file
+__all__ = ["User", "Deal", "DealAnalysis", "RentRollUnit", "PortfolioAggregate", "DealScreening", "Job"] 
\ No newline at end of file
@@ -1,10 +1,14 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, Text, ForeignKey, JSON
+from sqlalchemy import Column, Integer, String, Float, DateTime, Text, ForeignKey, JSON, Index
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 from app.core.database import Base
 
 class Deal(Base):
     __tablename__ = "deals"
+    __table_args__ = (
+        # Keyset pagination of a user's deals, newest first
+        Index("ix_deals_user_id_created_at_id", "user_id", "created_at", "id"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"))
@@ -17,6 +21,7 @@ class Deal(Base):
     capex_budget = Column(Float)
     loan_terms = Column(JSON)  # Store as JSON
     exit_assumptions = Column(JSON)  # Store as JSON
+    input_hash = Column(String(64))  # deal_input_hash of the saved input, checked against the stored analysis
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
     
@@ -29,11 +34,19 @@ class DealAnalysis(Base):
     __tablename__ = "deal_analyses"
     
     id = Column(Integer, primary_key=True, index=True)
-    deal_id = Column(Integer, ForeignKey("deals.id"))
+    deal_id = Column(Integer, ForeignKey("deals.id"), unique=True)  # One analysis per deal, upserted
     financial_metrics = Column(JSON)  # Store calculated metrics
     sensitivity_table = Column(JSON)  # Store sensitivity analysis
     ai_analysis = Column(JSON)  # Store AI insights
+    input_hash = Column(String(64))  # Deal.input_hash the analysis was computed from
+    calculator_version = Column(Integer)  # CALCULATOR_VERSION the analysis was computed with
+    grading_rules = Column(String(16))  # GradingRules.fingerprint the analysis was graded with
+    # Portfolio roll-up inputs (app.services.portfolio)
+    noi = Column(Float)
+    annual_debt_service = Column(Float)
+    equity = Column(Float)  # Down payment
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
     
     # Relationships
     deal = relationship("Deal", back_populates="analysis") 
\ No newline at end of file
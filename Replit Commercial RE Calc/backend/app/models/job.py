@@ -0,0 +1,30 @@
+from sqlalchemy import Column, Integer, Float, String, Text, Boolean, DateTime, JSON, Index
+from app.core.database import Base
+
+# Background jobs queued and run by app.services.jobs; times are naive UTC, set by the application
+class Job(Base):
+    __tablename__ = "jobs"
+    __table_args__ = (
+        # Workers take the oldest claimable job of their type
+        Index("ix_jobs_kind_status_created_at", "kind", "status", "created_at"),
+        # Finished jobs are swept once they expire
+        Index("ix_jobs_expires_at", "expires_at"),
+    )
+    
+    id = Column(String(32), primary_key=True)  # uuid4 hex, handed to the client
+    kind = Column(String(32), nullable=False)  # key of app.services.jobs.JOB_TYPES
+    status = Column(String(16), nullable=False, default="queued")  # queued, running, succeeded, failed, cancelled
+    payload = Column(JSON, nullable=False)  # input of the job type
+    progress = Column(Float, nullable=False, default=0.0)  # 0 to 1
+    message = Column(String(255))  # latest progress note
+    result = Column(Text)  # JSON, served as stored
+    result_entry = Column(JSON)  # or the upload cache entry the result is read from; see jobs.CachedResult
+    error = Column(Text)
+    cancel_requested = Column(Boolean, nullable=False, default=False)
+    attempts = Column(Integer, nullable=False, default=0)
+    owner = Column(String(64))  # JobRunner holding the lease of a running job
+    lease_expires_at = Column(DateTime)
+    created_at = Column(DateTime, nullable=False)
+    started_at = Column(DateTime)
+    finished_at = Column(DateTime)
+    expires_at = Column(DateTime)  # deleted, result and all, after this
@@ -0,0 +1,19 @@
+from sqlalchemy import Column, Integer, Float, DateTime
+from sqlalchemy.sql import func
+from app.core.database import Base
+
+# Running totals over one user's deals, maintained by app.services.portfolio
+class PortfolioAggregate(Base):
+    __tablename__ = "portfolio_aggregates"
+    
+    user_id = Column(Integer, primary_key=True, autoincrement=False)  # 0 for deals without an owner
+    deal_count = Column(Integer, nullable=False, default=0)
+    unit_count = Column(Integer, nullable=False, default=0)
+    total_purchase_price = Column(Float, nullable=False, default=0.0)
+    # Deals whose stored analysis was computed from their current input, and their totals
+    analyzed_deal_count = Column(Integer, nullable=False, default=0)
+    analyzed_purchase_price = Column(Float, nullable=False, default=0.0)
+    total_noi = Column(Float, nullable=False, default=0.0)
+    total_debt_service = Column(Float, nullable=False, default=0.0)  # Annual
+    total_equity = Column(Float, nullable=False, default=0.0)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
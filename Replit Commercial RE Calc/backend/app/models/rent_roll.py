@@ -7,7 +7,7 @@ class RentRollUnit(Base):
     __tablename__ = "rent_roll_units"
     
     id = Column(Integer, primary_key=True, index=True)
-    deal_id = Column(Integer, ForeignKey("deals.id"))
+    deal_id = Column(Integer, ForeignKey("deals.id"), index=True)
     unit_number = Column(String)
     unit_type = Column(String)
     bedrooms = Column(Integer)
@@ -0,0 +1,40 @@
+from sqlalchemy import Column, Integer, Float, DateTime, ForeignKey, Index
+from sqlalchemy.sql import func
+from app.core.database import Base
+
+METRIC_COLUMNS = (
+    "cap_rate",
+    "dscr",
+    "irr",
+    "cash_on_cash",
+    "equity_multiple",
+    "noi",
+    "purchase_price",
+    "number_of_units",
+)
+
+# Metrics of each deal's current analysis as typed columns, maintained by app.services.screening
+class DealScreening(Base):
+    __tablename__ = "deal_screening"
+    __table_args__ = tuple(
+        # One per metric: a range of it within a user's deals, in order, for sorting and keyset pages. Every
+        # metric follows so the other filters are checked inside the index, reading rows only for matches.
+        Index(
+            f"ix_deal_screening_{metric}",
+            "user_id", metric, "deal_id",
+            *(other for other in METRIC_COLUMNS if other != metric),
+        )
+        for metric in METRIC_COLUMNS
+    )
+    
+    deal_id = Column(Integer, ForeignKey("deals.id"), primary_key=True, autoincrement=False)
+    user_id = Column(Integer, nullable=False)  # 0 for deals without an owner
+    cap_rate = Column(Float, nullable=False)  # Going-in, percent
+    dscr = Column(Float, nullable=False)  # Infinite without debt service
+    irr = Column(Float, nullable=False)
+    cash_on_cash = Column(Float, nullable=False)
+    equity_multiple = Column(Float, nullable=False)
+    noi = Column(Float, nullable=False)
+    purchase_price = Column(Float, nullable=False)
+    number_of_units = Column(Integer, nullable=False)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
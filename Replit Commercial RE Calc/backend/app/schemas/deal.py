@@ -0,0 +1,365 @@
+from pydantic import BaseModel, ConfigDict, Field, PrivateAttr, model_validator
+from typing import Any, List, Literal, Optional, Dict, Union
+from datetime import datetime
+import numpy as np
+
+# Deal models shared by main_simple.py and the API routes
+class RentRollUnit(BaseModel):
+    unitNumber: str
+    unitType: str
+    bedrooms: int
+    bathrooms: int
+    squareFootage: float
+    monthlyRent: float
+    occupied: bool
+
+class RentRollColumns(BaseModel):
+    # The same fields as RentRollUnit, as parallel arrays with one entry per unit.
+    # Validated as whole lists, which is far cheaper than one model per unit.
+    unitNumber: List[str]
+    unitType: List[str]
+    bedrooms: List[int]
+    bathrooms: List[int]
+    squareFootage: List[float]
+    monthlyRent: List[float]
+    occupied: List[bool]
+
+    _arrays: Optional[Dict[str, np.ndarray]] = PrivateAttr(default=None)
+
+    @model_validator(mode="after")
+    def check_lengths(self):
+        lengths = {len(getattr(self, field)) for field in RentRollUnit.model_fields}
+        if len(lengths) > 1:
+            raise ValueError("Rent roll columns must all have the same length")
+        return self
+
+    def __len__(self) -> int:
+        return len(self.unitNumber)
+
+    def as_arrays(self) -> Dict[str, np.ndarray]:
+        """Numeric columns as NumPy arrays, built once per rent roll"""
+        if self._arrays is None:
+            self._arrays = {
+                "bedrooms": np.asarray(self.bedrooms, dtype=np.int32),
+                "bathrooms": np.asarray(self.bathrooms, dtype=np.int32),
+                "squareFootage": np.asarray(self.squareFootage, dtype=float),
+                "monthlyRent": np.asarray(self.monthlyRent, dtype=float),
+                "occupied": np.asarray(self.occupied, dtype=bool),
+            }
+        return self._arrays
+
+class OperatingExpenses(BaseModel):
+    propertyTax: float = 0
+    insurance: float = 0
+    utilities: float = 0
+    maintenance: float = 0
+    propertyManagement: float = 0
+    other: float = 0
+    total: float = 0
+
+class LoanTerms(BaseModel):
+    ltv: float = 75.0
+    interestRate: float = 5.5
+    amortizationPeriod: int = 30
+    isInterestOnly: bool = False
+    interestOnlyMonths: int = 0
+    loanAmount: float = 0.0
+    monthlyPayment: float = 0.0
+
+class ExitAssumptions(BaseModel):
+    holdPeriod: float = 5.0
+    exitCapRate: float = 6.5
+    annualAppreciation: float = 3.0
+    marketCapRate: float = 6.0
+    discountRate: float = 10.0
+
+class DealInput(BaseModel):
+    propertyType: str
+    purchasePrice: float
+    numberOfUnits: int
+    rentRoll: List[RentRollUnit] = []
+    # Columnar alternative to rentRoll for large portfolios; used instead of rentRoll when given
+    rentRollColumns: Optional[RentRollColumns] = None
+    vacancyRate: float
+    operatingExpenses: OperatingExpenses
+    capexBudget: float
+    loanTerms: LoanTerms
+    exitAssumptions: ExitAssumptions
+
+    def total_monthly_rent(self) -> float:
+        """Scheduled monthly rent across the rent roll, in whichever form it was sent"""
+        if self.rentRollColumns is not None:
+            return float(self.rentRollColumns.as_arrays()["monthlyRent"].sum())
+        return sum(float(unit.monthlyRent) for unit in self.rentRoll)
+
+class StoredDealAnalysis(BaseModel):
+    # The latest saved analysis of a deal (app.models.deal.DealAnalysis)
+    financialMetrics: Optional[Dict[str, Any]] = None
+    sensitivityTable: Optional[Dict[str, Any]] = None
+    aiAnalysis: Optional[Dict[str, Any]] = None
+    createdAt: Optional[datetime] = None
+
+class DealResponse(BaseModel):
+    # A stored deal (app.models.deal.Deal) in the shape of DealInput; build with DealResponse.model_validate(deal)
+    model_config = ConfigDict(from_attributes=True)
+
+    id: int
+    name: Optional[str] = None
+    propertyType: str
+    purchasePrice: float
+    numberOfUnits: int
+    # None unless the rent roll was loaded with the deal
+    rentRoll: Optional[List[RentRollUnit]] = None
+    vacancyRate: float
+    operatingExpenses: OperatingExpenses
+    capexBudget: float
+    loanTerms: LoanTerms
+    exitAssumptions: ExitAssumptions
+    # None unless loaded with the deal, or if the deal was never analyzed
+    analysis: Optional[StoredDealAnalysis] = None
+    createdAt: Optional[datetime] = None
+    updatedAt: Optional[datetime] = None
+
+    @model_validator(mode="before")
+    @classmethod
+    def from_deal(cls, value: Any) -> Any:
+        if isinstance(value, dict):
+            return value
+        # Only relationships loaded with the deal are read; touching any other would issue a query per deal
+        loaded = vars(value)
+        analysis = loaded.get("analysis")
+        return {
+            "id": value.id,
+            "name": value.name,
+            "propertyType": value.property_type,
+            "purchasePrice": value.purchase_price,
+            "numberOfUnits": value.number_of_units,
+            "rentRoll": [
+                {
+                    "unitNumber": unit.unit_number,
+                    "unitType": unit.unit_type,
+                    "bedrooms": unit.bedrooms,
+                    "bathrooms": unit.bathrooms,
+                    "squareFootage": unit.square_footage,
+                    "monthlyRent": unit.monthly_rent,
+                    "occupied": unit.occupied,
+                }
+                for unit in loaded["rent_roll_units"]
+            ] if "rent_roll_units" in loaded else None,
+            "vacancyRate": value.vacancy_rate,
+            "operatingExpenses": value.operating_expenses or {},
+            "capexBudget": value.capex_budget,
+            "loanTerms": value.loan_terms or {},
+            "exitAssumptions": value.exit_assumptions or {},
+            "analysis": {
+                "financialMetrics": analysis.financial_metrics,
+                "sensitivityTable": analysis.sensitivity_table,
+                "aiAnalysis": analysis.ai_analysis,
+                "createdAt": analysis.created_at,
+            } if analysis is not None else None,
+            "createdAt": value.created_at,
+            "updatedAt": value.updated_at,
+        }
+
+class DealPage(BaseModel):
+    items: List[DealResponse]
+    # Pass as ?cursor= to fetch the next page; None on the last page
+    nextCursor: Optional[str] = None
+
+class DealSummary(BaseModel):
+    # List-view columns of a stored deal
+    id: int
+    name: Optional[str] = None
+    propertyType: str
+    purchasePrice: float
+    numberOfUnits: int
+    createdAt: Optional[datetime] = None
+    updatedAt: Optional[datetime] = None
+
+class DealSummaryPage(BaseModel):
+    items: List[DealSummary]
+    # Pass as ?cursor= to fetch the next page; None on the last page
+    nextCursor: Optional[str] = None
+
+class PortfolioSummary(BaseModel):
+    # Totals over a user's deals; see app.services.portfolio
+    dealCount: int
+    unitCount: int
+    totalPurchasePrice: float
+    # NOI, debt service, equity and the ratios cover only deals analyzed since they were last edited
+    analyzedDeals: int
+    totalNoi: float
+    # Purchase-price-weighted going-in cap rate, in percent; None with no analyzed deals
+    weightedCapRate: Optional[float] = None
+    totalAnnualDebtService: float
+    # None without debt service
+    dscr: Optional[float] = None
+    equityDeployed: float
+    updatedAt: Optional[datetime] = None
+
+class FinancialMetrics(BaseModel):
+    noi: float
+    goingInCapRate: float
+    reversionCapRate: float
+    cashOnCashReturn: float
+    stabilizedCashOnCash: float
+    irr: float
+    equityMultiple: float
+    breakEvenOccupancy: float
+    dscr: float
+    exitSalePrice: float
+    totalReturn: float
+    annualCashFlow: float
+    exitValue: float
+    npv: float = 0.0
+    remainingLoanBalance: float = 0.0
+
+class AIAnalysis(BaseModel):
+    summary: str
+    redFlags: List[str]
+    recommendations: List[str]
+
+class DealAnalysis(BaseModel):
+    dealInput: DealInput
+    financialMetrics: FinancialMetrics
+    aiAnalysis: AIAnalysis
+    # Pass to /api/reanalyze-deal to patch this analysis
+    analysisId: Optional[str] = None
+
+class JsonPatchOperation(BaseModel):
+    # RFC 6902; path and from are JSON pointers into DealInput such as /exitAssumptions/exitCapRate
+    op: Literal["add", "remove", "replace", "move", "copy", "test"]
+    path: str
+    value: Any = None
+    from_: Optional[str] = Field(default=None, alias="from")
+
+class ReanalysisRequest(BaseModel):
+    analysisId: str
+    patch: List[JsonPatchOperation]
+
+class StageTiming(BaseModel):
+    # One of app.services.analysis_stages.STAGE_NAMES
+    stage: str
+    recomputed: bool
+    milliseconds: float
+
+class DealReanalysis(DealAnalysis):
+    previousAnalysisId: str
+    # In stage order; stages not recomputed reused the previous analysis
+    stages: List[StageTiming]
+
+class DealMetrics(BaseModel):
+    # The stored analysis of a saved deal; see app.services.analysis_snapshots
+    dealId: int
+    financialMetrics: FinancialMetrics
+    aiAnalysis: AIAnalysis
+    # Deal.input_hash, CALCULATOR_VERSION and grading rules fingerprint the analysis was computed from
+    inputHash: str
+    calculatorVersion: int
+    gradingRules: Optional[str] = None
+    computedAt: Optional[datetime] = None
+    # Whether this request computed the analysis instead of reading the stored one
+    recomputed: bool
+
+class MetricRange(BaseModel):
+    # Inclusive bounds; either may be left open
+    min: Optional[float] = None
+    max: Optional[float] = None
+
+class ScreeningRequest(BaseModel):
+    # Keyed by a ScreenedDeal metric, e.g. {"capRate": {"min": 7}, "units": {"min": 20, "max": 200}}
+    filters: Dict[str, MetricRange] = {}
+    sort: str = "capRate"
+    descending: bool = True
+    # nextCursor of the previous page, with the same filters and sort
+    cursor: Optional[str] = None
+    limit: int = Field(default=50, ge=1, le=1000)
+
+class ScreenedDeal(BaseModel):
+    dealId: int
+    capRate: float
+    # None without debt service
+    dscr: Optional[float] = None
+    irr: float
+    cashOnCash: float
+    equityMultiple: float
+    noi: float
+    purchasePrice: float
+    units: int
+
+class ScreeningPage(BaseModel):
+    items: List[ScreenedDeal]
+    nextCursor: Optional[str] = None
+
+class BatchDealInput(BaseModel):
+    deals: List[DealInput]
+
+class BatchDealAnalysis(BaseModel):
+    count: int
+    # Columnar: one list per FinancialMetrics field, in the same order as the input deals;
+    # None where a deal's value is not finite, e.g. the DSCR of a deal without debt
+    financialMetrics: Dict[str, List[Optional[float]]]
+    # Letter grade per deal for each graded metric, plus "overall" and "recommendation"
+    grades: Dict[str, List[str]] = {}
+
+class SensitivityAxis(BaseModel):
+    # One of app.services.sensitivity.SENSITIVITY_PARAMETERS
+    parameter: str
+    # Explicit adjustments, or an evenly spaced range from low to high
+    values: Optional[List[float]] = None
+    low: float = 0.0
+    high: float = 0.0
+    steps: int = Field(default=11, ge=1)
+
+class SensitivityGridRequest(BaseModel):
+    dealInput: DealInput
+    axes: List[SensitivityAxis]
+    metrics: List[str] = ["irr", "cashOnCashReturn", "dscr"]
+    # By default grids over 100,000 cells come back as float32, smaller ones nested
+    encoding: Optional[Literal["nested", "float32"]] = None
+
+class SensitivityGridAxis(BaseModel):
+    parameter: str
+    # The adjustments applied along this axis
+    values: List[float]
+
+class SensitivityGrid(BaseModel):
+    axes: List[SensitivityGridAxis]
+    shape: List[int]
+    # "nested": lists indexed [axis 0][axis 1]... for each requested FinancialMetrics field,
+    # None where a value is not finite, e.g. the DSCR of a deal without debt.
+    # "float32": base64 of little-endian float32 values in row-major order over shape, NaN
+    # where a value is not finite
+    encoding: str = "nested"
+    metrics: Dict[str, Union[list, str]]
+    # Inputs the deal left at 0 that were estimated (1500/unit rent, 50% of EGI expenses)
+    # before percent adjustments were applied to them
+    estimatedInputs: List[str] = []
+
+class DistributionSpec(BaseModel):
+    # normal (mean, std), uniform (low, high), triangular (low, mode, high) or fixed (mean)
+    kind: str = "normal"
+    mean: float = 0.0
+    std: float = 0.0
+    low: float = 0.0
+    high: float = 0.0
+    mode: float = 0.0
+
+class SimulationRequest(BaseModel):
+    dealInput: DealInput
+    # Keyed by rentGrowth, vacancyRate, expenseGrowth, exitCapRate or interestRate (all in percent)
+    distributions: Dict[str, DistributionSpec] = {}
+    paths: int = Field(default=100_000, ge=1)
+    seed: int = 0
+
+class SimulationResult(BaseModel):
+    paths: int
+    seed: int
+    # mean and p5...p95 of each outcome over the paths where it is finite; None if it
+    # is finite on none of them, e.g. the DSCR of an all-cash deal
+    irr: Dict[str, Optional[float]]
+    dscr: Dict[str, Optional[float]]
+    equityMultiple: Dict[str, Optional[float]]
+    npv: Dict[str, Optional[float]]
+    probabilityDscrBelowOne: float
+    probabilityOfLoss: float
@@ -0,0 +1,26 @@
+from pydantic import BaseModel
+from typing import Any, Dict, List, Optional
+
+class RentRollParseSummary(BaseModel):
+    unitCount: int
+    occupiedUnits: int
+    totalMonthlyRent: float
+    rejectedRows: int
+    errors: List[str]  # first few row errors only
+    columns: Dict[str, str]  # rent roll field -> header it was read from
+
+class FileUploadResponse(BaseModel):
+    success: bool
+    data: Optional[Any] = None
+    summary: Optional[RentRollParseSummary] = None
+    message: Optional[str] = None
+    error: Optional[str] = None
+    cached: bool = False  # served from the parsed-upload cache
+
+class UploadCacheStats(BaseModel):
+    hits: int
+    misses: int
+    evictions: int
+    entries: int
+    bytes: int
+    maxBytes: int
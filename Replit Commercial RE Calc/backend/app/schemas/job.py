@@ -0,0 +1,31 @@
+from pydantic import BaseModel
+from typing import Literal, Optional
+from datetime import datetime
+
+from app.schemas.deal import DealInput, FinancialMetrics
+
+JobState = Literal["queued", "running", "succeeded", "failed", "cancelled"]
+
+class JobSubmission(BaseModel):
+    # Poll /jobs/{jobId} for progress, then fetch /jobs/{jobId}/result
+    jobId: str
+    type: str
+    status: JobState
+
+class JobStatus(BaseModel):
+    jobId: str
+    type: str
+    status: JobState
+    progress: float  # 0 to 1
+    message: Optional[str] = None
+    error: Optional[str] = None  # why a failed job failed
+    attempts: int  # more than one if a worker was lost while running it
+    createdAt: datetime
+    startedAt: Optional[datetime] = None
+    finishedAt: Optional[datetime] = None
+    # Finished jobs and their results are deleted after this
+    expiresAt: Optional[datetime] = None
+
+class AIAnalysisJobRequest(BaseModel):
+    dealInput: DealInput
+    financialMetrics: FinancialMetrics
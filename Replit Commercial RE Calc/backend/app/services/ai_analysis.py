@@ -0,0 +1,253 @@
+"""
+Deal commentary from a language model, with the rule-based analysis as fallback.
+
+AIAnalyzer.analyze_deal asks the chat model named by OPENAI_MODEL for a
+summary, red flags and recommendations through the async OpenAI client, so
+waiting on the model never blocks the event loop. Its latency is bounded: at
+most AI_ANALYSIS_MAX_CONCURRENCY calls are in flight across the process, and
+a deal the model has not answered within AI_ANALYSIS_TIMEOUT, waiting for a
+slot included, is abandoned. The deal then gets generate_ai_analysis's
+rule-based analysis instead, as it does when the model errors or answers with
+anything but the expected JSON, or no model is configured. After the model
+call itself errors or times out the model is skipped for
+AI_ANALYSIS_RETRY_AFTER seconds, rather than every request waiting out the
+timeout while it is down. Timing out while still waiting for a slot only
+means the model is busy, so it does not stop other deals asking.
+
+The model is shown a profile of the deal with each metric rounded to a bucket
+(cap rate to a quarter point, DSCR to 0.05x, ...) rather than the exact
+figures, so deals with the same profile get the same prompt, and its answer
+is cached and reused for them.
+"""
+
+import asyncio
+import bisect
+import json
+import math
+import time
+import weakref
+from collections import Counter
+from typing import Any, Dict, NamedTuple, Union
+
+import openai
+from openai import AsyncOpenAI
+
+from app.core.config import settings
+from app.core.metrics import register_cache, register_collector
+from app.schemas.deal import AIAnalysis, DealInput, FinancialMetrics
+from app.services.analysis_cache import TTLCache
+from app.services.grading import generate_ai_analysis
+
+# FinancialMetrics fields shown to the model, and the step each is rounded to
+PROFILE_BUCKETS = {
+    "goingInCapRate": 0.25,
+    "cashOnCashReturn": 0.5,
+    "irr": 0.5,
+    "dscr": 0.05,
+    "equityMultiple": 0.1,
+    "breakEvenOccupancy": 2.5,
+}
+VACANCY_BUCKET = 2.5
+
+# Lower bounds of the unit count bands after the first
+UNIT_BANDS = (5, 20, 50, 100, 200)
+
+SYSTEM_PROMPT = (
+    "You are a commercial real estate underwriter. You are given the profile of a deal: its property "
+    "type, size band and rounded metrics, with rates, returns and occupancy in percent and DSCR and "
+    "equity multiple as ratios (a DSCR of inf means no debt). Reply with a JSON object with keys "
+    '"summary" (a short paragraph on the quality of the deal), "redFlags" (a list of risks) and '
+    '"recommendations" (a list of next steps for the buyer). Refer to the metrics only as given.'
+)
+
+ai_analysis_cache = TTLCache(settings.AI_ANALYSIS_CACHE_SIZE, settings.AI_ANALYSIS_CACHE_TTL)
+
+# model (answered by the model), rules (answered by generate_ai_analysis), timeouts, errors, invalid,
+# busy (timed out waiting for a slot)
+_counts: Counter = Counter()
+# Until when (time.monotonic) the model is skipped after a failure
+_retry_at = 0.0
+# Model calls holding a slot, now and at most
+_in_flight = 0
+_peak_in_flight = 0
+
+
+class _SlotTimeout(asyncio.TimeoutError):
+    """The timeout passed before the call got a slot, so the model was never asked"""
+
+
+class _Client(NamedTuple):
+    client: AsyncOpenAI
+    # Bounds the calls in flight; the server runs one event loop, so this is process wide
+    slots: asyncio.Semaphore
+
+
+# Asyncio primitives and the client's connection pool belong to the loop they were created on
+_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, _Client]" = weakref.WeakKeyDictionary()
+
+
+def _client() -> _Client:
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None:
+        client = _Client(
+            AsyncOpenAI(
+                # A local stub needs no key, but the client insists on one
+                api_key=settings.OPENAI_API_KEY or "unused",
+                base_url=settings.OPENAI_BASE_URL or None,
+                timeout=settings.AI_ANALYSIS_TIMEOUT,
+                max_retries=0,
+            ),
+            asyncio.Semaphore(settings.AI_ANALYSIS_MAX_CONCURRENCY),
+        )
+        _clients[loop] = client
+    return client
+
+
+def model_configured() -> bool:
+    return bool(settings.OPENAI_API_KEY or settings.OPENAI_BASE_URL)
+
+
+def _bucket(value: float, step: float) -> Union[float, str]:
+    if not math.isfinite(value):
+        # All-cash deals have an infinite DSCR, which JSON cannot carry as a number
+        return str(value)
+    return round(round(value / step) * step, 6)
+
+
+def _unit_band(units: int) -> str:
+    band = bisect.bisect_right(UNIT_BANDS, units)
+    low = UNIT_BANDS[band - 1] if band else 1
+    return f"{low}+" if band == len(UNIT_BANDS) else f"{low}-{UNIT_BANDS[band] - 1}"
+
+
+def metrics_profile(deal_input: DealInput, metrics: FinancialMetrics) -> Dict[str, Any]:
+    """What the model is shown of a deal; deals with equal profiles share an answer"""
+    return {
+        "propertyType": deal_input.propertyType,
+        "units": _unit_band(deal_input.numberOfUnits),
+        "vacancyRate": _bucket(deal_input.vacancyRate, VACANCY_BUCKET),
+        **{field: _bucket(getattr(metrics, field), step) for field, step in PROFILE_BUCKETS.items()},
+    }
+
+
+async def _ask_model(profile: Dict[str, Any], asked: asyncio.Event) -> AIAnalysis:
+    global _in_flight, _peak_in_flight
+    client = _client()
+    async with client.slots:
+        asked.set()
+        _in_flight += 1
+        _peak_in_flight = max(_peak_in_flight, _in_flight)
+        try:
+            response = await client.client.chat.completions.create(
+                model=settings.OPENAI_MODEL,
+                messages=[
+                    {"role": "system", "content": SYSTEM_PROMPT},
+                    {"role": "user", "content": json.dumps(profile)},
+                ],
+                response_format={"type": "json_object"},
+                temperature=0.2,
+            )
+        finally:
+            _in_flight -= 1
+    return AIAnalysis.model_validate_json(response.choices[0].message.content or "")
+
+
+def _retrieve_outcome(call: asyncio.Future) -> None:
+    # An abandoned call's exception is of no interest, but asyncio logs any left unretrieved
+    if not call.cancelled():
+        call.exception()
+
+
+async def _ask_model_within(profile: Dict[str, Any], timeout: float) -> AIAnalysis:
+    """_ask_model, raising asyncio.TimeoutError when timeout passes, without waiting for the abandoned call to wind down"""
+    asked = asyncio.Event()
+    call = asyncio.ensure_future(_ask_model(profile, asked))
+    call.add_done_callback(_retrieve_outcome)
+    try:
+        done, _ = await asyncio.wait((call,), timeout=timeout)
+    except asyncio.CancelledError:
+        call.cancel()
+        raise
+    if not done:
+        # Cancelling can take a while (the client closes the connection, which may itself stall); the
+        # call keeps its slot until it has, but the deal gets its answer now
+        call.cancel()
+        raise asyncio.TimeoutError if asked.is_set() else _SlotTimeout
+    return call.result()
+
+
+def ai_analysis_stats() -> Dict[str, Any]:
+    """Where analyses came from, failures by kind, model calls in flight, and the answer cache's hit ratio"""
+    return {
+        "model": _counts["model"],
+        "rules": _counts["rules"],
+        "timeouts": _counts["timeouts"],
+        "errors": _counts["errors"],
+        "invalid": _counts["invalid"],
+        "busy": _counts["busy"],
+        "inFlight": _in_flight,
+        "peakInFlight": _peak_in_flight,
+        "modelSkippedFor": max(0.0, _retry_at - time.monotonic()),
+        "cache": ai_analysis_cache.stats(),
+    }
+
+
+register_cache("ai_analysis", ai_analysis_cache.stats)
+register_collector(
+    "ai_analyses_total", "Deal analyses, by whether the model or the grading rules answered", "counter",
+    lambda: [("", {"source": source}, _counts[source]) for source in ("model", "rules")],
+)
+register_collector(
+    "ai_model_failures_total", "Model calls that timed out, failed or answered with invalid JSON", "counter",
+    lambda: [("", {"kind": kind}, _counts[kind]) for kind in ("timeouts", "errors", "invalid")],
+)
+register_collector(
+    "ai_model_calls_in_flight", "Model calls holding one of the AI_ANALYSIS_MAX_CONCURRENCY slots", "gauge",
+    lambda: [("", {}, _in_flight)],
+)
+
+
+class AIAnalyzer:
+    """Analysis of a deal by the configured chat model, or by the grading rules when it cannot answer in time"""
+
+    async def analyze_deal(self, deal_input: DealInput, metrics: Union[FinancialMetrics, Dict[str, Any]]) -> AIAnalysis:
+        global _retry_at
+        if not isinstance(metrics, FinancialMetrics):
+            metrics = FinancialMetrics.model_validate(metrics)
+        if not model_configured() or time.monotonic() < _retry_at:
+            return self._rules(deal_input, metrics)
+
+        profile = metrics_profile(deal_input, metrics)
+        key = json.dumps([settings.OPENAI_MODEL, profile], sort_keys=True)
+        analysis = ai_analysis_cache.get(key)
+        if analysis is not None:
+            _counts["model"] += 1
+            return analysis
+
+        try:
+            analysis = await _ask_model_within(profile, settings.AI_ANALYSIS_TIMEOUT)
+        except _SlotTimeout:
+            # Every slot stayed taken; the model is busy, not down
+            _counts["busy"] += 1
+            return self._rules(deal_input, metrics)
+        except asyncio.TimeoutError:
+            _counts["timeouts"] += 1
+            _retry_at = time.monotonic() + settings.AI_ANALYSIS_RETRY_AFTER
+            return self._rules(deal_input, metrics)
+        except openai.OpenAIError:
+            _counts["errors"] += 1
+            _retry_at = time.monotonic() + settings.AI_ANALYSIS_RETRY_AFTER
+            return self._rules(deal_input, metrics)
+        except ValueError:
+            # The model answered, just not with an AIAnalysis; no reason to stop asking it
+            _counts["invalid"] += 1
+            return self._rules(deal_input, metrics)
+
+        _counts["model"] += 1
+        ai_analysis_cache.put(key, analysis)
+        return analysis
+
+    def _rules(self, deal_input: DealInput, metrics: FinancialMetrics) -> AIAnalysis:
+        _counts["rules"] += 1
+        return generate_ai_analysis(deal_input, metrics)
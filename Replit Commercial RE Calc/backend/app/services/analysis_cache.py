@@ -0,0 +1,209 @@
+"""
+Memoized deal analyses.
+
+A DealInput is reduced to a canonical JSON form (sorted keys, floats
+normalized so 5, 5.0 and 5.000000000001 agree) and hashed; rent rolls, which
+can run to tens of thousands of units, are normalized and hashed as NumPy
+columns instead of through JSON. The hash, together with CALCULATOR_VERSION
+and the fingerprint of the grading rules in force, is both the cache key and
+the ETag of the response, so a client holding the ETag of an unchanged input
+can be answered with 304 before anything is computed. Rendered response
+bodies are kept in a bounded LRU whose entries also expire after a TTL,
+together with the input and its stage results so a later re-analysis can
+patch the input and rerun only the affected stages.
+
+The LRU is bounded by bytes as well as entries, since one deal with a large
+rent roll outweighs thousands of small ones. An entry is weighed from its
+body, which echoes the whole input: the parsed input and the stage results
+kept with it take about nine times the body's size again (measured with
+tracemalloc for 10 to 10k units), so an entry counts as ten times its body.
+"""
+
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, NamedTuple, Optional
+
+import numpy as np
+from pydantic import BaseModel
+
+from app.core.config import settings
+from app.core.metrics import register_cache
+from app.schemas.deal import DealInput, RentRollUnit
+from app.services.grading import grading_rules
+
+# Bump whenever the metrics or analysis for a given input change
+CALCULATOR_VERSION = 1
+
+# Significant digits kept when normalizing floats
+FLOAT_SIGNIFICANT_DIGITS = 12
+
+# Memory an AnalysisEntry holds per byte of its rendered body
+ENTRY_BYTES_PER_BODY_BYTE = 10
+
+
+def _normalize(value: Any) -> Any:
+    if isinstance(value, bool) or value is None or isinstance(value, str):
+        return value
+    if isinstance(value, (int, float)):
+        number = float(f"{float(value):.{FLOAT_SIGNIFICANT_DIGITS}g}")
+        # 5.0 and 5 hash alike, and so do 0.0 and -0.0
+        return int(number) if number.is_integer() else number
+    if isinstance(value, dict):
+        return {key: _normalize(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_normalize(item) for item in value]
+    return value
+
+
+def _normalize_array(values: np.ndarray) -> np.ndarray:
+    """Vectorized counterpart of _normalize for a float column"""
+    with np.errstate(divide="ignore", invalid="ignore"):
+        magnitude = np.floor(np.log10(np.abs(values)))
+    magnitude[~np.isfinite(magnitude)] = 0
+    scale = 10.0 ** (FLOAT_SIGNIFICANT_DIGITS - 1 - magnitude)
+    return np.round(values * scale) / scale + 0.0
+
+
+def canonical_hash(model: BaseModel, exclude=None) -> str:
+    """SHA-256 of a model's canonical JSON form"""
+    canonical = json.dumps(
+        _normalize(model.model_dump(mode="json", exclude=exclude)),
+        sort_keys=True,
+        separators=(",", ":"),
+        allow_nan=True,
+    )
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def _update_with_columns(digest, columns: Dict[str, list]) -> None:
+    for field, annotation in RentRollUnit.model_fields.items():
+        values = columns[field]
+        digest.update(field.encode())
+        if annotation.annotation is str:
+            digest.update("\x1f".join(values).encode("utf-8"))
+        else:
+            digest.update(_normalize_array(np.asarray(values, dtype=float)).tobytes())
+
+
+def deal_input_hash(deal_input: DealInput) -> str:
+    """canonical_hash of a DealInput, with the rent roll hashed column by column"""
+    digest = hashlib.sha256(canonical_hash(deal_input, exclude={"rentRoll", "rentRollColumns"}).encode())
+    digest.update(b"rentRoll")
+    _update_with_columns(digest, {
+        field: [getattr(unit, field) for unit in deal_input.rentRoll] for field in RentRollUnit.model_fields
+    })
+    if deal_input.rentRollColumns is not None:
+        digest.update(b"rentRollColumns")
+        _update_with_columns(digest, {field: getattr(deal_input.rentRollColumns, field) for field in RentRollUnit.model_fields})
+    return digest.hexdigest()
+
+
+def analysis_id(deal_input: DealInput) -> str:
+    """Identifies the analysis of an input; the same input under the same grading rules always gets the same id"""
+    return f"{CALCULATOR_VERSION}-{grading_rules().fingerprint[:8]}-{deal_input_hash(deal_input)}"
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Whether an If-None-Match header covers etag (weak comparison, as RFC 9110 asks)"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    candidates = (tag.strip() for tag in if_none_match.split(","))
+    return any(tag.removeprefix("W/") == etag for tag in candidates)
+
+
+class AnalysisEntry(NamedTuple):
+    # Rendered DealAnalysis JSON
+    body: bytes
+    # The input as submitted, before the analysis filled in loan terms
+    deal_input: DealInput
+    # Per-stage results from app.services.analysis_stages.run_stages
+    stages: Dict[str, Dict[str, Any]]
+
+
+def entry_bytes(entry: AnalysisEntry) -> int:
+    """Estimated memory held by an analysis cache entry"""
+    return ENTRY_BYTES_PER_BODY_BYTE * len(entry.body)
+
+
+class TTLCache:
+    """
+    LRU cache whose entries also expire ttl seconds after they are stored.
+
+    With max_bytes and weigh, the least recently used entries are also evicted
+    until the weights of those left add up to at most max_bytes; a value
+    heavier than max_bytes on its own is not stored.
+    """
+
+    def __init__(self, max_size: int, ttl: float, max_bytes: int = 0, weigh: Optional[Callable[[Any], int]] = None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.weigh = weigh
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.not_modified = 0
+        self._entries: OrderedDict = OrderedDict()  # key -> (expires_at, value, weight)
+
+    def get(self, key: str) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] <= time.monotonic():
+            self._remove(key)
+            self.expirations += 1
+            entry = None
+        if entry is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def put(self, key: str, value: Any) -> None:
+        if self.max_size <= 0:
+            return
+        weight = self.weigh(value) if self.weigh else 0
+        if key in self._entries:
+            self._remove(key)
+        if self.max_bytes and weight > self.max_bytes:
+            self.evictions += 1
+            return
+        self._entries[key] = (time.monotonic() + self.ttl, value, weight)
+        self.bytes += weight
+        while len(self._entries) > self.max_size or (self.max_bytes and self.bytes > self.max_bytes):
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+
+    def _remove(self, key: str) -> None:
+        self.bytes -= self._entries.pop(key)[2]
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self.bytes = 0
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hitRatio": self.hits / lookups if lookups else 0.0,
+            "notModified": self.not_modified,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "size": len(self._entries),
+            "maxSize": self.max_size,
+            "bytes": self.bytes,
+            "maxBytes": self.max_bytes,
+            "ttlSeconds": self.ttl,
+        }
+
+
+analysis_cache = TTLCache(
+    settings.ANALYSIS_CACHE_SIZE, settings.ANALYSIS_CACHE_TTL, settings.ANALYSIS_CACHE_MAX_BYTES, entry_bytes
+)
+register_cache("analysis", analysis_cache.stats)
@@ -0,0 +1,152 @@
+"""
+Stored analyses of saved deals, served read-through.
+
+Each deal has at most one DealAnalysis row, a snapshot recording the deal's
+input hash (deal_input_hash), the CALCULATOR_VERSION it was computed with
+and the fingerprint of the grading rules it was graded with. Deals store the
+hash of their current input whenever they are saved, so telling whether a
+snapshot is still current is a comparison of two columns: current snapshots
+are returned as stored, in one query for any number of deals, without
+loading rent rolls or computing anything. Only deals changed since their
+snapshot, or analyzed by an older calculator or under other grading rules,
+are loaded and analyzed again, and their snapshots upserted in one
+statement, along with their owners' portfolio totals and their screening
+rows.
+"""
+
+import math
+from typing import Dict, Iterable, List
+
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.database import upsert_insert
+from app.models.deal import Deal, DealAnalysis as DealAnalysisRecord
+from app.schemas.deal import AIAnalysis, DealInput, DealMetrics, DealResponse, FinancialMetrics
+from app.services.analysis_cache import CALCULATOR_VERSION, deal_input_hash
+from app.services.analysis_stages import run_stages
+from app.services.grading import grading_rules
+from app.services.deal_service import loading_options
+from app.services.portfolio import analysis_rollup, apply_changes, contribution
+from app.services.screening import screening_row, upsert_screening
+
+
+def stored_deal_input(deal: Deal) -> DealInput:
+    """The DealInput of a saved deal loaded with its rent roll"""
+    fields = DealResponse.model_validate(deal).model_dump(include=set(DealInput.model_fields))
+    return DealInput.model_validate(fields)
+
+
+def json_floats(values: dict) -> dict:
+    # JSON has no infinity (Postgres rejects it); store it as a string, which validates back to a float
+    return {
+        key: str(value) if isinstance(value, float) and not math.isfinite(value) else value
+        for key, value in values.items()
+    }
+
+
+def _is_current(input_hash, snapshot, rules_fingerprint: str) -> bool:
+    return (
+        snapshot is not None
+        and input_hash is not None
+        and snapshot.input_hash == input_hash
+        and snapshot.calculator_version == CALCULATOR_VERSION
+        and snapshot.grading_rules == rules_fingerprint
+    )
+
+
+async def _upsert_snapshots(db: AsyncSession, values: List[dict]) -> Dict[int, object]:
+    """Insert or replace the snapshots of several deals; returns when each was written, by deal id"""
+    dialect = (await db.connection()).dialect.name
+    statement = upsert_insert(dialect, DealAnalysisRecord).values(values)
+    statement = statement.on_conflict_do_update(
+        index_elements=[DealAnalysisRecord.deal_id],
+        set_={
+            **{column: statement.excluded[column] for column in values[0] if column != "deal_id"},
+            "updated_at": func.now(),
+        },
+    ).returning(DealAnalysisRecord.deal_id, DealAnalysisRecord.updated_at)
+    return dict((await db.execute(statement)).all())
+
+
+async def _recompute(db: AsyncSession, deal_ids: List[int]) -> Dict[int, DealMetrics]:
+    result = await db.execute(
+        select(Deal)
+        .options(*loading_options(["rentRoll", "analysis"]))
+        .where(Deal.id.in_(deal_ids))
+        .execution_options(populate_existing=True)
+    )
+    metrics, values, changes, screening = {}, [], [], []
+    for deal in result.scalars():
+        before = contribution(deal, analysis_rollup(deal, deal.analysis))
+        deal_input = stored_deal_input(deal)
+        if deal.input_hash is None:
+            # Saved before deals recorded their input hash
+            deal.input_hash = deal_input_hash(deal_input)
+        results, _ = run_stages(deal_input)
+        metrics[deal.id] = DealMetrics(
+            dealId=deal.id,
+            financialMetrics=results["returns"]["metrics"],
+            aiAnalysis=results["grading"]["analysis"],
+            inputHash=deal.input_hash,
+            calculatorVersion=CALCULATOR_VERSION,
+            gradingRules=results["grading"]["rules"],
+            recomputed=True,
+        )
+        rollup = {
+            "noi": results["noi"]["noi"],
+            "annual_debt_service": results["debt"]["annualDebtService"],
+            "equity": results["debt"]["downPayment"],
+        }
+        values.append({
+            "deal_id": deal.id,
+            "financial_metrics": json_floats(results["returns"]["metrics"].model_dump()),
+            "ai_analysis": results["grading"]["analysis"].model_dump(),
+            "input_hash": deal.input_hash,
+            "calculator_version": CALCULATOR_VERSION,
+            "grading_rules": results["grading"]["rules"],
+            **rollup,
+        })
+        changes.append((deal.user_id, before, contribution(deal, rollup)))
+        screening.append(screening_row(deal, results["returns"]["metrics"]))
+    if values:
+        for deal_id, computed_at in (await _upsert_snapshots(db, values)).items():
+            metrics[deal_id].computedAt = computed_at
+        await apply_changes(db, changes)
+        await upsert_screening(db, screening)
+        await db.commit()
+    return metrics
+
+
+async def get_deal_metrics(db: AsyncSession, deal_ids: Iterable[int]) -> Dict[int, DealMetrics]:
+    """
+    Metrics and analysis of each saved deal in deal_ids, by deal id.
+
+    Deals that do not exist are left out. Current snapshots are read in one
+    query; the rest are recomputed and stored before returning.
+    """
+    deal_ids = list(dict.fromkeys(deal_ids))
+    result = await db.execute(
+        select(Deal.id, Deal.input_hash, DealAnalysisRecord)
+        .outerjoin(DealAnalysisRecord, DealAnalysisRecord.deal_id == Deal.id)
+        .where(Deal.id.in_(deal_ids))
+    )
+    metrics, stale = {}, []
+    rules_fingerprint = grading_rules().fingerprint
+    for deal_id, input_hash, snapshot in result.all():
+        if not _is_current(input_hash, snapshot, rules_fingerprint):
+            stale.append(deal_id)
+            continue
+        metrics[deal_id] = DealMetrics(
+            dealId=deal_id,
+            financialMetrics=FinancialMetrics.model_validate(snapshot.financial_metrics),
+            aiAnalysis=AIAnalysis.model_validate(snapshot.ai_analysis),
+            inputHash=input_hash,
+            calculatorVersion=snapshot.calculator_version,
+            gradingRules=snapshot.grading_rules,
+            computedAt=snapshot.updated_at,
+            recomputed=False,
+        )
+    if stale:
+        metrics.update(await _recompute(db, stale))
+    return metrics
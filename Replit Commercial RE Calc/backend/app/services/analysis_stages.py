@@ -0,0 +1,305 @@
+"""
+Deal analysis split into dependency-tracked stages.
+
+    income -> noi -> debt -> cashFlows -> exit -> returns -> grading
+
+Each stage declares the DealInput fields it reads (as JSON pointers) and the
+stages whose results it uses. When an input is patched, only stages reading a
+changed field, and everything downstream of them, are recomputed; the rest
+reuse the results of the previous run. Running every stage is exactly
+calculate_financial_metrics followed by generate_ai_analysis.
+"""
+
+import math
+import time
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Set, Tuple
+
+import numpy as np
+
+from app.schemas.deal import DealInput, FinancialMetrics
+from app.services.batch_metrics import (
+    DEFAULT_EXIT_CAP_RATE,
+    DEFAULT_EXPENSE_RATIO,
+    DEFAULT_HOLD_PERIOD,
+    DEFAULT_RENT_PER_UNIT,
+    EXPENSE_FIELDS,
+)
+from app.services.debt import debt_schedules
+from app.services.grading import generate_ai_analysis, grading_rules
+from app.services.json_patch import apply_patch, parse_pointer
+from app.services.projection import (
+    project_equity_returns,
+    project_operations,
+    project_sale,
+    projection_horizon,
+)
+
+# Fields large enough that a patch not touching them should not round-trip them through JSON
+_LARGE_FIELDS = ("rentRoll", "rentRollColumns")
+
+
+class Stage(NamedTuple):
+    name: str
+    # JSON pointers into DealInput read by the stage
+    inputs: Tuple[str, ...]
+    # Stages whose results the stage uses
+    depends_on: Tuple[str, ...]
+    run: Callable[[DealInput, Dict[str, Dict[str, Any]]], Dict[str, Any]]
+
+
+def _safe_divide(numerator, denominator, default=0):
+    return numerator / denominator if denominator != 0 else default
+
+
+def _income(deal_input: DealInput, results) -> Dict[str, Any]:
+    monthly_rent = deal_input.total_monthly_rent()
+
+    # If no rent roll data, estimate based on units and market assumptions
+    if monthly_rent == 0 and deal_input.numberOfUnits > 0:
+        monthly_rent = float(deal_input.numberOfUnits * DEFAULT_RENT_PER_UNIT)
+
+    vacancy_rate = deal_input.vacancyRate / 100
+    annual_gross_income = float(monthly_rent * 12)
+    return {
+        "monthlyRent": monthly_rent,
+        "vacancyRate": vacancy_rate,
+        "annualGrossIncome": annual_gross_income,
+        "effectiveGrossIncome": float(annual_gross_income * (1 - vacancy_rate)),
+    }
+
+
+def _noi(deal_input: DealInput, results) -> Dict[str, Any]:
+    effective_gross_income = results["income"]["effectiveGrossIncome"]
+    total_expenses = float(sum(getattr(deal_input.operatingExpenses, field) for field in EXPENSE_FIELDS))
+
+    # If no operating expenses provided, estimate a share of effective gross income
+    if total_expenses == 0 and effective_gross_income > 0:
+        total_expenses = float(effective_gross_income * DEFAULT_EXPENSE_RATIO)
+
+    return {"totalExpenses": total_expenses, "noi": float(effective_gross_income - total_expenses)}
+
+
+def _debt(deal_input: DealInput, results) -> Dict[str, Any]:
+    loan_terms = deal_input.loanTerms
+    purchase_price = deal_input.purchasePrice
+    loan_amount = float(loan_terms.loanAmount) if loan_terms.loanAmount else 0.0
+
+    # If loan amount is 0, calculate from LTV
+    if loan_amount == 0:
+        loan_amount = float(purchase_price * (float(loan_terms.ltv) / 100))
+
+    monthly_payment = float(loan_terms.monthlyPayment) if loan_terms.monthlyPayment else 0.0
+    hold_period_years = (
+        float(deal_input.exitAssumptions.holdPeriod) if deal_input.exitAssumptions.holdPeriod > 0 else DEFAULT_HOLD_PERIOD
+    )
+    hold_months = np.maximum(np.array([round(hold_period_years * 12)]), 1)
+    horizon = projection_horizon(hold_months)
+
+    # Debt service and the balance after each month, honoring interest-only months
+    debt_service, balance = debt_schedules(
+        np.array([loan_amount]),
+        np.array([float(loan_terms.interestRate)]),
+        np.array([float(int(loan_terms.amortizationPeriod))]),
+        np.array([float(int(loan_terms.interestOnlyMonths))]),
+        np.array([loan_terms.isInterestOnly]),
+        horizon,
+        monthly_payment=np.array([monthly_payment]),
+    )
+
+    # Year-1 debt service, including any interest-only months
+    annual_debt_service = float(debt_service[0, :12].sum())
+    return {
+        "loanAmount": loan_amount,
+        "monthlyPayment": monthly_payment if monthly_payment != 0 else float(debt_service[0, 0]),
+        "downPayment": float(purchase_price - loan_amount),
+        "holdMonths": hold_months,
+        "horizon": horizon,
+        "debtService": debt_service,
+        "loanBalance": balance,
+        "annualDebtService": annual_debt_service,
+    }
+
+
+def _cash_flows(deal_input: DealInput, results) -> Dict[str, Any]:
+    income = results["income"]
+    debt = results["debt"]
+    growth_rate = np.array([float(deal_input.exitAssumptions.annualAppreciation) / 100])
+    operations = project_operations(
+        np.array([float(income["monthlyRent"])]),
+        np.array([float(income["vacancyRate"])]),
+        np.array([results["noi"]["totalExpenses"]]),
+        growth_rate,
+        growth_rate,
+        debt["horizon"],
+    )
+    return {**operations, "cashFlow": operations["noi"] - debt["debtService"]}
+
+
+def _exit(deal_input: DealInput, results) -> Dict[str, Any]:
+    exit_cap_rate = deal_input.exitAssumptions.exitCapRate
+    exit_cap_rate_decimal = float(exit_cap_rate) / 100 if exit_cap_rate > 0 else DEFAULT_EXIT_CAP_RATE
+    return project_sale(
+        results["cashFlows"]["noi"],
+        results["debt"]["loanBalance"],
+        results["debt"]["holdMonths"],
+        np.array([exit_cap_rate_decimal]),
+    )
+
+
+def _returns(deal_input: DealInput, results) -> Dict[str, Any]:
+    noi = results["noi"]["noi"]
+    debt = results["debt"]
+    sale = results["exit"]
+    down_payment = debt["downPayment"]
+
+    equity = project_equity_returns(
+        results["cashFlows"]["cashFlow"],
+        debt["holdMonths"],
+        sale["netSaleProceeds"],
+        np.array([down_payment]),
+        np.array([float(deal_input.exitAssumptions.discountRate) / 100]),
+    )
+
+    annual_debt_service = debt["annualDebtService"]
+    going_in_cap_rate = _safe_divide(noi, deal_input.purchasePrice) * 100
+    dscr = _safe_divide(noi, annual_debt_service, float("inf"))
+    cash_flow_before_tax = float(noi - annual_debt_service)
+    cash_on_cash_return = _safe_divide(cash_flow_before_tax, down_payment) * 100 if down_payment > 0 else 0
+
+    exit_value = float(sale["salePrice"][0])
+    total_return = float(equity["totalDistributions"][0])
+    projected_irr = float(equity["irr"][0])
+    irr = projected_irr * 100 if down_payment > 0 and math.isfinite(projected_irr) else 0
+
+    metrics = FinancialMetrics(
+        noi=float(noi),
+        goingInCapRate=float(going_in_cap_rate),
+        reversionCapRate=float(deal_input.exitAssumptions.exitCapRate),
+        cashOnCashReturn=float(cash_on_cash_return),
+        stabilizedCashOnCash=float(cash_on_cash_return),
+        irr=float(irr),
+        equityMultiple=float(_safe_divide(total_return, down_payment) if down_payment > 0 else 1.0),
+        breakEvenOccupancy=float(0),
+        dscr=float(dscr),
+        exitSalePrice=float(exit_value),
+        totalReturn=float(total_return),
+        annualCashFlow=float(cash_flow_before_tax),
+        exitValue=float(exit_value),
+        npv=float(equity["npv"][0]),
+        remainingLoanBalance=float(sale["remainingBalance"][0]),
+    )
+    return {**equity, "metrics": metrics}
+
+
+def _grading(deal_input: DealInput, results) -> Dict[str, Any]:
+    rules = grading_rules()
+    return {"analysis": generate_ai_analysis(deal_input, results["returns"]["metrics"], rules), "rules": rules.fingerprint}
+
+
+# In dependency order; every stage depends only on stages before it
+STAGES = (
+    Stage("income", ("/rentRoll", "/rentRollColumns", "/numberOfUnits", "/vacancyRate"), (), _income),
+    Stage("noi", ("/operatingExpenses",), ("income",), _noi),
+    Stage("debt", ("/purchasePrice", "/loanTerms", "/exitAssumptions/holdPeriod"), (), _debt),
+    Stage("cashFlows", ("/exitAssumptions/annualAppreciation",), ("income", "noi", "debt"), _cash_flows),
+    Stage("exit", ("/exitAssumptions/exitCapRate",), ("cashFlows", "debt"), _exit),
+    Stage(
+        "returns",
+        ("/purchasePrice", "/exitAssumptions/exitCapRate", "/exitAssumptions/discountRate"),
+        ("noi", "debt", "cashFlows", "exit"),
+        _returns,
+    ),
+    Stage("grading", ("/numberOfUnits", "/vacancyRate", "/propertyType"), ("returns",), _grading),
+)
+
+STAGE_NAMES = tuple(stage.name for stage in STAGES)
+
+
+def _lookup(model: Any, pointer: str) -> Any:
+    value = model
+    for token in parse_pointer(pointer):
+        value = getattr(value, token)
+    return value
+
+
+def changed_stages(previous: DealInput, current: DealInput) -> Set[str]:
+    """Stages reading at least one field that differs between the two inputs"""
+    changed = set()
+    compared = {}
+    for stage in STAGES:
+        for pointer in stage.inputs:
+            if pointer not in compared:
+                before, after = _lookup(previous, pointer), _lookup(current, pointer)
+                compared[pointer] = before is not after and before != after
+            if compared[pointer]:
+                changed.add(stage.name)
+                break
+    return changed
+
+
+def run_stages(
+    deal_input: DealInput,
+    previous: Optional[Dict[str, Dict[str, Any]]] = None,
+    changed: Optional[Set[str]] = None,
+    through: str = STAGE_NAMES[-1],
+) -> Tuple[Dict[str, Dict[str, Any]], List[Dict[str, Any]]]:
+    """
+    Run the stages up to and including through, timing each one.
+
+    With previous results, a stage is recomputed only if it is in changed, has
+    no previous result, or depends on a stage that was recomputed. Returns the
+    results by stage name and one {stage, recomputed, milliseconds} timing per
+    stage run.
+    """
+    changed = changed or set()
+    results = {}
+    recomputed = set()
+    timings = []
+    for stage in STAGES:
+        start = time.perf_counter()
+        if (
+            previous is None
+            or stage.name not in previous
+            or stage.name in changed
+            or recomputed.intersection(stage.depends_on)
+        ):
+            results[stage.name] = stage.run(deal_input, results)
+            recomputed.add(stage.name)
+        else:
+            results[stage.name] = previous[stage.name]
+        timings.append({
+            "stage": stage.name,
+            "recomputed": stage.name in recomputed,
+            "milliseconds": (time.perf_counter() - start) * 1000,
+        })
+        if stage.name == through:
+            break
+    return results, timings
+
+
+def patch_deal_input(deal_input: DealInput, operations: List[Dict[str, Any]]) -> DealInput:
+    """
+    Apply a JSON Patch to a DealInput and validate the result.
+
+    Rent rolls the patch does not mention are carried over as they are rather
+    than dumped, patched and validated again. Raises ValueError for a patch
+    that does not apply or an input that does not validate.
+    """
+    roots = set()
+    for operation in operations:
+        for pointer in (operation.get("path", ""), operation.get("from")):
+            if pointer is not None:
+                tokens = parse_pointer(pointer)
+                roots.add(tokens[0] if tokens else "")
+    untouched = set() if "" in roots else set(_LARGE_FIELDS) - roots
+
+    document = apply_patch(deal_input.model_dump(exclude=untouched), operations)
+    if not isinstance(document, dict):
+        raise ValueError("A patched deal input must be an object")
+    patched = DealInput.model_validate({key: value for key, value in document.items() if key not in untouched})
+    return patched.model_copy(update={field: getattr(deal_input, field) for field in untouched})
+
+
+def loan_terms_update(results: Dict[str, Dict[str, Any]]) -> Dict[str, float]:
+    """The loan amount and payment the analysis settled on, as LoanTerms fields"""
+    return {"loanAmount": results["debt"]["loanAmount"], "monthlyPayment": results["debt"]["monthlyPayment"]}
@@ -0,0 +1,243 @@
+"""
+Columnar NumPy engine for analyzing many deals in one pass.
+
+Mirrors calculate_financial_metrics in main_simple.py field for field, but
+works on arrays with one element per deal instead of one DealInput at a time.
+"""
+
+from typing import Dict, Sequence
+
+import numpy as np
+
+from app.services.projection import project_cash_flows
+
+# Same fallbacks as the scalar path
+DEFAULT_RENT_PER_UNIT = 1500.0
+DEFAULT_EXPENSE_RATIO = 0.5
+DEFAULT_EXIT_CAP_RATE = 0.065
+DEFAULT_HOLD_PERIOD = 5
+
+# Deals projected per call so the monthly (deals x months) matrices stay small
+PROJECTION_CHUNK_SIZE = 2048
+
+EXPENSE_FIELDS = (
+    "propertyTax",
+    "insurance",
+    "utilities",
+    "maintenance",
+    "propertyManagement",
+    "other",
+)
+
+# Input columns produced by deals_to_columns, in row order
+INPUT_COLUMNS = (
+    "purchasePrice",
+    "numberOfUnits",
+    "monthlyRent",
+    "vacancyRate",
+    "operatingExpenses",
+    "ltv",
+    "interestRate",
+    "amortizationPeriod",
+    "isInterestOnly",
+    "interestOnlyMonths",
+    "loanAmount",
+    "monthlyPayment",
+    "holdPeriod",
+    "exitCapRate",
+    "annualAppreciation",
+    "discountRate",
+)
+
+# Output columns of calculate_financial_metrics_batch
+METRIC_COLUMNS = (
+    "noi",
+    "goingInCapRate",
+    "reversionCapRate",
+    "cashOnCashReturn",
+    "stabilizedCashOnCash",
+    "irr",
+    "equityMultiple",
+    "breakEvenOccupancy",
+    "dscr",
+    "exitSalePrice",
+    "totalReturn",
+    "annualCashFlow",
+    "exitValue",
+    "npv",
+    "remainingLoanBalance",
+    "loanAmount",
+    "monthlyPayment",
+)
+
+
+def deals_to_columns(deals: Sequence) -> Dict[str, np.ndarray]:
+    """Flatten a sequence of DealInput models into one array per input field"""
+    rows = [
+        (
+            deal.purchasePrice,
+            deal.numberOfUnits,
+            deal.total_monthly_rent(),
+            deal.vacancyRate,
+            sum(getattr(deal.operatingExpenses, field) for field in EXPENSE_FIELDS),
+            deal.loanTerms.ltv,
+            deal.loanTerms.interestRate,
+            deal.loanTerms.amortizationPeriod,
+            deal.loanTerms.isInterestOnly,
+            deal.loanTerms.interestOnlyMonths,
+            deal.loanTerms.loanAmount,
+            deal.loanTerms.monthlyPayment,
+            deal.exitAssumptions.holdPeriod,
+            deal.exitAssumptions.exitCapRate,
+            deal.exitAssumptions.annualAppreciation,
+            deal.exitAssumptions.discountRate,
+        )
+        for deal in deals
+    ]
+    table = np.array(rows, dtype=float).reshape(len(rows), len(INPUT_COLUMNS))
+
+    columns = {name: table[:, i] for i, name in enumerate(INPUT_COLUMNS)}
+    columns["isInterestOnly"] = columns["isInterestOnly"].astype(bool)
+    return columns
+
+
+def column_lists(columns: Dict[str, np.ndarray], names: Sequence[str]) -> Dict[str, list]:
+    """
+    The named columns as lists ready for JSON, with None for each value that is not finite.
+
+    A deal without debt service has an infinite DSCR, which JSON cannot carry; it
+    goes out as null for that deal alone rather than failing the whole batch.
+    """
+    lists = {}
+    for name in names:
+        values = columns[name]
+        column = values.tolist()
+        for index in np.flatnonzero(~np.isfinite(values)).tolist():
+            column[index] = None
+        lists[name] = column
+    return lists
+
+
+def _safe_divide(numerator: np.ndarray, denominator: np.ndarray, default) -> np.ndarray:
+    """Elementwise numerator / denominator, falling back to default where denominator is 0"""
+    nonzero = denominator != 0
+    out = np.where(nonzero, numerator, default) / np.where(nonzero, denominator, 1.0)
+    return np.where(nonzero, out, default)
+
+
+def calculate_financial_metrics_batch(columns: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+    """
+    Calculate the FinancialMetrics fields for every deal in a column set.
+
+    Returns one float64 array per FinancialMetrics field, in deal order.
+    """
+    purchase_price = columns["purchasePrice"].astype(float)
+    num_units = columns["numberOfUnits"].astype(float)
+    vacancy_rate = columns["vacancyRate"] / 100
+
+    # Rent roll, falling back to a per-unit estimate
+    total_monthly_rent = columns["monthlyRent"].astype(float)
+    total_monthly_rent = np.where(
+        (total_monthly_rent == 0) & (num_units > 0),
+        num_units * DEFAULT_RENT_PER_UNIT,
+        total_monthly_rent,
+    )
+
+    annual_gross_income = total_monthly_rent * 12
+    effective_gross_income = annual_gross_income * (1 - vacancy_rate)
+
+    total_expenses = columns["operatingExpenses"].astype(float)
+    total_expenses = np.where(
+        (total_expenses == 0) & (effective_gross_income > 0),
+        effective_gross_income * DEFAULT_EXPENSE_RATIO,
+        total_expenses,
+    )
+
+    noi = effective_gross_income - total_expenses
+
+    going_in_cap_rate = _safe_divide(noi, purchase_price, 0.0) * 100
+    exit_cap_rate = columns["exitCapRate"].astype(float)
+
+    # Loan sizing
+    loan_amount = columns["loanAmount"].astype(float)
+    loan_amount = np.where(loan_amount == 0, purchase_price * (columns["ltv"] / 100), loan_amount)
+
+    down_payment = purchase_price - loan_amount
+    has_equity = down_payment > 0
+    given_payment = columns["monthlyPayment"].astype(float)
+
+    hold_period_input = columns["holdPeriod"].astype(float)
+    hold_months = np.round(np.where(hold_period_input > 0, hold_period_input, DEFAULT_HOLD_PERIOD) * 12)
+    exit_cap_rate_decimal = np.where(exit_cap_rate > 0, exit_cap_rate / 100, DEFAULT_EXIT_CAP_RATE)
+    growth_rate = columns["annualAppreciation"] / 100
+    # Optional column; expenses otherwise grow with rents
+    expense_growth_rate = columns.get("expenseGrowth", columns["annualAppreciation"]) / 100
+    discount_rate = columns["discountRate"] / 100
+
+    n = noi.shape[0]
+    annual_debt_service = np.empty(n)
+    first_payment = np.empty(n)
+    exit_value = np.empty(n)
+    remaining_loan_balance = np.empty(n)
+    total_return = np.empty(n)
+    npv = np.empty(n)
+    projected_irr = np.empty(n)
+
+    for start in range(0, n, PROJECTION_CHUNK_SIZE):
+        chunk = slice(start, start + PROJECTION_CHUNK_SIZE)
+        projection = project_cash_flows(
+            monthly_rent=total_monthly_rent[chunk],
+            vacancy_rate=vacancy_rate[chunk],
+            annual_expenses=total_expenses[chunk],
+            rent_growth=growth_rate[chunk],
+            expense_growth=expense_growth_rate[chunk],
+            loan_amount=loan_amount[chunk],
+            annual_rate=columns["interestRate"][chunk],
+            amortization_years=columns["amortizationPeriod"][chunk],
+            interest_only_months=columns["interestOnlyMonths"][chunk],
+            interest_only=columns["isInterestOnly"][chunk],
+            hold_months=hold_months[chunk],
+            exit_cap_rate=exit_cap_rate_decimal[chunk],
+            equity=down_payment[chunk],
+            discount_rate=discount_rate[chunk],
+            monthly_payment=given_payment[chunk],
+        )
+        annual_debt_service[chunk] = projection["debtService"][:, :12].sum(axis=1)
+        first_payment[chunk] = projection["debtService"][:, 0]
+        exit_value[chunk] = projection["salePrice"]
+        remaining_loan_balance[chunk] = projection["remainingBalance"]
+        total_return[chunk] = projection["totalDistributions"]
+        npv[chunk] = projection["npv"]
+        projected_irr[chunk] = projection["irr"]
+
+    monthly_payment = np.where(given_payment == 0, first_payment, given_payment)
+
+    dscr = _safe_divide(noi, annual_debt_service, np.inf)
+    annual_cash_flow = noi - annual_debt_service
+    cash_on_cash_return = np.where(
+        has_equity, _safe_divide(annual_cash_flow, down_payment, 0.0) * 100, 0.0
+    )
+
+    irr = np.where(has_equity & np.isfinite(projected_irr), projected_irr * 100, 0.0)
+    equity_multiple = np.where(has_equity, _safe_divide(total_return, down_payment, 0.0), 1.0)
+
+    return {
+        "noi": noi,
+        "goingInCapRate": going_in_cap_rate,
+        "reversionCapRate": exit_cap_rate,
+        "cashOnCashReturn": cash_on_cash_return,
+        "stabilizedCashOnCash": cash_on_cash_return,
+        "irr": irr,
+        "equityMultiple": equity_multiple,
+        "breakEvenOccupancy": np.zeros_like(noi),
+        "dscr": dscr,
+        "exitSalePrice": exit_value,
+        "totalReturn": total_return,
+        "annualCashFlow": annual_cash_flow,
+        "exitValue": exit_value,
+        "npv": npv,
+        "remainingLoanBalance": remaining_loan_balance,
+        # Exposed so callers can mirror the scalar path's loanTerms write-back
+        "loanAmount": loan_amount,
+        "monthlyPayment": monthly_payment,
+    }
@@ -0,0 +1,199 @@
+"""
+Stored deals: create, list, read, update and delete.
+
+All queries run on an AsyncSession so routes await the database instead of
+blocking the event loop. Relationships are never lazy-loaded: a query names
+the ones its response needs (see DEAL_RELATIONSHIPS), each is fetched with
+one selectin query for the whole page, and touching any other raises instead
+of quietly issuing a query per deal.
+
+Deal lists are paged by keyset on (created_at, id), newest first, and only
+load the list-view columns. The cursor is the position of the last deal on
+the previous page, so a page deep in the list costs an index seek rather
+than scanning and discarding every earlier row as OFFSET does. The cursor's
+created_at is read back from that deal's row instead of being bound from
+Python: SQLite stores server-default timestamps without fractional seconds
+but binds datetimes with them, so deals created in the same second would
+never sort below a bound cursor and the same page would repeat forever.
+"""
+
+import base64
+import json
+from datetime import datetime
+from typing import Iterable, List, Optional, Tuple
+
+from sqlalchemy import delete, func, select, tuple_
+from sqlalchemy.engine import Row
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import raiseload, selectinload
+from sqlalchemy.sql import Select
+
+from app.models.deal import Deal, DealAnalysis
+from app.models.rent_roll import RentRollUnit as RentRollUnitRecord
+from app.schemas.deal import DealInput
+from app.services.analysis_cache import deal_input_hash
+from app.services.portfolio import analysis_rollup, apply_changes, contribution
+from app.services.rent_roll_store import insert_units, rent_roll_values, replace_units
+from app.services.screening import remove_screening
+
+
+# Columns loaded for list views, in DealSummary order
+SUMMARY_COLUMNS = (
+    Deal.id,
+    Deal.name,
+    Deal.property_type,
+    Deal.purchase_price,
+    Deal.number_of_units,
+    Deal.created_at,
+    Deal.updated_at,
+)
+
+
+# Relationships a response can include, by DealResponse field
+DEAL_RELATIONSHIPS = {
+    "rentRoll": Deal.rent_roll_units,
+    "analysis": Deal.analysis,
+}
+
+
+def loading_options(include: Iterable[str] = ()) -> list:
+    """selectinload for each included relationship, raiseload for all others"""
+    include = set(include)
+    unknown = include - set(DEAL_RELATIONSHIPS)
+    if unknown:
+        raise ValueError(f"Unknown relationships: {', '.join(sorted(unknown))}; expected {', '.join(DEAL_RELATIONSHIPS)}")
+    return [selectinload(DEAL_RELATIONSHIPS[name]) for name in sorted(include)] + [raiseload("*")]
+
+
+def encode_cursor(created_at: Optional[datetime], deal_id: int) -> str:
+    """Opaque cursor for the page after the deal at (created_at, deal_id)"""
+    position = [created_at.isoformat() if created_at else None, deal_id]
+    return base64.urlsafe_b64encode(json.dumps(position).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[Optional[datetime], int]:
+    try:
+        created_at, deal_id = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        return (datetime.fromisoformat(created_at) if created_at else None), int(deal_id)
+    except (ValueError, TypeError):
+        raise ValueError("Invalid cursor")
+
+
+def _keyset_page(query: Select, user_id: Optional[int], cursor: Optional[str], limit: int) -> Select:
+    """Restrict a deals query to one page of a user's deals, newest first, plus one row"""
+    query = (
+        query.where(Deal.user_id == user_id)
+        .order_by(Deal.created_at.desc(), Deal.id.desc())
+        # One extra row tells whether another page follows
+        .limit(limit + 1)
+    )
+    if cursor is not None:
+        created_at, deal_id = decode_cursor(cursor)
+        # The stored value, as the database compares it; the encoded one only if that deal is gone
+        position = select(Deal.created_at).where(Deal.id == deal_id).scalar_subquery()
+        query = query.where(tuple_(Deal.created_at, Deal.id) < tuple_(func.coalesce(position, created_at), deal_id))
+    return query
+
+
+def _split_page(rows: list, limit: int) -> Tuple[list, Optional[str]]:
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor(rows[-1].created_at, rows[-1].id)
+
+
+def _deal_fields(deal_input: DealInput) -> dict:
+    """Deal column values for a DealInput"""
+    return {
+        "property_type": deal_input.propertyType,
+        "purchase_price": deal_input.purchasePrice,
+        "number_of_units": deal_input.numberOfUnits,
+        "vacancy_rate": deal_input.vacancyRate,
+        "operating_expenses": deal_input.operatingExpenses.model_dump(),
+        "capex_budget": deal_input.capexBudget,
+        "loan_terms": deal_input.loanTerms.model_dump(),
+        "exit_assumptions": deal_input.exitAssumptions.model_dump(),
+        # Lets a stored analysis be checked against the deal without loading its rent roll
+        "input_hash": deal_input_hash(deal_input),
+    }
+
+
+class DealService:
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def create_deal(self, deal_input: DealInput, user_id: Optional[int] = None) -> Deal:
+        deal = Deal(user_id=user_id, **_deal_fields(deal_input))
+        self.db.add(deal)
+        await self.db.flush()
+        await insert_units(self.db, deal.id, rent_roll_values(deal_input))
+        await apply_changes(self.db, [(user_id, None, contribution(deal))])
+        await self.db.commit()
+        return await self.get_deal(deal.id)
+
+    async def get_deal_summaries(
+        self, user_id: Optional[int] = None, cursor: Optional[str] = None, limit: int = 100
+    ) -> Tuple[List[Row], Optional[str]]:
+        """
+        One page of a user's deals, newest first, as SUMMARY_COLUMNS rows.
+
+        Returns the rows and the cursor of the next page, or None on the last
+        page. Deals without an owner are listed for user_id None.
+        """
+        query = _keyset_page(select(*SUMMARY_COLUMNS), user_id, cursor, limit)
+        return _split_page(list((await self.db.execute(query)).all()), limit)
+
+    async def get_deals(
+        self,
+        user_id: Optional[int] = None,
+        cursor: Optional[str] = None,
+        limit: int = 100,
+        include: Iterable[str] = (),
+    ) -> Tuple[List[Deal], Optional[str]]:
+        """
+        One page of a user's deals, newest first, with the included relationships.
+
+        However long the page, this is one query for the deals plus one per
+        included relationship.
+        """
+        query = _keyset_page(select(Deal).options(*loading_options(include)), user_id, cursor, limit)
+        return _split_page(list((await self.db.execute(query)).scalars().all()), limit)
+
+    async def get_deal(self, deal_id: int, include: Iterable[str] = ("rentRoll",)) -> Optional[Deal]:
+        result = await self.db.execute(
+            select(Deal)
+            .options(*loading_options(include))
+            .where(Deal.id == deal_id)
+            .execution_options(populate_existing=True)
+        )
+        return result.scalar_one_or_none()
+
+    async def update_deal(self, deal_id: int, deal_input: DealInput) -> Optional[Deal]:
+        deal = await self.get_deal(deal_id, include=("analysis",))
+        if deal is None:
+            return None
+        before = contribution(deal, analysis_rollup(deal, deal.analysis))
+        previous_hash = deal.input_hash
+        for column, value in _deal_fields(deal_input).items():
+            setattr(deal, column, value)
+        # A changed input stops the stored analysis counting towards the portfolio or screens
+        await apply_changes(self.db, [(deal.user_id, before, contribution(deal, analysis_rollup(deal, deal.analysis)))])
+        if deal.input_hash != previous_hash:
+            await remove_screening(self.db, [deal_id])
+        # Only units that were added, changed or removed are written
+        await replace_units(self.db, deal_id, rent_roll_values(deal_input))
+        await self.db.commit()
+        return await self.get_deal(deal_id)
+
+    async def delete_deal(self, deal_id: int) -> bool:
+        deal = await self.get_deal(deal_id, include=("analysis",))
+        if deal is None:
+            return False
+        await self.db.execute(delete(RentRollUnitRecord).where(RentRollUnitRecord.deal_id == deal_id))
+        await self.db.execute(delete(DealAnalysis).where(DealAnalysis.deal_id == deal_id))
+        await remove_screening(self.db, [deal_id])
+        result = await self.db.execute(delete(Deal).where(Deal.id == deal_id))
+        if result.rowcount > 0:
+            await apply_changes(self.db, [(deal.user_id, contribution(deal, analysis_rollup(deal, deal.analysis)), None)])
+        await self.db.commit()
+        return result.rowcount > 0
@@ -0,0 +1,204 @@
+"""
+Amortization schedules for interest-only-then-amortizing loans.
+
+Schedules are built per $1 of principal and cached by loan terms, so every
+deal and scenario with the same rate, amortization and IO period shares one
+schedule and only pays for scaling it by the loan amount.
+"""
+
+from functools import lru_cache
+from typing import Dict, NamedTuple
+
+import numpy as np
+
+from app.core.metrics import register_cache
+
+# Distinct (rate, amortization, IO months) combinations kept in memory
+SCHEDULE_CACHE_SIZE = 512
+
+# Rates are rounded before caching so 5.5 and 5.500000001 share a schedule
+RATE_DECIMALS = 8
+
+# Balances below half a cent are treated as paid off
+PAYOFF_EPSILON = 0.005
+
+
+class AmortizationSchedule(NamedTuple):
+    """Per-$1 schedule. Period 1 is the first payment; balance[0] is the opening balance."""
+    payment: np.ndarray
+    interest: np.ndarray
+    principal: np.ndarray
+    balance: np.ndarray
+
+
+def _read_only(*arrays: np.ndarray) -> None:
+    for array in arrays:
+        array.setflags(write=False)
+
+
+@lru_cache(maxsize=SCHEDULE_CACHE_SIZE)
+def normalized_schedule(annual_rate: float, amortization_years: int, interest_only_months: int) -> AmortizationSchedule:
+    """
+    Build the schedule for $1 of principal.
+
+    The loan pays interest only for interest_only_months, then amortizes fully
+    over amortization_years. With no amortization the loan stays interest-only
+    and the full balance is due at payoff. Arrays are shared between callers
+    and therefore read-only.
+    """
+    monthly_rate = annual_rate / 100 / 12
+    io_months = max(int(interest_only_months), 0)
+    amort_months = max(int(amortization_years), 0) * 12
+    periods = io_months + amort_months
+
+    balance = np.ones(periods + 1)
+    payment = np.full(periods, monthly_rate)
+
+    if amort_months > 0:
+        k = np.arange(1, amort_months + 1)
+        if monthly_rate > 0:
+            growth_n = (1 + monthly_rate) ** amort_months
+            balance[io_months + 1:] = (growth_n - (1 + monthly_rate) ** k) / (growth_n - 1)
+            payment[io_months:] = monthly_rate * growth_n / (growth_n - 1)
+        else:
+            balance[io_months + 1:] = 1 - k / amort_months
+            payment[io_months:] = 1 / amort_months
+        balance[-1] = 0.0
+
+    interest = monthly_rate * balance[:-1]
+    principal = balance[:-1] - balance[1:]
+
+    _read_only(payment, interest, principal, balance)
+    return AmortizationSchedule(payment, interest, principal, balance)
+
+
+def schedule_terms(annual_rate: float, amortization_years: int, interest_only_months: int, interest_only: bool):
+    """Cache key for a loan; fully interest-only loans ignore amortization"""
+    if interest_only:
+        return round(float(annual_rate), RATE_DECIMALS), 0, 0
+    return round(float(annual_rate), RATE_DECIMALS), int(amortization_years), int(interest_only_months)
+
+
+def amortization_schedule(
+    loan_amount: float,
+    annual_rate: float,
+    amortization_years: int,
+    interest_only_months: int = 0,
+    interest_only: bool = False,
+) -> Dict[str, np.ndarray]:
+    """Full schedule for one loan in dollars: payment, interest, principal and balance per period"""
+    schedule = normalized_schedule(
+        *schedule_terms(annual_rate, amortization_years, interest_only_months, interest_only)
+    )
+    return {field: getattr(schedule, field) * loan_amount for field in AmortizationSchedule._fields}
+
+
+def schedule_cache_info() -> Dict[str, int]:
+    """Hit/miss counters for the shared schedule cache"""
+    info = normalized_schedule.cache_info()
+    return {
+        "hits": info.hits,
+        "misses": info.misses,
+        # Every miss adds a schedule, so those no longer held were evicted
+        "evictions": info.misses - info.currsize,
+        "size": info.currsize,
+        "maxSize": info.maxsize,
+    }
+
+
+register_cache("amortization_schedule", schedule_cache_info)
+
+
+def _extend(schedule: AmortizationSchedule, monthly_rate: float, periods: int):
+    """
+    Payment and balance of a schedule over exactly `periods` months.
+
+    Past the end of the schedule the final balance stays outstanding at
+    interest only, which is nothing for a fully amortized loan and the
+    balloon's interest for a loan that never amortizes.
+    """
+    have = schedule.payment.shape[0]
+    if periods <= have:
+        return schedule.payment[:periods], schedule.balance[:periods + 1]
+
+    final_balance = schedule.balance[-1]
+    payment = np.concatenate([schedule.payment, np.full(periods - have, monthly_rate * final_balance)])
+    balance = np.concatenate([schedule.balance, np.full(periods - have, final_balance)])
+    return payment, balance
+
+
+def _level_payment_schedule(loan_amount, monthly_rate, monthly_payment, interest_only, periods: int):
+    """Debt service and balance for loans whose monthly payment was given rather than computed"""
+    t = np.arange(periods + 1)[None, :]
+    rate = monthly_rate[:, None]
+    payment = monthly_payment[:, None]
+    principal = loan_amount[:, None]
+
+    with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+        growth = (1 + rate) ** t
+        balance = np.where(
+            rate != 0,
+            principal * growth - payment * (growth - 1) / rate,
+            principal - payment * t,
+        )
+    balance = np.where(interest_only[:, None], principal, np.maximum(balance, 0.0))
+
+    # The payment stops once the loan is paid off
+    debt_service = np.where(balance[:, :-1] > PAYOFF_EPSILON, payment, 0.0)
+    return debt_service, balance
+
+
+def debt_schedules(
+    loan_amount,
+    annual_rate,
+    amortization_years,
+    interest_only_months,
+    interest_only,
+    periods: int,
+    monthly_payment=None,
+):
+    """
+    Monthly debt service (loans x periods) and balance (loans x periods + 1) for many loans.
+
+    Each distinct set of terms is looked up once in the schedule cache and the
+    shared per-$1 schedule is scaled by every loan amount using it. Loans with a
+    non-zero monthly_payment keep that payment instead of the computed one.
+    """
+    loan_amount = np.asarray(loan_amount, dtype=float)
+    annual_rate = np.asarray(annual_rate, dtype=float)
+    interest_only = np.asarray(interest_only, dtype=bool)
+
+    keys = np.column_stack([
+        np.round(annual_rate, RATE_DECIMALS),
+        np.where(interest_only, 0, np.trunc(amortization_years)),
+        np.where(interest_only, 0, np.trunc(interest_only_months)),
+    ])
+    if keys.shape[0] == 1:
+        terms, inverse = keys, np.zeros(1, dtype=int)
+    else:
+        terms, inverse = np.unique(keys, axis=0, return_inverse=True)
+        inverse = inverse.reshape(-1)
+
+    payment_table = np.empty((terms.shape[0], periods))
+    balance_table = np.empty((terms.shape[0], periods + 1))
+    for k, (rate, amortization, io_months) in enumerate(terms):
+        schedule = normalized_schedule(float(rate), int(amortization), int(io_months))
+        payment_table[k], balance_table[k] = _extend(schedule, rate / 100 / 12, periods)
+
+    principal = np.maximum(loan_amount, 0.0)[:, None]
+    debt_service = payment_table[inverse] * principal
+    balance = balance_table[inverse] * principal
+
+    if monthly_payment is not None:
+        monthly_payment = np.asarray(monthly_payment, dtype=float)
+        given = monthly_payment != 0
+        if given.any():
+            debt_service[given], balance[given] = _level_payment_schedule(
+                loan_amount[given],
+                annual_rate[given] / 100 / 12,
+                monthly_payment[given],
+                interest_only[given],
+                periods,
+            )
+
+    return debt_service, balance
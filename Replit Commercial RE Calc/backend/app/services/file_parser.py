@@ -0,0 +1,530 @@
+"""
+Rent roll and T12 file parsing.
+
+Rent rolls arrive in whatever layout the operator exports, so headers are
+matched against a table of aliases and every row goes through the same
+vectorized validation whether the file was loaded whole (CSV or Excel) or
+streamed (CSV only). Streaming reads the upload a block of rows at a time and
+folds each block into compact typed arrays, so memory holds one block of raw
+text plus a few bytes per parsed field however large the file is. The result
+is encoded back out of those arrays a block of values at a time, straight
+into the upload cache or the response, never as one JSON document in memory.
+
+Excel parsing is CPU-bound, so workbooks are parsed in a dedicated process
+pool with openpyxl's read-only row iterator rather than on the event loop.
+"""
+
+import asyncio
+import io
+import json
+import os
+import time
+import zipfile
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+from fastapi import UploadFile
+from starlette.concurrency import run_in_threadpool
+
+from app.core.config import settings
+from app.services.t12_parser import T12_PARSER_VERSION, extract_t12
+from app.services.upload_cache import (
+    HashingReader,
+    JSONStream,
+    hash_bytes,
+    read_chunks,
+    upload_cache,
+    upload_head,
+)
+
+# Bump whenever parsing changes what an upload produces; invalidates cached results
+RENT_ROLL_PARSER_VERSION = 1
+
+# Rent roll field -> normalized header names that map onto it
+RENT_ROLL_COLUMN_ALIASES = {
+    "unitNumber": ("unitnumber", "unit", "unitno", "unitid", "apt", "aptno", "apartment", "suite"),
+    "unitType": ("unittype", "type", "floorplan", "plan", "layout"),
+    "bedrooms": ("bedrooms", "beds", "bed", "br", "bd"),
+    "bathrooms": ("bathrooms", "baths", "bath", "ba"),
+    "squareFootage": ("squarefootage", "sqft", "squarefeet", "sf", "size", "area"),
+    "monthlyRent": ("monthlyrent", "rent", "currentrent", "contractrent", "leaserent", "marketrent", "actualrent"),
+    "occupied": ("occupied", "status", "occupancy", "occupancystatus"),
+}
+
+NUMERIC_FIELDS = ("bedrooms", "bathrooms", "squareFootage", "monthlyRent")
+
+OCCUPIED_VALUES = ("", "1", "y", "yes", "true", "occupied", "o", "leased", "current")
+VACANT_VALUES = ("0", "n", "no", "false", "vacant", "v", "unoccupied", "notice", "down")
+
+# Row errors reported back to the caller; the rest are only counted
+MAX_REPORTED_ERRORS = 50
+
+# Separates unit numbers inside one stored block
+_UNIT_SEPARATOR = "\x1f"
+
+# Values per column encoded at a time when a streamed result is written out
+JSON_BLOCK_VALUES = 10_000
+
+# Workbook rows validated per block; the job deadline is checked between blocks
+EXCEL_BLOCK_ROWS = 5_000
+
+# Niceness of Excel workers so parsing yields the CPU to the API process
+EXCEL_WORKER_NICENESS = 10
+
+
+class ParserBusyError(RuntimeError):
+    """Raised when the Excel parse queue is full"""
+
+
+def normalize_header(name) -> str:
+    """Lowercase a header and drop everything but letters and digits: 'Sq. Ft.' -> 'sqft'"""
+    return "".join(c for c in str(name).lower() if c.isalnum())
+
+
+def map_rent_roll_header(header: Sequence) -> Dict[str, int]:
+    """Column index of each rent roll field found in the header row"""
+    positions = {}
+    for i, name in enumerate(header):
+        positions.setdefault(normalize_header(name), i)
+
+    mapping = {}
+    for field, aliases in RENT_ROLL_COLUMN_ALIASES.items():
+        for alias in aliases:
+            if alias in positions:
+                mapping[field] = positions[alias]
+                break
+    if "monthlyRent" not in mapping:
+        raise ValueError("Rent roll has no rent column; expected a header such as 'Monthly Rent' or 'Rent'")
+    return mapping
+
+
+_NUMBER_NOISE = str.maketrans("(", "-", "$, )")
+
+
+def _parse_number(text: str) -> float:
+    """'$1,250.00' -> 1250.0 and '(50)' -> -50.0; blank is 0 and anything else NaN"""
+    text = str(text).translate(_NUMBER_NOISE)
+    try:
+        return float(text) if text else 0.0
+    except ValueError:
+        return np.nan
+
+
+def _factorize(values: pd.Series):
+    """
+    Integer codes and distinct values of a column.
+
+    Rent roll columns repeat heavily (a few rents, floor plans and bed/bath
+    counts), so parsing the distinct values and indexing by code is much
+    cheaper than parsing every cell.
+    """
+    codes, uniques = pd.factorize(values.to_numpy(dtype=object))
+    return codes, list(uniques)
+
+
+def _parse_numbers(values: pd.Series) -> np.ndarray:
+    codes, uniques = _factorize(values)
+    return np.array([_parse_number(value) for value in uniques], dtype=float)[codes]
+
+
+class RentRollBuilder:
+    """
+    Validates blocks of rent roll rows into compact typed arrays.
+
+    Rows that fail validation are skipped and counted; the first
+    MAX_REPORTED_ERRORS messages are kept for the response.
+    """
+
+    def __init__(self, header: Sequence):
+        self.mapping = map_rent_roll_header(header)
+        self.source_columns = {field: str(header[i]).strip() for field, i in self.mapping.items()}
+        self.bedrooms = array("i")
+        self.bathrooms = array("i")
+        self.square_footage = array("d")
+        self.monthly_rent = array("d")
+        self.occupied = array("b")
+        # Unit types as codes into unit_type_names; unit numbers as one joined string per block
+        self.unit_type_codes = array("i")
+        self.unit_type_names: List[str] = []
+        self._unit_type_index: Dict[str, int] = {}
+        self._unit_number_blocks: List[str] = []
+        self.rows_seen = 0
+        self.rejected_rows = 0
+        self.errors: List[str] = []
+
+    def _column(self, frame: pd.DataFrame, field: str) -> pd.Series:
+        index = self.mapping.get(field)
+        if index is None or index >= frame.shape[1]:
+            return pd.Series("", index=frame.index)
+        return frame.iloc[:, index].fillna("")
+
+    def _reject(self, row_numbers: np.ndarray, message: str) -> None:
+        room = MAX_REPORTED_ERRORS - len(self.errors)
+        self.errors.extend(f"Row {row}: {message}" for row in row_numbers[:max(room, 0)])
+
+    def add_frame(self, frame: pd.DataFrame) -> None:
+        """Validate a block of rows (all cells as strings) and keep the good ones"""
+        # Data rows are numbered from 1, counting separator-only lines
+        row_numbers = np.arange(self.rows_seen + 1, self.rows_seen + len(frame) + 1)
+        self.rows_seen += len(frame)
+
+        # Skip separator-only lines; only rows without a rent can be blank
+        no_rent = np.flatnonzero((self._column(frame, "monthlyRent") == "").to_numpy())
+        if no_rent.size:
+            keep = np.ones(len(frame), dtype=bool)
+            keep[no_rent] = ~(frame.iloc[no_rent].fillna("") == "").all(axis=1).to_numpy()
+            frame, row_numbers = frame[keep], row_numbers[keep]
+        if frame.empty:
+            return
+
+        valid = np.ones(len(frame), dtype=bool)
+        numbers = {}
+        for field in NUMERIC_FIELDS:
+            values = _parse_numbers(self._column(frame, field))
+            bad = ~np.isfinite(values)
+            self._reject(row_numbers[bad & valid], f"{field} is not a number")
+            valid &= ~bad
+            numbers[field] = values
+
+        negative = valid & (numbers["monthlyRent"] < 0)
+        self._reject(row_numbers[negative], "monthlyRent is negative")
+        valid &= ~negative
+
+        codes, statuses = _factorize(self._column(frame, "occupied"))
+        statuses = [str(status).strip().lower() for status in statuses]
+        occupied = np.array([status in OCCUPIED_VALUES for status in statuses], dtype=bool)[codes]
+        known = np.array([status in OCCUPIED_VALUES or status in VACANT_VALUES for status in statuses], dtype=bool)[codes]
+        unknown = valid & ~known
+        self._reject(row_numbers[unknown], "occupancy status not recognized")
+        valid &= ~unknown
+
+        self.rejected_rows += int((~valid).sum())
+        if not valid.any():
+            return
+
+        self.bedrooms.frombytes(numbers["bedrooms"][valid].astype(np.int32).tobytes())
+        self.bathrooms.frombytes(numbers["bathrooms"][valid].astype(np.int32).tobytes())
+        self.square_footage.frombytes(numbers["squareFootage"][valid].tobytes())
+        self.monthly_rent.frombytes(numbers["monthlyRent"][valid].tobytes())
+        self.occupied.frombytes(occupied[valid].astype(np.int8).tobytes())
+
+        codes, names = _factorize(self._column(frame, "unitType")[valid])
+        block_codes = np.array([self._unit_type_code(str(name).strip()) for name in names], dtype=np.int32)[codes]
+        self.unit_type_codes.frombytes(block_codes.tobytes())
+
+        unit_numbers = [
+            str(number).strip().replace(_UNIT_SEPARATOR, "") or str(row)
+            for number, row in zip(self._column(frame, "unitNumber")[valid], row_numbers[valid])
+        ]
+        self._unit_number_blocks.append(_UNIT_SEPARATOR.join(unit_numbers))
+
+    def _unit_type_code(self, name: str) -> int:
+        code = self._unit_type_index.get(name)
+        if code is None:
+            code = self._unit_type_index[name] = len(self.unit_type_names)
+            self.unit_type_names.append(name)
+        return code
+
+    def __len__(self) -> int:
+        return len(self.monthly_rent)
+
+    def to_columns(self) -> Dict[str, list]:
+        """Parallel lists in the shape of RentRollColumns"""
+        unit_numbers = [number for block in self._unit_number_blocks for number in block.split(_UNIT_SEPARATOR)]
+        return {
+            "unitNumber": unit_numbers,
+            "unitType": [self.unit_type_names[code] for code in self.unit_type_codes],
+            "bedrooms": self.bedrooms.tolist(),
+            "bathrooms": self.bathrooms.tolist(),
+            "squareFootage": self.square_footage.tolist(),
+            "monthlyRent": self.monthly_rent.tolist(),
+            "occupied": [bool(value) for value in self.occupied],
+        }
+
+    def to_units(self) -> List[Dict]:
+        """One dict per unit in the shape of RentRollUnit"""
+        columns = self.to_columns()
+        return [dict(zip(columns, values)) for values in zip(*columns.values())]
+
+    def _column_blocks(self) -> Iterator[tuple]:
+        """(field, values) in the shape of RentRollColumns, each field in lists of at most JSON_BLOCK_VALUES"""
+        yield "unitNumber", self._unit_number_lists()
+        slices = [slice(start, start + JSON_BLOCK_VALUES) for start in range(0, len(self), JSON_BLOCK_VALUES)]
+        names = self.unit_type_names
+        yield "unitType", ([names[code] for code in self.unit_type_codes[part]] for part in slices)
+        yield "bedrooms", (self.bedrooms[part].tolist() for part in slices)
+        yield "bathrooms", (self.bathrooms[part].tolist() for part in slices)
+        yield "squareFootage", (self.square_footage[part].tolist() for part in slices)
+        yield "monthlyRent", (self.monthly_rent[part].tolist() for part in slices)
+        yield "occupied", ([bool(value) for value in self.occupied[part]] for part in slices)
+
+    def _unit_number_lists(self) -> Iterator[List[str]]:
+        for block in self._unit_number_blocks:
+            while True:
+                numbers = block.split(_UNIT_SEPARATOR, JSON_BLOCK_VALUES)
+                if len(numbers) <= JSON_BLOCK_VALUES:
+                    yield numbers
+                    break
+                block = numbers.pop()
+                yield numbers
+
+    def iter_json(self) -> Iterator[bytes]:
+        """{"data": to_columns(), "summary": summary()} as JSON, encoded a block of values at a time"""
+        encode = json.JSONEncoder(separators=(",", ":")).encode
+        yield b'{"data":{'
+        for i, (field, blocks) in enumerate(self._column_blocks()):
+            yield f'{"," if i else ""}"{field}":['.encode()
+            first = True
+            for values in blocks:
+                if values:
+                    yield (encode(values)[1:-1] if first else "," + encode(values)[1:-1]).encode("utf-8")
+                    first = False
+            yield b"]"
+        yield b'},"summary":' + encode(self.summary()).encode("utf-8") + b"}"
+
+    def summary(self) -> Dict:
+        return {
+            "unitCount": len(self),
+            "occupiedUnits": int(np.frombuffer(self.occupied, dtype=np.int8).sum()),
+            "totalMonthlyRent": float(np.frombuffer(self.monthly_rent, dtype=np.float64).sum()),
+            "rejectedRows": self.rejected_rows,
+            "errors": self.errors,
+            "columns": self.source_columns,
+        }
+
+
+def build_rent_roll(header: Sequence, frames: Iterable[pd.DataFrame]) -> RentRollBuilder:
+    builder = RentRollBuilder(header)
+    for frame in frames:
+        builder.add_frame(frame)
+    return builder
+
+
+def stream_rent_roll_csv(
+    stream, chunk_rows: Optional[int] = None, progress: Optional[Callable[[float], None]] = None
+) -> RentRollBuilder:
+    """
+    Parse a CSV rent roll from a seekable binary stream, chunk_rows rows at a time.
+
+    progress, if given, is called with the share of the stream read after each chunk.
+    """
+    start = stream.tell()
+    size = stream.seek(0, os.SEEK_END) - start
+    stream.seek(start)
+    reader = pd.read_csv(
+        stream,
+        dtype=str,
+        keep_default_na=False,
+        encoding="utf-8-sig",
+        encoding_errors="replace",
+        on_bad_lines="skip",
+        chunksize=chunk_rows or settings.RENT_ROLL_CHUNK_ROWS,
+    )
+    with reader:
+        first = next(reader, None)
+        if first is None:
+            raise ValueError("Rent roll file is empty")
+        builder = RentRollBuilder(list(first.columns))
+        builder.add_frame(first)
+        for frame in reader:
+            builder.add_frame(frame)
+            if progress is not None and size:
+                # The parser reads ahead of the rows it has returned, so this runs slightly early
+                progress(min((stream.tell() - start) / size, 1.0))
+    return builder
+
+
+_excel_pool: Optional[ProcessPoolExecutor] = None
+_excel_jobs = 0
+
+
+def _lower_priority() -> None:
+    try:
+        os.nice(EXCEL_WORKER_NICENESS)
+    except OSError:
+        pass
+
+
+def get_excel_pool() -> ProcessPoolExecutor:
+    """Process pool for workbook parsing, created on first use"""
+    global _excel_pool
+    if _excel_pool is None:
+        _excel_pool = ProcessPoolExecutor(
+            max_workers=settings.EXCEL_PARSE_WORKERS,
+            initializer=_lower_priority,
+        )
+    return _excel_pool
+
+
+def _check_deadline(deadline: float) -> None:
+    if time.time() > deadline:
+        raise TimeoutError("Workbook parsing timed out")
+
+
+def parse_workbook_rent_roll(content: bytes, extension: str, deadline: float) -> RentRollBuilder:
+    """
+    Parse the first sheet of a workbook; runs inside an Excel pool worker.
+
+    .xlsx files are read row by row in openpyxl's read-only mode. Legacy .xls
+    files are loaded whole with xlrd. The job gives up with TimeoutError
+    once the wall clock passes `deadline`.
+    """
+    if extension == ".xls":
+        import xlrd
+        from xlrd.compdoc import CompDocError
+
+        try:
+            frame = pd.read_excel(io.BytesIO(content), dtype=str, engine="xlrd").fillna("")
+        except (xlrd.XLRDError, CompDocError) as error:
+            raise ValueError(f"Not a readable .xls workbook: {error}") from None
+        return build_rent_roll(list(frame.columns), [frame])
+
+    from openpyxl import load_workbook
+    from openpyxl.utils.exceptions import InvalidFileException
+
+    try:
+        workbook = load_workbook(io.BytesIO(content), read_only=True, data_only=True)
+    except (zipfile.BadZipFile, InvalidFileException, KeyError) as error:
+        # Not a zip, or a zip without the parts of a workbook
+        raise ValueError(f"Not a readable .xlsx workbook: {error}") from None
+    try:
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+        for header in rows:
+            if any(cell not in (None, "") for cell in header):
+                break
+        else:
+            raise ValueError("Rent roll file is empty")
+
+        builder = RentRollBuilder(["" if cell is None else str(cell) for cell in header])
+        block = []
+        for row in rows:
+            block.append(row)
+            if len(block) == EXCEL_BLOCK_ROWS:
+                _check_deadline(deadline)
+                builder.add_frame(pd.DataFrame(block, dtype=object))
+                block = []
+        if block:
+            builder.add_frame(pd.DataFrame(block, dtype=object))
+        return builder
+    finally:
+        workbook.close()
+
+
+async def run_excel_job(content: bytes, extension: str) -> RentRollBuilder:
+    """
+    Parse a workbook in the Excel pool without blocking the event loop.
+
+    At most EXCEL_PARSE_QUEUE_DEPTH jobs may be queued or running; beyond
+    that ParserBusyError is raised straight away. A job still queued when its
+    request is cancelled or times out is dropped from the queue, and a
+    running job stops itself at its deadline.
+    """
+    global _excel_jobs
+    if _excel_jobs >= settings.EXCEL_PARSE_QUEUE_DEPTH:
+        raise ParserBusyError("Too many workbooks are being parsed; try again shortly")
+
+    timeout = settings.EXCEL_PARSE_TIMEOUT
+    _excel_jobs += 1
+    future = get_excel_pool().submit(parse_workbook_rent_roll, content, extension, time.time() + timeout)
+    try:
+        # The worker enforces the deadline itself; the grace period covers pickling the result
+        return await asyncio.wait_for(asyncio.wrap_future(future), timeout + 5)
+    except asyncio.TimeoutError:
+        raise TimeoutError("Workbook parsing timed out")
+    finally:
+        future.cancel()
+        _excel_jobs -= 1
+
+
+class FileParser:
+    """
+    Parses uploads through the content-addressed upload cache.
+
+    Results are the FileUploadResponse fields ({"data": ..., "summary": ...}),
+    or a CachedJSON holding the same object when the upload was seen before.
+    Streamed rent rolls come back as a JSONStream of that object instead.
+    """
+
+    async def _cached(self, file: UploadFile, kind: str, variant: str, version: int, parse):
+        """The result of parse(content) for the upload's content, from the cache if it is there"""
+        await file.seek(0)
+        content = await file.read()
+        digest = await run_in_threadpool(hash_bytes, content)
+        cached = await run_in_threadpool(upload_cache.get, digest, kind, variant, version)
+        if cached is not None:
+            return cached
+
+        result = await parse(content)
+        await run_in_threadpool(upload_cache.put, digest, kind, variant, version, result)
+        return result
+
+    async def _cached_stream(self, file: UploadFile, kind: str, variant: str, version: int, parse) -> JSONStream:
+        """
+        Like _cached for a parse(stream) reading the upload in chunks and
+        returning a RentRollBuilder, whose result is written and sent in chunks.
+        The upload is hashed as it is parsed.
+        """
+        source = file.file
+        head = await run_in_threadpool(upload_head, source)
+        digest = await run_in_threadpool(upload_cache.recognize, source, head, kind, variant, version)
+        if digest is not None:
+            cached = await run_in_threadpool(upload_cache.get_stream, digest, kind, variant, version)
+            if cached is not None:
+                return cached
+
+        reader = HashingReader(source)
+        builder = await parse(reader)
+        digest = await run_in_threadpool(reader.finish)
+        stored = await run_in_threadpool(
+            upload_cache.put_stream, digest, kind, variant, version, builder.iter_json(), head
+        )
+        if stored is not None:
+            return JSONStream(read_chunks(stored), cached=False, entry=(digest, kind, variant, version), handle=stored)
+        # Not cached; encode it again as it is sent
+        return JSONStream(builder.iter_json(), cached=False)
+
+    async def parse_rent_roll(
+        self, file: UploadFile, stream: bool = False, progress: Optional[Callable[[float], None]] = None
+    ):
+        """
+        Parse an uploaded rent roll.
+
+        By default the whole file is loaded and data is a list of units. With
+        stream=True a CSV is read in blocks of rows instead, data is columnar
+        (RentRollColumns) and a parse summary is included, and progress, if
+        given, is called with the share of the file read after each block.
+        The result is then a JSONStream, to be sent without decoding it.
+        """
+        extension = os.path.splitext(file.filename or "")[1].lower()
+        if stream and extension != ".csv":
+            raise ValueError("Streaming parse is only available for CSV rent rolls")
+
+        variant = f"{extension.lstrip('.')}-{'columns' if stream else 'units'}"
+        if stream:
+            return await self._cached_stream(
+                file, "rent_roll", variant, RENT_ROLL_PARSER_VERSION,
+                lambda reader: run_in_threadpool(stream_rent_roll_csv, reader, None, progress),
+            )
+
+        async def parse(content: bytes):
+            if extension in (".xlsx", ".xls"):
+                builder = await run_excel_job(content, extension)
+            else:
+                builder = await run_in_threadpool(self._load_csv_rent_roll, content)
+            return {"data": builder.to_units(), "summary": None}
+
+        return await self._cached(file, "rent_roll", variant, RENT_ROLL_PARSER_VERSION, parse)
+
+    async def parse_t12(self, file: UploadFile, progress: Optional[Callable[[float], None]] = None):
+        """Extract the operating statement of a T12 PDF; see app.services.t12_parser"""
+        async def parse(content: bytes):
+            return {"data": await extract_t12(content, progress), "summary": None}
+
+        return await self._cached(file, "t12", "pdf", T12_PARSER_VERSION, parse)
+
+    def _load_csv_rent_roll(self, content: bytes) -> RentRollBuilder:
+        frame = pd.read_csv(io.BytesIO(content), dtype=str, keep_default_na=False, encoding="utf-8-sig")
+        return build_rent_roll(list(frame.columns), [frame])
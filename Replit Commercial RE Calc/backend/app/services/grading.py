@@ -0,0 +1,327 @@
+"""
+Letter grades for deal metrics and the rule-based analysis built from them.
+
+Grading is table driven. The rules (grade thresholds per metric, with
+overrides per property type, metric weights, overall grade bands, and the
+red-flag and strength rules) are plain data: DEFAULT_GRADING_RULES, with
+any top-level keys replaced by the JSON file named in GRADING_RULES_FILE.
+They are compiled into NumPy arrays once, and grade_deals grades whole
+columns of deals with np.searchsorted and boolean masks, so a batch costs a
+few array operations per metric rather than Python per deal.
+
+The rules file is checked on every use and recompiled when it changes, so
+thresholds can be edited without a restart. Each compiled rule set has a
+fingerprint; cached and stored analyses record it and are regraded once the
+rules change.
+"""
+
+import copy
+import hashlib
+import json
+import logging
+import os
+import threading
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence
+
+import numpy as np
+
+from app.core.config import settings
+from app.schemas.deal import AIAnalysis, DealInput, FinancialMetrics
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_GRADING_RULES: Dict[str, Any] = {
+    # Worst to best
+    "grades": ["D", "C", "B", "A", "A+"],
+    "gradePoints": [1.0, 2.0, 3.0, 4.0, 4.3],
+    # Ascending lower bounds of each grade after the first; a value equal to a bound earns the higher grade
+    "metrics": {
+        "cap_rate": {"field": "goingInCapRate", "thresholds": [5.0, 6.0, 7.0, 8.0]},
+        "cash_on_cash": {"field": "cashOnCashReturn", "thresholds": [6.0, 8.0, 10.0, 12.0]},
+        "dscr": {"field": "dscr", "thresholds": [1.15, 1.25, 1.35, 1.5]},
+        "irr": {"field": "irr", "thresholds": [8.0, 10.0, 12.0, 15.0]},
+        "equity_multiple": {"field": "equityMultiple", "thresholds": [1.5, 1.75, 2.0, 2.5]},
+        "noi_per_unit": {"field": "noiPerUnitMonthly", "thresholds": [75.0, 100.0, 125.0, 150.0]},
+    },
+    # Thresholds replacing the ones above for a property type, e.g. {"Office": {"cap_rate": [6, 7, 8, 9]}}
+    "propertyTypes": {},
+    # Share of the overall score from each metric's grade points, added in this order
+    "weights": {"cap_rate": 0.25, "cash_on_cash": 0.25, "irr": 0.25, "dscr": 0.15, "equity_multiple": 0.10},
+    # Bands of the weighted score, worst to best
+    "overall": {
+        "thresholds": [2.0, 2.5, 3.0, 3.5, 4.0],
+        "grades": ["D", "C", "B", "B+", "A", "A+"],
+        "recommendations": ["AVOID", "AVOID", "HOLD/CONSIDER", "BUY", "BUY", "STRONG BUY"],
+    },
+    # Each rule applies where field is strictly below or above its bound
+    "redFlags": [
+        {
+            "field": "goingInCapRate", "below": 5,
+            "redFlag": "Going-in cap rate is below 5%, indicating potentially overpriced property",
+            "recommendation": "Consider negotiating a lower purchase price",
+        },
+        {
+            "field": "dscr", "below": 1.2,
+            "redFlag": "DSCR below 1.2 indicates high leverage risk",
+            "recommendation": "Consider reducing loan amount or improving NOI",
+        },
+        {
+            "field": "cashOnCashReturn", "below": 6,
+            "redFlag": "Cash-on-cash return below 6% may not meet investor requirements",
+            "recommendation": "Look for ways to increase NOI or reduce expenses",
+        },
+        {
+            "field": "vacancyRate", "above": 10,
+            "redFlag": "High vacancy rate may indicate market or property issues",
+            "recommendation": "Investigate market conditions and property management",
+        },
+    ],
+    "strengths": [
+        {"field": "goingInCapRate", "above": 8, "summary": "Strong going-in cap rate suggests good value"},
+        {"field": "dscr", "above": 1.5, "summary": "Strong debt service coverage provides good safety margin"},
+        {"field": "cashOnCashReturn", "above": 10, "summary": "Excellent cash-on-cash return indicates strong cash flow"},
+    ],
+}
+
+# Columns rules can read: every FinancialMetrics field plus these
+DEAL_FIELDS = ("numberOfUnits", "vacancyRate", "noiPerUnitMonthly")
+
+RECOMMENDATION_EXPLANATIONS = {
+    "STRONG BUY": "This deal shows exceptional returns across all key metrics. The combination of strong cash flow, solid debt coverage, and attractive cap rate makes this a premium investment opportunity.",
+    "BUY": "This is a solid investment opportunity with good returns and manageable risk. The metrics indicate this property should perform well in the current market.",
+    "HOLD/CONSIDER": "This deal has mixed results. While some metrics are acceptable, consider negotiating better terms or look for ways to improve performance before proceeding.",
+}
+DEFAULT_EXPLANATION = "This deal does not meet standard investment criteria. The returns are below market expectations and/or the risk profile is too high for most investors."
+
+
+class DealGrades(NamedTuple):
+    # Letter grade per deal for each metric in the rules
+    metrics: Dict[str, np.ndarray]
+    score: np.ndarray
+    overall: np.ndarray
+    recommendation: np.ndarray
+    # (deals, rules) masks of the red-flag and strength rules that apply
+    red_flags: np.ndarray
+    strengths: np.ndarray
+
+
+class _Rule(NamedTuple):
+    field: str
+    below: Optional[float]
+    above: Optional[float]
+
+
+def _thresholds(values: Sequence[float], grades: int, name: str) -> np.ndarray:
+    thresholds = np.asarray(values, dtype=float)
+    if thresholds.shape != (grades - 1,) or np.any(np.diff(thresholds) < 0):
+        raise ValueError(f"{name} needs {grades - 1} ascending thresholds")
+    return thresholds
+
+
+def _compile_rules(entries: List[Dict[str, Any]], fields: set, kind: str) -> List[_Rule]:
+    rules = []
+    for entry in entries:
+        if entry.get("field") not in fields:
+            raise ValueError(f"{kind} rule reads unknown field {entry.get('field')!r}")
+        if ("below" in entry) == ("above" in entry):
+            raise ValueError(f"{kind} rule on {entry['field']} needs exactly one of below or above")
+        rules.append(_Rule(entry["field"], entry.get("below"), entry.get("above")))
+    return rules
+
+
+class GradingRules:
+    """A compiled rule set; build with compile_grading_rules"""
+
+    def __init__(self, source: Dict[str, Any]):
+        self.source = source
+        self.fingerprint = hashlib.sha256(json.dumps(source, sort_keys=True).encode()).hexdigest()[:16]
+        self.grades = np.array(source["grades"], dtype=str)
+        self.grade_points = np.asarray(source["gradePoints"], dtype=float)
+        if len(self.grade_points) != len(self.grades):
+            raise ValueError("gradePoints needs one value per grade")
+
+        fields = set(FinancialMetrics.model_fields) | set(DEAL_FIELDS)
+        self.fields = {}
+        self.thresholds = {}  # property type ("" for the defaults) -> metric -> thresholds
+        defaults = {}
+        for metric, spec in source["metrics"].items():
+            if spec["field"] not in fields:
+                raise ValueError(f"Metric {metric} reads unknown field {spec['field']!r}")
+            self.fields[metric] = spec["field"]
+            defaults[metric] = _thresholds(spec["thresholds"], len(self.grades), metric)
+        self.thresholds[""] = defaults
+        for property_type, overrides in source["propertyTypes"].items():
+            unknown = set(overrides) - set(defaults)
+            if unknown:
+                raise ValueError(f"Unknown metrics for {property_type}: {', '.join(sorted(unknown))}")
+            self.thresholds[property_type] = {
+                metric: _thresholds(values, len(self.grades), f"{property_type} {metric}")
+                for metric, values in overrides.items()
+            }
+
+        self.weights = source["weights"]
+        unknown = set(self.weights) - set(defaults)
+        if unknown:
+            raise ValueError(f"Weights for unknown metrics: {', '.join(sorted(unknown))}")
+        overall = source["overall"]
+        self.overall_grades = np.array(overall["grades"], dtype=str)
+        self.overall_thresholds = _thresholds(overall["thresholds"], len(self.overall_grades), "overall")
+        self.recommendations = np.array(overall["recommendations"], dtype=str)
+        if len(self.recommendations) != len(self.overall_grades):
+            raise ValueError("overall needs one recommendation per grade")
+
+        self.red_flag_rules = _compile_rules(source["redFlags"], fields, "Red-flag")
+        self.red_flag_text = [(entry["redFlag"], entry.get("recommendation")) for entry in source["redFlags"]]
+        self.strength_rules = _compile_rules(source["strengths"], fields, "Strength")
+        self.strength_text = [entry["summary"] for entry in source["strengths"]]
+
+    def grade_indices(self, metric: str, values: np.ndarray, property_types: Optional[np.ndarray] = None) -> np.ndarray:
+        """Index into grades of each value of a metric"""
+        # NaN grades lowest, as it fails every comparison
+        values = np.where(np.isnan(values), -np.inf, values)
+        indices = np.searchsorted(self.thresholds[""][metric], values, side="right")
+        if property_types is not None:
+            for property_type, overrides in self.thresholds.items():
+                if property_type and metric in overrides:
+                    mask = property_types == property_type
+                    if mask.any():
+                        indices[mask] = np.searchsorted(overrides[metric], values[mask], side="right")
+        return indices
+
+    def rule_masks(self, rules: List[_Rule], columns: Dict[str, np.ndarray], count: int) -> np.ndarray:
+        masks = np.zeros((count, len(rules)), dtype=bool)
+        for i, rule in enumerate(rules):
+            values = columns[rule.field]
+            masks[:, i] = values < rule.below if rule.below is not None else values > rule.above
+        return masks
+
+
+def compile_grading_rules(overrides: Optional[Dict[str, Any]] = None) -> GradingRules:
+    """Compile DEFAULT_GRADING_RULES with top-level keys replaced from overrides; raises ValueError if invalid"""
+    source = copy.deepcopy(DEFAULT_GRADING_RULES)
+    if overrides:
+        unknown = set(overrides) - set(source)
+        if unknown:
+            raise ValueError(f"Unknown grading rule keys: {', '.join(sorted(unknown))}")
+        source.update(copy.deepcopy(overrides))
+    try:
+        return GradingRules(source)
+    except (KeyError, TypeError) as e:
+        raise ValueError(f"Invalid grading rules: {e!r}")
+
+
+_default_rules = compile_grading_rules()
+_rules = _default_rules
+_rules_source = None  # (path, mtime) of the rules file _rules was loaded from
+_rules_lock = threading.Lock()
+
+
+def grading_rules() -> GradingRules:
+    """The current rules, reloading GRADING_RULES_FILE if it changed since it was last read"""
+    global _rules, _rules_source
+    path = settings.GRADING_RULES_FILE
+    try:
+        source = (path, os.stat(path).st_mtime_ns) if path else None
+    except OSError:
+        source = (path, None)
+    if source == _rules_source:
+        return _rules
+    with _rules_lock:
+        if source != _rules_source:
+            if source is None:
+                _rules = _default_rules
+            else:
+                try:
+                    with open(path) as f:
+                        _rules = compile_grading_rules(json.load(f))
+                except (OSError, ValueError) as e:
+                    # Keep grading with the last good rules until the file is fixed
+                    logger.warning("Grading rules in %s not loaded: %s", path, e)
+            _rules_source = source
+        return _rules
+
+
+def grade_deals(
+    columns: Dict[str, np.ndarray],
+    property_types: Optional[Sequence[str]] = None,
+    rules: Optional[GradingRules] = None,
+) -> DealGrades:
+    """
+    Grade a column set of deals.
+
+    columns holds one array per FinancialMetrics field plus numberOfUnits and
+    vacancyRate; property_types, if given, selects per-type thresholds.
+    """
+    rules = rules or grading_rules()
+    count = len(columns["noi"])
+    columns = dict(columns)
+    units = np.asarray(columns["numberOfUnits"], dtype=float)
+    columns["noiPerUnitMonthly"] = np.where(
+        units > 0, columns["noi"] / np.where(units > 0, units, 1.0) / 12, 0.0
+    )
+    types = np.asarray(property_types, dtype=object) if property_types is not None else None
+
+    indices = {
+        metric: rules.grade_indices(metric, np.asarray(columns[field], dtype=float), types)
+        for metric, field in rules.fields.items()
+    }
+    score = np.zeros(count)
+    for metric, weight in rules.weights.items():
+        score = score + rules.grade_points[indices[metric]] * weight
+    overall = np.searchsorted(rules.overall_thresholds, score, side="right")
+
+    return DealGrades(
+        metrics={metric: rules.grades[index] for metric, index in indices.items()},
+        score=score,
+        overall=rules.overall_grades[overall],
+        recommendation=rules.recommendations[overall],
+        red_flags=rules.rule_masks(rules.red_flag_rules, columns, count),
+        strengths=rules.rule_masks(rules.strength_rules, columns, count),
+    )
+
+
+def grade_metric(metric_type: str, value: float, num_units: int = 1) -> str:
+    """Grade financial metrics with letter grades"""
+    rules = grading_rules()
+    if metric_type not in rules.fields:
+        return "C"
+    if metric_type == "noi_per_unit":
+        value = (value / num_units) / 12 if num_units > 0 else 0
+    return str(rules.grades[rules.grade_indices(metric_type, np.array([float(value)]))[0]])
+
+
+def generate_ai_analysis(
+    deal_input: DealInput, metrics: FinancialMetrics, rules: Optional[GradingRules] = None
+) -> AIAnalysis:
+    """Generate AI-like analysis with grading"""
+    rules = rules or grading_rules()
+    columns = {field: np.array([float(value)]) for field, value in metrics.model_dump().items()}
+    columns["numberOfUnits"] = np.array([float(deal_input.numberOfUnits)])
+    columns["vacancyRate"] = np.array([float(deal_input.vacancyRate)])
+    grades = grade_deals(columns, [deal_input.propertyType], rules)
+
+    red_flags = []
+    recommendations = []
+    for (red_flag, recommendation), applies in zip(rules.red_flag_text, grades.red_flags[0]):
+        if applies:
+            red_flags.append(red_flag)
+            if recommendation:
+                recommendations.append(recommendation)
+    summary_parts = [text for text, applies in zip(rules.strength_text, grades.strengths[0]) if applies]
+    if not summary_parts:
+        summary_parts.append("This deal shows moderate returns with standard risk profile")
+
+    grade = {metric: letters[0] for metric, letters in grades.metrics.items()}
+    grades_summary = f"Metric Grades: Cap Rate {grade.get('cap_rate')} ({metrics.goingInCapRate:.1f}%), Cash-on-Cash {grade.get('cash_on_cash')} ({metrics.cashOnCashReturn:.1f}%), DSCR {grade.get('dscr')} ({metrics.dscr:.2f}x), IRR {grade.get('irr')} ({metrics.irr:.1f}%), Equity Multiple {grade.get('equity_multiple')} ({metrics.equityMultiple:.1f}x), NOI/Unit {grade.get('noi_per_unit')}"
+
+    overall_grade = grades.overall[0]
+    investment_recommendation = grades.recommendation[0]
+    investment_explanation = RECOMMENDATION_EXPLANATIONS.get(investment_recommendation, DEFAULT_EXPLANATION)
+
+    summary = f"OVERALL GRADE: {overall_grade} - {investment_recommendation}. {investment_explanation} Analysis: {grades_summary}. {'. '.join(summary_parts)}."
+
+    return AIAnalysis(
+        summary=summary,
+        redFlags=red_flags,
+        recommendations=recommendations
+    )
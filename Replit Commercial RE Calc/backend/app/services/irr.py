@@ -0,0 +1,190 @@
+"""
+Batched IRR and XIRR.
+
+Solves a whole matrix of cash flows at once, one row per scenario, with a
+vectorized safeguarded Newton iteration. Rows Newton cannot settle fall back
+to bisection on a bracketing interval. Every row reports whether it converged,
+and rows whose flows never change sign are flagged instead of iterated.
+"""
+
+from typing import NamedTuple, Optional
+
+import numpy as np
+
+# Row status codes
+CONVERGED = 0
+NO_SIGN_CHANGE = 1
+NOT_CONVERGED = 2
+
+NEWTON_MAX_ITERATIONS = 30
+BISECTION_MAX_ITERATIONS = 200
+RATE_TOLERANCE = 1e-10
+
+# Rates per period must stay above -100%
+MIN_RATE = -0.999999
+
+# Candidate rates used to find a bracket for bisection
+BRACKET_LADDER = np.array([MIN_RATE, -0.9, -0.5, -0.2, -0.05, 0.0, 0.02, 0.05, 0.1, 0.2, 0.5, 1.0, 2.0, 5.0, 10.0, 100.0])
+
+# Rows solved together; bounds the (rows x periods) temporaries
+ROW_BLOCK = 65_536
+
+
+class IRRResult(NamedTuple):
+    rate: np.ndarray       # per-period rate, NaN where not converged
+    converged: np.ndarray  # bool per row
+    status: np.ndarray     # CONVERGED, NO_SIGN_CHANGE or NOT_CONVERGED per row
+
+
+def _npv(cash_flows: np.ndarray, times: np.ndarray, rate: np.ndarray) -> np.ndarray:
+    """NPV of each row at its own rate"""
+    return (cash_flows * np.exp(-np.log1p(rate)[:, None] * times)).sum(axis=1)
+
+
+def _npv_and_slope(cash_flows: np.ndarray, times: np.ndarray, rate: np.ndarray):
+    """NPV of each row and its derivative with respect to the rate"""
+    discounted = cash_flows * np.exp(-np.log1p(rate)[:, None] * times)
+    npv = discounted.sum(axis=1)
+    slope = -(discounted * times).sum(axis=1) / (1 + rate)
+    return npv, slope
+
+
+def _horner_npv_and_slope(columns: np.ndarray, rate: np.ndarray):
+    """
+    _npv_and_slope for flows at periods 0, 1, 2, ..., given as (periods x rows).
+
+    Evaluates the NPV as a polynomial in 1 / (1 + rate) by Horner's rule: a
+    multiply and an add per cash flow instead of an exp.
+    """
+    discount = 1 / (1 + rate)
+    npv = columns[-1].copy()
+    derivative = np.zeros_like(npv)
+    for flows in columns[-2::-1]:
+        derivative *= discount
+        derivative += npv
+        npv *= discount
+        npv += flows
+    return npv, -derivative * discount * discount
+
+
+def _solve_block(cash_flows: np.ndarray, times: np.ndarray, guess: np.ndarray) -> IRRResult:
+    n = cash_flows.shape[0]
+    # Flows one period apart are solved with Horner's rule, a period's flows contiguous
+    regular = times.ndim == 1 and np.array_equal(times, np.arange(times.shape[0]))
+    columns = np.ascontiguousarray(cash_flows.T) if regular else None
+    rate = np.full(n, np.nan)
+    status = np.full(n, NOT_CONVERGED, dtype=np.int8)
+
+    has_sign_change = (cash_flows.min(axis=1) < 0) & (cash_flows.max(axis=1) > 0)
+    status[~has_sign_change] = NO_SIGN_CHANGE
+
+    # Row-relative tolerance on the NPV itself
+    scale = np.abs(cash_flows).sum(axis=1)
+
+    # Safeguarded Newton: steps may not cross -100%, and rows that blow up stop
+    current = np.clip(np.where(np.isfinite(guess), guess, 0.1), MIN_RATE, None)
+    active = np.flatnonzero(has_sign_change)
+    with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+        for _ in range(NEWTON_MAX_ITERATIONS):
+            if active.size == 0:
+                break
+            r = current[active]
+            if regular:
+                npv, slope = _horner_npv_and_slope(columns if active.size == n else columns[:, active], r)
+            else:
+                row_times = times if times.ndim == 1 else times[active]
+                npv, slope = _npv_and_slope(cash_flows[active], row_times, r)
+
+            step = npv / slope
+            proposed = r - step
+            # Halve the distance to the floor instead of jumping past it
+            proposed = np.where(proposed <= MIN_RATE, (r + MIN_RATE) / 2, proposed)
+
+            done = (np.abs(proposed - r) <= RATE_TOLERANCE * (1 + np.abs(r))) | (np.abs(npv) <= 1e-12 * scale[active])
+            failed = ~np.isfinite(proposed)
+
+            current[active] = proposed
+            solved = active[done & ~failed]
+            rate[solved] = current[solved]
+            status[solved] = CONVERGED
+            active = active[~done & ~failed]
+
+        # Bisection for whatever Newton left behind
+        leftover = np.flatnonzero(has_sign_change & (status != CONVERGED))
+        if leftover.size:
+            rate[leftover], converged = _bisect(
+                cash_flows[leftover], times if times.ndim == 1 else times[leftover]
+            )
+            status[leftover[converged]] = CONVERGED
+
+    rate[status != CONVERGED] = np.nan
+    return IRRResult(rate, status == CONVERGED, status)
+
+
+def _bisect(cash_flows: np.ndarray, times: np.ndarray):
+    """Bisection on the lowest bracketing interval of BRACKET_LADDER"""
+    n = cash_flows.shape[0]
+    ladder_npv = np.stack(
+        [_npv(cash_flows, times, np.full(n, r)) for r in BRACKET_LADDER], axis=1
+    )
+    # Near -100% discounting overflows; an NPV that is not finite brackets nothing
+    finite = np.isfinite(ladder_npv)
+    sign_change = (np.signbit(ladder_npv[:, :-1]) != np.signbit(ladder_npv[:, 1:])) & finite[:, :-1] & finite[:, 1:]
+    bracketed = sign_change.any(axis=1)
+    first = np.argmax(sign_change, axis=1)
+
+    lo = BRACKET_LADDER[first]
+    hi = BRACKET_LADDER[first + 1]
+    npv_lo = ladder_npv[np.arange(n), first]
+
+    for _ in range(BISECTION_MAX_ITERATIONS):
+        mid = (lo + hi) / 2
+        npv_mid = _npv(cash_flows, times, mid)
+        same_side = np.signbit(npv_mid) == np.signbit(npv_lo)
+        lo = np.where(same_side, mid, lo)
+        npv_lo = np.where(same_side, npv_mid, npv_lo)
+        hi = np.where(same_side, hi, mid)
+        if np.all(hi - lo <= RATE_TOLERANCE * (1 + np.abs(lo))):
+            break
+
+    converged = bracketed & (hi - lo <= RATE_TOLERANCE * (1 + np.abs(lo)))
+    return np.where(converged, (lo + hi) / 2, np.nan), converged
+
+
+def irr(cash_flows, guess=0.1, times: Optional[np.ndarray] = None) -> IRRResult:
+    """
+    Per-period IRR of each row of a (rows x periods) cash-flow matrix.
+
+    Column j is received at period j unless `times` gives the period of each
+    column (shared by all rows) or of each cell (same shape as cash_flows).
+    `guess` is a scalar or one starting rate per row.
+    """
+    cash_flows = np.atleast_2d(np.asarray(cash_flows, dtype=float))
+    n, periods = cash_flows.shape
+    times = np.arange(periods, dtype=float) if times is None else np.asarray(times, dtype=float)
+    guess = np.broadcast_to(np.asarray(guess, dtype=float), (n,))
+
+    rate = np.empty(n)
+    converged = np.empty(n, dtype=bool)
+    status = np.empty(n, dtype=np.int8)
+    for start in range(0, n, ROW_BLOCK):
+        block = slice(start, start + ROW_BLOCK)
+        block_times = times if times.ndim == 1 else times[block]
+        result = _solve_block(cash_flows[block], block_times, guess[block].copy())
+        rate[block], converged[block], status[block] = result
+
+    return IRRResult(rate, converged, status)
+
+
+def xirr(cash_flows, dates, guess=0.1) -> IRRResult:
+    """
+    Annual IRR of irregularly dated cash flows, Excel XIRR style.
+
+    dates are datetime64 values (or anything np.datetime64 accepts), either
+    one per column or one per cell; time is measured in 365-day years from
+    each row's first date.
+    """
+    cash_flows = np.atleast_2d(np.asarray(cash_flows, dtype=float))
+    days = np.asarray(dates, dtype="datetime64[D]").astype(np.int64)
+    origin = days[..., :1]
+    return irr(cash_flows, guess=guess, times=(days - origin) / 365.0)
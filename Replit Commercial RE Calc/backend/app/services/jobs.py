@@ -0,0 +1,472 @@
+"""
+Background jobs, queued in the database and run by in-process workers.
+
+Slow work (parsing large uploads, model commentary) can be submitted as a job
+instead of running inside the request: submit_job stores a row in jobs and
+returns at once, and the client polls the job's status and progress until it
+finishes, then fetches its result. There is no broker; the jobs table is the
+queue, so jobs outlive the process that accepted them.
+
+Every API process runs a JobRunner with a fixed number of workers per job
+type (JOB_WORKERS), so one kind of job cannot starve the others; the work
+itself runs where it always has, in the upload parsers' process pools or the
+thread pool, or on the event loop for model calls. Workers claim a job with
+a conditional UPDATE, so processes sharing the table never take the same job
+twice, and hold a lease on it that they renew every JOB_HEARTBEAT_INTERVAL,
+writing the job's latest progress and checking for cancellation at the same
+time. A job whose lease lapses because its process died is claimed again by
+the next free worker, up to JOB_MAX_ATTEMPTS runs; a runner shutting down
+cleanly puts its running jobs straight back in the queue. Finished jobs are
+deleted, result and all, JOB_RESULT_TTL seconds after they finish.
+
+A streamed rent roll's result is already a file in the upload cache, too
+large to hold in memory, so the job keeps a reference to that entry
+(result_entry) rather than a copy, and its result is streamed from the cache
+when fetched. Should the cache evict the entry first, the result is gone and
+the file has to be uploaded again.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import shutil
+import socket
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Dict, List, NamedTuple, Optional, Union
+
+from fastapi import UploadFile
+from sqlalchemy import and_, delete, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
+
+from app.core.config import settings
+from app.core.database import get_async_session_factory
+from app.core.metrics import register_collector
+from app.models.job import Job
+from app.schemas.deal import DealInput, FinancialMetrics
+from app.schemas.job import JobStatus
+from app.services.ai_analysis import AIAnalyzer
+from app.services.file_parser import FileParser
+from app.services.upload_cache import CachedJSON, JSONStream, upload_cache
+
+logger = logging.getLogger(__name__)
+
+FINISHED = ("succeeded", "failed", "cancelled")
+
+# Seconds between sweeps for expired jobs
+SWEEP_INTERVAL = 60.0
+
+# Uploads waiting for their job, deleted once it finishes
+JOB_UPLOAD_DIR = os.path.join(settings.UPLOAD_DIR, "jobs")
+
+# Bytes copied per read when an upload is stored for its job
+UPLOAD_COPY_CHUNK = 1024 * 1024
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+class JobProgress:
+    """Progress reported by a running job; written to the job at its next heartbeat"""
+
+    def __init__(self, fraction: float = 0.0, message: Optional[str] = None):
+        self.fraction = fraction
+        self.message = message
+
+    def report(self, fraction: float, message: Optional[str] = None) -> None:
+        # Called from worker threads too; two attribute writes need no lock
+        self.fraction = min(max(float(fraction), 0.0), 1.0)
+        if message is not None:
+            self.message = message[:255]
+
+
+class CachedResult(NamedTuple):
+    # The upload cache entry holding the parsed fields of a FileUploadResponse
+    digest: str
+    kind: str
+    variant: str
+    version: int
+    # The rest of the FileUploadResponse
+    message: str
+    cached: bool
+
+
+class JobType(NamedTuple):
+    # Does the work: given the job's payload and its progress, returns the result, either
+    # JSON-serializable, already JSON text or a CachedResult
+    run: Callable[[Dict[str, Any], JobProgress], Awaitable[Any]]
+    # Removes whatever the payload refers to outside the jobs table, once the job is finished
+    cleanup: Optional[Callable[[Dict[str, Any]], None]] = None
+
+
+def _remove_upload(payload: Dict[str, Any]) -> None:
+    try:
+        os.remove(payload["path"])
+    except FileNotFoundError:
+        pass
+
+
+def _upload_result(result, message: str) -> Union[str, CachedResult]:
+    # The body the synchronous upload endpoints return (FileUploadResponse)
+    if isinstance(result, JSONStream):
+        if result.entry is not None:
+            result.close()
+            return CachedResult(*result.entry, message, result.cached)
+        # Not in the cache (disabled, or the result outgrew it); the jobs table holds it instead
+        cached, fields = result.cached, json.loads(b"".join(result))
+    else:
+        cached = isinstance(result, CachedJSON)
+        fields = json.loads(result) if cached else result
+    return json.dumps({"success": True, "message": message, "error": None, "cached": cached, **fields})
+
+
+async def _parse_rent_roll(payload: Dict[str, Any], progress: JobProgress) -> Union[str, CachedResult]:
+    with open(payload["path"], "rb") as handle:
+        upload = UploadFile(handle, filename=payload["filename"])
+        result = await FileParser().parse_rent_roll(upload, stream=payload["stream"], progress=progress.report)
+        return await run_in_threadpool(_upload_result, result, "Rent roll parsed successfully")
+
+
+async def _parse_t12(payload: Dict[str, Any], progress: JobProgress) -> str:
+    with open(payload["path"], "rb") as handle:
+        upload = UploadFile(handle, filename=payload["filename"])
+        result = await FileParser().parse_t12(upload, progress=progress.report)
+    return _upload_result(result, "T12 statement parsed successfully")
+
+
+async def _analyze_deal(payload: Dict[str, Any], progress: JobProgress) -> Dict[str, Any]:
+    analysis = await AIAnalyzer().analyze_deal(
+        DealInput.model_validate(payload["dealInput"]),
+        FinancialMetrics.model_validate(payload["financialMetrics"]),
+    )
+    return analysis.model_dump()
+
+
+JOB_TYPES: Dict[str, JobType] = {
+    "rent_roll": JobType(_parse_rent_roll, _remove_upload),
+    "t12": JobType(_parse_t12, _remove_upload),
+    "ai_analysis": JobType(_analyze_deal),
+}
+
+
+def job_status(job: Job) -> JobStatus:
+    return JobStatus(
+        jobId=job.id,
+        type=job.kind,
+        status=job.status,
+        progress=job.progress,
+        message=job.message,
+        error=job.error,
+        attempts=job.attempts,
+        createdAt=job.created_at,
+        startedAt=job.started_at,
+        finishedAt=job.finished_at,
+        expiresAt=job.expires_at,
+    )
+
+
+async def submit_job(db: AsyncSession, kind: str, payload: Dict[str, Any], job_id: Optional[str] = None) -> Job:
+    """Queue a job of a type in JOB_TYPES and commit; a runner in this process starts it straight away"""
+    if kind not in JOB_TYPES:
+        raise ValueError(f"Unknown job type '{kind}'")
+    job = Job(
+        id=job_id or uuid.uuid4().hex,
+        kind=kind,
+        status="queued",
+        payload=payload,
+        progress=0.0,
+        cancel_requested=False,
+        attempts=0,
+        created_at=_now(),
+    )
+    db.add(job)
+    await db.commit()
+    if _runner is not None:
+        _runner.wake(kind)
+    return job
+
+
+def _store_upload(source, path: str) -> None:
+    source.seek(0)
+    with open(path, "wb") as target:
+        shutil.copyfileobj(source, target, UPLOAD_COPY_CHUNK)
+
+
+async def submit_upload_job(db: AsyncSession, kind: str, file: UploadFile, **options) -> Job:
+    """Queue parsing of an upload; the file is kept under JOB_UPLOAD_DIR until the job finishes"""
+    job_id = uuid.uuid4().hex
+    os.makedirs(JOB_UPLOAD_DIR, exist_ok=True)
+    path = os.path.join(JOB_UPLOAD_DIR, job_id + os.path.splitext(file.filename or "")[1].lower())
+    await run_in_threadpool(_store_upload, file.file, path)
+    try:
+        return await submit_job(db, kind, {"path": path, "filename": file.filename, **options}, job_id)
+    except Exception:
+        os.remove(path)
+        raise
+
+
+def cached_result(job: Job) -> Optional[JSONStream]:
+    """The fields of a job's result_entry read from the upload cache, or None if it has been evicted"""
+    entry = job.result_entry
+    stream = upload_cache.get_stream(entry["digest"], entry["kind"], entry["variant"], entry["version"])
+    return None if stream is None else JSONStream(stream, cached=entry["cached"], handle=stream.handle)
+
+
+async def get_job(db: AsyncSession, job_id: str) -> Optional[Job]:
+    """The job, or None if there is none or it has expired"""
+    job = await db.get(Job, job_id, populate_existing=True)
+    if job is None or (job.expires_at is not None and job.expires_at <= _now()):
+        return None
+    return job
+
+
+async def cancel_job(db: AsyncSession, job_id: str) -> Optional[Job]:
+    """
+    Cancel a job. A queued job is cancelled at once; a running one is stopped
+    by its worker at the next heartbeat. Finished jobs are left as they are.
+    """
+    now = _now()
+    cancelled = await db.execute(
+        update(Job)
+        .where(Job.id == job_id, Job.status == "queued")
+        .values(
+            status="cancelled", cancel_requested=True, finished_at=now,
+            expires_at=now + timedelta(seconds=settings.JOB_RESULT_TTL),
+        )
+    )
+    if not cancelled.rowcount:
+        await db.execute(update(Job).where(Job.id == job_id, Job.status == "running").values(cancel_requested=True))
+    await db.commit()
+    job = await get_job(db, job_id)
+    if job is not None and cancelled.rowcount:
+        _cleanup(job.kind, job.payload)
+    return job
+
+
+def _cleanup(kind: str, payload: Dict[str, Any]) -> None:
+    cleanup = JOB_TYPES[kind].cleanup
+    if cleanup is not None:
+        try:
+            cleanup(payload)
+        except Exception:
+            logger.exception("Cleaning up after a %s job failed", kind)
+
+
+def _claimable(kind: str, now: datetime):
+    return and_(
+        Job.kind == kind,
+        or_(Job.status == "queued", and_(Job.status == "running", Job.lease_expires_at < now)),
+    )
+
+
+class JobRunner:
+    """The job workers of one process"""
+
+    def __init__(self, workers: Dict[str, int]):
+        unknown = set(workers) - set(JOB_TYPES)
+        if unknown:
+            raise ValueError(f"Unknown job types in JOB_WORKERS: {', '.join(sorted(unknown))}")
+        self.workers = workers
+        # Identifies this runner's leases
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._wakeups = {kind: asyncio.Event() for kind in workers}
+        # Jobs being run, by type
+        self.running = {kind: 0 for kind in workers}
+        self._tasks: List[asyncio.Task] = []
+
+    def start(self) -> None:
+        for kind, count in self.workers.items():
+            for _ in range(count):
+                self._tasks.append(asyncio.create_task(self._work(kind)))
+        self._tasks.append(asyncio.create_task(self._sweep()))
+
+    async def stop(self) -> None:
+        """Stop the workers, putting the jobs they were running back in the queue"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def wake(self, kind: str) -> None:
+        if kind in self._wakeups:
+            self._wakeups[kind].set()
+
+    async def _work(self, kind: str) -> None:
+        wakeup = self._wakeups[kind]
+        while True:
+            try:
+                wakeup.clear()
+                job = await self._claim(kind)
+                if job is not None:
+                    self.running[kind] += 1
+                    try:
+                        await self._run(job)
+                    finally:
+                        self.running[kind] -= 1
+                    continue
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                # Usually the database being unreachable; keep polling
+                logger.exception("Job worker for %s failed", kind)
+            # Not asyncio.wait_for: it swallows a cancellation that arrives as the wakeup does, and
+            # the runner would never stop
+            woken = asyncio.ensure_future(wakeup.wait())
+            try:
+                await asyncio.wait((woken,), timeout=settings.JOB_POLL_INTERVAL)
+            finally:
+                woken.cancel()
+
+    async def _claim(self, kind: str) -> Optional[Job]:
+        async with get_async_session_factory()() as db:
+            while True:
+                now = _now()
+                job_id = await db.scalar(
+                    select(Job.id).where(_claimable(kind, now)).order_by(Job.created_at).limit(1)
+                )
+                if job_id is None:
+                    return None
+                # Another worker may have claimed it since; the condition is checked again as it is taken
+                claimed = await db.execute(
+                    update(Job)
+                    .where(Job.id == job_id, _claimable(kind, now))
+                    .values(
+                        status="running",
+                        owner=self.owner,
+                        attempts=Job.attempts + 1,
+                        started_at=now,
+                        lease_expires_at=now + timedelta(seconds=settings.JOB_LEASE_TIMEOUT),
+                    )
+                )
+                await db.commit()
+                if claimed.rowcount:
+                    return await db.get(Job, job_id, populate_existing=True)
+
+    async def _update(self, job_id: str, **values) -> bool:
+        """Update a job this runner holds the lease on; False if it no longer does"""
+        async with get_async_session_factory()() as db:
+            result = await db.execute(
+                update(Job).where(Job.id == job_id, Job.owner == self.owner, Job.status == "running").values(**values)
+            )
+            await db.commit()
+            return bool(result.rowcount)
+
+    async def _heartbeat(self, job: Job, progress: JobProgress) -> Optional[str]:
+        """Renew the lease and write progress; returns why the job must stop, if it must"""
+        async with get_async_session_factory()() as db:
+            result = await db.execute(
+                update(Job)
+                .where(Job.id == job.id, Job.owner == self.owner, Job.status == "running")
+                .values(
+                    progress=progress.fraction,
+                    message=progress.message,
+                    lease_expires_at=_now() + timedelta(seconds=settings.JOB_LEASE_TIMEOUT),
+                )
+                .returning(Job.cancel_requested)
+            )
+            cancel_requested = result.scalar()
+            await db.commit()
+        if cancel_requested is None:
+            return "lost"
+        return "cancelled" if cancel_requested else None
+
+    async def _finish(self, job: Job, status: str, **values) -> None:
+        now = _now()
+        finished = await self._update(
+            job.id,
+            status=status,
+            owner=None,
+            lease_expires_at=None,
+            finished_at=now,
+            expires_at=now + timedelta(seconds=settings.JOB_RESULT_TTL),
+            **values,
+        )
+        if finished:
+            _cleanup(job.kind, job.payload)
+
+    async def _run(self, job: Job) -> None:
+        if job.attempts > settings.JOB_MAX_ATTEMPTS:
+            await self._finish(
+                job, "failed", error=f"Gave up after {settings.JOB_MAX_ATTEMPTS} attempts; its worker was lost each time"
+            )
+            return
+        if job.cancel_requested:
+            await self._finish(job, "cancelled")
+            return
+
+        progress = JobProgress(job.progress, job.message)
+        work = asyncio.create_task(JOB_TYPES[job.kind].run(job.payload, progress))
+        try:
+            while True:
+                done, _ = await asyncio.wait((work,), timeout=settings.JOB_HEARTBEAT_INTERVAL)
+                if done:
+                    break
+                stop = await self._heartbeat(job, progress)
+                if stop is not None:
+                    work.cancel()
+                    await asyncio.gather(work, return_exceptions=True)
+                    if stop == "cancelled":
+                        await self._finish(job, "cancelled", progress=progress.fraction, message=progress.message)
+                    # A lost lease means another worker has the job now; leave it to them
+                    return
+        except asyncio.CancelledError:
+            # The runner is stopping: stop the work and hand the job back without using up an attempt
+            work.cancel()
+            await asyncio.gather(work, return_exceptions=True)
+            await asyncio.shield(self._update(
+                job.id, status="queued", owner=None, lease_expires_at=None, attempts=job.attempts - 1,
+            ))
+            raise
+
+        error = work.exception()
+        if error is None:
+            result = work.result()
+            if isinstance(result, CachedResult):
+                stored = {"result_entry": result._asdict()}
+            else:
+                stored = {"result": result if isinstance(result, str) else json.dumps(result)}
+            await self._finish(job, "succeeded", progress=1.0, message=progress.message, **stored)
+        else:
+            # Bad input and timeouts are the job's outcome; anything else is worth a traceback
+            if not isinstance(error, (ValueError, TimeoutError)):
+                logger.error("%s job %s failed", job.kind, job.id, exc_info=error)
+            await self._finish(
+                job, "failed", error=str(error) or type(error).__name__,
+                progress=progress.fraction, message=progress.message,
+            )
+
+    async def _sweep(self) -> None:
+        while True:
+            try:
+                async with get_async_session_factory()() as db:
+                    await db.execute(delete(Job).where(Job.expires_at <= _now()))
+                    await db.commit()
+            except Exception:
+                logger.exception("Sweeping expired jobs failed")
+            await asyncio.sleep(SWEEP_INTERVAL)
+
+
+_runner: Optional[JobRunner] = None
+
+register_collector(
+    "jobs_running", "Background jobs this process's workers are running, by type", "gauge",
+    lambda: [("", {"type": kind}, count) for kind, count in (_runner.running.items() if _runner else ())],
+)
+
+
+async def start_job_runner() -> None:
+    """Start this process's job workers (an application startup handler)"""
+    global _runner
+    if _runner is None:
+        _runner = JobRunner(settings.JOB_WORKERS)
+        _runner.start()
+
+
+async def stop_job_runner() -> None:
+    global _runner
+    if _runner is not None:
+        runner, _runner = _runner, None
+        await runner.stop()
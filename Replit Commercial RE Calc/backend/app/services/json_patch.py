@@ -0,0 +1,136 @@
+"""
+JSON Patch (RFC 6902) applied to plain JSON-like documents.
+
+Supports add, remove, replace, move, copy and test. Paths are JSON Pointers
+(RFC 6901). Operations are applied in order to a copy of the containers they
+touch, so the original document is never modified; any failure raises
+ValueError and nothing is applied.
+"""
+
+import copy
+from typing import Any, Dict, List, Tuple
+
+
+def parse_pointer(pointer: str) -> List[str]:
+    """'/loanTerms/interestRate' -> ['loanTerms', 'interestRate']"""
+    if pointer == "":
+        return []
+    if not pointer.startswith("/"):
+        raise ValueError(f"Invalid JSON pointer: {pointer!r}")
+    return [token.replace("~1", "/").replace("~0", "~") for token in pointer[1:].split("/")]
+
+
+def _index(container: list, token: str, allow_end: bool = False) -> int:
+    if token == "-" and allow_end:
+        return len(container)
+    if not token.isdigit() or (len(token) > 1 and token.startswith("0")):
+        raise ValueError(f"Invalid array index: {token!r}")
+    index = int(token)
+    if index > len(container) or (index == len(container) and not allow_end):
+        raise ValueError(f"Array index out of range: {token}")
+    return index
+
+
+def _child(container: Any, token: str) -> Any:
+    if isinstance(container, dict):
+        if token not in container:
+            raise ValueError(f"Path segment not found: {token!r}")
+        return container[token]
+    if isinstance(container, list):
+        return container[_index(container, token)]
+    raise ValueError(f"Cannot descend into a scalar at {token!r}")
+
+
+def resolve(document: Any, pointer: str) -> Any:
+    """The value at pointer, or ValueError if it does not exist"""
+    value = document
+    for token in parse_pointer(pointer):
+        value = _child(value, token)
+    return value
+
+
+def _parent(document: Any, tokens: List[str]) -> Tuple[Any, Any]:
+    """
+    Copy the containers along tokens[:-1] and return (new document, parent).
+
+    Only the containers on the path are copied; siblings are shared with the
+    original document.
+    """
+    root = copy.copy(document)
+    parent = root
+    for token in tokens[:-1]:
+        child = copy.copy(_child(parent, token))
+        if isinstance(parent, dict):
+            parent[token] = child
+        else:
+            parent[_index(parent, token)] = child
+        parent = child
+    return root, parent
+
+
+def _add(document: Any, tokens: List[str], value: Any) -> Any:
+    if not tokens:
+        return value
+    root, parent = _parent(document, tokens)
+    if isinstance(parent, dict):
+        parent[tokens[-1]] = value
+    elif isinstance(parent, list):
+        parent.insert(_index(parent, tokens[-1], allow_end=True), value)
+    else:
+        raise ValueError(f"Cannot add to a scalar at {tokens[-1]!r}")
+    return root
+
+
+def _remove(document: Any, tokens: List[str]) -> Any:
+    if not tokens:
+        raise ValueError("Cannot remove the whole document")
+    root, parent = _parent(document, tokens)
+    _child(parent, tokens[-1])
+    if isinstance(parent, dict):
+        del parent[tokens[-1]]
+    else:
+        del parent[_index(parent, tokens[-1])]
+    return root
+
+
+def apply_patch(document: Any, operations: List[Dict[str, Any]]) -> Any:
+    """Apply RFC 6902 operations ({"op", "path", "value"/"from"}) in order and return the result"""
+    for operation in operations:
+        op = operation.get("op")
+        tokens = parse_pointer(operation.get("path", ""))
+
+        if op == "add":
+            document = _add(document, tokens, copy.deepcopy(operation.get("value")))
+        elif op == "remove":
+            document = _remove(document, tokens)
+        elif op == "replace":
+            document = _add(_remove(document, tokens), tokens, copy.deepcopy(operation.get("value"))) \
+                if tokens else copy.deepcopy(operation.get("value"))
+        elif op in ("move", "copy"):
+            source = operation.get("from")
+            if source is None:
+                raise ValueError(f"'{op}' needs a 'from' pointer")
+            value = resolve(document, source)
+            if op == "move":
+                if operation["path"].startswith(source + "/"):
+                    raise ValueError("Cannot move a value into one of its children")
+                document = _remove(document, parse_pointer(source))
+            document = _add(document, tokens, copy.deepcopy(value))
+        elif op == "test":
+            if resolve(document, operation.get("path", "")) != operation.get("value"):
+                raise ValueError(f"Test failed at {operation.get('path')!r}")
+        else:
+            raise ValueError(f"Unsupported patch operation: {op!r}")
+    return document
+
+
+def patched_paths(operations: List[Dict[str, Any]]) -> List[str]:
+    """Pointers a patch can change: every path, plus the source of each move"""
+    paths = []
+    for operation in operations:
+        if operation.get("op") == "test":
+            continue
+        paths.append(operation.get("path", ""))
+        if operation.get("op") == "move":
+            paths.append(operation.get("from", ""))
+    return paths
@@ -0,0 +1,151 @@
+"""
+Portfolio totals per user, maintained incrementally.
+
+portfolio_aggregates keeps one row of running sums per user. Each write that
+changes a deal's contribution adds the difference to its owner's row in the
+same transaction, with one upsert: creating, updating or deleting a deal, or
+storing its analysis. Reading a portfolio is then a primary-key lookup
+however many deals it holds, and ratios such as the weighted cap rate and
+DSCR are derived from the sums when read.
+
+Every deal contributes its count, units and purchase price. Its NOI, debt
+service and equity count only while its stored analysis was computed from
+its current input, so editing a deal drops those figures until the deal is
+analyzed again (GET /api/analysis/metrics/{deal_id}). rebuild_portfolios
+recomputes every row from deals and deal_analyses in one aggregate query, to
+repair drift or to fill the table for deals saved before it existed.
+"""
+
+from typing import Dict, Iterable, Optional, Tuple
+
+from sqlalchemy import and_, case, delete, func, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.database import upsert_insert
+from app.models.deal import Deal, DealAnalysis
+from app.models.portfolio import PortfolioAggregate
+from app.schemas.deal import PortfolioSummary
+
+# portfolio_aggregates.user_id of deals without an owner
+UNOWNED = 0
+
+# Running sums in portfolio_aggregates, in column order
+SUM_COLUMNS = (
+    "deal_count",
+    "unit_count",
+    "total_purchase_price",
+    "analyzed_deal_count",
+    "analyzed_purchase_price",
+    "total_noi",
+    "total_debt_service",
+    "total_equity",
+)
+
+# A change to one deal's contribution: owner, contribution before, contribution after (None for none)
+Change = Tuple[Optional[int], Optional[Dict[str, float]], Optional[Dict[str, float]]]
+
+
+def owner_key(user_id: Optional[int]) -> int:
+    return UNOWNED if user_id is None else user_id
+
+
+def analysis_rollup(deal: Deal, analysis: Optional[DealAnalysis]) -> Optional[Dict[str, float]]:
+    """The roll-up figures of a deal's stored analysis, or None if it does not count for the deal's current input"""
+    if (
+        analysis is None
+        or analysis.noi is None
+        or deal.input_hash is None
+        or analysis.input_hash != deal.input_hash
+    ):
+        return None
+    return {"noi": analysis.noi, "annual_debt_service": analysis.annual_debt_service, "equity": analysis.equity}
+
+
+def contribution(deal: Deal, rollup: Optional[Dict[str, float]] = None) -> Dict[str, float]:
+    """What a deal adds to each of its owner's sums, given the roll-up figures of its analysis if they count"""
+    purchase_price = deal.purchase_price or 0.0
+    analyzed = rollup is not None
+    return {
+        "deal_count": 1,
+        "unit_count": deal.number_of_units or 0,
+        "total_purchase_price": purchase_price,
+        "analyzed_deal_count": int(analyzed),
+        "analyzed_purchase_price": purchase_price if analyzed else 0.0,
+        "total_noi": rollup["noi"] if analyzed else 0.0,
+        "total_debt_service": rollup["annual_debt_service"] if analyzed else 0.0,
+        "total_equity": rollup["equity"] if analyzed else 0.0,
+    }
+
+
+async def apply_changes(db: AsyncSession, changes: Iterable[Change]) -> None:
+    """Add each change's difference to its owner's sums, in one statement within the session's transaction"""
+    deltas: Dict[int, Dict[str, float]] = {}
+    for user_id, before, after in changes:
+        delta = deltas.setdefault(owner_key(user_id), dict.fromkeys(SUM_COLUMNS, 0))
+        for column in SUM_COLUMNS:
+            delta[column] += (after or {}).get(column, 0) - (before or {}).get(column, 0)
+    rows = [{"user_id": user_id, **delta} for user_id, delta in deltas.items() if any(delta.values())]
+    if not rows:
+        return
+
+    dialect = (await db.connection()).dialect.name
+    statement = upsert_insert(dialect, PortfolioAggregate).values(rows)
+    await db.execute(statement.on_conflict_do_update(
+        index_elements=[PortfolioAggregate.user_id],
+        set_={
+            # Increment in SQL so concurrent writers to one portfolio do not overwrite each other
+            **{column: getattr(PortfolioAggregate, column) + statement.excluded[column] for column in SUM_COLUMNS},
+            "updated_at": func.now(),
+        },
+    ))
+
+
+def _ratio(numerator: float, denominator: float, scale: float = 1.0) -> Optional[float]:
+    return numerator / denominator * scale if denominator else None
+
+
+async def get_portfolio(db: AsyncSession, user_id: Optional[int] = None) -> PortfolioSummary:
+    """A user's portfolio totals, read from their aggregate row"""
+    row = await db.get(PortfolioAggregate, owner_key(user_id))
+    sums = {column: getattr(row, column) if row is not None else 0 for column in SUM_COLUMNS}
+    return PortfolioSummary(
+        dealCount=sums["deal_count"],
+        unitCount=sums["unit_count"],
+        totalPurchasePrice=sums["total_purchase_price"],
+        analyzedDeals=sums["analyzed_deal_count"],
+        totalNoi=sums["total_noi"],
+        weightedCapRate=_ratio(sums["total_noi"], sums["analyzed_purchase_price"], 100),
+        totalAnnualDebtService=sums["total_debt_service"],
+        dscr=_ratio(sums["total_noi"], sums["total_debt_service"]),
+        equityDeployed=sums["total_equity"],
+        updatedAt=row.updated_at if row is not None else None,
+    )
+
+
+async def rebuild_portfolios(db: AsyncSession) -> int:
+    """Recompute every portfolio's sums from the stored deals and analyses; returns the number of portfolios"""
+    counted = and_(DealAnalysis.noi.isnot(None), DealAnalysis.input_hash == Deal.input_hash)
+
+    def counted_sum(column):
+        return func.coalesce(func.sum(case((counted, column), else_=0)), 0)
+
+    user_id = func.coalesce(Deal.user_id, UNOWNED)
+    totals = (
+        select(
+            user_id,
+            func.count(Deal.id),
+            func.coalesce(func.sum(Deal.number_of_units), 0),
+            func.coalesce(func.sum(Deal.purchase_price), 0.0),
+            counted_sum(1),
+            counted_sum(Deal.purchase_price),
+            counted_sum(DealAnalysis.noi),
+            counted_sum(DealAnalysis.annual_debt_service),
+            counted_sum(DealAnalysis.equity),
+        )
+        .outerjoin(DealAnalysis, DealAnalysis.deal_id == Deal.id)
+        .group_by(user_id)
+    )
+    await db.execute(delete(PortfolioAggregate))
+    await db.execute(insert(PortfolioAggregate).from_select(("user_id",) + SUM_COLUMNS, totals))
+    await db.commit()
+    return await db.scalar(select(func.count()).select_from(PortfolioAggregate))
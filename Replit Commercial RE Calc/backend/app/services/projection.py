@@ -0,0 +1,183 @@
+"""
+Monthly cash-flow projection engine.
+
+Projects rent, vacancy, expenses, debt service and sale proceeds month by month
+over the hold period and solves for the IRR of the resulting equity cash flows.
+Every input is an array with one element per deal (plain floats are accepted
+for a single deal); series come back as (deals, months) matrices. The
+operations, sale and equity-return steps are also usable on their own, which
+is how app.services.analysis_stages reruns one step without the others.
+"""
+
+from typing import Dict
+
+import numpy as np
+
+from app.services.debt import debt_schedules
+from app.services.irr import irr as solve_irr
+
+DEFAULT_DISCOUNT_RATE = 0.10
+
+# Months of NOI past the exit used to value the property (forward NOI)
+FORWARD_MONTHS = 12
+
+
+def projection_horizon(hold_months) -> int:
+    """Months projected for the given hold periods: the longest hold plus the forward NOI window"""
+    return int(np.max(hold_months)) + FORWARD_MONTHS
+
+
+def project_operations(monthly_rent, vacancy_rate, annual_expenses, rent_growth, expense_growth, horizon):
+    """Monthly gross rent, vacancy loss, expenses and NOI with annual step growth"""
+    n = monthly_rent.shape[0]
+    months = np.arange(1, horizon + 1)
+    year_index = (months - 1) // 12
+
+    gross_rent = np.empty((n, horizon))
+    vacancy_loss = np.empty((n, horizon))
+    expenses = np.empty((n, horizon))
+    noi = np.empty((n, horizon))
+
+    np.power((1 + rent_growth)[:, None], year_index[None, :], out=gross_rent)
+    gross_rent *= monthly_rent[:, None]
+    np.multiply(gross_rent, vacancy_rate[:, None], out=vacancy_loss)
+    np.power((1 + expense_growth)[:, None], year_index[None, :], out=expenses)
+    expenses *= (annual_expenses / 12)[:, None]
+    np.subtract(gross_rent, vacancy_loss, out=noi)
+    noi -= expenses
+
+    return {
+        "months": months,
+        "grossRent": gross_rent,
+        "vacancyLoss": vacancy_loss,
+        "expenses": expenses,
+        "noi": noi,
+    }
+
+
+def project_sale(noi, balance, hold_months, exit_cap_rate):
+    """Sale at month hold_months for the forward 12-month NOI capitalized at exit_cap_rate"""
+    rows = np.arange(noi.shape[0])
+    exit_col = hold_months - 1
+    cumulative_noi = np.cumsum(noi, axis=1)
+    forward_noi = cumulative_noi[rows, exit_col + FORWARD_MONTHS] - cumulative_noi[rows, exit_col]
+    sale_price = forward_noi / exit_cap_rate
+    remaining_balance = balance[rows, hold_months]
+    return {
+        "forwardNoi": forward_noi,
+        "salePrice": sale_price,
+        "remainingBalance": remaining_balance,
+        "netSaleProceeds": sale_price - remaining_balance,
+    }
+
+
+def project_equity_returns(cash_flow, hold_months, net_sale_proceeds, equity, discount_rate):
+    """Equity cash flows (period 0 is the initial investment), their IRR and NPV"""
+    n, horizon = cash_flow.shape
+    rows = np.arange(n)
+    months = np.arange(1, horizon + 1)
+
+    in_hold = months[None, :] <= hold_months[:, None]
+    equity_flows = np.zeros((n, horizon + 1))
+    equity_flows[:, 0] = -equity
+    equity_flows[:, 1:] = np.where(in_hold, cash_flow, 0.0)
+    equity_flows[rows, hold_months] += net_sale_proceeds
+
+    total_distributions = equity_flows[:, 1:].sum(axis=1)
+
+    # Start Newton from the equity multiple spread evenly over the hold
+    with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+        guess = (total_distributions / equity) ** (1 / hold_months) - 1
+        guess[~np.isfinite(guess)] = 0.01
+        monthly_irr = solve_irr(equity_flows, guess=guess).rate
+        irr = (1 + monthly_irr) ** 12 - 1
+
+    monthly_discount = (1 + discount_rate) ** (1 / 12) - 1
+    discount = np.exp(-np.outer(np.log1p(monthly_discount), np.arange(horizon + 1)))
+    npv = (equity_flows * discount).sum(axis=1)
+
+    return {
+        "equityCashFlows": equity_flows,
+        "totalDistributions": total_distributions,
+        "irr": irr,
+        "npv": npv,
+    }
+
+
+def project_cash_flows(
+    monthly_rent,
+    vacancy_rate,
+    annual_expenses,
+    rent_growth,
+    expense_growth,
+    loan_amount,
+    annual_rate,
+    amortization_years,
+    interest_only_months,
+    interest_only,
+    hold_months,
+    exit_cap_rate,
+    equity,
+    discount_rate=DEFAULT_DISCOUNT_RATE,
+    monthly_payment=0.0,
+) -> Dict[str, np.ndarray]:
+    """
+    Project monthly cash flows from year-1 operations through the sale.
+
+    Rates are decimals (0.05 for 5%) except annual_rate, which is a percentage
+    like LoanTerms.interestRate. Rent and expenses step up by their growth rate
+    once every 12 months. Debt service and balances come from the shared
+    amortization schedules in app.services.debt, honoring interest-only
+    periods; a non-zero monthly_payment overrides the computed payment. The
+    property sells at month hold_months for the forward 12-month NOI
+    capitalized at exit_cap_rate.
+    """
+    monthly_rent = np.atleast_1d(np.asarray(monthly_rent, dtype=float))
+    n = monthly_rent.shape[0]
+
+    def column(value, dtype=float):
+        value = np.asarray(value, dtype=dtype)
+        return value if value.shape == (n,) else np.full(n, value, dtype=dtype)
+
+    vacancy_rate = column(vacancy_rate)
+    annual_expenses = column(annual_expenses)
+    rent_growth = column(rent_growth)
+    expense_growth = column(expense_growth)
+    loan_amount = column(loan_amount)
+    annual_rate = column(annual_rate)
+    amortization_years = column(amortization_years)
+    interest_only_months = column(interest_only_months)
+    interest_only = column(interest_only, bool)
+    monthly_payment = column(monthly_payment)
+    hold_months = np.maximum(column(hold_months, int), 1)
+    exit_cap_rate = column(exit_cap_rate)
+    equity = column(equity)
+    discount_rate = column(discount_rate)
+
+    horizon = projection_horizon(hold_months)
+    operations = project_operations(monthly_rent, vacancy_rate, annual_expenses, rent_growth, expense_growth, horizon)
+
+    # Debt service and the balance after each month (column 0 is the opening balance)
+    debt_service, balance = debt_schedules(
+        loan_amount,
+        annual_rate,
+        amortization_years,
+        interest_only_months,
+        interest_only,
+        horizon,
+        monthly_payment=monthly_payment,
+    )
+    cash_flow = operations["noi"] - debt_service
+
+    sale = project_sale(operations["noi"], balance, hold_months, exit_cap_rate)
+    returns = project_equity_returns(cash_flow, hold_months, sale["netSaleProceeds"], equity, discount_rate)
+
+    return {
+        **operations,
+        "debtService": debt_service,
+        "cashFlow": cash_flow,
+        "loanBalance": balance,
+        "holdMonths": hold_months,
+        **sale,
+        **returns,
+    }
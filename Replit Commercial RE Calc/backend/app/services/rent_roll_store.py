@@ -0,0 +1,103 @@
+"""
+Bulk persistence of rent roll units.
+
+Units are written as plain rows rather than one ORM object each: COPY on
+Postgres (asyncpg), batched executemany INSERTs elsewhere. Updating a deal's
+rent roll diffs the new units against the stored rows by unit number and
+only inserts, updates or deletes the rows that changed, in batches. Repeated
+unit numbers are matched in order of appearance.
+"""
+
+from collections import defaultdict, deque
+from typing import Dict, List, Tuple
+
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.models.rent_roll import RentRollUnit as RentRollUnitRecord
+from app.schemas.deal import DealInput
+
+# RentRollUnit schema fields and the rent_roll_units columns they are stored in
+UNIT_COLUMNS = (
+    ("unitNumber", "unit_number"),
+    ("unitType", "unit_type"),
+    ("bedrooms", "bedrooms"),
+    ("bathrooms", "bathrooms"),
+    ("squareFootage", "square_footage"),
+    ("monthlyRent", "monthly_rent"),
+    ("occupied", "occupied"),
+)
+COLUMN_NAMES = tuple(column for _, column in UNIT_COLUMNS)
+
+
+def rent_roll_values(deal_input: DealInput) -> List[Tuple]:
+    """One tuple of COLUMN_NAMES values per unit, from whichever rent roll form the input uses"""
+    if deal_input.rentRollColumns is not None:
+        columns = deal_input.rentRollColumns
+        return list(zip(*(getattr(columns, field) for field, _ in UNIT_COLUMNS)))
+    return [tuple(getattr(unit, field) for field, _ in UNIT_COLUMNS) for unit in deal_input.rentRoll]
+
+
+def _batches(items: list, size: int):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+async def insert_units(db: AsyncSession, deal_id: int, values: List[Tuple]) -> None:
+    """Insert units for a deal in bulk, within the session's transaction"""
+    if not values:
+        return
+    connection = await db.connection()
+    if connection.dialect.driver == "asyncpg":
+        raw = await connection.get_raw_connection()
+        await raw.driver_connection.copy_records_to_table(
+            RentRollUnitRecord.__tablename__,
+            records=[(deal_id, *row) for row in values],
+            columns=("deal_id",) + COLUMN_NAMES,
+        )
+        return
+    for batch in _batches(values, settings.RENT_ROLL_WRITE_BATCH):
+        await db.execute(
+            insert(RentRollUnitRecord),
+            [dict(zip(COLUMN_NAMES, row), deal_id=deal_id) for row in batch],
+        )
+
+
+async def replace_units(db: AsyncSession, deal_id: int, values: List[Tuple]) -> Dict[str, int]:
+    """
+    Make a deal's stored units match values, touching only rows that differ.
+
+    Returns how many rows were inserted, updated, deleted and left unchanged.
+    """
+    result = await db.execute(
+        select(RentRollUnitRecord.id, *(getattr(RentRollUnitRecord, column) for column in COLUMN_NAMES))
+        .where(RentRollUnitRecord.deal_id == deal_id)
+        .order_by(RentRollUnitRecord.id)
+    )
+    stored = defaultdict(deque)  # unit number -> (id, values) in insertion order
+    for row in result.all():
+        stored[row[1]].append((row[0], tuple(row[1:])))
+
+    inserts, updates = [], []
+    unchanged = 0
+    for row in values:
+        matches = stored.get(row[0])
+        if not matches:
+            inserts.append(row)
+            continue
+        unit_id, current = matches.popleft()
+        if current == row:
+            unchanged += 1
+        else:
+            updates.append(dict(zip(COLUMN_NAMES, row), id=unit_id))
+    deletes = [unit_id for matches in stored.values() for unit_id, _ in matches]
+
+    for batch in _batches(deletes, settings.RENT_ROLL_WRITE_BATCH):
+        await db.execute(delete(RentRollUnitRecord).where(RentRollUnitRecord.id.in_(batch)))
+    for batch in _batches(updates, settings.RENT_ROLL_WRITE_BATCH):
+        # Bulk UPDATE by primary key: one executemany per batch
+        await db.execute(update(RentRollUnitRecord), batch)
+    await insert_units(db, deal_id, inserts)
+
+    return {"inserted": len(inserts), "updated": len(updates), "deleted": len(deletes), "unchanged": unchanged}
@@ -0,0 +1,212 @@
+"""
+Screening deals by ranges of their analyzed metrics.
+
+Stored analyses keep their metrics in a JSON column, which cannot be filtered
+without decoding every row. deal_screening copies the metrics of each deal's
+current analysis into typed columns, with one (user_id, metric, deal_id)
+index per metric, and is written alongside the analysis snapshot: upserted
+when an analysis is stored, and dropped when the deal is edited (its analysis
+no longer matches) or deleted.
+
+A screen filters on any number of ranges and pages by keyset on the sort
+metric and deal id. Usually a page is an index range scan in sort order that
+stops after limit matches, rather than a sort of every matching deal; when a
+filter matches few deals, scanning that filter's range and sorting the
+matches is cheaper. Postgres chooses between the two from its column
+histograms. SQLite keeps no statistics on ranges, so each filter's range is
+probed with a bounded count first, and the other metrics are written as
+column + 0, which SQLite cannot answer from an index, to leave it one choice.
+"""
+
+import base64
+import json
+import math
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import delete, func, select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.database import upsert_insert
+from app.models.deal import Deal, DealAnalysis
+from app.models.screening import DealScreening
+from app.schemas.deal import FinancialMetrics, MetricRange, ScreenedDeal
+from app.services.portfolio import owner_key
+
+# ScreenedDeal metrics and the deal_screening columns holding them
+SCREENING_COLUMNS = {
+    "capRate": DealScreening.cap_rate,
+    "dscr": DealScreening.dscr,
+    "irr": DealScreening.irr,
+    "cashOnCash": DealScreening.cash_on_cash,
+    "equityMultiple": DealScreening.equity_multiple,
+    "noi": DealScreening.noi,
+    "purchasePrice": DealScreening.purchase_price,
+    "units": DealScreening.number_of_units,
+}
+
+
+def screening_row(deal: Deal, metrics: FinancialMetrics) -> dict:
+    """deal_screening values for a deal and the metrics of its current analysis"""
+    return {
+        "deal_id": deal.id,
+        "user_id": owner_key(deal.user_id),
+        "cap_rate": metrics.goingInCapRate,
+        "dscr": metrics.dscr,
+        "irr": metrics.irr,
+        "cash_on_cash": metrics.cashOnCashReturn,
+        "equity_multiple": metrics.equityMultiple,
+        "noi": metrics.noi,
+        "purchase_price": deal.purchase_price or 0.0,
+        "number_of_units": deal.number_of_units or 0,
+    }
+
+
+async def upsert_screening(db: AsyncSession, rows: List[dict]) -> None:
+    """Insert or replace the screening rows of several deals, within the session's transaction"""
+    if not rows:
+        return
+    dialect = (await db.connection()).dialect.name
+    statement = upsert_insert(dialect, DealScreening).values(rows)
+    await db.execute(statement.on_conflict_do_update(
+        index_elements=[DealScreening.deal_id],
+        set_={
+            **{column: statement.excluded[column] for column in rows[0] if column != "deal_id"},
+            "updated_at": func.now(),
+        },
+    ))
+
+
+async def remove_screening(db: AsyncSession, deal_ids: Iterable[int]) -> None:
+    await db.execute(delete(DealScreening).where(DealScreening.deal_id.in_(list(deal_ids))))
+
+
+def _encode_cursor(value: float, deal_id: int) -> str:
+    return base64.urlsafe_b64encode(json.dumps([value, deal_id]).encode()).decode().rstrip("=")
+
+
+def _decode_cursor(cursor: str) -> Tuple[float, int]:
+    try:
+        value, deal_id = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        return float(value), int(deal_id)
+    except (ValueError, TypeError):
+        raise ValueError("Invalid cursor")
+
+
+def _check_metric(metric: str) -> None:
+    if metric not in SCREENING_COLUMNS:
+        raise ValueError(f"Unknown metric '{metric}'; expected one of {', '.join(SCREENING_COLUMNS)}")
+
+
+def _in_range(column, bounds: MetricRange) -> list:
+    conditions = []
+    if bounds.min is not None:
+        conditions.append(column >= bounds.min)
+    if bounds.max is not None:
+        conditions.append(column <= bounds.max)
+    return conditions
+
+
+async def _driving_metric(db: AsyncSession, user_id: int, filters: Dict[str, MetricRange], sort: str) -> str:
+    """The filter matching fewest deals if it matches under SCREENING_PROBE_ROWS, else the sort metric"""
+    driving, fewest = sort, settings.SCREENING_PROBE_ROWS
+    for metric, bounds in filters.items():
+        conditions = _in_range(SCREENING_COLUMNS[metric], bounds)
+        if not conditions:
+            continue
+        probe = (
+            select(DealScreening.deal_id)
+            .where(DealScreening.user_id == user_id, *conditions)
+            .limit(settings.SCREENING_PROBE_ROWS)
+        )
+        count = await db.scalar(select(func.count()).select_from(probe.subquery()))
+        if count < fewest:
+            driving, fewest = metric, count
+    return driving
+
+
+def _screened_deal(row) -> ScreenedDeal:
+    values = {metric: getattr(row, column.key) for metric, column in SCREENING_COLUMNS.items()}
+    if not math.isfinite(values["dscr"]):
+        values["dscr"] = None
+    return ScreenedDeal(dealId=row.deal_id, **values)
+
+
+async def screen_deals(
+    db: AsyncSession,
+    filters: Dict[str, MetricRange],
+    sort: str = "capRate",
+    descending: bool = True,
+    cursor: Optional[str] = None,
+    limit: int = 50,
+    user_id: Optional[int] = None,
+) -> Tuple[List[ScreenedDeal], Optional[str]]:
+    """
+    One page of a user's analyzed deals within every range in filters, ordered by sort.
+
+    Returns the deals and the cursor of the next page, or None on the last
+    page. Raises ValueError for an unknown metric or an invalid cursor.
+    """
+    for metric in (sort, *filters):
+        _check_metric(metric)
+    user_id = owner_key(user_id)
+    driving = None
+    if (await db.connection()).dialect.name == "sqlite":
+        driving = await _driving_metric(db, user_id, filters, sort)
+
+    def expression(metric: str):
+        # column + 0 keeps SQLite from walking any index but the driving metric's
+        column = SCREENING_COLUMNS[metric]
+        return column if driving in (None, metric) else column + 0
+
+    query = select(DealScreening).where(DealScreening.user_id == user_id)
+    for metric, bounds in filters.items():
+        query = query.where(*_in_range(expression(metric), bounds))
+
+    sort_expression = expression(sort)
+    if cursor is not None:
+        position = tuple_(sort_expression, DealScreening.deal_id)
+        after = _decode_cursor(cursor)
+        query = query.where(position < after if descending else position > after)
+    if descending:
+        query = query.order_by(sort_expression.desc(), DealScreening.deal_id.desc())
+    else:
+        query = query.order_by(sort_expression, DealScreening.deal_id)
+
+    # One extra row tells whether another page follows
+    rows = (await db.execute(query.limit(limit + 1))).scalars().all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = _encode_cursor(getattr(rows[-1], SCREENING_COLUMNS[sort].key), rows[-1].deal_id)
+    return [_screened_deal(row) for row in rows], next_cursor
+
+
+async def rebuild_screening(db: AsyncSession, batch_size: int = 1000) -> int:
+    """
+    Recreate deal_screening from the stored analyses that match their deal's current input.
+
+    For databases with analyses stored before the table existed. Returns the
+    number of deals indexed.
+    """
+    await db.execute(delete(DealScreening))
+    query = (
+        select(Deal.id, Deal.user_id, Deal.purchase_price, Deal.number_of_units, DealAnalysis.financial_metrics)
+        .join(DealAnalysis, DealAnalysis.deal_id == Deal.id)
+        .where(DealAnalysis.input_hash == Deal.input_hash)
+        .order_by(Deal.id)
+        .limit(batch_size)
+    )
+    indexed, last_id = 0, None
+    while True:
+        page = query if last_id is None else query.where(Deal.id > last_id)
+        rows = (await db.execute(page)).all()
+        if not rows:
+            break
+        await upsert_screening(db, [
+            screening_row(row, FinancialMetrics.model_validate(row.financial_metrics)) for row in rows
+        ])
+        indexed += len(rows)
+        last_id = rows[-1].id
+    await db.commit()
+    return indexed
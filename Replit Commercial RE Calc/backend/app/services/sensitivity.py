@@ -0,0 +1,327 @@
+"""
+N-dimensional sensitivity grids.
+
+Each axis adjusts one deal input the same way SensitivityPanel.tsx does, and
+the axes are broadcast against each other into the full cartesian grid. A
+cell matches what POST /api/analyze-deal returns for the adjusted deal.
+
+The grid is not run cell by cell through the batch metrics engine. Every
+quantity is computed on the smallest grid of the axes it depends on and only
+broadcast at the end: debt schedules per price and rate, growth paths per
+appreciation, and monthly NOI as year-1 NOI times the growth path, since rent
+and expenses grow alike. Year-1 metrics (NOI, cap rate, DSCR, cash-on-cash)
+therefore cost a few array operations per cell, and the projected ones sums
+over those small grids. Only the IRR still solves every cell's equity cash
+flows, and only when it is asked for.
+
+Rent and expenses fall back to the same estimates as the scalar path (1500
+per unit, half of effective gross income) before percent adjustments apply,
+so an adjustment to an estimated input still moves the grid; the inputs that
+were estimated are reported.
+
+Up to MAX_GRID_CELLS cells, enough for 6 axes of 11 steps, are solved in one
+request. Grids past NESTED_GRID_CELLS go back as base64-packed float32 rather
+than nested JSON lists, which would run to tens of megabytes per metric.
+"""
+
+import base64
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.services.batch_metrics import (
+    DEFAULT_EXIT_CAP_RATE,
+    DEFAULT_EXPENSE_RATIO,
+    DEFAULT_HOLD_PERIOD,
+    DEFAULT_RENT_PER_UNIT,
+    METRIC_COLUMNS,
+)
+from app.services.debt import debt_schedules
+from app.services.irr import irr as solve_irr
+from app.services.projection import FORWARD_MONTHS
+
+# parameter -> (input column, how an adjustment applies)
+#   "percent": value * (1 + adjustment / 100)
+#   "points":  value + adjustment
+SENSITIVITY_PARAMETERS = {
+    "purchasePrice": ("purchasePrice", "percent"),
+    "monthlyRent": ("monthlyRent", "percent"),
+    "operatingExpenses": ("operatingExpenses", "percent"),
+    "vacancyRate": ("vacancyRate", "points"),
+    "interestRate": ("interestRate", "points"),
+    "exitCapRate": ("exitCapRate", "points"),
+    "annualAppreciation": ("annualAppreciation", "points"),
+}
+
+# Inputs that cannot go negative once adjusted
+NON_NEGATIVE_COLUMNS = ("vacancyRate", "interestRate", "exitCapRate")
+
+DEFAULT_GRID_METRICS = ("irr", "cashOnCashReturn", "dscr")
+
+# Metrics that need the monthly projection through the sale; the rest are year-1 figures
+PROJECTED_METRICS = (
+    "irr",
+    "equityMultiple",
+    "exitSalePrice",
+    "exitValue",
+    "totalReturn",
+    "npv",
+    "remainingLoanBalance",
+)
+
+# Guard against grids too large to solve in one request: 6 axes of 11 steps (1,771,561 cells)
+# fit, a 7th axis does not. Every cell costs an IRR solve, a few seconds for the full 6 x 11 grid.
+MAX_GRID_CELLS = 2_000_000
+
+# Larger grids are sent as packed float32 rather than nested lists, which would cost ~20 bytes
+# of JSON per cell and metric (~35 MB per metric for 6 x 11) against ~5.3 base64-encoded
+GRID_ENCODINGS = ("nested", "float32")
+NESTED_GRID_CELLS = 100_000
+
+# Cells whose IRR is solved together; bounds the (cells x months) cash-flow matrix
+IRR_CHUNK_SIZE = 65_536
+
+
+class SensitivityResult(NamedTuple):
+    # metric -> array with one dimension per axis, in axis order
+    metrics: Dict[str, np.ndarray]
+    # Inputs the deal left at 0 that were estimated before being adjusted
+    estimated: List[str]
+
+
+def axis_values(values=None, low: float = 0.0, high: float = 0.0, steps: int = 11) -> np.ndarray:
+    """Explicit axis adjustments, or `steps` evenly spaced ones from low to high"""
+    if values is not None:
+        return np.asarray(values, dtype=float)
+    return np.linspace(low, high, steps)
+
+
+def grid_lists(values: np.ndarray) -> list:
+    """A metric grid as nested lists ready for JSON, with None for each value that is not finite"""
+    finite = np.isfinite(values)
+    if finite.all():
+        return values.tolist()
+    nested = values.astype(object)
+    nested[~finite] = None
+    return nested.tolist()
+
+
+def grid_float32(values: np.ndarray) -> str:
+    """A metric grid as base64 of little-endian float32 in row-major (C) order, NaN where not finite"""
+    packed = np.where(np.isfinite(values), values, np.nan).astype("<f4")
+    return base64.b64encode(packed.tobytes()).decode("ascii")
+
+
+def encode_grid(metrics: Dict[str, np.ndarray], encoding: Optional[str] = None) -> Tuple[str, Dict[str, object]]:
+    """
+    The encoding used and each metric grid in it, nested lists or float32.
+
+    Without an encoding, grids of up to NESTED_GRID_CELLS cells are nested
+    lists and larger ones float32.
+    """
+    if encoding is not None and encoding not in GRID_ENCODINGS:
+        raise ValueError(f"Unknown grid encoding: {encoding}; use one of {', '.join(GRID_ENCODINGS)}")
+    if encoding is None:
+        cells = max((values.size for values in metrics.values()), default=0)
+        encoding = "nested" if cells <= NESTED_GRID_CELLS else "float32"
+    encode = grid_lists if encoding == "nested" else grid_float32
+    return encoding, {metric: encode(values) for metric, values in metrics.items()}
+
+
+def _safe_divide(numerator, denominator, default):
+    nonzero = denominator != 0
+    return np.where(nonzero, numerator / np.where(nonzero, denominator, 1.0), default)
+
+
+def _flat_index(shape: Tuple[int, ...], grid_shape: Tuple[int, ...]) -> np.ndarray:
+    # For every cell of grid_shape, the row of a table laid out over the smaller shape
+    return np.broadcast_to(np.arange(int(np.prod(shape))).reshape(shape), grid_shape).ravel()
+
+
+def sensitivity_grid(
+    base_columns: Dict[str, np.ndarray],
+    axes: Sequence[Tuple[str, np.ndarray]],
+    metrics: Sequence[str] = DEFAULT_GRID_METRICS,
+) -> SensitivityResult:
+    """
+    Evaluate metrics over the cartesian product of the axes.
+
+    base_columns holds a single deal as produced by deals_to_columns. axes is a
+    sequence of (parameter, adjustments) pairs; the result maps each metric to
+    an array with one dimension per axis, in axis order.
+    """
+    unknown = [metric for metric in metrics if metric not in METRIC_COLUMNS]
+    if unknown:
+        raise ValueError(f"Unknown metrics: {', '.join(unknown)}")
+    for parameter, _ in axes:
+        if parameter not in SENSITIVITY_PARAMETERS:
+            raise ValueError(f"Unknown sensitivity parameter: {parameter}")
+
+    shape = tuple(len(values) for _, values in axes)
+    cells = int(np.prod(shape, dtype=np.int64))
+    if cells > MAX_GRID_CELLS:
+        raise ValueError(f"Sensitivity grid has {cells} cells; the maximum is {MAX_GRID_CELLS}")
+
+    base = {name: float(values[0]) for name, values in base_columns.items()}
+    units = base["numberOfUnits"]
+
+    # Estimates first, so adjustments apply to them; the expense estimate follows each cell's income
+    estimated = []
+    if base["monthlyRent"] == 0 and units > 0:
+        base["monthlyRent"] = units * DEFAULT_RENT_PER_UNIT
+        estimated.append("monthlyRent")
+    estimate_expenses = base["operatingExpenses"] == 0
+
+    # Every input as an array over only the axes that adjust it (0-d if none do)
+    inputs = {name: np.asarray(value) for name, value in base.items()}
+    expense_adjustment = np.asarray(1.0)
+    for axis, (parameter, values) in enumerate(axes):
+        column, mode = SENSITIVITY_PARAMETERS[parameter]
+        adjustment = np.asarray(values, dtype=float).reshape(
+            tuple(len(values) if i == axis else 1 for i in range(len(shape)))
+        )
+        if column == "operatingExpenses" and estimate_expenses:
+            # Applied once the estimate is known
+            expense_adjustment = expense_adjustment * (1 + adjustment / 100)
+            continue
+        if mode == "percent":
+            adjusted = inputs[column] * (1 + adjustment / 100)
+        else:
+            adjusted = inputs[column] + adjustment
+        if column in NON_NEGATIVE_COLUMNS:
+            adjusted = np.maximum(adjusted, 0.0)
+        inputs[column] = adjusted
+
+    price = inputs["purchasePrice"]
+    monthly_rent = inputs["monthlyRent"]
+    vacancy_rate = inputs["vacancyRate"] / 100
+    effective_gross_income = monthly_rent * 12 * (1 - vacancy_rate)
+    total_expenses = inputs["operatingExpenses"]
+    if estimate_expenses:
+        total_expenses = np.where(
+            effective_gross_income > 0, effective_gross_income * DEFAULT_EXPENSE_RATIO, 0.0
+        ) * expense_adjustment
+        if np.any(effective_gross_income > 0):
+            estimated.append("operatingExpenses")
+    noi = effective_gross_income - total_expenses
+
+    loan_amount = price * (base["ltv"] / 100) if base["loanAmount"] == 0 else np.asarray(base["loanAmount"])
+    down_payment = price - loan_amount
+    has_equity = down_payment > 0
+
+    hold_period = base["holdPeriod"] if base["holdPeriod"] > 0 else DEFAULT_HOLD_PERIOD
+    hold_months = max(int(np.round(hold_period * 12)), 1)
+    horizon = hold_months + FORWARD_MONTHS
+
+    # Debt schedules over the price and rate axes only
+    debt_shape = np.broadcast_shapes(np.shape(loan_amount), np.shape(inputs["interestRate"]))
+    debt_count = int(np.prod(debt_shape))
+    debt_service, balance = debt_schedules(
+        np.broadcast_to(loan_amount, debt_shape).ravel(),
+        np.broadcast_to(inputs["interestRate"], debt_shape).ravel(),
+        np.full(debt_count, base["amortizationPeriod"]),
+        np.full(debt_count, base["interestOnlyMonths"]),
+        np.full(debt_count, bool(base["isInterestOnly"])),
+        horizon,
+        monthly_payment=np.full(debt_count, base["monthlyPayment"]),
+    )
+    annual_debt_service = debt_service[:, :12].sum(axis=1).reshape(debt_shape)
+    monthly_payment = (
+        debt_service[:, 0].reshape(debt_shape) if base["monthlyPayment"] == 0 else np.asarray(base["monthlyPayment"])
+    )
+
+    annual_cash_flow = noi - annual_debt_service
+    cash_on_cash = np.where(has_equity, _safe_divide(annual_cash_flow, down_payment, 0.0) * 100, 0.0)
+    values = {
+        "noi": noi,
+        "goingInCapRate": _safe_divide(noi, price, 0.0) * 100,
+        "reversionCapRate": inputs["exitCapRate"],
+        "cashOnCashReturn": cash_on_cash,
+        "stabilizedCashOnCash": cash_on_cash,
+        "breakEvenOccupancy": np.asarray(0.0),
+        "dscr": _safe_divide(noi, annual_debt_service, np.inf),
+        "annualCashFlow": annual_cash_flow,
+        "loanAmount": loan_amount,
+        "monthlyPayment": monthly_payment,
+    }
+
+    if any(metric in PROJECTED_METRICS for metric in metrics):
+        # Rent and expenses both step up with appreciation once a year, so monthly NOI is
+        # year-1 monthly NOI times one growth path per appreciation value
+        growth_rate = inputs["annualAppreciation"] / 100
+        year_index = np.arange(horizon) // 12
+        growth = (1 + growth_rate)[..., None] ** year_index
+        base_noi = noi / 12
+
+        monthly_discount = (1 + base["discountRate"] / 100) ** (1 / 12) - 1
+        discount = np.exp(-np.log1p(monthly_discount) * np.arange(horizon + 1))
+
+        held_growth = growth[..., :hold_months]
+        held_debt = debt_service[:, :hold_months]
+        exit_cap_rate = np.where(inputs["exitCapRate"] > 0, inputs["exitCapRate"] / 100, DEFAULT_EXIT_CAP_RATE)
+        sale_price = base_noi * growth[..., hold_months:hold_months + FORWARD_MONTHS].sum(axis=-1) / exit_cap_rate
+        remaining_balance = balance[:, hold_months].reshape(debt_shape)
+        net_sale_proceeds = sale_price - remaining_balance
+
+        total_distributions = (
+            base_noi * held_growth.sum(axis=-1)
+            - held_debt.sum(axis=1).reshape(debt_shape)
+            + net_sale_proceeds
+        )
+        npv = (
+            -down_payment
+            + base_noi * (held_growth * discount[1:hold_months + 1]).sum(axis=-1)
+            - (held_debt @ discount[1:hold_months + 1]).reshape(debt_shape)
+            + net_sale_proceeds * discount[hold_months]
+        )
+        values.update({
+            "exitSalePrice": sale_price,
+            "exitValue": sale_price,
+            "totalReturn": total_distributions,
+            "npv": npv,
+            "remainingLoanBalance": remaining_balance,
+            "equityMultiple": np.where(has_equity, _safe_divide(total_distributions, down_payment, 0.0), 1.0),
+        })
+
+        if "irr" in metrics:
+            values["irr"] = _grid_irr(
+                shape, base_noi, held_growth, held_debt, debt_shape,
+                down_payment, net_sale_proceeds, total_distributions, hold_months,
+            )
+
+    return SensitivityResult(
+        {metric: np.broadcast_to(values[metric], shape).astype(float) for metric in metrics},
+        estimated,
+    )
+
+
+def _grid_irr(shape, base_noi, held_growth, held_debt, debt_shape, down_payment, net_sale_proceeds,
+              total_distributions, hold_months) -> np.ndarray:
+    """Annual IRR in percent of every cell, solving the equity cash flows a chunk of cells at a time"""
+    growth_shape = held_growth.shape[:-1]
+    growth_table = held_growth.reshape(-1, hold_months)
+    growth_index = _flat_index(growth_shape, shape)
+    debt_index = _flat_index(debt_shape, shape)
+
+    base_noi = np.broadcast_to(base_noi, shape).ravel()
+    equity = np.broadcast_to(down_payment, shape).ravel()
+    net_sale_proceeds = np.broadcast_to(net_sale_proceeds, shape).ravel()
+    total_distributions = np.broadcast_to(total_distributions, shape).ravel()
+
+    irr = np.zeros(equity.shape[0])
+    solved = np.flatnonzero(equity > 0)
+    for start in range(0, solved.shape[0], IRR_CHUNK_SIZE):
+        rows = solved[start:start + IRR_CHUNK_SIZE]
+        flows = np.empty((rows.shape[0], hold_months + 1))
+        flows[:, 0] = -equity[rows]
+        np.multiply(base_noi[rows, None], growth_table[growth_index[rows]], out=flows[:, 1:])
+        flows[:, 1:] -= held_debt[debt_index[rows]]
+        flows[:, hold_months] += net_sale_proceeds[rows]
+
+        # Start Newton from the equity multiple spread evenly over the hold, as the projection does
+        with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+            guess = (total_distributions[rows] / equity[rows]) ** (1 / hold_months) - 1
+            guess[~np.isfinite(guess)] = 0.01
+            annual = (1 + solve_irr(flows, guess=guess).rate) ** 12 - 1
+        irr[rows] = np.where(np.isfinite(annual), annual * 100, 0.0)
+    return irr.reshape(shape)
@@ -0,0 +1,157 @@
+"""
+Monte Carlo risk simulation.
+
+Samples rent growth, vacancy, expense inflation, exit cap rate and interest
+rate for every path and runs the paths through the batch metrics engine in
+fixed-size chunks spread across a process pool. Each chunk draws from its own
+child of the request seed, so results depend only on the seed and the number
+of paths, never on how many workers ran them.
+"""
+
+import os
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import Dict, Optional
+
+import numpy as np
+
+from app.core.config import settings
+from app.services.batch_metrics import calculate_financial_metrics_batch
+
+# Paths per unit of work; also the unit of seeding, so changing it changes results
+CHUNK_PATHS = 10_000
+
+PERCENTILES = (5, 10, 25, 50, 75, 90, 95)
+
+# Simulated input -> deal column it replaces
+SIMULATED_COLUMNS = {
+    "rentGrowth": "annualAppreciation",
+    "vacancyRate": "vacancyRate",
+    "expenseGrowth": "expenseGrowth",
+    "exitCapRate": "exitCapRate",
+    "interestRate": "interestRate",
+}
+
+# Sampled values are clipped into a sensible range (percent)
+COLUMN_BOUNDS = {
+    "vacancyRate": (0.0, 100.0),
+    "exitCapRate": (0.1, None),
+    "interestRate": (0.0, None),
+}
+
+# Rates are quoted in basis points; rounding keeps the amortization schedule cache effective
+RATE_DECIMALS = 2
+
+_pool: Optional[ProcessPoolExecutor] = None
+
+
+def get_simulation_pool() -> ProcessPoolExecutor:
+    """Process pool shared by all simulation requests, created on first use"""
+    global _pool
+    if _pool is None:
+        workers = settings.SIMULATION_WORKERS or os.cpu_count() or 1
+        _pool = ProcessPoolExecutor(max_workers=workers)
+    return _pool
+
+
+def _sample(rng: np.random.Generator, spec: Dict, size: int) -> np.ndarray:
+    """Draw from one distribution spec: normal, uniform, triangular or fixed"""
+    kind = spec.get("kind", "normal")
+    if kind == "normal":
+        return rng.normal(spec["mean"], spec.get("std", 0.0), size)
+    if kind == "uniform":
+        return rng.uniform(spec["low"], spec["high"], size)
+    if kind == "triangular":
+        return rng.triangular(spec["low"], spec["mode"], spec["high"], size)
+    if kind == "fixed":
+        return np.full(size, float(spec["mean"]))
+    raise ValueError(f"Unknown distribution kind: {kind}")
+
+
+def _simulate_chunk(
+    base_columns: Dict[str, np.ndarray],
+    distributions: Dict[str, Dict],
+    seed: int,
+    chunk_index: int,
+    size: int,
+) -> Dict[str, np.ndarray]:
+    """Sample and evaluate one chunk of paths; runs inside a worker process"""
+    rng = np.random.default_rng(np.random.SeedSequence(seed, spawn_key=(chunk_index,)))
+
+    columns = {name: np.repeat(values[:1], size) for name, values in base_columns.items()}
+    columns.setdefault("expenseGrowth", columns["annualAppreciation"].copy())
+
+    # Sample in a fixed order so every input gets the same draws for a given seed
+    for name in SIMULATED_COLUMNS:
+        if name not in distributions:
+            continue
+        column = SIMULATED_COLUMNS[name]
+        values = _sample(rng, distributions[name], size)
+        low, high = COLUMN_BOUNDS.get(column, (None, None))
+        if low is not None or high is not None:
+            values = np.clip(values, low, high)
+        if column == "interestRate":
+            values = np.round(values, RATE_DECIMALS)
+            # A sampled rate has to drive the payment
+            columns["monthlyPayment"] = np.zeros(size)
+        columns[column] = values
+
+    metrics = calculate_financial_metrics_batch(columns)
+    return {
+        "irr": metrics["irr"],
+        "dscr": metrics["dscr"],
+        "equityMultiple": metrics["equityMultiple"],
+        "npv": metrics["npv"],
+    }
+
+
+def _summarize(values: np.ndarray) -> Dict[str, Optional[float]]:
+    """Mean and percentiles of the finite values; None for all of them if no path had one"""
+    finite = values[np.isfinite(values)]
+    if finite.size == 0:
+        # e.g. the DSCR of an all-cash deal; 0.0 would read as debt it cannot cover
+        return {"mean": None, **{f"p{p}": None for p in PERCENTILES}}
+    summary = {"mean": float(finite.mean())}
+    summary.update({f"p{p}": float(v) for p, v in zip(PERCENTILES, np.percentile(finite, PERCENTILES))})
+    return summary
+
+
+def run_simulation(
+    base_columns: Dict[str, np.ndarray],
+    distributions: Dict[str, Dict],
+    paths: int,
+    seed: int,
+    executor: Optional[Executor] = None,
+) -> Dict:
+    """
+    Simulate `paths` scenarios of one deal and summarize the outcome distributions.
+
+    distributions maps a key of SIMULATED_COLUMNS to a spec such as
+    {"kind": "normal", "mean": 3.0, "std": 1.0}; inputs without one keep the
+    deal's value. Chunks run on `executor` when given, otherwise inline.
+    """
+    unknown = [name for name in distributions if name not in SIMULATED_COLUMNS]
+    if unknown:
+        raise ValueError(f"Unknown simulated inputs: {', '.join(unknown)}")
+    if paths < 1 or paths > settings.SIMULATION_MAX_PATHS:
+        raise ValueError(f"paths must be between 1 and {settings.SIMULATION_MAX_PATHS}")
+
+    sizes = [min(CHUNK_PATHS, paths - start) for start in range(0, paths, CHUNK_PATHS)]
+    args = [(base_columns, distributions, seed, i, size) for i, size in enumerate(sizes)]
+
+    if executor is None or len(args) == 1:
+        chunks = [_simulate_chunk(*chunk_args) for chunk_args in args]
+    else:
+        chunks = list(executor.map(_simulate_chunk, *zip(*args)))
+
+    results = {name: np.concatenate([chunk[name] for chunk in chunks]) for name in chunks[0]}
+
+    return {
+        "paths": paths,
+        "seed": seed,
+        "irr": _summarize(results["irr"]),
+        "dscr": _summarize(results["dscr"]),
+        "equityMultiple": _summarize(results["equityMultiple"]),
+        "npv": _summarize(results["npv"]),
+        "probabilityDscrBelowOne": float(np.mean(results["dscr"] < 1.0)),
+        "probabilityOfLoss": float(np.mean(results["equityMultiple"] < 1.0)),
+    }
@@ -0,0 +1,280 @@
+"""
+T12 (trailing twelve months) operating statement extraction from PDFs.
+
+Pages are extracted in parallel across a process pool, a sliding window of
+pages at a time in page order. Each worker pulls the text lines of one page
+with pdfplumber and splits them into labels and amounts. The parent merges
+pages in order, tracking the income/expense section across page breaks, and
+maps labels onto the OperatingExpenses fields. Once the operating statement
+pages have been seen and a page follows that is not part of the statement,
+pages still queued are cancelled, so long packages stop after the statement.
+"""
+
+import asyncio
+import os
+import re
+import tempfile
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Tuple
+
+from app.core.config import settings
+
+# Bump whenever extraction changes what a PDF produces; invalidates cached results
+T12_PARSER_VERSION = 1
+
+# Niceness of PDF workers so extraction yields the CPU to the API process
+T12_WORKER_NICENESS = 10
+
+# Any of these on a page marks it as part of an operating statement
+STATEMENT_KEYWORDS = (
+    "operating statement", "income statement", "profit and loss", "profit & loss",
+    "trailing 12", "trailing twelve", "t12", "t-12", "net operating income",
+)
+
+# A page without a statement keyword still counts with this many recognized line items
+MIN_RECOGNIZED_LINE_ITEMS = 3
+
+# (label keywords, field) in match order; totals come first so "Total Utilities" is not a utility
+TOTAL_LINE_ITEMS = (
+    (("net operating income", "noi"), "netOperatingIncome"),
+    (("total operating expenses", "total expenses"), "totalExpenses"),
+    (("effective gross income", "total income", "total revenue", "total operating income"), "effectiveGrossIncome"),
+)
+INCOME_LINE_ITEMS = (
+    (("vacancy", "concession", "bad debt", "credit loss", "loss to lease"), "vacancyLoss"),
+    (("gross potential", "rental income", "rent income", "gross rent", "base rent", "rents"), "grossPotentialRent"),
+    (("other income", "parking", "laundry", "fee", "reimbursement", "storage", "pet", "late"), "otherIncome"),
+)
+EXPENSE_LINE_ITEMS = (
+    (("tax",), "propertyTax"),
+    (("insurance",), "insurance"),
+    (("utilit", "electric", "water", "sewer", "gas", "trash", "refuse"), "utilities"),
+    (("repair", "maintenance", "turnover", "make ready", "landscap", "cleaning", "pest"), "maintenance"),
+    (("management",), "propertyManagement"),
+    (("payroll", "salar", "admin", "marketing", "advertis", "legal", "professional", "office",
+      "contract", "general", "misc", "other"), "other"),
+)
+
+_AMOUNT = re.compile(r"^\(?-?\$?\d[\d,]*(?:\.\d+)?\)?$")
+
+_pdf_pool: Optional[ProcessPoolExecutor] = None
+
+
+def get_pdf_pool() -> ProcessPoolExecutor:
+    """Process pool for PDF page extraction, created on first use"""
+    global _pdf_pool
+    if _pdf_pool is None:
+        _pdf_pool = ProcessPoolExecutor(
+            max_workers=settings.PDF_PARSE_WORKERS,
+            initializer=os.nice,
+            initargs=(T12_WORKER_NICENESS,),
+        )
+    return _pdf_pool
+
+
+def _parse_amount(token: str) -> Optional[float]:
+    if token in ("-", "--", "—"):
+        return 0.0
+    if not _AMOUNT.match(token):
+        return None
+    negative = token.startswith("(") or token.startswith("-")
+    value = float(token.strip("()-$").replace(",", "") or 0)
+    return -value if negative else value
+
+
+def split_line_item(line: str) -> Tuple[str, List[float]]:
+    """'Real Estate Taxes 1,000 (250) 3,500' -> ('Real Estate Taxes', [1000.0, -250.0, 3500.0])"""
+    tokens = line.split()
+    amounts = []
+    while tokens:
+        value = _parse_amount(tokens[-1])
+        if value is None:
+            break
+        amounts.append(value)
+        tokens.pop()
+    return " ".join(tokens), amounts[::-1]
+
+
+def _match(label: str, table) -> Optional[str]:
+    for keywords, field in table:
+        if any(keyword in label for keyword in keywords):
+            return field
+    return None
+
+
+@contextmanager
+def _open_pdf(path: str, **options):
+    """pdfplumber.open, raising ValueError like other bad input when pdfminer cannot parse the file"""
+    import pdfplumber
+    from pdfminer.psparser import PSException
+
+    try:
+        with pdfplumber.open(path, **options) as pdf:
+            yield pdf
+    except PSException as error:
+        # PDFSyntaxError, PSEOF and the rest of pdfminer's parse errors
+        raise ValueError(f"Not a readable PDF: {error}") from None
+
+
+def extract_t12_page(path: str, page_number: int) -> Dict:
+    """Line items of one PDF page; runs inside a PDF pool worker"""
+    start = time.perf_counter()
+    with _open_pdf(path, pages=[page_number + 1]) as pdf:
+        text = pdf.pages[0].extract_text() or ""
+
+    lines = []
+    recognized = 0
+    for raw_line in text.splitlines():
+        label, amounts = split_line_item(raw_line.strip())
+        if not label or not any(c.isalpha() for c in label):
+            continue
+        lines.append((label, amounts))
+        if amounts and _match(label.lower(), TOTAL_LINE_ITEMS + INCOME_LINE_ITEMS + EXPENSE_LINE_ITEMS):
+            recognized += 1
+
+    lowered = text.lower()
+    has_amounts = any(amounts for _, amounts in lines)
+    statement = has_amounts and (
+        any(keyword in lowered for keyword in STATEMENT_KEYWORDS) or recognized >= MIN_RECOGNIZED_LINE_ITEMS
+    )
+    return {
+        "page": page_number + 1,
+        "seconds": time.perf_counter() - start,
+        "operatingStatement": statement,
+        "lines": lines,
+    }
+
+
+def _annual_amount(amounts: List[float]) -> float:
+    """The total column when there is one; twelve bare months are summed"""
+    return sum(amounts) if len(amounts) == 12 else amounts[-1]
+
+
+def merge_t12_pages(pages: List[Dict], page_count: int) -> Dict:
+    """Combine statement pages, in page order, into one normalized T12"""
+    income = {"grossPotentialRent": 0.0, "vacancyLoss": 0.0, "otherIncome": 0.0}
+    expenses = {field: 0.0 for _, field in EXPENSE_LINE_ITEMS}
+    reported = {}
+    line_items = []
+
+    section = None
+    for page in pages:
+        if not page["operatingStatement"]:
+            continue
+        for label, amounts in page["lines"]:
+            lowered = label.lower()
+            if not amounts:
+                # Section headings carry no amounts
+                if "expense" in lowered:
+                    section = "expense"
+                elif "income" in lowered or "revenue" in lowered:
+                    section = "income"
+                continue
+
+            amount = _annual_amount(amounts)
+            field = _match(lowered, TOTAL_LINE_ITEMS)
+            if field:
+                reported[field] = amount
+                category = field
+            elif lowered.startswith("total") or lowered.startswith("subtotal"):
+                # Subtotals of line items already counted
+                category = "subtotal"
+            else:
+                category = None
+                tables = [("income", INCOME_LINE_ITEMS), ("expense", EXPENSE_LINE_ITEMS)]
+                if section == "expense":
+                    tables.reverse()
+                for table_section, table in tables:
+                    field = _match(lowered, table)
+                    if field:
+                        section = table_section
+                        break
+                if field in income:
+                    income[field] += abs(amount) if field == "vacancyLoss" else amount
+                    category = field
+                elif field in expenses:
+                    expenses[field] += amount
+                    category = field
+            line_items.append({"page": page["page"], "label": label, "amount": amount, "category": category})
+
+    effective_gross_income = income["grossPotentialRent"] - income["vacancyLoss"] + income["otherIncome"]
+    total_expenses = sum(expenses.values())
+    return {
+        "pageCount": page_count,
+        "pagesScanned": len(pages),
+        "statementPages": [page["page"] for page in pages if page["operatingStatement"]],
+        "income": income,
+        "operatingExpenses": {**expenses, "total": total_expenses},
+        "effectiveGrossIncome": effective_gross_income,
+        "netOperatingIncome": effective_gross_income - total_expenses,
+        "reportedTotals": reported,
+        "lineItems": line_items,
+        "pageTimings": [
+            {"page": page["page"], "seconds": page["seconds"], "operatingStatement": page["operatingStatement"]}
+            for page in pages
+        ],
+    }
+
+
+def _statement_finished(pages: List[Dict]) -> bool:
+    """True once a non-statement page follows the statement pages"""
+    return len(pages) > 1 and not pages[-1]["operatingStatement"] and any(
+        page["operatingStatement"] for page in pages[:-1]
+    )
+
+
+def _page_count(path: str) -> int:
+    with _open_pdf(path) as pdf:
+        return len(pdf.pages)
+
+
+async def extract_t12(content: bytes, progress: Optional[Callable[[float], None]] = None) -> Dict:
+    """
+    Extract a normalized T12 from PDF bytes without blocking the event loop.
+
+    Up to twice PDF_PARSE_WORKERS pages are in flight at a time. Results are
+    consumed in page order so the early stop sees pages as they appear in the
+    document. The whole extraction is limited to PDF_PARSE_TIMEOUT seconds.
+    progress, if given, is called with the share of pages read after each one.
+    """
+    loop = asyncio.get_running_loop()
+    pool = get_pdf_pool()
+    window = max(settings.PDF_PARSE_WORKERS, 1) * 2
+
+    # Workers open the file by path rather than receiving the bytes once per page
+    with tempfile.NamedTemporaryFile(suffix=".pdf", dir=settings.UPLOAD_DIR) as handle:
+        handle.write(content)
+        handle.flush()
+
+        page_count = await loop.run_in_executor(pool, _page_count, handle.name)
+        pending = deque()
+        pages = []
+        next_page = 0
+
+        async def scan():
+            nonlocal next_page
+            while next_page < page_count or pending:
+                while next_page < page_count and len(pending) < window:
+                    pending.append(asyncio.wrap_future(pool.submit(extract_t12_page, handle.name, next_page)))
+                    next_page += 1
+                pages.append(await pending.popleft())
+                if progress is not None:
+                    progress(len(pages) / page_count)
+                if _statement_finished(pages):
+                    break
+
+        try:
+            await asyncio.wait_for(scan(), settings.PDF_PARSE_TIMEOUT)
+        except asyncio.TimeoutError:
+            raise TimeoutError("T12 extraction timed out")
+        finally:
+            # Queued pages are dropped; pages already running finish and are ignored
+            for future in pending:
+                future.cancel()
+
+    if not any(page["operatingStatement"] for page in pages):
+        raise ValueError("No operating statement found in the PDF")
+    return merge_t12_pages(pages, page_count)
@@ -0,0 +1,305 @@
+"""
+Content-addressed on-disk cache of parsed uploads.
+
+Uploads are hashed with SHA-256 as the parser reads them, so hashing costs no
+read of its own, and the parsed result is stored as JSON under
+UPLOAD_DIR/parsed, keyed by the hash, the kind of file, how it was parsed and
+the parser version. Bumping a parser's version makes its old entries
+unreachable; they age out through the size-bounded LRU eviction like any
+other entry. Recency is the file's mtime, refreshed on every hit, so the LRU
+order survives restarts. Hits hand back the stored JSON bytes undecoded so a
+repeat upload costs a file read rather than a parse.
+
+Results too large to hold in memory (streamed rent rolls) go through
+put_stream and get_stream instead: they are written a chunk at a time as they
+are encoded and read back a chunk at a time as they are sent. Their hash is
+only complete once the file has been parsed, so a repeat is recognized
+up front by its size and first chunk, then confirmed by hashing the file.
+Those fingerprints are kept in memory, so after a restart the first repeat
+of each file is parsed again.
+"""
+
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, BinaryIO, Dict, Iterable, Iterator, Optional, Tuple
+
+from app.core.config import settings
+from app.core.metrics import register_cache
+
+# Bytes read at a time when a whole file is hashed, and the size of the first
+# chunk that fingerprints a streamed upload
+HASH_CHUNK_SIZE = 1024 * 1024
+
+# Bytes read per chunk when a stored result is streamed back
+STREAM_CHUNK_SIZE = 1024 * 1024
+
+
+class CachedJSON(bytes):
+    """Raw JSON of a cached result, passed through without decoding"""
+
+
+class JSONStream:
+    """Raw JSON of a result too large to hold in memory, as an iterable of byte chunks"""
+
+    def __init__(
+        self,
+        chunks: Iterable[bytes],
+        cached: bool,
+        entry: Optional[Tuple[str, str, str, int]] = None,
+        handle: Optional[BinaryIO] = None,
+    ):
+        self.chunks = chunks
+        self.cached = cached  # read from the cache rather than parsed for this request
+        self.entry = entry  # (hash, kind, variant, version) of the cache entry holding the JSON, if there is one
+        self.handle = handle  # the entry opened for reading, when the chunks come from it
+
+    def __iter__(self) -> Iterator[bytes]:
+        return iter(self.chunks)
+
+    def close(self) -> None:
+        """Give up on the chunks not read yet"""
+        if self.handle is not None:
+            self.handle.close()
+
+
+def read_chunks(handle: BinaryIO) -> Iterator[bytes]:
+    """The rest of an open file in STREAM_CHUNK_SIZE pieces, closing it at the end"""
+    with handle:
+        while True:
+            chunk = handle.read(STREAM_CHUNK_SIZE)
+            if not chunk:
+                return
+            yield chunk
+
+
+def hash_bytes(content: bytes) -> str:
+    return hashlib.sha256(content).hexdigest()
+
+
+def hash_file(source: BinaryIO) -> str:
+    """SHA-256 of a file from its start, read in chunks; the file is rewound afterwards"""
+    digest = hashlib.sha256()
+    source.seek(0)
+    while True:
+        chunk = source.read(HASH_CHUNK_SIZE)
+        if not chunk:
+            break
+        digest.update(chunk)
+    source.seek(0)
+    return digest.hexdigest()
+
+
+def upload_head(source: BinaryIO) -> str:
+    """Size and hash of the first chunk of a file, from which a streamed repeat is recognized; rewinds it"""
+    size = source.seek(0, os.SEEK_END)
+    source.seek(0)
+    head = hashlib.sha256(source.read(HASH_CHUNK_SIZE)).hexdigest()
+    source.seek(0)
+    return f"{size}:{head}"
+
+
+class HashingReader:
+    """
+    Read-only view of a file that hashes what is read through it.
+
+    The hash is of the whole file only if it is read front to back from the
+    start and to the end; finish() reads whatever the parser left.
+    """
+
+    def __init__(self, raw: BinaryIO):
+        self.raw = raw
+        self._digest = hashlib.sha256()
+
+    def read(self, size: int = -1) -> bytes:
+        data = self.raw.read(size)
+        self._digest.update(data)
+        return data
+
+    def seek(self, offset: int, whence: int = os.SEEK_SET) -> int:
+        return self.raw.seek(offset, whence)
+
+    def tell(self) -> int:
+        return self.raw.tell()
+
+    def __iter__(self):
+        # pandas takes anything with read and __iter__ for a file
+        return iter(self.read, b"")
+
+    def finish(self) -> str:
+        while self.read(HASH_CHUNK_SIZE):
+            pass
+        return self._digest.hexdigest()
+
+
+class UploadCache:
+    """Size-bounded LRU of parsed results, one JSON file per entry"""
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: Optional[OrderedDict] = None  # path -> size, least recently used first
+        self._heads: OrderedDict = OrderedDict()  # (upload_head, kind, variant, version) -> hash
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def _path(self, digest: str, kind: str, variant: str, version: int) -> str:
+        return os.path.join(self.directory, digest[:2], f"{digest}.{kind}.{variant}.v{version}.json")
+
+    def _load_index(self) -> OrderedDict:
+        """Entries already on disk, oldest first; built on first use"""
+        if self._entries is None:
+            found = []
+            for root, _, names in os.walk(self.directory):
+                for name in names:
+                    if name.endswith(".json"):
+                        stat = os.stat(os.path.join(root, name))
+                        found.append((stat.st_mtime, os.path.join(root, name), stat.st_size))
+            found.sort()
+            self._entries = OrderedDict((path, size) for _, path, size in found)
+            self._bytes = sum(self._entries.values())
+        return self._entries
+
+    def _open(self, digest: str, kind: str, variant: str, version: int) -> Optional[BinaryIO]:
+        """The entry opened for reading, counting the hit or miss; None on a miss"""
+        if self.max_bytes <= 0:
+            return None
+        path = self._path(digest, kind, variant, version)
+        with self._lock:
+            entries = self._load_index()
+            if path not in entries:
+                self.misses += 1
+                return None
+            entries.move_to_end(path)
+            self.hits += 1
+        try:
+            handle = open(path, "rb")
+            os.utime(path)
+            return handle
+        except OSError:
+            # Removed behind our back; treat as a miss
+            with self._lock:
+                self._forget(path)
+                self.hits -= 1
+                self.misses += 1
+            return None
+
+    def get(self, digest: str, kind: str, variant: str, version: int) -> Optional[CachedJSON]:
+        handle = self._open(digest, kind, variant, version)
+        if handle is None:
+            return None
+        with handle:
+            return CachedJSON(handle.read())
+
+    def recognize(self, source: BinaryIO, head: str, kind: str, variant: str, version: int) -> Optional[str]:
+        """
+        Hash of a file stored through put_stream before, or None if it was not.
+        The whole file is hashed only when its head (upload_head) matches.
+        """
+        if self.max_bytes <= 0:
+            return None
+        with self._lock:
+            known = self._heads.get((head, kind, variant, version))
+        if known is None or hash_file(source) != known:
+            return None
+        return known
+
+    def get_stream(self, digest: str, kind: str, variant: str, version: int) -> Optional[JSONStream]:
+        """Like get, reading the entry a chunk at a time as the stream is consumed"""
+        handle = self._open(digest, kind, variant, version)
+        if handle is None:
+            return None
+        return JSONStream(read_chunks(handle), cached=True, entry=(digest, kind, variant, version), handle=handle)
+
+    def put(self, digest: str, kind: str, variant: str, version: int, result: Any) -> None:
+        if self.max_bytes <= 0:
+            return
+        data = json.dumps(result, separators=(",", ":")).encode("utf-8")
+        stored = self.put_stream(digest, kind, variant, version, (data,))
+        if stored is not None:
+            stored.close()
+
+    def put_stream(
+        self, digest: str, kind: str, variant: str, version: int, chunks: Iterable[bytes], head: Optional[str] = None
+    ) -> Optional[BinaryIO]:
+        """
+        Store a result given as JSON chunks, writing each as it arrives. With
+        the upload's head (upload_head), recognize finds the upload again.
+
+        Returns the new entry opened for reading from the start, which stays
+        readable even if it is evicted meanwhile. Returns None when nothing was
+        stored: the cache is disabled, or the result outgrew the whole cache,
+        in which case the chunks were consumed only up to that point.
+        """
+        if self.max_bytes <= 0:
+            return None
+        path = self._path(digest, kind, variant, version)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temporary = f"{path}.{threading.get_ident()}.tmp"
+        handle = open(temporary, "w+b")
+        size = 0
+        try:
+            for chunk in chunks:
+                size += len(chunk)
+                if size > self.max_bytes:
+                    break
+                handle.write(chunk)
+            if size > self.max_bytes:
+                handle.close()
+                os.remove(temporary)
+                return None
+            handle.flush()
+            os.replace(temporary, path)
+        except BaseException:
+            handle.close()
+            if os.path.exists(temporary):
+                os.remove(temporary)
+            raise
+        handle.seek(0)
+
+        with self._lock:
+            entries = self._load_index()
+            self._forget(path)
+            entries[path] = size
+            self._bytes += size
+            if head is not None:
+                self._heads[(head, kind, variant, version)] = digest
+                self._heads.move_to_end((head, kind, variant, version))
+            while self._bytes > self.max_bytes and entries:
+                oldest = next(iter(entries))
+                self._forget(oldest)
+                self.evictions += 1
+                try:
+                    os.remove(oldest)
+                except OSError:
+                    pass
+            # No more heads than entries; the oldest are the likeliest evicted
+            while len(self._heads) > len(entries):
+                self._heads.popitem(last=False)
+        return handle
+
+    def _forget(self, path: str) -> None:
+        size = self._entries.pop(path, None)
+        if size is not None:
+            self._bytes -= size
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            entries = self._load_index()
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": len(entries),
+                "bytes": self._bytes,
+                "maxBytes": self.max_bytes,
+            }
+
+
+upload_cache = UploadCache(os.path.join(settings.UPLOAD_DIR, "parsed"), settings.UPLOAD_CACHE_MAX_BYTES)
+register_cache("upload", upload_cache.stats)
@@ -0,0 +1,113 @@
+"""
+Latency check for screening deals by metric ranges.
+
+Seeds a scratch SQLite database with screening rows for one user (random
+metrics, about 1% of deals all-cash), then runs a set of screens, following
+each for a few pages, and times every page. The script exits non-zero if
+any page takes longer than the budget.
+
+Run from the backend directory:
+    python benchmarks/deal_screening.py [--deals 1000000] [--budget-ms 100]
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from app.core.database import Base
+from app.models.base import DealScreening
+from app.schemas.deal import MetricRange
+from app.services.screening import screen_deals
+
+PAGES = 3
+PAGE_SIZE = 50
+
+# (filters, sort, descending)
+SCREENS = (
+    ({"capRate": (7, None), "dscr": (1.25, None), "irr": (12, None), "units": (20, 200)}, "capRate", True),
+    ({"capRate": (7, None), "dscr": (1.25, None), "irr": (12, None), "units": (20, 200)}, "irr", False),
+    ({"capRate": (11, None), "irr": (20, None)}, "dscr", True),
+    ({"units": (100, 101)}, "capRate", True),
+    ({}, "noi", True),
+)
+
+
+def seed_rows(deals: int, seed: int = 0) -> list:
+    rng = np.random.default_rng(seed)
+    dscr = rng.normal(1.3, 0.3, deals)
+    dscr[rng.random(deals) < 0.01] = np.inf
+    columns = {
+        "deal_id": np.arange(1, deals + 1),
+        "user_id": np.zeros(deals, dtype=int),
+        "cap_rate": rng.normal(6.5, 1.5, deals),
+        "dscr": dscr,
+        "irr": rng.normal(11, 4, deals),
+        "cash_on_cash": rng.normal(7, 3, deals),
+        "equity_multiple": rng.normal(1.8, 0.4, deals),
+        "noi": rng.normal(500_000, 200_000, deals),
+        "purchase_price": rng.normal(8_000_000, 3_000_000, deals),
+        "number_of_units": rng.integers(1, 400, deals),
+    }
+    names = list(columns)
+    return [dict(zip(names, row)) for row in zip(*(columns[name].tolist() for name in names))]
+
+
+async def main(deals: int, budget_ms: float) -> int:
+    with tempfile.TemporaryDirectory() as directory:
+        engine = create_async_engine(f"sqlite+aiosqlite:///{os.path.join(directory, 'screening.db')}")
+        indexes = list(DealScreening.__table__.indexes)
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+            # Loading before indexing is much faster than maintaining the indexes row by row
+            for index in indexes:
+                await conn.run_sync(index.drop)
+        start = time.perf_counter()
+        rows = seed_rows(deals)
+        async with engine.begin() as conn:
+            for offset in range(0, len(rows), 50_000):
+                await conn.execute(insert(DealScreening), rows[offset:offset + 50_000])
+            for index in indexes:
+                await conn.run_sync(index.create)
+        print(f"Seeded {deals} deals in {time.perf_counter() - start:.1f}s")
+        sessions = async_sessionmaker(engine, expire_on_commit=False)
+
+        slow = 0
+        for filters, sort, descending in SCREENS:
+            ranges = {metric: MetricRange(min=low, max=high) for metric, (low, high) in filters.items()}
+            timings = []
+            cursor = None
+            async with sessions() as db:
+                for _ in range(PAGES):
+                    start = time.perf_counter()
+                    _, cursor = await screen_deals(db, ranges, sort, descending, cursor, PAGE_SIZE)
+                    timings.append((time.perf_counter() - start) * 1000)
+                    if cursor is None:
+                        break
+            slow += sum(elapsed > budget_ms for elapsed in timings)
+            order = f"{sort} {'desc' if descending else 'asc'}"
+            print(f"{','.join(filters) or '-':<26} {order:<18} " + " ".join(f"{elapsed:>7.1f}ms" for elapsed in timings))
+
+        await engine.dispose()
+
+    if slow:
+        print(f"FAIL: {slow} page(s) took longer than {budget_ms:g}ms")
+        return 1
+    print(f"OK: every page within {budget_ms:g}ms")
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--deals", type=int, default=1_000_000)
+    parser.add_argument("--budget-ms", type=float, default=100.0)
+    args = parser.parse_args()
+    sys.exit(asyncio.run(main(args.deals, args.budget_ms)))
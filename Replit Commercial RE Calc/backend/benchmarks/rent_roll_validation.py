@@ -0,0 +1,91 @@
+"""
+Validation-time benchmark: list-of-units rent roll vs columnar rent roll.
+
+Builds the same deal payload in both forms at several portfolio sizes and
+times DealInput validation plus the rent total, which is what every
+analyze call pays before any metrics are computed.
+
+Run from the backend directory:
+    python benchmarks/rent_roll_validation.py
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.schemas.deal import DealInput
+
+UNIT_COUNTS = (1_000, 5_000, 10_000, 20_000)
+REPEATS = 5
+
+
+def base_payload():
+    return {
+        "propertyName": "Benchmark Portfolio",
+        "propertyAddress": "1 Benchmark Way",
+        "propertyType": "Multifamily",
+        "purchasePrice": 250_000_000,
+        "closingCosts": 2_500_000,
+        "vacancyRate": 5,
+        "operatingExpenses": {
+            "propertyTax": 2_000_000, "insurance": 600_000, "utilities": 900_000,
+            "maintenance": 1_100_000, "management": 1_400_000, "other": 300_000,
+        },
+        "capexBudget": 1_000_000,
+        "loanTerms": {
+            "loanAmount": 0, "interestRate": 6.5, "ltv": 70, "amortizationPeriod": 30,
+            "isInterestOnly": False, "interestOnlyMonths": 0, "monthlyPayment": 0,
+        },
+        "exitAssumptions": {"holdPeriod": 5, "exitCapRate": 5.5, "annualAppreciation": 3},
+    }
+
+
+def list_payload(units: int):
+    payload = base_payload()
+    payload["numberOfUnits"] = units
+    payload["rentRoll"] = [
+        {
+            "unitNumber": str(i), "unitType": "2BR", "bedrooms": 2, "bathrooms": 1,
+            "squareFootage": 900.0, "monthlyRent": 1500.0 + i % 300, "occupied": i % 20 != 0,
+        }
+        for i in range(units)
+    ]
+    return payload
+
+
+def columnar_payload(units: int):
+    payload = base_payload()
+    payload["numberOfUnits"] = units
+    payload["rentRollColumns"] = {
+        "unitNumber": [str(i) for i in range(units)],
+        "unitType": ["2BR"] * units,
+        "bedrooms": [2] * units,
+        "bathrooms": [1] * units,
+        "squareFootage": [900.0] * units,
+        "monthlyRent": [1500.0 + i % 300 for i in range(units)],
+        "occupied": [i % 20 != 0 for i in range(units)],
+    }
+    return payload
+
+
+def best_time(payload) -> float:
+    best = float("inf")
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        DealInput.model_validate(payload).total_monthly_rent()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    print(f"{'units':>8} {'list (ms)':>12} {'columnar (ms)':>14} {'speedup':>9}")
+    for units in UNIT_COUNTS:
+        as_list = best_time(list_payload(units))
+        as_columns = best_time(columnar_payload(units))
+        print(f"{units:>8} {as_list * 1000:>12.2f} {as_columns * 1000:>14.2f} {as_list / as_columns:>8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
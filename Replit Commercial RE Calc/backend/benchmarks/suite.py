@@ -0,0 +1,296 @@
+"""
+Benchmark suite for the calculation, API and parsing hot paths.
+
+Times, on synthetic deals, rent rolls and T12s of 10, 1k and 100k units
+(benchmarks/synthetic.py):
+
+- calculate_financial_metrics, grade_metric and generate_ai_analysis
+- POST /api/analyze-deal through the ASGI app in process, CONCURRENCY
+  requests at a time: once with a different deal every request, so every
+  one is computed, and once with the same deal, so all but the first are
+  answered from the analysis cache
+- the rent roll CSV parsers (whole file to units, streamed to columns) and
+  the T12 PDF extraction
+
+Each benchmark is repeated until it has run for MIN_TIME seconds (and at
+least MIN_RUNS times), and its median seconds per call is what counts. The
+results are written as JSON and compared with a baseline from an earlier
+run; the script exits non-zero if any benchmark's median is more than the
+threshold slower than the baseline's. Timings only compare on the same
+machine, so keep the baseline next to where the suite runs rather than in
+version control, and save a new one after an intended slowdown.
+
+The other scripts in benchmarks/ check specific budgets (statement counts,
+screening latency, model fallback) and pass or fail on their own.
+
+Run from the backend directory:
+    python benchmarks/suite.py [--sizes 10,1000] [--only parse] [--threshold 0.25]
+    python benchmarks/suite.py --save-baseline
+"""
+
+import argparse
+import asyncio
+import io
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+import timeit
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+import numpy as np
+
+from app.core.config import settings
+from app.main_simple import app, calculate_financial_metrics
+from app.schemas.deal import DealInput
+from app.services.analysis_cache import analysis_cache
+from app.services import file_parser
+from app.services.file_parser import FileParser, stream_rent_roll_csv
+from app.services.grading import generate_ai_analysis, grade_metric
+from app.services.t12_parser import extract_t12
+from app.services.upload_cache import UploadCache
+
+from synthetic import UNIT_COUNTS, deal_payload, rent_roll_csv, t12_pdf
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_OUTPUT = os.path.join(BENCHMARK_DIR, "results.json")
+DEFAULT_BASELINE = os.path.join(BENCHMARK_DIR, "baseline.json")
+
+# Seconds each benchmark is repeated for, and the fewest repeats
+MIN_TIME = 1.0
+MIN_RUNS = 3
+
+# Share a median may grow by over the baseline before it counts as a regression
+DEFAULT_THRESHOLD = 0.25
+
+# Requests in flight at once against the in-process API, and the most sent per round; rounds of
+# large deals are cut to about API_ROUND_UNITS units in all
+CONCURRENCY = 8
+API_ROUND_REQUESTS = 200
+API_ROUND_UNITS = 200_000
+
+# (metric, value) pairs graded by the grade_metric benchmark, one of each metric type
+GRADE_CASES = (
+    ("cap_rate", 6.8), ("cash_on_cash", 9.5), ("dscr", 1.32),
+    ("irr", 14.2), ("equity_multiple", 1.9), ("noi_per_unit", 1_200_000),
+)
+
+Result = Dict[str, Any]
+
+
+def summarize(seconds: List[float], **extra) -> Result:
+    return {
+        "median": statistics.median(seconds),
+        "min": min(seconds),
+        "max": max(seconds),
+        "runs": len(seconds),
+        **extra,
+    }
+
+
+def time_calls(call: Callable[[], Any], per_call: int = 1) -> Result:
+    """Seconds per call, over runs of as many calls as timeit's autorange fits in a fifth of a second"""
+    timer = timeit.Timer(call)
+    # Calibrating doubles as the warm-up
+    number, _ = timer.autorange()
+    seconds = []
+    started = time.perf_counter()
+    while len(seconds) < MIN_RUNS or time.perf_counter() - started < MIN_TIME:
+        seconds.append(timer.timeit(number) / number / per_call)
+    return summarize(seconds, calls=number * per_call)
+
+
+def bench_calculate_financial_metrics(units: int) -> Result:
+    deal_input = DealInput.model_validate(deal_payload(units))
+    return time_calls(lambda: calculate_financial_metrics(deal_input))
+
+
+def bench_grade_metric() -> Result:
+    def grade_all():
+        for metric, value in GRADE_CASES:
+            grade_metric(metric, value, 100)
+
+    return time_calls(grade_all, per_call=len(GRADE_CASES))
+
+
+def bench_generate_ai_analysis(units: int) -> Result:
+    deal_input = DealInput.model_validate(deal_payload(units))
+    metrics = calculate_financial_metrics(deal_input)
+    return time_calls(lambda: generate_ai_analysis(deal_input, metrics))
+
+
+def bench_parse_rent_roll_csv(units: int) -> Result:
+    content = rent_roll_csv(units)
+    return time_calls(lambda: FileParser()._load_csv_rent_roll(content).to_units())
+
+
+def bench_parse_rent_roll_csv_stream(units: int) -> Result:
+    content = rent_roll_csv(units)
+    return time_calls(lambda: stream_rent_roll_csv(io.BytesIO(content)).to_columns())
+
+
+def bench_parse_t12(units: int, loop: asyncio.AbstractEventLoop) -> Result:
+    content = t12_pdf(units)
+    return time_calls(lambda: loop.run_until_complete(extract_t12(content)))
+
+
+async def _post_all(client: httpx.AsyncClient, bodies: List[bytes]) -> List[float]:
+    """Seconds each request took, CONCURRENCY at a time"""
+    slots = asyncio.Semaphore(CONCURRENCY)
+    headers = {"content-type": "application/json"}
+
+    async def post(body: bytes) -> float:
+        async with slots:
+            start = time.perf_counter()
+            response = await client.post("/api/analyze-deal", content=body, headers=headers)
+            elapsed = time.perf_counter() - start
+        if response.status_code != 200:
+            raise RuntimeError(f"/api/analyze-deal answered {response.status_code}: {response.text[:200]}")
+        return elapsed
+
+    return await asyncio.gather(*(post(body) for body in bodies))
+
+
+async def _bench_analyze_deal(units: int, cached: bool) -> Result:
+    # Every request gets its own purchase price unless the cache is what is measured
+    template = json.dumps({**deal_payload(units), "purchasePrice": "PRICE"})
+    base_price = units * 160_000
+    requests_per_round = max(CONCURRENCY, min(API_ROUND_REQUESTS, API_ROUND_UNITS // units))
+    sent = 0
+
+    def bodies(count: int) -> List[bytes]:
+        nonlocal sent
+        prices = [base_price] * count if cached else range(base_price + sent, base_price + sent + count)
+        sent += count
+        return [template.replace('"PRICE"', str(price)).encode() for price in prices]
+
+    analysis_cache.clear()
+    latencies = []
+    async with httpx.AsyncClient(app=app, base_url="http://benchmark") as client:
+        await _post_all(client, bodies(CONCURRENCY))
+        started = time.perf_counter()
+        rounds = 0
+        while rounds < MIN_RUNS or time.perf_counter() - started < MIN_TIME:
+            latencies.extend(await _post_all(client, bodies(requests_per_round)))
+            rounds += 1
+        elapsed = time.perf_counter() - started
+    return summarize(
+        latencies,
+        p95=float(np.percentile(latencies, 95)),
+        requestsPerSecond=len(latencies) / elapsed,
+        concurrency=CONCURRENCY,
+    )
+
+
+def benchmarks(sizes, loop: asyncio.AbstractEventLoop) -> Dict[str, Callable[[], Result]]:
+    """Benchmark name -> function running it"""
+    suite = {"grade_metric": bench_grade_metric}
+    for units in sizes:
+        suite[f"calculate_financial_metrics[{units}]"] = lambda units=units: bench_calculate_financial_metrics(units)
+        suite[f"generate_ai_analysis[{units}]"] = lambda units=units: bench_generate_ai_analysis(units)
+        for cached in (False, True):
+            name = f"api_analyze_deal_{'cached' if cached else 'computed'}[{units}]"
+            suite[name] = lambda units=units, cached=cached: loop.run_until_complete(
+                _bench_analyze_deal(units, cached)
+            )
+        suite[f"parse_rent_roll_csv[{units}]"] = lambda units=units: bench_parse_rent_roll_csv(units)
+        suite[f"parse_rent_roll_csv_stream[{units}]"] = lambda units=units: bench_parse_rent_roll_csv_stream(units)
+        suite[f"parse_t12[{units}]"] = lambda units=units: bench_parse_t12(units, loop)
+    return suite
+
+
+def environment() -> Dict[str, Any]:
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+        "numpy": np.__version__,
+    }
+
+
+def compare(results: Result, baseline: Result, threshold: float) -> List[str]:
+    """Print each benchmark against the baseline; returns the names of those that regressed"""
+    if baseline.get("environment") != results["environment"]:
+        print("Note: the baseline was recorded in a different environment; timings may not compare")
+    regressions = []
+    print(f"\n{'benchmark':<44} {'baseline ms':>12} {'now ms':>10} {'change':>8}")
+    for name, result in results["benchmarks"].items():
+        before = baseline.get("benchmarks", {}).get(name)
+        if before is None:
+            print(f"{name:<44} {'-':>12} {result['median'] * 1000:>10.3f}      new")
+            continue
+        change = result["median"] / before["median"] - 1
+        regressed = change > threshold
+        if regressed:
+            regressions.append(name)
+        print(
+            f"{name:<44} {before['median'] * 1000:>12.3f} {result['median'] * 1000:>10.3f} {change:>+8.0%}"
+            + ("  REGRESSION" if regressed else "")
+        )
+    return regressions
+
+
+def main(sizes, only: Optional[str], output: str, baseline_path: str, threshold: float, save_baseline: bool) -> int:
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    results = {
+        "createdAt": datetime.now(timezone.utc).isoformat(),
+        "environment": environment(),
+        "benchmarks": {},
+    }
+    print(f"{'benchmark':<44} {'median ms':>10} {'min ms':>10} {'calls':>7}")
+    # Parser scratch files and parsed uploads go to a temporary directory, not the app's UPLOAD_DIR
+    with tempfile.TemporaryDirectory(prefix="benchmark-uploads-") as uploads:
+        settings.UPLOAD_DIR = uploads
+        file_parser.upload_cache = UploadCache(os.path.join(uploads, "parsed"), settings.UPLOAD_CACHE_MAX_BYTES)
+        for name, run in benchmarks(sizes, loop).items():
+            if only and only not in name:
+                continue
+            result = run()
+            results["benchmarks"][name] = result
+            print(f"{name:<44} {result['median'] * 1000:>10.3f} {result['min'] * 1000:>10.3f} "
+                  f"{result.get('calls', result['runs']):>7}"
+                  + (f"  {result['requestsPerSecond']:.0f} req/s" if "requestsPerSecond" in result else ""))
+    loop.close()
+
+    with open(output, "w") as handle:
+        json.dump(results, handle, indent=2)
+    print(f"\nResults written to {output}")
+
+    if save_baseline:
+        with open(baseline_path, "w") as handle:
+            json.dump(results, handle, indent=2)
+        print(f"Saved as the baseline, {baseline_path}")
+        return 0
+    if not os.path.exists(baseline_path):
+        print(f"No baseline at {baseline_path}; run with --save-baseline to record one")
+        return 0
+    with open(baseline_path) as handle:
+        regressions = compare(results, json.load(handle), threshold)
+    if regressions:
+        print(f"FAIL: {len(regressions)} benchmark(s) more than {threshold:.0%} slower than the baseline")
+        return 1
+    print(f"OK: no benchmark more than {threshold:.0%} slower than the baseline")
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", default=",".join(map(str, UNIT_COUNTS)), help="unit counts, comma separated")
+    parser.add_argument("--only", help="run only benchmarks whose name contains this")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT)
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="slowdown over the baseline that fails the run, as a share (0.25 is 25%%)")
+    parser.add_argument("--save-baseline", action="store_true", help="record this run as the baseline")
+    args = parser.parse_args()
+    sizes = [int(size) for size in args.sizes.split(",")]
+    sys.exit(main(sizes, args.only, args.output, args.baseline, args.threshold, args.save_baseline))
@@ -0,0 +1,159 @@
+"""
+Synthetic inputs for the benchmarks, sized by unit count.
+
+Every generator is seeded, so a size always produces the same deal, rent
+roll or T12, and timings from different runs compare like with like.
+"""
+
+import random
+from typing import Any, Dict, List
+
+UNIT_COUNTS = (10, 1_000, 100_000)
+
+# Deals with more units than this send their rent roll columnar, as large portfolios do
+COLUMNAR_FROM = 10_000
+
+# A synthetic T12 has one statement page per property of this many units, up to T12_MAX_PAGES
+# pages; larger portfolios get larger properties
+UNITS_PER_T12_PAGE = 250
+T12_MAX_PAGES = 40
+
+UNIT_TYPES = (("Studio", 0, 1, 450.0, 1100.0), ("1BR", 1, 1, 650.0, 1350.0), ("2BR", 2, 1, 900.0, 1700.0),
+              ("2BR", 2, 2, 1050.0, 1900.0), ("3BR", 3, 2, 1250.0, 2300.0))
+
+
+def rent_roll_rows(units: int, seed: int = 0) -> List[Dict[str, Any]]:
+    rng = random.Random(seed)
+    rows = []
+    for i in range(units):
+        unit_type, bedrooms, bathrooms, square_footage, rent = rng.choice(UNIT_TYPES)
+        rows.append({
+            "unitNumber": f"{100 + i // 40}-{i % 40 + 1}",
+            "unitType": unit_type,
+            "bedrooms": bedrooms,
+            "bathrooms": bathrooms,
+            "squareFootage": square_footage,
+            "monthlyRent": round(rent * rng.uniform(0.9, 1.15), 2),
+            "occupied": rng.random() > 0.06,
+        })
+    return rows
+
+
+def deal_payload(units: int, seed: int = 0) -> Dict[str, Any]:
+    """A POST /api/analyze-deal body for a multifamily deal of this many units"""
+    rows = rent_roll_rows(units, seed)
+    payload = {
+        "propertyName": f"Synthetic {units} Units",
+        "propertyAddress": "1 Benchmark Way",
+        "propertyType": "Multifamily",
+        "purchasePrice": units * 160_000.0,
+        "numberOfUnits": units,
+        "closingCosts": units * 3_000.0,
+        "vacancyRate": 5,
+        "operatingExpenses": {
+            "propertyTax": units * 1_900.0, "insurance": units * 550.0, "utilities": units * 800.0,
+            "maintenance": units * 950.0, "management": units * 700.0, "other": units * 250.0,
+        },
+        "capexBudget": units * 2_000.0,
+        "loanTerms": {
+            "loanAmount": 0, "interestRate": 6.5, "ltv": 70, "amortizationPeriod": 30,
+            "isInterestOnly": False, "interestOnlyMonths": 0, "monthlyPayment": 0,
+        },
+        "exitAssumptions": {"holdPeriod": 5, "exitCapRate": 5.75, "annualAppreciation": 3},
+    }
+    if units > COLUMNAR_FROM:
+        payload["rentRollColumns"] = {field: [row[field] for row in rows] for field in rows[0]}
+    else:
+        payload["rentRoll"] = rows
+    return payload
+
+
+def rent_roll_csv(units: int, seed: int = 0) -> bytes:
+    """A rent roll export as property management software writes it"""
+    lines = ["Unit,Unit Type,Beds,Baths,Sq Ft,Market Rent,Status"]
+    for row in rent_roll_rows(units, seed):
+        lines.append(
+            f"{row['unitNumber']},{row['unitType']},{row['bedrooms']},{row['bathrooms']},"
+            f"{row['squareFootage']:.0f},\"${row['monthlyRent']:,.2f}\",{'Occupied' if row['occupied'] else 'Vacant'}"
+        )
+    return ("\n".join(lines) + "\n").encode()
+
+
+# (label, annual amount per unit); None starts a section
+T12_LINE_ITEMS = (
+    ("Income", None),
+    ("Gross Potential Rent", 19_800.0),
+    ("Vacancy Loss", -990.0),
+    ("Concessions", -180.0),
+    ("Parking Income", 240.0),
+    ("Laundry Income", 90.0),
+    ("Total Income", 18_960.0),
+    ("Operating Expenses", None),
+    ("Real Estate Taxes", 1_900.0),
+    ("Property Insurance", 550.0),
+    ("Electric", 320.0),
+    ("Water & Sewer", 480.0),
+    ("Repairs & Maintenance", 700.0),
+    ("Make Ready", 250.0),
+    ("Property Management Fee", 700.0),
+    ("Payroll", 900.0),
+    ("Marketing", 120.0),
+    ("Total Operating Expenses", 5_920.0),
+    ("Net Operating Income", 13_040.0),
+)
+
+
+def _t12_page_lines(property_number: int, units: int) -> List[str]:
+    lines = [
+        f"Synthetic Property {property_number} - Operating Statement",
+        "Trailing 12 Months",
+        "Jan Feb Mar Apr May Jun Jul Aug Sep Oct Nov Dec Total",
+    ]
+    for label, per_unit in T12_LINE_ITEMS:
+        if per_unit is None:
+            lines.append(label)
+            continue
+        month = round(per_unit * units / 12)
+        amount = f"({abs(month):,})" if month < 0 else f"{month:,}"
+        total = f"({abs(month * 12):,})" if month < 0 else f"{month * 12:,}"
+        lines.append(" ".join([label] + [amount] * 12 + [total]))
+    return lines
+
+
+def _pdf_text(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def pdf(pages: List[List[str]]) -> bytes:
+    """A minimal PDF with one page of plain text lines per entry; enough for pdfplumber"""
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>", None, b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    for lines in pages:
+        stream = "BT /F1 7 Tf 9 TL 24 760 Td " + " ".join(f"({_pdf_text(line)}) '" for line in lines) + " ET"
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream".encode())
+        objects.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Resources << /Font << /F1 3 0 R >> >> "
+            f"/Contents {len(objects)} 0 R >>".encode()
+        )
+        kids.append(f"{len(objects)} 0 R")
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {len(kids)} >>".encode()
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += f"{number} 0 obj\n".encode() + body + b"\nendobj\n"
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    out += "".join(f"{offset:010d} 00000 n \n" for offset in offsets).encode()
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+    return bytes(out)
+
+
+def t12_pdf(units: int) -> bytes:
+    """A portfolio T12: one operating statement page per property"""
+    properties = min(-(-units // UNITS_PER_T12_PAGE), T12_MAX_PAGES)
+    return pdf([
+        _t12_page_lines(number + 1, units // properties + (number < units % properties))
+        for number in range(properties)
+    ])
@@ -0,0 +1,34 @@
+"""
+Rebuild every user's portfolio totals from the stored deals and analyses.
+
+portfolio_aggregates is maintained incrementally as deals and analyses are
+saved; run this after adding the table to an existing database, after
+writing deals outside DealService, or to clear accumulated rounding drift.
+
+Run from the backend directory:
+    python scripts/rebuild_portfolios.py
+"""
+
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app.models.base  # noqa: F401  (registers every model)
+from app.core.database import get_async_engine, get_async_session_factory
+from app.services.portfolio import rebuild_portfolios
+
+
+async def main() -> int:
+    start = time.perf_counter()
+    async with get_async_session_factory()() as db:
+        portfolios = await rebuild_portfolios(db)
+    await get_async_engine().dispose()
+    print(f"Rebuilt {portfolios} portfolio(s) in {time.perf_counter() - start:.2f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
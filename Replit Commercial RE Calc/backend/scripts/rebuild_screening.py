@@ -0,0 +1,34 @@
+"""
+Rebuild the deal screening table from the stored analyses.
+
+deal_screening is written whenever an analysis is stored; run this after
+adding the table to an existing database, or after writing analyses outside
+app.services.analysis_snapshots.
+
+Run from the backend directory:
+    python scripts/rebuild_screening.py
+"""
+
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app.models.base  # noqa: F401  (registers every model)
+from app.core.database import get_async_engine, get_async_session_factory
+from app.services.screening import rebuild_screening
+
+
+async def main() -> int:
+    start = time.perf_counter()
+    async with get_async_session_factory()() as db:
+        indexed = await rebuild_screening(db)
+    await get_async_engine().dispose()
+    print(f"Indexed {indexed} deal(s) in {time.perf_counter() - start:.2f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,70 @@
+import os
+import sys
+
+import httpx
+import pytest
+import pytest_asyncio
+from fastapi import APIRouter, FastAPI
+
+# Import the backend as the `app` package, as main_simple.py and uvicorn do
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine  # noqa: E402
+
+from app.api.routes import files  # noqa: E402
+from app.core.config import settings  # noqa: E402
+from app.core.database import Base, get_async_db  # noqa: E402
+import app.models.base  # noqa: E402,F401  registers every model with Base
+from app.services import file_parser, jobs  # noqa: E402
+from app.services.upload_cache import UploadCache  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def upload_dir(tmp_path, monkeypatch):
+    """UPLOAD_DIR, job uploads and the parsed-upload cache under tmp_path, so no test writes to the real uploads/"""
+    uploads = tmp_path / "uploads"
+    uploads.mkdir()
+    cache = UploadCache(str(uploads / "parsed"), settings.UPLOAD_CACHE_MAX_BYTES)
+    monkeypatch.setattr(settings, "UPLOAD_DIR", str(uploads))
+    monkeypatch.setattr(jobs, "JOB_UPLOAD_DIR", str(uploads / "jobs"))
+    monkeypatch.setattr(file_parser, "upload_cache", cache)
+    monkeypatch.setattr(files, "upload_cache", cache)
+    monkeypatch.setattr(jobs, "upload_cache", cache)
+    return uploads
+
+
+@pytest_asyncio.fixture
+async def engine(tmp_path):
+    """An async engine on a scratch SQLite file with every table created"""
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'test.db'}")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    yield engine
+    await engine.dispose()
+
+
+@pytest_asyncio.fixture
+async def sessions(engine):
+    """Session factory on the scratch database, configured like get_async_session_factory"""
+    return async_sessionmaker(engine, autoflush=False, expire_on_commit=False)
+
+
+@pytest_asyncio.fixture
+async def router_client(sessions):
+    """Factory for an HTTP client on an app serving one router, with get_async_db on the scratch database"""
+    clients = []
+
+    async def db():
+        async with sessions() as session:
+            yield session
+
+    def client(router: APIRouter, prefix: str = "") -> httpx.AsyncClient:
+        app = FastAPI()
+        app.include_router(router, prefix=prefix)
+        app.dependency_overrides[get_async_db] = db
+        clients.append(httpx.AsyncClient(app=app, base_url="http://test"))
+        return clients[-1]
+
+    yield client
+    for client in clients:
+        await client.aclose()
@@ -0,0 +1,55 @@
+"""Deal payloads shared by the test modules, as JSON request bodies"""
+
+
+def deal(**overrides) -> dict:
+    """A levered 16-unit multifamily deal; dict overrides are merged into the defaults"""
+    payload = {
+        "propertyType": "Multifamily",
+        "purchasePrice": 2_400_000,
+        "numberOfUnits": 16,
+        "rentRoll": [
+            {
+                "unitNumber": str(100 + i),
+                "unitType": "2BR",
+                "bedrooms": 2,
+                "bathrooms": 1,
+                "squareFootage": 900,
+                "monthlyRent": 1_450 + 25 * i,
+                "occupied": i % 7 != 0,
+            }
+            for i in range(16)
+        ],
+        "vacancyRate": 5,
+        "operatingExpenses": {"propertyTax": 30_000, "insurance": 9_000, "maintenance": 14_000},
+        "capexBudget": 40_000,
+        "loanTerms": {"ltv": 70, "interestRate": 6.5, "amortizationPeriod": 30},
+        "exitAssumptions": {"holdPeriod": 5, "exitCapRate": 6.0, "annualAppreciation": 3},
+    }
+    for key, value in overrides.items():
+        if isinstance(value, dict) and isinstance(payload.get(key), dict):
+            payload[key] = {**payload[key], **value}
+        else:
+            payload[key] = value
+    return payload
+
+
+DEALS = {
+    "levered": deal(),
+    "all cash": deal(loanTerms={"ltv": 0}),
+    "no rent roll": deal(rentRoll=[]),
+    "no expenses": deal(operatingExpenses={"propertyTax": 0, "insurance": 0, "maintenance": 0}),
+    "interest only": deal(loanTerms={"isInterestOnly": True}),
+    "interest only past the hold": deal(loanTerms={"interestOnlyMonths": 84}),
+    "given loan": deal(loanTerms={"loanAmount": 1_500_000, "monthlyPayment": 9_800}),
+    "default hold": deal(exitAssumptions={"holdPeriod": 0, "exitCapRate": 0}),
+    "fractional hold": deal(exitAssumptions={"holdPeriod": 3.5, "discountRate": 8}),
+    "columnar rent roll": deal(
+        rentRoll=[],
+        rentRollColumns={
+            "unitNumber": ["1", "2"], "unitType": ["1BR", "1BR"], "bedrooms": [1, 1], "bathrooms": [1, 1],
+            "squareFootage": [650, 650], "monthlyRent": [1_200, 1_250], "occupied": [True, False],
+        },
+        numberOfUnits=2,
+        purchasePrice=300_000,
+    ),
+}
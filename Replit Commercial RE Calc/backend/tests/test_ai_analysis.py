@@ -0,0 +1,223 @@
+import asyncio
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from app.api.routes import analysis
+from app.core.config import settings
+from app.schemas.deal import DealInput, FinancialMetrics
+from app.services import ai_analysis
+from app.services.ai_analysis import AIAnalyzer, ai_analysis_cache, ai_analysis_stats
+
+STUB_SUMMARY = "Stub model analysis"
+
+TIMEOUT = 0.3
+
+# Seconds an analysis may run past the timeout; the stub shares the process, and the GIL
+MARGIN = 0.25
+
+
+class StubModel(ThreadingHTTPServer):
+    """Local stand-in for the OpenAI chat completions endpoint, answering after latency seconds"""
+
+    daemon_threads = True
+    request_queue_size = 256
+
+    def __init__(self, latency: float = 0.0, error_rate: float = 0.0):
+        super().__init__(("127.0.0.1", 0), StubHandler)
+        self.latency = latency
+        self.error_rate = error_rate
+        self.calls = 0
+        self.lock = threading.Lock()
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    server: StubModel
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("content-length", 0)))
+        with self.server.lock:
+            self.server.calls += 1
+        time.sleep(self.server.latency)
+        if random.random() < self.server.error_rate:
+            self._reply(500, {"error": {"message": "stub failure", "type": "server_error"}})
+            return
+        content = json.dumps({"summary": STUB_SUMMARY, "redFlags": [], "recommendations": ["Verify the rent roll"]})
+        self._reply(200, {
+            "id": "stub", "object": "chat.completion", "created": int(time.time()), "model": "stub",
+            "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": content}}],
+        })
+
+    def _reply(self, status: int, body: dict):
+        payload = json.dumps(body).encode()
+        try:
+            self.send_response(status)
+            self.send_header("content-type", "application/json")
+            self.send_header("content-length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+        except (BrokenPipeError, ConnectionResetError):
+            # The analyzer timed out and hung up
+            pass
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def stub_model(monkeypatch):
+    """Start a stub model and point the analyzer at it, with fresh analyzer state"""
+    stubs = []
+
+    def start(latency: float = 0.0, error_rate: float = 0.0, retry_after: float = 0.0) -> StubModel:
+        stub = StubModel(latency, error_rate)
+        threading.Thread(target=stub.serve_forever, daemon=True).start()
+        stubs.append(stub)
+        monkeypatch.setattr(settings, "OPENAI_BASE_URL", f"http://127.0.0.1:{stub.server_address[1]}/v1")
+        monkeypatch.setattr(settings, "AI_ANALYSIS_TIMEOUT", TIMEOUT)
+        monkeypatch.setattr(settings, "AI_ANALYSIS_RETRY_AFTER", retry_after)
+        monkeypatch.setattr(ai_analysis, "_retry_at", 0.0)
+        monkeypatch.setattr(ai_analysis, "_peak_in_flight", 0)
+        monkeypatch.setattr(ai_analysis, "_counts", ai_analysis.Counter())
+        ai_analysis_cache.clear()
+        ai_analysis._clients.clear()
+        return stub
+
+    yield start
+    for stub in stubs:
+        stub.shutdown()
+        stub.server_close()
+
+
+def deal(rng: random.Random):
+    deal_input = DealInput.model_validate({
+        "propertyType": rng.choice(["Multifamily", "Office", "Retail"]),
+        "purchasePrice": 5_000_000,
+        "numberOfUnits": rng.randint(10, 300),
+        "vacancyRate": 5,
+        "operatingExpenses": {},
+        "capexBudget": 0,
+        "loanTerms": {},
+        "exitAssumptions": {},
+    })
+    metrics = FinancialMetrics(
+        noi=rng.uniform(200_000, 600_000), goingInCapRate=rng.uniform(4, 10), reversionCapRate=6.5,
+        cashOnCashReturn=rng.uniform(2, 14), stabilizedCashOnCash=8, irr=rng.uniform(5, 20),
+        equityMultiple=rng.uniform(1.2, 2.8), breakEvenOccupancy=rng.uniform(60, 95), dscr=rng.uniform(1.0, 2.0),
+        exitSalePrice=6_000_000, totalReturn=50, annualCashFlow=100_000, exitValue=6_000_000,
+    )
+    return deal_input, metrics
+
+
+async def timed_analysis(delay: float, deal_input: DealInput, metrics: FinancialMetrics):
+    await asyncio.sleep(delay)
+    start = time.perf_counter()
+    result = await AIAnalyzer().analyze_deal(deal_input, metrics)
+    return time.perf_counter() - start, result.summary == STUB_SUMMARY
+
+
+async def analyze_stream(deals: int = 40, rate: float = 40.0) -> list:
+    """Analyze deals arriving at rate per second; (seconds taken, answered by the model) for each"""
+    # Creating the client loads CA certificates, which blocks the loop for a moment; not what is timed here
+    ai_analysis._client()
+    rng = random.Random(0)
+    results = await asyncio.gather(*(timed_analysis(i / rate, *deal(rng)) for i in range(deals)))
+    # Abandoned calls hold their slots until they wind down
+    while ai_analysis_stats()["inFlight"]:
+        await asyncio.sleep(0.01)
+    return results
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("latency, error_rate, answered", [
+    # (latency as a multiple of the timeout, share of calls failing, share answered by the model)
+    (0.1, 0.0, 1.0),
+    (3.0, 0.0, 0.0),
+    (0.0, 1.0, 0.0),
+], ids=["healthy", "slow", "failing"])
+async def test_every_analysis_returns_within_the_timeout(stub_model, latency, error_rate, answered):
+    stub_model(latency * TIMEOUT, error_rate)
+
+    results = await analyze_stream()
+
+    assert max(elapsed for elapsed, _ in results) <= TIMEOUT + MARGIN
+    assert sum(by_model for _, by_model in results) == answered * len(results)
+    assert ai_analysis_stats()["peakInFlight"] <= settings.AI_ANALYSIS_MAX_CONCURRENCY
+
+
+@pytest.mark.asyncio
+async def test_flaky_model_falls_back_for_failed_calls_only(stub_model):
+    stub_model(0.1 * TIMEOUT, error_rate=0.3)
+
+    results = await analyze_stream()
+
+    stats = ai_analysis_stats()
+    assert 0 < sum(by_model for _, by_model in results) < len(results)
+    assert stats["errors"] > 0
+    assert stats["rules"] == stats["errors"] + stats["busy"]
+
+
+@pytest.mark.asyncio
+async def test_concurrency_limit_holds_under_load(stub_model, monkeypatch):
+    monkeypatch.setattr(settings, "AI_ANALYSIS_MAX_CONCURRENCY", 3)
+    stub_model(0.5 * TIMEOUT)
+
+    results = await analyze_stream(deals=30, rate=1000.0)
+
+    stats = ai_analysis_stats()
+    assert stats["peakInFlight"] == 3
+    # Deals queued behind full slots are answered by the rules in time
+    assert stats["busy"] > 0
+    assert max(elapsed for elapsed, _ in results) <= TIMEOUT + MARGIN
+
+
+@pytest.mark.asyncio
+async def test_model_call_timeout_skips_the_model_for_a_while(stub_model):
+    stub = stub_model(latency=3 * TIMEOUT, retry_after=60.0)
+    deal_input, metrics = deal(random.Random(1))
+
+    first = await AIAnalyzer().analyze_deal(deal_input, metrics)
+    second = await AIAnalyzer().analyze_deal(deal_input, metrics)
+
+    assert first.summary != STUB_SUMMARY and second.summary != STUB_SUMMARY
+    assert stub.calls == 1
+    stats = ai_analysis_stats()
+    assert stats["timeouts"] == 1
+    assert stats["modelSkippedFor"] > 0
+
+
+@pytest.mark.asyncio
+async def test_waiting_for_a_slot_does_not_skip_the_model(stub_model):
+    stub = stub_model(retry_after=60.0)
+    deal_input, metrics = deal(random.Random(2))
+
+    # Every slot taken for longer than the timeout
+    slots = ai_analysis._client().slots
+    for _ in range(settings.AI_ANALYSIS_MAX_CONCURRENCY):
+        await slots.acquire()
+    busy = await AIAnalyzer().analyze_deal(deal_input, metrics)
+    for _ in range(settings.AI_ANALYSIS_MAX_CONCURRENCY):
+        slots.release()
+    answered = await AIAnalyzer().analyze_deal(deal_input, metrics)
+
+    assert busy.summary != STUB_SUMMARY
+    assert answered.summary == STUB_SUMMARY
+    stats = ai_analysis_stats()
+    assert (stats["busy"], stats["timeouts"], stats["modelSkippedFor"]) == (1, 0, 0.0)
+    assert stub.calls == 1
+
+
+@pytest.mark.asyncio
+async def test_stats_endpoint(stub_model, router_client):
+    stub_model()
+    client = router_client(analysis.router, "/analysis")
+    await AIAnalyzer().analyze_deal(*deal(random.Random(3)))
+
+    response = await client.get("/analysis/ai-analysis/stats")
+
+    assert response.status_code == 200
+    assert response.json()["model"] == 1
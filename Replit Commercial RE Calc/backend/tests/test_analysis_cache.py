@@ -0,0 +1,103 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from app.main_simple import app
+from app.services import analysis_cache as analysis_cache_module
+from app.services.analysis_cache import TTLCache, analysis_cache, entry_bytes
+from deals import deal
+
+
+class Clock:
+    """A stand-in for time.monotonic that only moves when told to"""
+
+    def __init__(self):
+        self.now = 1_000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(analysis_cache_module.time, "monotonic", clock)
+    return clock
+
+
+def test_matching_if_none_match_is_answered_with_304_before_any_lookup():
+    analysis_cache.clear()
+    client = TestClient(app)
+    first = client.post("/api/analyze-deal", json=deal())
+    etag = first.headers["etag"]
+    before = analysis_cache.stats()
+
+    for header in (etag, f"W/{etag}", f'"other", {etag}', "*"):
+        response = client.post("/api/analyze-deal", json=deal(), headers={"If-None-Match": header})
+        assert response.status_code == 304, header
+        assert response.headers["etag"] == etag and not response.content
+
+    after = analysis_cache.stats()
+    assert after["notModified"] - before["notModified"] == 4
+    assert (after["hits"], after["misses"]) == (before["hits"], before["misses"])
+
+    # A stale ETag gets the full body, from the cache
+    response = client.post("/api/analyze-deal", json=deal(), headers={"If-None-Match": '"stale"'})
+    assert response.status_code == 200 and response.content == first.content
+    assert analysis_cache.stats()["hits"] == after["hits"] + 1
+
+
+def test_entries_expire_after_the_ttl(clock):
+    cache = TTLCache(max_size=10, ttl=60)
+    cache.put("a", 1)
+
+    clock.now += 59.9
+    assert cache.get("a") == 1
+    clock.now += 0.1
+    assert cache.get("a") is None
+
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["expirations"], stats["size"]) == (1, 1, 1, 0)
+
+
+def test_least_recently_used_entry_is_evicted_first():
+    cache = TTLCache(max_size=3, ttl=60)
+    for key in "abc":
+        cache.put(key, key)
+    cache.get("a")
+
+    cache.put("d", "d")
+
+    assert cache.get("b") is None
+    assert [cache.get(key) for key in "acd"] == ["a", "c", "d"]
+    assert cache.stats()["evictions"] == 1
+
+
+def test_entries_are_evicted_to_stay_within_max_bytes():
+    cache = TTLCache(max_size=100, ttl=60, max_bytes=100, weigh=len)
+    cache.put("a", b"x" * 40)
+    cache.put("b", b"x" * 40)
+    cache.get("a")
+
+    cache.put("c", b"x" * 30)
+    assert cache.get("b") is None and cache.stats()["bytes"] == 70
+
+    # Replacing an entry counts only its new weight
+    cache.put("a", b"x" * 10)
+    assert cache.stats()["bytes"] == 40
+
+    # Too heavy to keep at all, and nothing else is evicted for it
+    cache.put("huge", b"x" * 101)
+    assert cache.get("huge") is None
+    assert cache.stats()["size"] == 2 and cache.stats()["bytes"] == 40
+
+    cache.clear()
+    assert cache.stats()["bytes"] == 0
+
+
+def test_analysis_entries_are_weighed_by_their_body():
+    analysis_cache.clear()
+    TestClient(app).post("/api/analyze-deal", json=deal())
+
+    (_, entry, weight), = analysis_cache._entries.values()
+    assert weight == entry_bytes(entry) == 10 * len(entry.body)
+    assert analysis_cache.stats()["bytes"] == weight
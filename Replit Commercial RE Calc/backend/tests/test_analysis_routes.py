@@ -0,0 +1,70 @@
+import pytest
+import pytest_asyncio
+
+from app.api.routes import analysis
+from app.core.database import count_queries
+from app.main_simple import calculate_financial_metrics
+from app.schemas.deal import DealInput
+from app.services.deal_service import DealService
+from deals import DEALS
+
+
+@pytest_asyncio.fixture
+async def deal_ids(sessions):
+    async with sessions() as db:
+        service = DealService(db)
+        names = ("levered", "given loan")
+        return [(await service.create_deal(DealInput.model_validate(DEALS[name]))).id for name in names]
+
+
+@pytest.fixture
+def client(router_client):
+    return router_client(analysis.router, "/analysis")
+
+
+def expected_metrics(name: str) -> dict:
+    return calculate_financial_metrics(DealInput.model_validate(DEALS[name])).model_dump()
+
+
+@pytest.mark.asyncio
+async def test_analyze_deal(client):
+    response = await client.post("/analysis/analyze-deal", json=DEALS["levered"])
+
+    assert response.status_code == 200
+    body = response.json()
+    assert body["financialMetrics"] == pytest.approx(expected_metrics("levered"))
+    # 70% of the purchase price, written back into the echoed input
+    assert body["dealInput"]["loanTerms"]["loanAmount"] == pytest.approx(0.7 * DEALS["levered"]["purchasePrice"])
+    assert body["aiAnalysis"]["summary"]
+
+
+@pytest.mark.asyncio
+async def test_deal_metrics_are_computed_once_then_read(engine, client, deal_ids):
+    first = await client.get(f"/analysis/metrics/{deal_ids[0]}")
+    with count_queries(engine) as statements:
+        second = await client.get(f"/analysis/metrics/{deal_ids[0]}")
+
+    assert first.status_code == second.status_code == 200
+    assert first.json()["recomputed"] is True
+    assert second.json()["recomputed"] is False
+    assert len(statements) == 1
+    assert second.json()["financialMetrics"] == pytest.approx(expected_metrics("levered"))
+
+
+@pytest.mark.asyncio
+async def test_unknown_deal_metrics_are_not_found(client, deal_ids):
+    response = await client.get(f"/analysis/metrics/{max(deal_ids) + 1}")
+
+    assert response.status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_metrics_of_several_deals_in_request_order(client, deal_ids):
+    levered, given_loan = deal_ids
+    response = await client.get("/analysis/metrics", params={"dealId": [given_loan, 999, levered, given_loan]})
+
+    assert response.status_code == 200
+    body = response.json()
+    assert [item["dealId"] for item in body] == [given_loan, levered]
+    assert body[0]["financialMetrics"] == pytest.approx(expected_metrics("given loan"))
+    assert body[1]["financialMetrics"] == pytest.approx(expected_metrics("levered"))
@@ -0,0 +1,35 @@
+import sqlite3
+
+from fastapi.testclient import TestClient
+
+from app.core import database
+from app.core.config import settings
+from app.core.database import Base
+from app.main_simple import app
+from app.services import jobs
+
+
+def test_startup_creates_every_table_on_a_fresh_database(tmp_path, monkeypatch):
+    path = tmp_path / "fresh.db"
+    monkeypatch.setattr(settings, "DATABASE_URL", f"sqlite:///{path}")
+    # Created again on first use, on the fresh database
+    monkeypatch.setattr(database, "_async_engine", None)
+    monkeypatch.setattr(database, "_async_session_factory", None)
+
+    with TestClient(app) as client:
+        deals = client.get("/api/deals/")
+        portfolio = client.get("/api/deals/portfolio")
+        screened = client.post("/api/analysis/screen", json={})
+        missing_job = client.get("/api/jobs/no-such-job")
+        formats = client.get("/api/files/supported-formats")
+        running = jobs._runner is not None
+        engine = database._async_engine
+    engine.sync_engine.dispose()
+
+    assert deals.status_code == portfolio.status_code == screened.status_code == formats.status_code == 200
+    assert missing_job.status_code == 404
+    # The job workers run for as long as the app does
+    assert running and jobs._runner is None
+    with sqlite3.connect(path) as db:
+        tables = {name for name, in db.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    assert tables == set(Base.metadata.tables)
@@ -0,0 +1,35 @@
+import math
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.main_simple import app, calculate_financial_metrics
+from app.schemas.deal import DealInput, FinancialMetrics
+from app.services.batch_metrics import calculate_financial_metrics_batch, deals_to_columns
+from deals import DEALS
+
+
+def test_batch_matches_scalar_path_for_each_deal():
+    deals = [DealInput.model_validate(payload) for payload in DEALS.values()]
+    batch = calculate_financial_metrics_batch(deals_to_columns(deals))
+
+    for index, (name, deal_input) in enumerate(zip(DEALS, deals)):
+        expected = calculate_financial_metrics(deal_input)
+        for field in FinancialMetrics.model_fields:
+            scalar, vectorized = getattr(expected, field), float(batch[field][index])
+            if math.isinf(scalar):
+                assert vectorized == scalar, (name, field)
+            else:
+                assert vectorized == pytest.approx(scalar, rel=1e-9, abs=1e-6), (name, field)
+
+
+def test_all_cash_deal_does_not_fail_the_batch():
+    response = TestClient(app).post("/api/analyze-deals", json={"deals": [DEALS["all cash"], DEALS["levered"]]})
+
+    assert response.status_code == 200
+    body = response.json()
+    assert body["count"] == 2
+    dscr = body["financialMetrics"]["dscr"]
+    assert dscr[0] is None
+    assert dscr[1] == pytest.approx(calculate_financial_metrics(DealInput.model_validate(DEALS["levered"])).dscr)
+    assert len(body["grades"]["overall"]) == 2
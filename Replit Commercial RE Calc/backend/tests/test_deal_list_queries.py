@@ -0,0 +1,55 @@
+from itertools import combinations
+
+import pytest
+import pytest_asyncio
+
+from app.api.routes import deals
+from app.core.database import count_queries
+from app.models.base import DealAnalysis
+from app.schemas.deal import DealInput
+from app.services.deal_service import DEAL_RELATIONSHIPS, DealService
+from deals import deal
+
+PAGE_SIZES = (1, 10, 40)
+
+# Every combination of relationships a details page can include
+INCLUDES = [
+    list(include)
+    for count in range(len(DEAL_RELATIONSHIPS) + 1)
+    for include in combinations(DEAL_RELATIONSHIPS, count)
+]
+
+
+@pytest_asyncio.fixture
+async def client(sessions, router_client):
+    """Deals router on a database of deals that each have a rent roll and an analysis"""
+    async with sessions() as db:
+        service = DealService(db)
+        template = DealInput.model_validate(deal())
+        for _ in range(max(PAGE_SIZES)):
+            created = await service.create_deal(template)
+            db.add(DealAnalysis(deal_id=created.id, financial_metrics={"noi": 1.0}, ai_analysis={}))
+        await db.commit()
+    return router_client(deals.router, "/deals")
+
+
+async def statements_for(engine, client, url: str, **params) -> int:
+    with count_queries(engine) as statements:
+        response = await client.get(url, params=params)
+    assert response.status_code == 200, response.text
+    assert len(response.json()["items"]) == params["limit"]
+    return len(statements)
+
+
+@pytest.mark.asyncio
+async def test_listing_deals_is_one_statement_whatever_the_page_size(engine, client):
+    for limit in PAGE_SIZES:
+        assert await statements_for(engine, client, "/deals/", limit=limit) == 1, limit
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("include", INCLUDES, ids=lambda include: ",".join(include) or "-")
+async def test_deal_details_cost_one_statement_per_included_relationship(engine, client, include):
+    for limit in PAGE_SIZES:
+        statements = await statements_for(engine, client, "/deals/details", limit=limit, include=include)
+        assert statements == 1 + len(include), limit
@@ -0,0 +1,43 @@
+import pytest
+from sqlalchemy import literal_column, update
+
+from app.models.base import Deal
+from app.schemas.deal import DealInput
+from app.services.deal_service import DealService
+from deals import deal
+
+# As SQLite's CURRENT_TIMESTAMP server default stores them: whole seconds, no fraction
+SAME_SECOND = "'2024-05-01 09:30:00'"
+EARLIER_SECOND = "'2024-05-01 09:29:59'"
+
+
+async def seed(sessions, count: int) -> list:
+    async with sessions() as db:
+        service = DealService(db)
+        ids = [(await service.create_deal(DealInput.model_validate(deal()))).id for _ in range(count)]
+        # All but the first two share a timestamp, stored in the server default's format
+        await db.execute(update(Deal).where(Deal.id.in_(ids[:2])).values(created_at=literal_column(EARLIER_SECOND)))
+        await db.execute(update(Deal).where(Deal.id.in_(ids[2:])).values(created_at=literal_column(SAME_SECOND)))
+        await db.commit()
+    return ids
+
+
+async def collect_pages(sessions, method: str, limit: int) -> list:
+    pages, cursor = [], None
+    while True:
+        async with sessions() as db:
+            rows, cursor = await getattr(DealService(db), method)(cursor=cursor, limit=limit)
+        pages.append([row.id for row in rows])
+        if cursor is None or len(pages) > 10:
+            return pages
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("method", ["get_deal_summaries", "get_deals"])
+async def test_pages_advance_through_deals_sharing_a_timestamp(sessions, method):
+    ids = await seed(sessions, 7)
+
+    pages = await collect_pages(sessions, method, limit=2)
+
+    assert pages == [[7, 6], [5, 4], [3, 2], [1]]
+    assert sorted(sum(pages, [])) == ids
@@ -0,0 +1,82 @@
+import numpy as np
+import numpy_financial as npf
+import pytest
+
+from app.core.metrics import render_metrics
+from app.services.debt import amortization_schedule, debt_schedules, normalized_schedule, schedule_cache_info
+
+LOANS = [
+    # (loan amount, annual rate %, amortization years, interest-only months)
+    (1_680_000, 6.5, 30, 0),
+    (1_500_000, 7.25, 25, 24),
+    (900_000, 0.0, 10, 6),
+]
+
+
+def month_by_month(loan_amount, annual_rate, amortization_years, interest_only_months):
+    """Payment, interest, principal and balance of each month, rolling the balance forward"""
+    monthly_rate = annual_rate / 100 / 12
+    amortizing_payment = -npf.pmt(monthly_rate, amortization_years * 12, loan_amount)
+    rows, balance = [], loan_amount
+    for month in range(interest_only_months + amortization_years * 12):
+        interest = balance * monthly_rate
+        payment = interest if month < interest_only_months else amortizing_payment
+        balance -= payment - interest
+        rows.append((payment, interest, payment - interest, balance))
+    return {field: np.array(column) for field, column in zip(("payment", "interest", "principal", "balance"), zip(*rows))}
+
+
+@pytest.mark.parametrize("loan", LOANS, ids=["amortizing", "interest only first", "no interest"])
+def test_cached_schedule_matches_month_by_month_amortization(loan):
+    loan_amount, annual_rate, amortization_years, interest_only_months = loan
+    expected = month_by_month(*loan)
+
+    # The second lookup is served from the cache, scaled by a different loan amount
+    for amount in (loan_amount, loan_amount / 2):
+        schedule = amortization_schedule(amount, annual_rate, amortization_years, interest_only_months)
+        scale = amount / loan_amount
+        for field in ("payment", "interest", "principal"):
+            np.testing.assert_allclose(schedule[field], expected[field] * scale, rtol=1e-9, atol=1e-6, err_msg=field)
+        np.testing.assert_allclose(schedule["balance"][1:], expected["balance"] * scale, rtol=1e-9, atol=1e-6)
+        assert schedule["balance"][0] == amount
+
+    if interest_only_months:
+        np.testing.assert_allclose(schedule["principal"][:interest_only_months], 0.0)
+    assert schedule["balance"][-1] == 0.0
+
+
+def test_debt_schedules_share_cached_schedules_and_honor_interest_only_months():
+    normalized_schedule.cache_clear()
+    loans = np.array([1_000_000, 2_000_000, 1_500_000, 800_000])
+    interest_only_months = np.array([0, 0, 12, 12])
+
+    debt_service, balance = debt_schedules(
+        loans, np.full(4, 6.0), np.full(4, 30), interest_only_months, np.zeros(4, dtype=bool), 60
+    )
+
+    info = schedule_cache_info()
+    assert (info["misses"], info["size"]) == (2, 2)
+    for i, loan in enumerate(loans):
+        expected = month_by_month(loan, 6.0, 30, interest_only_months[i])
+        np.testing.assert_allclose(debt_service[i], expected["payment"][:60], rtol=1e-9)
+        np.testing.assert_allclose(balance[i, 1:], expected["balance"][:60], rtol=1e-9)
+    np.testing.assert_allclose(balance[2:, 12], loans[2:])
+
+
+def test_schedule_cache_is_exposed_as_metrics():
+    normalized_schedule.cache_clear()
+    for _ in range(3):
+        amortization_schedule(1_000_000, 6.0, 30)
+
+    lines = render_metrics().splitlines()
+
+    assert 'cache_hits_total{cache="amortization_schedule"} 2' in lines
+    assert 'cache_misses_total{cache="amortization_schedule"} 1' in lines
+    assert 'cache_entries{cache="amortization_schedule"} 1' in lines
+
+
+def test_interest_only_loan_pays_interest_until_the_balance_is_due():
+    debt_service, balance = debt_schedules([2_000_000], [5.5], [30], [0], [True], 120)
+
+    np.testing.assert_allclose(debt_service, 2_000_000 * 0.055 / 12)
+    np.testing.assert_allclose(balance, 2_000_000)
@@ -0,0 +1,154 @@
+import io
+import json
+import tracemalloc
+
+import pytest
+from fastapi import UploadFile
+
+from app.api.routes import files
+from app.services import file_parser
+from app.services.file_parser import FileParser, stream_rent_roll_csv
+from app.services.upload_cache import HASH_CHUNK_SIZE, CachedJSON, JSONStream, UploadCache, read_chunks
+
+HEADER = "Unit #,Floor Plan,Beds,Baths,Sq. Ft.,Current Rent,Status\n"
+
+
+class CountingFile(io.BytesIO):
+    """An in-memory upload counting the bytes read from it"""
+
+    bytes_read = 0
+
+    def read(self, size=-1):
+        data = super().read(size)
+        self.bytes_read += len(data)
+        return data
+
+
+def result_body(result) -> dict:
+    """A FileParser result as the object it encodes"""
+    if isinstance(result, JSONStream):
+        return json.loads(b"".join(result))
+    return json.loads(result) if isinstance(result, CachedJSON) else result
+
+
+def rent_roll_csv(units: int) -> bytes:
+    """A CSV rent roll; every 97th row has a rent that is not a number"""
+    rows = [HEADER]
+    for i in range(units):
+        rent = "call" if i % 97 == 96 else f'"${1_000 + i % 7 * 125:,}.00"'
+        rows.append(f"{i + 1},{'AB'[i % 2]}{i % 3 + 1},{i % 3 + 1},{i % 2 + 1},{700 + i % 5 * 50},{rent},"
+                    f"{'Vacant' if i % 11 == 0 else 'Occupied'}\n")
+    return "".join(rows).encode()
+
+
+def test_json_is_written_in_blocks_matching_the_columns(monkeypatch):
+    monkeypatch.setattr(file_parser, "JSON_BLOCK_VALUES", 7)
+    builder = stream_rent_roll_csv(io.BytesIO(rent_roll_csv(500)), chunk_rows=60)
+
+    chunks = list(builder.iter_json())
+
+    assert json.loads(b"".join(chunks)) == {"data": builder.to_columns(), "summary": builder.summary()}
+    # At least one chunk per block of values in each of the seven columns
+    assert len(chunks) > 7 * (len(builder) // 7)
+    assert builder.summary()["rejectedRows"] == 5
+
+
+def test_encoding_memory_does_not_grow_with_the_rent_roll(tmp_path):
+    cache = UploadCache(str(tmp_path), 1 << 30)
+    peaks = []
+    for units in (20_000, 200_000):
+        builder = stream_rent_roll_csv(io.BytesIO(rent_roll_csv(units)))
+        tracemalloc.start()
+        stored = cache.put_stream(str(units).rjust(64, "0"), "rent_roll", "csv-columns", 1, builder.iter_json())
+        for _ in read_chunks(stored):
+            pass
+        peaks.append(tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+
+    # Ten times the units, and the whole result is several megabytes; a block of values is not
+    assert peaks[1] < 2 * peaks[0]
+    assert peaks[1] < 4 * 1024 * 1024
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("max_bytes", [1 << 30, 0], ids=["cache", "no cache"])
+async def test_streamed_upload_response(router_client, tmp_path, monkeypatch, max_bytes):
+    monkeypatch.setattr(file_parser, "upload_cache", UploadCache(str(tmp_path), max_bytes))
+    client = router_client(files.router)
+    content = rent_roll_csv(3_000)
+    expected = stream_rent_roll_csv(io.BytesIO(content))
+
+    bodies = []
+    for _ in range(2):
+        response = await client.post(
+            "/upload-rent-roll", params={"stream": "true"}, files={"file": ("roll.csv", content, "text/csv")}
+        )
+        assert response.status_code == 200
+        bodies.append(response.json())
+
+    for body in bodies:
+        assert body["success"] and body["message"] == "Rent roll parsed successfully"
+        assert body["data"] == expected.to_columns()
+        assert body["summary"] == expected.summary()
+    assert [body["cached"] for body in bodies] == [False, bool(max_bytes)]
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("stream", [True, False], ids=["stream", "whole"])
+async def test_upload_is_hashed_from_the_parsers_reads(tmp_path, monkeypatch, stream):
+    monkeypatch.setattr(file_parser, "upload_cache", UploadCache(str(tmp_path), 1 << 30))
+    content = rent_roll_csv(60_000)
+    # Same size and first chunk, different last rent
+    changed = content[:-20] + content[-20:].replace(b"$1,", b"$2,")
+    assert len(changed) == len(content) > HASH_CHUNK_SIZE and changed != content
+
+    results = []
+    for upload in (content, content, changed):
+        source = CountingFile(upload)
+        result = await FileParser().parse_rent_roll(UploadFile(source, filename="roll.csv"), stream=stream)
+        results.append((source.bytes_read, result_body(result)))
+
+    # Parsing reads the file once; the streamed path reads its first chunk again to fingerprint it
+    first_chunk = HASH_CHUNK_SIZE if stream else 0
+    assert results[0][0] == first_chunk + len(content)
+    # A repeat is hashed, not parsed
+    assert results[1][0] == first_chunk + len(content)
+    assert results[1][1] == results[0][1]
+    assert results[2][1] != results[0][1]
+    stats = file_parser.upload_cache.stats()
+    assert (stats["hits"], stats["entries"]) == (1, 2)
+
+
+def workbook(extension: str, units: int) -> bytes:
+    """rent_roll_csv's rows as the first sheet of an .xlsx or .xls workbook"""
+    rows = [line.split(",", 7) for line in rent_roll_csv(units).decode().splitlines()]
+    rows = [row[:5] + [",".join(row[5:-1]).strip('"'), row[-1]] for row in rows]
+    buffer = io.BytesIO()
+    if extension == ".xlsx":
+        from openpyxl import Workbook
+
+        book = Workbook()
+        for row in rows:
+            book.active.append(row)
+    else:
+        xlwt = pytest.importorskip("xlwt")
+        book = xlwt.Workbook()
+        sheet = book.add_sheet("Rent Roll")
+        for r, row in enumerate(rows):
+            for c, value in enumerate(row):
+                sheet.write(r, c, value)
+    book.save(buffer)
+    return buffer.getvalue()
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("extension", [".xlsx", ".xls"])
+async def test_workbook_rent_rolls_parse_like_csv(tmp_path, monkeypatch, extension):
+    monkeypatch.setattr(file_parser, "upload_cache", UploadCache(str(tmp_path), 0))
+    content = workbook(extension, 300)
+
+    parsed = await FileParser().parse_rent_roll(UploadFile(io.BytesIO(content), filename=f"roll{extension}"))
+    expected = await FileParser().parse_rent_roll(UploadFile(io.BytesIO(rent_roll_csv(300)), filename="roll.csv"))
+
+    assert result_body(parsed)["data"] == result_body(expected)["data"]
+    assert len(result_body(parsed)["data"]) == 300 - 300 // 97
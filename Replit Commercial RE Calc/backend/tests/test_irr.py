@@ -0,0 +1,82 @@
+import numpy as np
+import numpy_financial as npf
+import pytest
+
+from app.services import irr as irr_module
+from app.services.irr import CONVERGED, NO_SIGN_CHANGE, NOT_CONVERGED, irr, xirr
+
+
+def test_matches_numpy_financial_on_random_rows():
+    rng = np.random.default_rng(0)
+    # An investment, then distributions that may be losses, then a sale
+    flows = np.empty((400, 61))
+    flows[:, 0] = -rng.uniform(1e5, 5e6, 400)
+    flows[:, 1:] = rng.uniform(-0.005, 0.02, (400, 60)) * -flows[:, :1]
+    flows[:, -1] += rng.uniform(0.3, 2.5, 400) * -flows[:, 0]
+
+    result = irr(flows)
+
+    assert result.converged.all()
+    expected = np.array([npf.irr(row) for row in flows])
+    np.testing.assert_allclose(result.rate, expected, rtol=0, atol=1e-9)
+
+
+def test_periods_given_per_cell_match_the_regular_solve():
+    flows = np.array([[-1000.0, 300, 400, 500], [-500.0, 0, 0, 800]])
+
+    # Regular periods are solved by Horner's rule, explicit ones through exp
+    regular = irr(flows)
+    explicit = irr(flows, times=np.tile(np.arange(4.0), (2, 1)))
+
+    np.testing.assert_allclose(explicit.rate, regular.rate, rtol=1e-12)
+
+
+@pytest.mark.parametrize("flows", [[100.0, 50, 25], [-100.0, -50, 0], [0.0, 0, 0]], ids=["gains", "losses", "zeros"])
+def test_rows_without_a_sign_change_are_flagged(flows):
+    result = irr([flows, [-100.0, 110, 0]])
+
+    assert np.isnan(result.rate[0]) and not result.converged[0]
+    assert result.status[0] == NO_SIGN_CHANGE
+    # The rest of the batch is unaffected
+    assert result.converged[1] and result.rate[1] == pytest.approx(0.1)
+
+
+def test_bisection_settles_rows_newton_cannot(monkeypatch):
+    bisected = []
+
+    def spy(cash_flows, times):
+        bisected.append(cash_flows.shape[0])
+        return bisect(cash_flows, times)
+
+    bisect = irr_module._bisect
+    monkeypatch.setattr(irr_module, "_bisect", spy)
+    # Newton started next to -100% overflows; the answer is 2 ** (1 / 60) - 1
+    hard = [-1.0] + [0.0] * 59 + [2.0]
+    easy = [-100.0, 110.0] + [0.0] * 59
+
+    result = irr([hard, easy], guess=[-0.99, 0.1])
+
+    assert bisected == [1]
+    assert result.converged.all() and (result.status == CONVERGED).all()
+    np.testing.assert_allclose(result.rate, [2 ** (1 / 60) - 1, 0.1], rtol=1e-8)
+
+
+def test_rows_with_no_rate_do_not_converge():
+    # 1 - 3v + 3.5v^2 has no real root; the other needs a rate below -100%
+    result = irr([[1.0, -3.0, 3.5], [-1e6, 1e-3, 0.0]])
+
+    assert np.isnan(result.rate).all() and not result.converged.any()
+    assert (result.status == NOT_CONVERGED).all()
+
+
+def test_xirr_matches_known_dated_flows():
+    # Excel's XIRR documentation example
+    dates = np.array(["2008-01-01", "2008-03-01", "2008-10-30", "2009-02-15", "2009-04-01"], dtype="datetime64[D]")
+    flows = [-10_000, 2_750, 4_250, 3_250, 2_750]
+
+    result = xirr([flows, [-1_000, 1_100, 0, 0, 0]], [dates, dates])
+
+    assert result.converged.all()
+    assert result.rate[0] == pytest.approx(0.373362535, abs=1e-8)
+    # 10% over the 60 days from January 1 to March 1, 2008
+    assert result.rate[1] == pytest.approx(1.1 ** (365 / 60) - 1, rel=1e-10)
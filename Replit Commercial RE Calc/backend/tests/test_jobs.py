@@ -0,0 +1,271 @@
+import asyncio
+import json
+import logging
+import time
+from datetime import timedelta
+
+import pytest
+import pytest_asyncio
+from fastapi import UploadFile
+
+from app.api.routes import jobs as jobs_routes
+from app.core.config import settings
+from app.models.job import Job
+from app.services import jobs
+from app.services.file_parser import FileParser
+from app.services.jobs import JOB_TYPES, JobRunner, JobType, _now, cancel_job, get_job, submit_job, submit_upload_job
+
+
+class Work:
+    """A test job type that runs until released, recording what it was asked to do"""
+
+    def __init__(self):
+        self.started = asyncio.Event()
+        self.release = asyncio.Event()
+        self.runs = 0
+        self.cancelled = False
+        self.cleaned_up = []
+
+    async def run(self, payload, progress):
+        self.runs += 1
+        progress.report(0.5, "halfway")
+        self.started.set()
+        try:
+            await self.release.wait()
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+        return {"echo": payload["value"]}
+
+    def cleanup(self, payload):
+        self.cleaned_up.append(payload["value"])
+
+
+@pytest_asyncio.fixture
+async def work(sessions, monkeypatch):
+    """Job type "test" backed by a Work, with jobs stored in the scratch database and quick heartbeats"""
+    work = Work()
+    monkeypatch.setitem(JOB_TYPES, "test", JobType(work.run, work.cleanup))
+    monkeypatch.setattr(jobs, "get_async_session_factory", lambda: sessions)
+    monkeypatch.setattr(settings, "JOB_HEARTBEAT_INTERVAL", 0.05)
+    monkeypatch.setattr(settings, "JOB_POLL_INTERVAL", 0.05)
+    return work
+
+
+@pytest_asyncio.fixture
+async def runner(work):
+    runners = []
+
+    def start(**workers) -> JobRunner:
+        runner = JobRunner(workers or {"test": 1})
+        runner.start()
+        runners.append(runner)
+        return runner
+
+    yield start
+    for runner in runners:
+        await runner.stop()
+
+
+async def load(sessions, job_id: str) -> Job:
+    async with sessions() as db:
+        return await db.get(Job, job_id)
+
+
+async def wait_for(sessions, job_id: str, *statuses: str, seconds: float = 10.0) -> Job:
+    deadline = time.monotonic() + seconds
+    while True:
+        job = await load(sessions, job_id)
+        if job.status in statuses:
+            return job
+        assert time.monotonic() < deadline, f"job still {job.status}"
+        await asyncio.sleep(0.02)
+
+
+async def submit(sessions, value: str = "a", kind: str = "test") -> str:
+    async with sessions() as db:
+        return (await submit_job(db, kind, {"value": value})).id
+
+
+@pytest.mark.asyncio
+async def test_running_job_holds_a_lease_renewed_with_its_progress(sessions, work, runner):
+    job_id = await submit(sessions)
+    worker = runner()
+
+    await asyncio.wait_for(work.started.wait(), 5)
+    claimed = await wait_for(sessions, job_id, "running")
+    await asyncio.sleep(4 * settings.JOB_HEARTBEAT_INTERVAL)
+    renewed = await load(sessions, job_id)
+
+    assert claimed.owner == worker.owner and claimed.attempts == 1
+    assert renewed.lease_expires_at > claimed.lease_expires_at > _now()
+    assert (renewed.progress, renewed.message) == (0.5, "halfway")
+
+    work.release.set()
+    finished = await wait_for(sessions, job_id, "succeeded")
+    assert finished.result == '{"echo": "a"}'
+    assert finished.owner is None and finished.lease_expires_at is None
+    assert finished.expires_at > finished.finished_at
+    assert work.cleaned_up == ["a"]
+
+
+@pytest.mark.asyncio
+async def test_lapsed_lease_is_claimed_again(sessions, work, runner):
+    job_id = await submit(sessions)
+    # As a worker whose process died mid-job leaves it
+    async with sessions() as db:
+        job = await db.get(Job, job_id)
+        job.status, job.owner, job.attempts = "running", "gone:1:dead", 1
+        job.lease_expires_at = _now() - timedelta(seconds=1)
+        await db.commit()
+
+    worker = runner()
+    await asyncio.wait_for(work.started.wait(), 5)
+    reclaimed = await load(sessions, job_id)
+    work.release.set()
+
+    assert (reclaimed.status, reclaimed.owner, reclaimed.attempts) == ("running", worker.owner, 2)
+    assert (await wait_for(sessions, job_id, "succeeded")).attempts == 2
+
+
+@pytest.mark.asyncio
+async def test_job_whose_worker_keeps_dying_is_failed(sessions, work, runner):
+    job_id = await submit(sessions)
+    async with sessions() as db:
+        job = await db.get(Job, job_id)
+        job.status, job.owner, job.attempts = "running", "gone:1:dead", settings.JOB_MAX_ATTEMPTS
+        job.lease_expires_at = _now() - timedelta(seconds=1)
+        await db.commit()
+
+    runner()
+    failed = await wait_for(sessions, job_id, "failed")
+
+    assert "Gave up" in failed.error
+    assert work.runs == 0
+    assert work.cleaned_up == ["a"]
+
+
+@pytest.mark.asyncio
+async def test_stopping_the_runner_requeues_its_jobs(sessions, work, runner):
+    job_id = await submit(sessions)
+    worker = runner()
+    await asyncio.wait_for(work.started.wait(), 5)
+
+    await worker.stop()
+    requeued = await load(sessions, job_id)
+
+    assert work.cancelled
+    assert (requeued.status, requeued.owner, requeued.lease_expires_at) == ("queued", None, None)
+    # The interrupted run does not count against JOB_MAX_ATTEMPTS
+    assert requeued.attempts == 0
+    assert work.cleaned_up == []
+
+
+@pytest.mark.asyncio
+async def test_cancelling_a_queued_job_is_immediate(sessions, work):
+    job_id = await submit(sessions)
+
+    async with sessions() as db:
+        cancelled = await cancel_job(db, job_id)
+
+    assert cancelled.status == "cancelled" and cancelled.finished_at is not None
+    assert work.cleaned_up == ["a"]
+
+
+@pytest.mark.asyncio
+async def test_cancelling_a_running_job_stops_it_at_the_next_heartbeat(sessions, work, runner):
+    job_id = await submit(sessions)
+    runner()
+    await asyncio.wait_for(work.started.wait(), 5)
+
+    async with sessions() as db:
+        requested = await cancel_job(db, job_id)
+    cancelled = await wait_for(sessions, job_id, "cancelled")
+
+    assert requested.status == "running" and requested.cancel_requested
+    assert work.cancelled
+    assert cancelled.progress == 0.5
+    assert work.cleaned_up == ["a"]
+
+
+@pytest.mark.asyncio
+async def test_finished_jobs_expire(sessions, work, runner, monkeypatch):
+    monkeypatch.setattr(settings, "JOB_RESULT_TTL", 0.0)
+    job_id = await submit(sessions)
+    work.release.set()
+    runner()
+    await wait_for(sessions, job_id, "succeeded")
+
+    async with sessions() as db:
+        assert await get_job(db, job_id) is None
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("kind, filename, options, error", [
+    ("t12", "statement.pdf", {}, "Not a readable PDF"),
+    ("rent_roll", "rent_roll.xlsx", {"stream": False}, "Not a readable .xlsx workbook"),
+    ("rent_roll", "rent_roll.xls", {"stream": False}, "Not a readable .xls workbook"),
+])
+async def test_malformed_upload_fails_as_bad_input(
+    sessions, work, runner, upload_dir, tmp_path, caplog, kind, filename, options, error
+):
+    upload = tmp_path / filename
+    upload.write_bytes(b"%PDF-1.4\nnot really a PDF")
+    with upload.open("rb") as handle:
+        async with sessions() as db:
+            job_id = (await submit_upload_job(db, kind, UploadFile(handle, filename=filename), **options)).id
+
+    with caplog.at_level(logging.ERROR, logger=jobs.logger.name):
+        runner(**{kind: 1})
+        failed = await wait_for(sessions, job_id, "failed", seconds=60)
+
+    assert failed.error.startswith(error)
+    # Bad input, not a failure worth a traceback
+    assert not caplog.records
+    assert not list((upload_dir / "jobs").iterdir())
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("stream", [True, False], ids=["stream", "whole"])
+async def test_upload_job_result_matches_the_synchronous_upload(sessions, work, runner, router_client, tmp_path, stream):
+    client = router_client(jobs_routes.router, "/jobs")
+    units = "".join(f"{i},1BR,1,1,650,\"$1,{i % 9}00.00\",Occupied\n" for i in range(2_000))
+    upload = tmp_path / "roll.csv"
+    upload.write_text("Unit #,Floor Plan,Beds,Baths,Sq. Ft.,Current Rent,Status\n" + units)
+
+    with upload.open("rb") as handle:
+        expected = await FileParser().parse_rent_roll(UploadFile(handle, filename="roll.csv"), stream=stream)
+        fields = json.loads(b"".join(expected)) if stream else expected
+        async with sessions() as db:
+            job_id = (await submit_upload_job(db, "rent_roll", UploadFile(handle, filename="roll.csv"), stream=stream)).id
+    runner(rent_roll=1)
+    job = await wait_for(sessions, job_id, "succeeded", "failed")
+
+    response = await client.get(f"/jobs/{job_id}/result")
+
+    assert response.status_code == 200
+    assert response.json() == {
+        "success": True, "message": "Rent roll parsed successfully", "error": None, "cached": True, **fields,
+    }
+    # A streamed result stays in the upload cache; the job only refers to it
+    assert (job.result is None) is stream and (job.result_entry is not None) is stream
+
+
+@pytest.mark.asyncio
+async def test_streamed_job_result_evicted_from_the_cache_is_gone(
+    sessions, work, runner, router_client, upload_dir, tmp_path
+):
+    client = router_client(jobs_routes.router, "/jobs")
+    upload = tmp_path / "roll.csv"
+    upload.write_text("Unit #,Current Rent\n101,\"$1,200.00\"\n")
+    with upload.open("rb") as handle:
+        async with sessions() as db:
+            job_id = (await submit_upload_job(db, "rent_roll", UploadFile(handle, filename="roll.csv"), stream=True)).id
+    runner(rent_roll=1)
+    await wait_for(sessions, job_id, "succeeded")
+
+    for entry in (upload_dir / "parsed").rglob("*.json"):
+        entry.unlink()
+    response = await client.get(f"/jobs/{job_id}/result")
+
+    assert response.status_code == 410
@@ -0,0 +1,65 @@
+from fastapi.testclient import TestClient
+
+from app.core import metrics
+from app.core.config import settings
+from app.core.metrics import render_metrics
+from app.main_simple import app
+from deals import deal
+
+ANALYZE = 'method="POST",route="/api/analyze-deal"'
+STAGE = 'http_request_stage_seconds_count{route="/api/analyze-deal",stage="endpoint"}'
+
+
+def samples() -> dict:
+    """The current metrics, by sample name and labels"""
+    values = {}
+    for line in render_metrics().splitlines():
+        if line and not line.startswith("#"):
+            name, value = line.rsplit(" ", 1)
+            values[name] = float(value)
+    return values
+
+
+def answer(*requests):
+    """The responses to (method, path, json) requests, and how much each metric changed meanwhile"""
+    client = TestClient(app)
+    before = samples()
+    responses = [client.request(method, path, json=body) for method, path, body in requests]
+    after = samples()
+    return responses, {name: value - before.get(name, 0) for name, value in after.items()}
+
+
+def test_every_request_is_counted_and_timed_by_stage():
+    responses, changed = answer(("POST", "/api/analyze-deal", deal()), ("GET", "/no-such-page", None))
+
+    assert [response.status_code for response in responses] == [200, 404]
+    assert changed[f"http_request_duration_seconds_count{{{ANALYZE}}}"] == 1
+    assert changed[f'http_requests_total{{{ANALYZE},status="200"}}'] == 1
+    assert changed['http_requests_total{method="GET",route="unmatched",status="404"}'] == 1
+    assert changed[STAGE] == 1
+    stages = [stage.split(";")[0] for stage in responses[0].headers["server-timing"].split(", ")]
+    assert stages[:2] == ["validate", "endpoint"] and stages[-2:] == ["serialize", "total"]
+    # No route, so no stages; still the total
+    assert responses[1].headers["server-timing"].startswith("total;dur=")
+
+
+def test_timings_are_reused_without_carrying_stages_over():
+    client = TestClient(app)
+    analyzed = client.post("/api/analyze-deal", json=deal(purchasePrice=2_500_000))
+
+    for _ in range(3):
+        health = client.get("/health")
+        assert [stage.split(";")[0] for stage in health.headers["server-timing"].split(", ")] == [
+            "validate", "endpoint", "serialize", "total"
+        ]
+    assert "hash" in analyzed.headers["server-timing"]
+    assert 0 < len(metrics._timings) <= metrics.TIMING_POOL_SIZE
+
+
+def test_server_timing_header_can_be_turned_off(monkeypatch):
+    monkeypatch.setattr(settings, "SERVER_TIMING_HEADER", False)
+
+    responses, changed = answer(("POST", "/api/analyze-deal", deal()))
+
+    assert "server-timing" not in responses[0].headers
+    assert changed[STAGE] == 1
@@ -0,0 +1,132 @@
+import numpy as np
+import numpy_financial as npf
+import pytest
+
+from app.main_simple import calculate_financial_metrics
+from app.schemas.deal import DealInput
+from app.services.batch_metrics import EXPENSE_FIELDS
+from app.services.projection import project_cash_flows
+from deals import DEALS
+
+LOANS = {
+    "amortizing": dict(loan_amount=1_680_000, annual_rate=6.5, amortization_years=30, interest_only_months=0),
+    "interest only for two years": dict(loan_amount=1_500_000, annual_rate=7.25, amortization_years=25,
+                                        interest_only_months=24),
+    "all cash": dict(loan_amount=0, annual_rate=6.5, amortization_years=30, interest_only_months=0),
+}
+
+
+def reference_projection(monthly_rent, vacancy_rate, annual_expenses, growth, loan_amount, annual_rate,
+                         amortization_years, interest_only_months, hold_months, exit_cap_rate, equity, discount_rate):
+    """The projection one month at a time: balances rolled forward, growth compounded, npf for IRR"""
+    monthly_rate = annual_rate / 100 / 12
+    amortizing_payment = -npf.pmt(monthly_rate, amortization_years * 12, loan_amount)
+    noi, cash_flow, balance = [], [], loan_amount
+    balances = [balance]
+    for month in range(hold_months + 12):
+        rent = monthly_rent * (1 + growth) ** (month // 12)
+        expenses = annual_expenses / 12 * (1 + growth) ** (month // 12)
+        noi.append(rent * (1 - vacancy_rate) - expenses)
+        payment = balance * monthly_rate if month < interest_only_months else min(amortizing_payment, balance * (1 + monthly_rate))
+        balance = balance * (1 + monthly_rate) - payment
+        balances.append(balance)
+        cash_flow.append(noi[-1] - payment)
+
+    sale_price = sum(noi[hold_months:hold_months + 12]) / exit_cap_rate
+    flows = [-equity] + cash_flow[:hold_months]
+    flows[-1] += sale_price - balances[hold_months]
+    monthly_discount = (1 + discount_rate) ** (1 / 12) - 1
+    return {
+        "salePrice": sale_price,
+        "remainingBalance": balances[hold_months],
+        "totalDistributions": sum(flows[1:]),
+        "irr": (1 + npf.irr(flows)) ** 12 - 1,
+        "npv": sum(flow / (1 + monthly_discount) ** t for t, flow in enumerate(flows)),
+    }
+
+
+@pytest.mark.parametrize("loan", list(LOANS))
+@pytest.mark.parametrize("hold_months", [60, 42])
+def test_projection_matches_month_by_month_reference(loan, hold_months):
+    inputs = dict(monthly_rent=24_000, vacancy_rate=0.05, annual_expenses=53_000, growth=0.03,
+                  hold_months=hold_months, exit_cap_rate=0.06, discount_rate=0.08, **LOANS[loan])
+    inputs["equity"] = 2_400_000 - inputs["loan_amount"]
+
+    projection = project_cash_flows(
+        inputs["monthly_rent"], inputs["vacancy_rate"], inputs["annual_expenses"], inputs["growth"], inputs["growth"],
+        inputs["loan_amount"], inputs["annual_rate"], inputs["amortization_years"], inputs["interest_only_months"],
+        False, hold_months, inputs["exit_cap_rate"], inputs["equity"], inputs["discount_rate"],
+    )
+    expected = reference_projection(**inputs)
+
+    assert projection["debtService"].shape == (1, hold_months + 12)
+    for field, value in expected.items():
+        assert projection[field][0] == pytest.approx(value, rel=1e-9, abs=1e-6), field
+
+
+def test_projection_of_many_deals_matches_each_alone():
+    rng = np.random.default_rng(0)
+    n = 50
+    inputs = dict(
+        monthly_rent=rng.uniform(5_000, 80_000, n), vacancy_rate=rng.uniform(0, 0.15, n),
+        annual_expenses=rng.uniform(10_000, 200_000, n), rent_growth=rng.uniform(0, 0.05, n),
+        expense_growth=rng.uniform(0, 0.05, n), loan_amount=rng.uniform(0, 3_000_000, n),
+        annual_rate=rng.uniform(3, 9, n), amortization_years=rng.choice([20, 25, 30], n),
+        interest_only_months=rng.choice([0, 12, 36], n), interest_only=rng.random(n) < 0.2,
+        hold_months=rng.integers(12, 361, n), exit_cap_rate=rng.uniform(0.04, 0.09, n),
+        equity=rng.uniform(500_000, 2_000_000, n),
+    )
+
+    together = project_cash_flows(**inputs)
+
+    for i in range(0, n, 7):
+        alone = project_cash_flows(**{name: values[i:i + 1] for name, values in inputs.items()})
+        for field in ("salePrice", "remainingBalance", "totalDistributions", "irr", "npv"):
+            np.testing.assert_allclose(together[field][i], alone[field][0], rtol=1e-9, err_msg=field)
+
+
+@pytest.mark.parametrize("name", ["levered", "all cash", "interest only past the hold", "fractional hold"])
+def test_projection_matches_the_scalar_analysis(name):
+    deal_input = DealInput.model_validate(DEALS[name])
+    loan_terms, exit_assumptions = deal_input.loanTerms, deal_input.exitAssumptions
+    loan_amount = deal_input.purchasePrice * loan_terms.ltv / 100
+    growth = exit_assumptions.annualAppreciation / 100
+
+    projection = project_cash_flows(
+        monthly_rent=deal_input.total_monthly_rent(),
+        vacancy_rate=deal_input.vacancyRate / 100,
+        annual_expenses=sum(getattr(deal_input.operatingExpenses, field) for field in EXPENSE_FIELDS),
+        rent_growth=growth,
+        expense_growth=growth,
+        loan_amount=loan_amount,
+        annual_rate=loan_terms.interestRate,
+        amortization_years=loan_terms.amortizationPeriod,
+        interest_only_months=loan_terms.interestOnlyMonths,
+        interest_only=loan_terms.isInterestOnly,
+        hold_months=round(exit_assumptions.holdPeriod * 12),
+        exit_cap_rate=exit_assumptions.exitCapRate / 100,
+        equity=deal_input.purchasePrice - loan_amount,
+        discount_rate=exit_assumptions.discountRate / 100,
+    )
+    metrics = calculate_financial_metrics(DealInput.model_validate(DEALS[name]))
+
+    year_one = slice(0, 12)
+    assert projection["noi"][0, year_one].sum() == pytest.approx(metrics.noi, rel=1e-9)
+    assert projection["cashFlow"][0, year_one].sum() == pytest.approx(metrics.annualCashFlow, rel=1e-9)
+    assert projection["salePrice"][0] == pytest.approx(metrics.exitValue, rel=1e-9)
+    assert projection["remainingBalance"][0] == pytest.approx(metrics.remainingLoanBalance, rel=1e-9, abs=1e-6)
+    assert projection["totalDistributions"][0] == pytest.approx(metrics.totalReturn, rel=1e-9)
+    assert projection["npv"][0] == pytest.approx(metrics.npv, rel=1e-9, abs=1e-6)
+    assert projection["irr"][0] * 100 == pytest.approx(metrics.irr, rel=1e-9)
+
+
+def test_interest_only_past_the_hold_repays_nothing():
+    projection = project_cash_flows(
+        monthly_rent=24_000, vacancy_rate=0.05, annual_expenses=53_000, rent_growth=0.03, expense_growth=0.03,
+        loan_amount=1_680_000, annual_rate=6.5, amortization_years=30, interest_only_months=84,
+        interest_only=False, hold_months=60, exit_cap_rate=0.06, equity=720_000,
+    )
+
+    assert projection["remainingBalance"][0] == pytest.approx(1_680_000)
+    np.testing.assert_allclose(projection["debtService"][0, :60], 1_680_000 * 0.065 / 12)
+
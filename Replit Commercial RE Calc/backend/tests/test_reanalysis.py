@@ -0,0 +1,109 @@
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.main_simple import app
+from app.schemas.deal import DealInput
+from app.services.analysis_stages import STAGE_NAMES, changed_stages, patch_deal_input, run_stages
+from deals import DEALS, deal
+
+# Patch -> the stages reading a field it changes, and those downstream of them
+PATCHES = {
+    "exit cap rate": ([{"op": "replace", "path": "/exitAssumptions/exitCapRate", "value": 6.5}],
+                      {"exit", "returns", "grading"}),
+    "discount rate": ([{"op": "add", "path": "/exitAssumptions/discountRate", "value": 9}], {"returns", "grading"}),
+    "appreciation": ([{"op": "replace", "path": "/exitAssumptions/annualAppreciation", "value": 2}],
+                     {"cashFlows", "exit", "returns", "grading"}),
+    "interest rate": ([{"op": "replace", "path": "/loanTerms/interestRate", "value": 7.25}],
+                      {"debt", "cashFlows", "exit", "returns", "grading"}),
+    "expenses": ([{"op": "replace", "path": "/operatingExpenses/insurance", "value": 12_000}],
+                 {"noi", "cashFlows", "exit", "returns", "grading"}),
+    "one rent": ([{"op": "replace", "path": "/rentRoll/3/monthlyRent", "value": 1_900}], set(STAGE_NAMES) - {"debt"}),
+    "property type": ([{"op": "replace", "path": "/propertyType", "value": "Office"}], {"grading"}),
+    "capex only": ([{"op": "replace", "path": "/capexBudget", "value": 55_000}], set()),
+}
+
+
+def comparable(body: dict) -> dict:
+    """A DealAnalysis body without what differs between equal analyses reached different ways"""
+    return {key: value for key, value in body.items() if key not in ("previousAnalysisId", "stages")}
+
+
+@pytest.mark.parametrize("name", list(PATCHES))
+def test_patch_reruns_only_the_affected_stages_and_matches_a_full_analysis(name):
+    operations, expected = PATCHES[name]
+    previous = DealInput.model_validate(deal())
+    previous_results, _ = run_stages(previous)
+
+    patched = patch_deal_input(previous, operations)
+    changed = changed_stages(previous, patched)
+    results, timings = run_stages(patched, previous_results, changed)
+    full, _ = run_stages(patched)
+
+    assert {timing["stage"] for timing in timings if timing["recomputed"]} == expected
+    assert [timing["stage"] for timing in timings] == list(STAGE_NAMES)
+    assert results["returns"]["metrics"] == full["returns"]["metrics"]
+    assert results["grading"]["analysis"] == full["grading"]["analysis"]
+    # The previous input is left as it was
+    assert previous == DealInput.model_validate(deal())
+
+
+def test_patch_not_touching_the_rent_roll_carries_it_over():
+    previous = DealInput.model_validate(deal())
+
+    patched = patch_deal_input(previous, [{"op": "replace", "path": "/vacancyRate", "value": 7}])
+    rent_patched = patch_deal_input(previous, [{"op": "remove", "path": "/rentRoll/0"}])
+
+    assert patched.rentRoll is previous.rentRoll and patched.vacancyRate == 7
+    assert len(rent_patched.rentRoll) == len(previous.rentRoll) - 1
+
+
+@pytest.mark.parametrize("operations", [
+    [{"op": "replace", "path": "/noSuchField/x", "value": 1}],
+    [{"op": "test", "path": "/purchasePrice", "value": 1}],
+    [{"op": "replace", "path": "/purchasePrice", "value": "a lot"}],
+], ids=["missing path", "failed test", "invalid input"])
+def test_patch_that_does_not_apply_raises_value_error(operations):
+    with pytest.raises(ValueError):
+        patch_deal_input(DealInput.model_validate(deal()), operations)
+
+
+@pytest.mark.parametrize("name", ["exit cap rate", "interest rate", "one rent"])
+def test_reanalyze_endpoint_matches_analyzing_the_patched_deal(name):
+    operations, expected = PATCHES[name]
+    client = TestClient(app)
+    analysis_id = client.post("/api/analyze-deal", json=DEALS["levered"]).json()["analysisId"]
+
+    response = client.post("/api/reanalyze-deal", json={"analysisId": analysis_id, "patch": operations})
+
+    assert response.status_code == 200
+    body = response.json()
+    assert body["previousAnalysisId"] == analysis_id
+    assert {stage["stage"] for stage in body["stages"] if stage["recomputed"]} == expected
+
+    patched = DealInput.model_validate(DEALS["levered"]).model_dump(mode="json")
+    for operation in operations:
+        # Every patch here replaces one value
+        *parents, last = operation["path"].strip("/").split("/")
+        target = patched
+        for token in parents:
+            target = target[int(token)] if isinstance(target, list) else target[token]
+        target[int(last) if isinstance(target, list) else last] = operation["value"]
+    full = client.post("/api/analyze-deal", json=patched)
+    assert full.json()["analysisId"] == body["analysisId"]
+    assert response.headers["etag"] == full.headers["etag"]
+    assert comparable(body) == comparable(json.loads(full.content))
+
+
+def test_reanalyze_endpoint_rejects_unknown_analyses_and_bad_patches():
+    client = TestClient(app)
+    analysis_id = client.post("/api/analyze-deal", json=DEALS["levered"]).json()["analysisId"]
+
+    unknown = client.post("/api/reanalyze-deal", json={"analysisId": "1-missing", "patch": []})
+    bad = client.post("/api/reanalyze-deal", json={
+        "analysisId": analysis_id, "patch": [{"op": "test", "path": "/purchasePrice", "value": 1}],
+    })
+
+    assert unknown.status_code == 404
+    assert bad.status_code == 400 and "Test failed" in bad.json()["detail"]
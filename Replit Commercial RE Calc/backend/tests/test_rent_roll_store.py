@@ -0,0 +1,98 @@
+import pytest
+from sqlalchemy import select
+
+from app.core.config import settings
+from app.core.database import count_queries
+from app.models.rent_roll import RentRollUnit as RentRollUnitRecord
+from app.schemas.deal import DealInput
+from app.services.deal_service import DealService
+from app.services.rent_roll_store import COLUMN_NAMES, rent_roll_values, replace_units
+from deals import deal
+
+
+async def stored_units(db, deal_id: int) -> list:
+    """(id, *COLUMN_NAMES values) of a deal's stored units, in insertion order"""
+    columns = (getattr(RentRollUnitRecord, column) for column in COLUMN_NAMES)
+    query = select(RentRollUnitRecord.id, *columns).where(RentRollUnitRecord.deal_id == deal_id)
+    return [tuple(row) for row in (await db.execute(query.order_by(RentRollUnitRecord.id))).all()]
+
+
+async def saved_deal(db, **overrides) -> int:
+    return (await DealService(db).create_deal(DealInput.model_validate(deal(**overrides)))).id
+
+
+def test_units_are_indexed_by_deal():
+    assert RentRollUnitRecord.__table__.c.deal_id.index
+
+
+@pytest.mark.asyncio
+async def test_replace_units_writes_only_the_rows_that_differ(sessions, monkeypatch):
+    monkeypatch.setattr(settings, "RENT_ROLL_WRITE_BATCH", 4)
+    async with sessions() as db:
+        deal_id = await saved_deal(db)
+        other_id = await saved_deal(db)
+        before = await stored_units(db, deal_id)
+        ids = {row[1]: row[0] for row in before}
+        values = [row[1:] for row in before]
+
+        # Unit 100 unchanged, 101 re-rented, 102 removed, 199 added, the rest unchanged
+        changed = (*values[1][:5], values[1][5] + 100, values[1][6])
+        added = ("199", "Studio", 0, 1, 450.0, 1_050.0, True)
+        new_values = [values[0], changed, *values[3:], added]
+        counts = await replace_units(db, deal_id, new_values)
+        await db.commit()
+
+        after = await stored_units(db, deal_id)
+        assert counts == {"inserted": 1, "updated": 1, "deleted": 1, "unchanged": len(values) - 2}
+        assert sorted(row[1:] for row in after) == sorted(new_values)
+        # Rows kept or updated in place keep their ids
+        assert {row[1]: row[0] for row in after if row[1] != "199"} == {
+            unit: unit_id for unit, unit_id in ids.items() if unit != "102"
+        }
+        # The other deal's units are untouched
+        assert len(await stored_units(db, other_id)) == len(values)
+
+
+@pytest.mark.asyncio
+async def test_replacing_with_the_same_units_writes_nothing(engine, sessions):
+    async with sessions() as db:
+        deal_id = await saved_deal(db)
+        values = rent_roll_values(DealInput.model_validate(deal()))
+
+        with count_queries(engine) as statements:
+            counts = await replace_units(db, deal_id, values)
+
+    assert counts == {"inserted": 0, "updated": 0, "deleted": 0, "unchanged": len(values)}
+    # Just the read of the stored rows
+    assert len(statements) == 1
+
+
+@pytest.mark.asyncio
+async def test_repeated_unit_numbers_are_matched_in_order(sessions):
+    units = [
+        {"unitNumber": "A", "unitType": "1BR", "bedrooms": 1, "bathrooms": 1, "squareFootage": 600,
+         "monthlyRent": rent, "occupied": True}
+        for rent in (1_000, 1_100, 1_200)
+    ]
+    async with sessions() as db:
+        deal_id = await saved_deal(db, rentRoll=units, numberOfUnits=3)
+        values = rent_roll_values(DealInput.model_validate(deal(rentRoll=units, numberOfUnits=3)))
+
+        # The first A changes; the third is dropped
+        counts = await replace_units(db, deal_id, [(*values[0][:5], 950.0, True), values[1]])
+        await db.commit()
+
+        assert counts == {"inserted": 0, "updated": 1, "deleted": 1, "unchanged": 1}
+        assert [row[6] for row in await stored_units(db, deal_id)] == [950.0, 1_100.0]
+
+
+@pytest.mark.asyncio
+async def test_update_deal_replaces_the_stored_rent_roll(sessions):
+    async with sessions() as db:
+        deal_id = await saved_deal(db)
+        smaller = deal(rentRoll=deal()["rentRoll"][:10], numberOfUnits=10)
+
+        updated = await DealService(db).update_deal(deal_id, DealInput.model_validate(smaller))
+
+        assert len(updated.rent_roll_units) == 10
+        assert [row[1:] for row in await stored_units(db, deal_id)] == rent_roll_values(DealInput.model_validate(smaller))
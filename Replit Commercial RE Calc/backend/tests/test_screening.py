@@ -0,0 +1,87 @@
+import pytest
+import pytest_asyncio
+
+from app.api.routes import analysis
+from app.main_simple import calculate_financial_metrics
+from app.schemas.deal import DealInput
+from app.services import analysis_snapshots
+from app.services.deal_service import DealService
+from deals import DEALS, deal
+
+PRICES = (1_800_000, 2_100_000, 2_400_000, 2_700_000, 3_000_000)
+
+
+@pytest_asyncio.fixture
+async def client(sessions, router_client):
+    """Analysis router on a database of analyzed deals: one per price, plus an all-cash deal"""
+    payloads = [deal(purchasePrice=price) for price in PRICES] + [DEALS["all cash"]]
+    async with sessions() as db:
+        service = DealService(db)
+        ids = [(await service.create_deal(DealInput.model_validate(payload))).id for payload in payloads]
+        # Storing the analyses is what fills the screening index
+        await analysis_snapshots.get_deal_metrics(db, ids)
+    client = router_client(analysis.router, "/analysis")
+    client.expected = {
+        deal_id: calculate_financial_metrics(DealInput.model_validate(payload))
+        for deal_id, payload in zip(ids, payloads)
+    }
+    return client
+
+
+async def screen_all(client, **request) -> list:
+    """Every page of a screen, one list of deals per page"""
+    pages, cursor = [], None
+    while True:
+        response = await client.post("/analysis/screen", json={**request, "cursor": cursor})
+        assert response.status_code == 200, response.text
+        body = response.json()
+        pages.append(body["items"])
+        cursor = body["nextCursor"]
+        if cursor is None or len(pages) > 10:
+            return pages
+
+
+@pytest.mark.asyncio
+async def test_screen_filters_sorts_and_pages(client):
+    floor = 10.0
+    expected = sorted(
+        (deal_id for deal_id, metrics in client.expected.items() if metrics.goingInCapRate >= floor),
+        # Ties, like the all-cash deal's cap rate, go newest first
+        key=lambda deal_id: (client.expected[deal_id].goingInCapRate, deal_id),
+        reverse=True,
+    )
+
+    pages = await screen_all(client, filters={"capRate": {"min": floor}}, sort="capRate", limit=2)
+
+    assert 2 < len(expected) < len(client.expected)
+    assert all(len(page) == 2 for page in pages[:-1])
+    items = [item for page in pages for item in page]
+    assert [item["dealId"] for item in items] == expected
+    for item in items:
+        assert item["capRate"] == pytest.approx(client.expected[item["dealId"]].goingInCapRate)
+        assert item["irr"] == pytest.approx(client.expected[item["dealId"]].irr)
+
+
+@pytest.mark.asyncio
+async def test_screen_combines_ranges_and_sends_missing_dscr_as_null(client):
+    levered = {deal_id for deal_id, metrics in client.expected.items() if metrics.dscr != float("inf")}
+
+    filters = {"units": {"min": 10, "max": 20}}
+    pages = await screen_all(client, filters=filters, sort="irr", descending=False, limit=10)
+
+    items = pages[0]
+    assert len(pages) == 1 and len(items) == len(client.expected)
+    assert [item["irr"] for item in items] == sorted(item["irr"] for item in items)
+    assert {item["dealId"] for item in items if item["dscr"] is not None} == levered
+
+    high_dscr = await screen_all(client, filters={"dscr": {"min": 1.25}, "units": {"min": 10}}, limit=10)
+    assert {item["dealId"] for item in high_dscr[0]} == {
+        deal_id for deal_id, metrics in client.expected.items() if metrics.dscr >= 1.25
+    }
+
+
+@pytest.mark.asyncio
+async def test_screen_rejects_unknown_metrics(client):
+    response = await client.post("/analysis/screen", json={"filters": {"color": {"min": 1}}})
+
+    assert response.status_code == 400
@@ -0,0 +1,163 @@
+import base64
+import itertools
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+from app.main_simple import app
+from app.schemas.deal import DealInput
+from app.services.batch_metrics import (
+    DEFAULT_EXPENSE_RATIO,
+    DEFAULT_RENT_PER_UNIT,
+    METRIC_COLUMNS,
+    calculate_financial_metrics_batch,
+    deals_to_columns,
+)
+from app.services.sensitivity import (
+    MAX_GRID_CELLS,
+    NESTED_GRID_CELLS,
+    NON_NEGATIVE_COLUMNS,
+    SENSITIVITY_PARAMETERS,
+    sensitivity_grid,
+)
+from deals import DEALS, deal
+
+GRID_DEALS = {
+    **DEALS,
+    "no rent roll or expenses": deal(
+        rentRoll=[], operatingExpenses={"propertyTax": 0, "insurance": 0, "maintenance": 0}
+    ),
+}
+
+# Every parameter, with adjustments that push rates below 0 and the exit cap onto its default
+AXES = [
+    ("purchasePrice", np.array([-10.0, 0.0, 15.0])),
+    ("monthlyRent", np.array([-20.0, 5.0])),
+    ("operatingExpenses", np.array([-30.0, 10.0])),
+    ("vacancyRate", np.array([-10.0, 3.0])),
+    ("interestRate", np.array([-7.0, 1.0])),
+    ("exitCapRate", np.array([-7.0, 0.0, 1.0])),
+    ("annualAppreciation", np.array([-1.0, 2.0])),
+]
+
+
+def adjusted_cells(columns):
+    """Every cell of AXES as its own deal, adjusting the estimated rent and expenses like the scalar path would"""
+    base = {name: float(values[0]) for name, values in columns.items()}
+    if base["monthlyRent"] == 0:
+        base["monthlyRent"] = base["numberOfUnits"] * DEFAULT_RENT_PER_UNIT
+    cells = []
+    for adjustments in itertools.product(*(values for _, values in AXES)):
+        cell = dict(base)
+        expense_factor = 1.0
+        for (parameter, _), adjustment in zip(AXES, adjustments):
+            column, mode = SENSITIVITY_PARAMETERS[parameter]
+            if column == "operatingExpenses" and base["operatingExpenses"] == 0:
+                expense_factor *= 1 + adjustment / 100
+                continue
+            cell[column] = cell[column] * (1 + adjustment / 100) if mode == "percent" else cell[column] + adjustment
+            if column in NON_NEGATIVE_COLUMNS:
+                cell[column] = max(cell[column], 0.0)
+        if base["operatingExpenses"] == 0:
+            income = cell["monthlyRent"] * 12 * (1 - cell["vacancyRate"] / 100)
+            cell["operatingExpenses"] = income * DEFAULT_EXPENSE_RATIO * expense_factor
+        cells.append(cell)
+
+    flat = {name: np.array([cell[name] for cell in cells]) for name in columns}
+    flat["isInterestOnly"] = flat["isInterestOnly"].astype(bool)
+    return flat
+
+
+@pytest.mark.parametrize("name", list(GRID_DEALS))
+def test_grid_matches_batch_engine_cell_by_cell(name):
+    columns = deals_to_columns([DealInput.model_validate(GRID_DEALS[name])])
+
+    grid = sensitivity_grid(columns, AXES, METRIC_COLUMNS)
+    expected = calculate_financial_metrics_batch(adjusted_cells(columns))
+
+    for metric in METRIC_COLUMNS:
+        assert grid.metrics[metric].shape == tuple(len(values) for _, values in AXES)
+        np.testing.assert_allclose(grid.metrics[metric].ravel(), expected[metric], rtol=1e-9, atol=1e-6, err_msg=metric)
+
+
+def test_adjustments_apply_to_estimated_inputs():
+    columns = deals_to_columns([DealInput.model_validate(GRID_DEALS["no rent roll or expenses"])])
+    axes = [("monthlyRent", np.array([-10.0, 0.0])), ("operatingExpenses", np.array([0.0, 20.0]))]
+
+    grid = sensitivity_grid(columns, axes, ["noi"])
+
+    assert grid.estimated == ["monthlyRent", "operatingExpenses"]
+    noi = grid.metrics["noi"]
+    assert noi[0, 0] == pytest.approx(0.9 * noi[1, 0])
+    assert noi[1, 1] < noi[1, 0]
+
+
+def test_endpoint_returns_applied_axis_values():
+    response = TestClient(app).post("/api/sensitivity-analysis", json={
+        "dealInput": DEALS["all cash"],
+        "axes": [
+            {"parameter": "purchasePrice", "low": -10, "high": 10, "steps": 3},
+            {"parameter": "exitCapRate", "values": [-0.5, 0.5]},
+        ],
+    })
+
+    assert response.status_code == 200
+    body = response.json()
+    assert body["axes"] == [
+        {"parameter": "purchasePrice", "values": [-10.0, 0.0, 10.0]},
+        {"parameter": "exitCapRate", "values": [-0.5, 0.5]},
+    ]
+    assert body["shape"] == [3, 2]
+    assert body["estimatedInputs"] == []
+    # No debt service, so no DSCR
+    assert body["metrics"]["dscr"] == [[None, None]] * 3
+    assert len(body["metrics"]["irr"]) == 3
+
+
+def test_endpoint_rejects_oversized_grid():
+    steps = int(np.ceil(MAX_GRID_CELLS ** (1 / 3))) + 1
+    axes = [
+        {"parameter": parameter, "low": -5, "high": 5, "steps": steps}
+        for parameter in ("purchasePrice", "monthlyRent", "vacancyRate")
+    ]
+    response = TestClient(app).post("/api/sensitivity-analysis", json={"dealInput": deal(), "axes": axes})
+
+    assert response.status_code == 400
+
+
+def float32_grid(body: dict, metric: str) -> np.ndarray:
+    return np.frombuffer(base64.b64decode(body["metrics"][metric]), dtype="<f4").reshape(body["shape"])
+
+
+def test_endpoint_encodes_grids_as_requested():
+    request = {"dealInput": DEALS["all cash"], "axes": [{"parameter": "purchasePrice", "low": -10, "high": 10, "steps": 5}]}
+    client = TestClient(app)
+
+    nested = client.post("/api/sensitivity-analysis", json=request).json()
+    packed = client.post("/api/sensitivity-analysis", json={**request, "encoding": "float32"}).json()
+
+    assert (nested["encoding"], packed["encoding"]) == ("nested", "float32")
+    for metric, values in nested["metrics"].items():
+        expected = np.array([np.nan if value is None else value for value in values], dtype="<f4")
+        np.testing.assert_array_equal(float32_grid(packed, metric), expected)
+    assert client.post("/api/sensitivity-analysis", json={**request, "encoding": "csv"}).status_code == 422
+
+
+def test_endpoint_answers_six_axes_of_eleven_steps():
+    parameters = ["purchasePrice", "monthlyRent", "operatingExpenses", "vacancyRate", "interestRate", "exitCapRate"]
+    axes = [{"parameter": parameter, "low": -5, "high": 5, "steps": 11} for parameter in parameters]
+
+    response = TestClient(app).post("/api/sensitivity-analysis", json={"dealInput": deal(), "axes": axes})
+
+    assert response.status_code == 200
+    body = response.json()
+    assert body["shape"] == [11] * 6 and 11 ** 6 > NESTED_GRID_CELLS
+    assert body["encoding"] == "float32"
+    # The corner cells, each against a grid of that one cell
+    for corner in itertools.product([0, 10], repeat=6):
+        cell_axes = [(parameter, np.array([-5.0 + index])) for parameter, index in zip(parameters, corner)]
+        expected = sensitivity_grid(deals_to_columns([DealInput.model_validate(deal())]), cell_axes)
+        for metric in expected.metrics:
+            value = float32_grid(body, metric)[corner]
+            assert value == pytest.approx(expected.metrics[metric].item(), rel=1e-6), (metric, corner)
@@ -0,0 +1,63 @@
+from concurrent.futures import ProcessPoolExecutor
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.main_simple import app
+from app.schemas.deal import DealInput
+from app.services.batch_metrics import deals_to_columns
+from app.services.simulation import CHUNK_PATHS, PERCENTILES, run_simulation
+from deals import DEALS
+
+DISTRIBUTIONS = {
+    "rentGrowth": {"kind": "normal", "mean": 3.0, "std": 1.5},
+    "vacancyRate": {"kind": "triangular", "low": 2.0, "mode": 5.0, "high": 15.0},
+    "exitCapRate": {"kind": "uniform", "low": 5.0, "high": 7.5},
+    "interestRate": {"kind": "normal", "mean": 6.5, "std": 0.5},
+}
+
+# Three chunks, the last one short
+PATHS = 2 * CHUNK_PATHS + 1_234
+
+
+def simulate(executor=None, seed: int = 7, name: str = "levered") -> dict:
+    columns = deals_to_columns([DealInput.model_validate(DEALS[name])])
+    return run_simulation(columns, DISTRIBUTIONS, PATHS, seed, executor)
+
+
+def test_same_seed_gives_the_same_results_however_many_workers():
+    inline = simulate()
+    with ProcessPoolExecutor(max_workers=1) as one, ProcessPoolExecutor(max_workers=3) as three:
+        assert simulate(one) == inline
+        assert simulate(three) == inline
+
+    assert simulate(seed=8) != inline
+    assert inline["irr"]["p5"] < inline["irr"]["p50"] < inline["irr"]["p95"]
+
+
+def test_all_cash_deal_has_no_dscr():
+    result = simulate(name="all cash")
+
+    assert result["dscr"] == {"mean": None, **{f"p{p}": None for p in PERCENTILES}}
+    assert result["probabilityDscrBelowOne"] == 0.0
+    assert result["irr"]["mean"] is not None
+
+
+def test_endpoint_sends_missing_dscr_as_null():
+    response = TestClient(app).post("/api/simulate-deal", json={
+        "dealInput": DEALS["all cash"], "distributions": DISTRIBUTIONS, "paths": 500, "seed": 1,
+    })
+
+    assert response.status_code == 200
+    body = response.json()
+    assert body["dscr"]["mean"] is None and body["dscr"]["p50"] is None
+    assert body["irr"]["p50"] is not None
+
+
+@pytest.mark.parametrize("distributions", [{"capRate": {"kind": "fixed", "mean": 6}}, {"vacancyRate": {"kind": "beta"}}])
+def test_endpoint_rejects_unknown_inputs_and_distributions(distributions):
+    response = TestClient(app).post("/api/simulate-deal", json={
+        "dealInput": DEALS["levered"], "distributions": distributions, "paths": 10,
+    })
+
+    assert response.status_code == 400
@@ -1,6 +1,6 @@
 'use client'
 
-import { useState } from 'react'
+import { useRef, useState } from 'react'
 import { Box, VStack, useSteps, Step, StepIcon, StepIndicator, StepNumber, StepSeparator, StepStatus, StepTitle, Stepper, Text as ChakraText } from '@chakra-ui/react'
 import DealInputForm from './DealInputForm'
 import DealResults from './DealResults'
@@ -19,6 +19,8 @@ export default function DealAnalyzer() {
   const [analysis, setAnalysis] = useState<DealAnalysis | null>(null)
   const [currentStep, setCurrentStep] = useState(0)
   const [isAnalyzing, setIsAnalyzing] = useState(false)
+  // ETag of the last analysis; an unchanged input comes back as 304 with no body
+  const lastAnalysis = useRef<{ etag: string; result: DealAnalysis } | null>(null)
 
   const { activeStep } = useSteps({
     index: currentStep,
@@ -44,12 +46,19 @@ export default function DealAnalyzer() {
         method: 'POST',
         headers: {
           'Content-Type': 'application/json',
+          ...(lastAnalysis.current ? { 'If-None-Match': lastAnalysis.current.etag } : {}),
         },
         body: JSON.stringify(input),
       })
 
       console.log('API response status:', response.status)
 
+      if (response.status === 304 && lastAnalysis.current) {
+        setAnalysis(lastAnalysis.current.result)
+        setCurrentStep(4) // Move to results step
+        return
+      }
+
       if (!response.ok) {
         const errorData = await response.text()
         console.error('API error response:', errorData)
@@ -59,6 +68,9 @@ export default function DealAnalyzer() {
       const result = await response.json()
       console.log('Analysis result:', result)
 
+      const etag = response.headers.get('ETag')
+      lastAnalysis.current = etag ? { etag, result } : null
+
       setAnalysis(result)
       setCurrentStep(4) // Move to results step
 
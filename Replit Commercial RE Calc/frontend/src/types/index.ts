@@ -11,6 +11,17 @@ export interface RentRollUnit {
   leaseEndDate?: string
 }
 
+// Columnar rent roll: the RentRollUnit fields as parallel arrays, one entry per unit
+export interface RentRollColumns {
+  unitNumber: string[]
+  unitType: string[]
+  bedrooms: number[]
+  bathrooms: number[]
+  squareFootage: number[]
+  monthlyRent: number[]
+  occupied: boolean[]
+}
+
 export interface OperatingExpenses {
   propertyTax: number
   insurance: number
@@ -36,6 +47,7 @@ export interface ExitAssumptions {
   exitCapRate: number
   annualAppreciation: number
   marketCapRate: number
+  discountRate?: number
 }
 
 export interface DealInput {
@@ -43,6 +55,7 @@ export interface DealInput {
   purchasePrice: number
   numberOfUnits: number
   rentRoll: RentRollUnit[]
+  rentRollColumns?: RentRollColumns
   vacancyRate: number
   operatingExpenses: OperatingExpenses
   capexBudget: number
@@ -64,6 +77,8 @@ export interface FinancialMetrics {
   totalReturn: number
   annualCashFlow: number
   exitValue: number
+  npv?: number
+  remainingLoanBalance?: number
 }
 
 export interface SensitivityTable {
@@ -72,6 +87,38 @@ export interface SensitivityTable {
   irrs: number[]
 }
 
+export type SensitivityParameter =
+  | 'purchasePrice'
+  | 'monthlyRent'
+  | 'operatingExpenses'
+  | 'vacancyRate'
+  | 'interestRate'
+  | 'exitCapRate'
+  | 'annualAppreciation'
+
+export interface SensitivityAxis {
+  parameter: SensitivityParameter
+  values?: number[]
+  low?: number
+  high?: number
+  steps?: number
+}
+
+// The adjustments applied along one axis of a grid
+export interface SensitivityGridAxis {
+  parameter: SensitivityParameter
+  values: number[]
+}
+
+// Metric values nested one array level per axis, in axis order; null where not finite
+export interface SensitivityGrid {
+  axes: SensitivityGridAxis[]
+  shape: number[]
+  metrics: Record<string, unknown[]>
+  // Inputs the deal left at 0 that were estimated before being adjusted
+  estimatedInputs: string[]
+}
+
 export interface AIAnalysis {
   summary: string
   redFlags: string[]
@@ -82,6 +129,79 @@ export interface DealAnalysis {
   dealInput: DealInput
   financialMetrics: FinancialMetrics
   aiAnalysis: AIAnalysis
+  analysisId?: string
+}
+
+export interface JsonPatchOperation {
+  op: 'add' | 'remove' | 'replace' | 'move' | 'copy' | 'test'
+  path: string
+  value?: unknown
+  from?: string
+}
+
+export interface StageTiming {
+  stage: 'income' | 'noi' | 'debt' | 'cashFlows' | 'exit' | 'returns' | 'grading'
+  recomputed: boolean
+  milliseconds: number
+}
+
+export interface DealReanalysis extends DealAnalysis {
+  previousAnalysisId: string
+  stages: StageTiming[]
+}
+
+export interface MetricRange {
+  min?: number
+  max?: number
+}
+
+export interface ScreeningRequest {
+  filters?: Record<string, MetricRange>
+  sort?: string
+  descending?: boolean
+  cursor?: string
+  limit?: number
+}
+
+export interface ScreenedDeal {
+  dealId: number
+  capRate: number
+  dscr?: number
+  irr: number
+  cashOnCash: number
+  equityMultiple: number
+  noi: number
+  purchasePrice: number
+  units: number
+}
+
+export interface ScreeningPage {
+  items: ScreenedDeal[]
+  nextCursor?: string
+}
+
+export interface PortfolioSummary {
+  dealCount: number
+  unitCount: number
+  totalPurchasePrice: number
+  analyzedDeals: number
+  totalNoi: number
+  weightedCapRate?: number
+  totalAnnualDebtService: number
+  dscr?: number
+  equityDeployed: number
+  updatedAt?: string
+}
+
+export interface DealMetrics {
+  dealId: number
+  financialMetrics: FinancialMetrics
+  aiAnalysis: AIAnalysis
+  inputHash: string
+  calculatorVersion: number
+  gradingRules?: string
+  computedAt?: string
+  recomputed: boolean
 }
 
 export interface AIAnalysis {
@@ -97,10 +217,41 @@ export interface DealAnalysis {
   aiAnalysis: AIAnalysis
 }
 
+export interface RentRollParseSummary {
+  unitCount: number
+  occupiedUnits: number
+  totalMonthlyRent: number
+  rejectedRows: number
+  errors: string[]
+  columns: Record<string, string>
+}
+
 export interface FileUploadResponse {
   success: boolean
-  data?: RentRollUnit[]
+  // List of units by default; columnar when the upload was streamed
+  data?: RentRollUnit[] | RentRollColumns
+  summary?: RentRollParseSummary
+  message?: string
+  error?: string
+}
+
+export type JobState = 'queued' | 'running' | 'succeeded' | 'failed' | 'cancelled'
+
+export interface JobSubmission {
+  jobId: string
+  type: string
+  status: JobState
+}
+
+export interface JobStatus extends JobSubmission {
+  progress: number  // 0 to 1
+  message?: string
   error?: string
+  attempts: number
+  createdAt: string
+  startedAt?: string
+  finishedAt?: string
+  expiresAt?: string
 }
 
 export interface ApiResponse<T> {